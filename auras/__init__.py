@@ -125,7 +125,14 @@ async def check_calendar_reminders_task(karina_client):
     """
     Утренняя проверка календаря на сегодня (7:00)
     Создаёт напоминания за 15 минут до каждого события
+
+    Если в процессе работает синхронизация календаря (brains.calendar_sync),
+    напоминания ставятся по изменениям событий и эта проверка не нужна.
     """
+    from brains.calendar_sync import is_sync_running
+    if is_sync_running():
+        return
+
     moscow_tz = timezone(timedelta(hours=3))
     now = datetime.now(moscow_tz)
 
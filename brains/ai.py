@@ -2,54 +2,24 @@ import httpx
 import logging
 import json
 import asyncio
-import time
 from datetime import datetime
 
 from brains.config import MISTRAL_API_KEY
 from brains.memory import search_memories
-from brains.clients import http_client, MISTRAL_URL, MODEL_NAME
+from brains.clients import http_clients, MISTRAL, MISTRAL_URL, MODEL_NAME
 from brains.chat_history import chat_history_cache
+from brains.rate_limiter import mistral_limiter
+from brains.circuit_breaker import CircuitBreaker, breaker_registry, parse_retry_after, MISTRAL_CHAT
 
 logger = logging.getLogger(__name__)
 
-class CircuitBreaker:
-    def __init__(self, max_failures=3, recovery_time=60):
-        self.max_failures = max_failures
-        self.recovery_time = recovery_time
-        self.failures = 0
-        self.last_failure_time = 0
-        self.is_open = False
-
-    def record_failure(self):
-        self.failures += 1
-        self.last_failure_time = time.time()
-        if self.failures >= self.max_failures:
-            self.is_open = True
-            logger.error(f"🚨 AI Circuit Breaker OPENED (failures: {self.failures})")
-
-    def record_success(self):
-        if self.is_open:
-            logger.info("✅ AI Circuit Breaker CLOSED (recovered)")
-        self.failures = 0
-        self.is_open = False
-
-    def can_proceed(self):
-        if not self.is_open:
-            return True
-        if time.time() - self.last_failure_time > self.recovery_time:
-            # Даем шанс на восстановление
-            return True
-        return False
-
-ai_breaker = CircuitBreaker()
-
-# ========== HTTP CLIENT ==========
-
-# Глобальный клиент для переиспользования соединений
+# Circuit breaker чата Mistral (CircuitBreaker реэкспортируется для совместимости)
+ai_breaker = breaker_registry.get(MISTRAL_CHAT)
+ai_retry_budget = breaker_registry.budget(MISTRAL_CHAT)
 
 async def mistral_request_with_retry(url, headers, payload, max_retries=2):
     """
-    Запрос к Mistral API с retry для 429 ошибок и обработкой различных типов ошибок.
+    Запрос к Mistral API через circuit breaker и retry budget.
     
     Args:
         url: URL API
@@ -60,79 +30,83 @@ async def mistral_request_with_retry(url, headers, payload, max_retries=2):
     Returns:
         JSON ответ или None при неудаче
     """
-    for attempt in range(max_retries):
-        try:
-            response = await http_client.post(url, json=payload, headers=headers)
-
-            if response.status_code == 200:
-                ai_breaker.record_success()
-                return response.json()
-            elif response.status_code == 429:
-                # Rate limit — экспоненциальная задержка
-                wait_time = (attempt + 1) * 2
-                logger.warning(f"⚠️ Mistral API rate limit (429). Попытка {attempt + 1}/{max_retries}. Жду {wait_time}s...")
-                await asyncio.sleep(wait_time)
-                # Не считаем это за failure для circuit breaker
-            elif response.status_code == 401:
-                # Authentication error — не имеет смысла retry
-                logger.error(f"🔐 Mistral API Authentication Error (401). Проверьте API ключ.")
-                ai_breaker.record_failure()
-                return None
-            elif response.status_code == 400:
-                # Bad request — ошибка в параметрах
-                logger.error(f"❌ Mistral API Bad Request (400): {response.text[:200]}")
-                ai_breaker.record_failure()
-                return None
-            elif response.status_code >= 500:
-                # Server error — можно retry
-                logger.warning(f"⚠️ Mistral API Server Error ({response.status_code}). Попытка {attempt + 1}/{max_retries}.")
+    if not ai_breaker.allow_request():
+        logger.warning("⚠️ Mistral Circuit Breaker открыт. Запрос отклонён.")
+        return None
+    ai_retry_budget.record_request()
+
+    # Проба half-open, не сообщившая результат (429, бюджет), освобождается на любом выходе
+    try:
+        for attempt in range(max_retries):
+            retry_after = None
+            try:
+                await mistral_limiter.wait_if_needed()
+                response = await http_clients.get(MISTRAL).post(url, json=payload, headers=headers)
+
+                if response.status_code == 200:
+                    ai_breaker.record_success()
+                    return response.json()
+                elif response.status_code == 429:
+                    # Rate limit — ждём сколько просит сервер; не считаем за failure
+                    retry_after = parse_retry_after(response.headers)
+                    logger.warning(f"⚠️ Mistral API rate limit (429). Попытка {attempt + 1}/{max_retries}.")
+                elif response.status_code == 401:
+                    # Authentication error — не имеет смысла retry
+                    logger.error(f"🔐 Mistral API Authentication Error (401). Проверьте API ключ.")
+                    ai_breaker.record_failure()
+                    return None
+                elif response.status_code == 400:
+                    # Bad request — ошибка в параметрах, сам сервис исправен
+                    logger.error(f"❌ Mistral API Bad Request (400): {response.text[:200]}")
+                    ai_breaker.record_success()
+                    return None
+                elif response.status_code >= 500:
+                    # Server error — можно retry
+                    logger.warning(f"⚠️ Mistral API Server Error ({response.status_code}). Попытка {attempt + 1}/{max_retries}.")
+                    ai_breaker.record_failure()
+                else:
+                    # Другие ошибки
+                    logger.error(f"❌ Mistral API Error: {response.status_code} - {response.text[:200]}")
+                    ai_breaker.record_failure()
+                    return None
+
+            except httpx.TimeoutException as e:
+                # Таймаут запроса
+                logger.error(f"⌛️ Mistral API Timeout (attempt {attempt + 1}/{max_retries}): {type(e).__name__}")
                 ai_breaker.record_failure()
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
-            else:
-                # Другие ошибки
-                logger.error(f"❌ Mistral API Error: {response.status_code} - {response.text[:200]}")
+
+            except httpx.ConnectError as e:
+                # Ошибка подключения — проблема с сетью
+                logger.error(f"🔌 Mistral API Connect Error (attempt {attempt + 1}/{max_retries}): {e}")
                 ai_breaker.record_failure()
-                return None
 
-        except httpx.TimeoutException as e:
-            # Таймаут запроса
-            logger.error(f"⌛️ Mistral API Timeout (attempt {attempt + 1}/{max_retries}): {type(e).__name__}")
-            ai_breaker.record_failure()
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
-            elif attempt == max_retries - 1:
-                return None
+            except httpx.RequestError as e:
+                # Другие ошибки запроса
+                logger.error(f"❌ Mistral API Request Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
+                ai_breaker.record_failure()
 
-        except httpx.ConnectError as e:
-            # Ошибка подключения — проблема с сетью
-            logger.error(f"🔌 Mistral API Connect Error (attempt {attempt + 1}/{max_retries}): {e}")
-            ai_breaker.record_failure()
-            if attempt < max_retries - 1:
-                await asyncio.sleep(3)  # Более длительная пауза для проблем сети
-            elif attempt == max_retries - 1:
+            except json.JSONDecodeError as e:
+                # Ошибка парсинга JSON ответа
+                logger.error(f"📄 Mistral API JSON Decode Error: {e}")
+                ai_breaker.record_failure()
                 return None
 
-        except httpx.RequestError as e:
-            # Другие ошибки запроса
-            logger.error(f"❌ Mistral API Request Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
-            ai_breaker.record_failure()
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
-            elif attempt == max_retries - 1:
+            except Exception as e:
+                # Неожиданная ошибка — логируем и прекращаем retry
+                logger.exception(f"💥 Mistral API Unexpected Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
+                ai_breaker.record_failure()
                 return None
 
-        except json.JSONDecodeError as e:
-            # Ошибка парсинга JSON ответа
-            logger.error(f"📄 Mistral API JSON Decode Error: {e}")
-            ai_breaker.record_failure()
-            return None
-
-        except Exception as e:
-            # Неожиданная ошибка — логируем и прекращаем retry
-            logger.exception(f"💥 Mistral API Unexpected Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
-            ai_breaker.record_failure()
-            return None
+            # Повторяем только пока breaker закрыт и бюджет повторов не исчерпан
+            if attempt == max_retries - 1 or ai_breaker.is_open:
+                break
+            delay = ai_retry_budget.next_delay(attempt, retry_after)
+            if delay is None:
+                logger.warning("⚠️ Mistral: бюджет повторов исчерпан")
+                break
+            await asyncio.sleep(delay)
+    finally:
+        ai_breaker.release_probe()
 
     return None
 
@@ -430,15 +404,10 @@ async def ask_karina(prompt: str, chat_id: int = 0) -> str:
     if not MISTRAL_API_KEY:
         return "У меня нет ключа от моих новых мозгов... 😔"
 
-    # Проверка Circuit Breaker
-    if not ai_breaker.can_proceed():
-        if ai_breaker.is_open and time.time() - ai_breaker.last_failure_time > ai_breaker.recovery_time:
-            # Автоматически сбрасываем при попытке прохода после времени восстановления
-            logger.info("🔄 AI Circuit Breaker: попытка автоматического восстановления")
-            ai_breaker.record_success()
-        else:
-            logger.warning(f"⚠️ AI Circuit Breaker открыт. Запрос отклонён.")
-            return "Ой, я кажется немного переутомилась... 🧠💨 Дай мне минутку прийти в себя, и я снова буду готова болтать!"
+    # Проверка Circuit Breaker (без резервирования пробы — её займёт сам запрос)
+    if not ai_breaker.is_available():
+        logger.warning(f"⚠️ AI Circuit Breaker открыт. Запрос отклонён.")
+        return "Ой, я кажется немного переутомилась... 🧠💨 Дай мне минутку прийти в себя, и я снова буду готова болтать!"
 
     now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
@@ -469,7 +438,7 @@ async def ask_karina(prompt: str, chat_id: int = 0) -> str:
     messages = [{"role": "system", "content": SYSTEM_PROMPT.format(now=now_str)}] + chat_history
 
     try:
-        # Используем глобальный http_client
+        # Пул соединений Mistral из реестра http_clients
         result = await mistral_request_with_retry(
             MISTRAL_URL, headers,
             {
@@ -544,17 +513,14 @@ async def ask_karina(prompt: str, chat_id: int = 0) -> str:
 
     except asyncio.TimeoutError:
         logger.error("⌛️ Таймаут запроса к Mistral AI")
-        ai_breaker.record_failure()
         return "Я жду ответ слишком долго... Проверь интернет и попробуй снова! 🔌"
 
     except httpx.ConnectError as e:
         logger.error(f"🔌 Ошибка подключения к Mistral: {e}")
-        ai_breaker.record_failure()
         return "Нет подключения к интернету... Проверь сеть! 🌐"
 
     except Exception as e:
         logger.exception(f"💥 Неожиданная ошибка в ask_karina: {type(e).__name__} - {e}")
-        ai_breaker.record_failure()
         return "Кажется, я потеряла связь со своим облачным разумом... 🔌 Попробуй чуть позже!"
 
 
@@ -622,10 +588,13 @@ async def ask_karina_react(prompt: str, chat_id: int = None) -> str:
         response += f"Выполнено шагов: {len(result.steps)}\n\n"
         
         for step in result.steps:
-            response += f"• Шаг {step['step_id']}: OK"
+            response += f"• Шаг {step['step_id']}: OK ({step.get('elapsed', 0):.1f} сек)"
             if step.get('attempts', 1) > 1:
                 response += f" (с попытки {step['attempts']})"
             response += "\n"
+        response += f"\n⏱ Всего: {result.elapsed:.1f} сек\n"
+        if result.plan_cached:
+            response += "♻️ План из кэша\n"
         
         if result.lessons_learned:
             response += "\n📚 Уроки:\n"
@@ -50,7 +50,7 @@ class AIToolExecutor:
                 return await self._check_conflicts()
             
             elif tool_name == "get_health_stats":
-                return await self._get_health_stats(args)
+                return await self._get_health_stats(args, user_id)
             
             elif tool_name == "save_to_memory":
                 return await self._save_memory(args, user_id)
@@ -144,13 +144,13 @@ class AIToolExecutor:
         report = await asyncio.wait_for(get_conflict_report(), timeout=10.0)
         return f"Отчет по конфликтам:\n{report}"
     
-    async def _get_health_stats(self, args: Dict) -> str:
+    async def _get_health_stats(self, args: Dict, user_id: int) -> str:
         """Получает статистику здоровья"""
         from brains.health import get_health_report_text
         
         days = args.get("days", 7)
         report = await asyncio.wait_for(
-            get_health_report_text(days),
+            get_health_report_text(days, user_id=user_id),
             timeout=10.0
         )
         return f"Статистика здоровья:\n{report}"
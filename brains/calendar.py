@@ -2,10 +2,22 @@ import json
 import logging
 import ast
 import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httplib2
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from brains.config import GOOGLE_CALENDAR_CREDENTIALS
+from brains.circuit_breaker import breaker_registry, GOOGLE_CALENDAR
+from brains.exceptions import CalendarError
+from brains.calendar_sync import calendar_sync, store_ready
+from brains.calendar_conflicts import conflict_index, conflict_dict, find_overlaps
 
 # Подавляем лишние логи от Google
 logging.getLogger('googleapiclient.discovery_cache').setLevel(logging.ERROR)
@@ -14,34 +26,178 @@ logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+# Календари запрашиваются параллельно в отдельном пуле потоков
+CALENDAR_FETCH_WORKERS = 8
+# Список календарей меняется редко
+CALENDAR_LIST_TTL = 600
+HTTP_TIMEOUT = 30
+
+calendar_breaker = breaker_registry.get(GOOGLE_CALENDAR)
+
 # Кэш для календаря
 _calendar_cache = {
     "events": None,
     "expire_at": None
 }
 
+_calendar_list_cache = {
+    "items": None,
+    "expire_at": 0.0
+}
+
+# Сервис и учётные данные создаются один раз на процесс
+_service = None
+_credentials = None
+_service_lock = threading.Lock()
+
+_executor = ThreadPoolExecutor(max_workers=CALENDAR_FETCH_WORKERS, thread_name_prefix="gcal")
+# httplib2.Http не потокобезопасен: у каждого потока пула своё соединение
+_thread_local = threading.local()
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Ошибка сервиса (а не запроса): сеть, таймаут, 429 или 5xx"""
+    if isinstance(error, HttpError):
+        return error.resp.status == 429 or error.resp.status >= 500
+    return True
+
+
+def _authorized_http() -> AuthorizedHttp:
+    """Авторизованный транспорт текущего потока (keep-alive переиспользуется)"""
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = AuthorizedHttp(_credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        _thread_local.http = http
+    return http
+
+
+def _run_request(request):
+    return request.execute(http=_authorized_http())
+
+
+def _check_breaker():
+    if not calendar_breaker.allow_request():
+        raise CalendarError("Google Calendar временно недоступен (circuit breaker открыт)")
+
+
+async def _call(request):
+    """Выполняет запрос в пуле потоков и сообщает результат breaker'у (без проверки)"""
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_executor, _run_request, request)
+    except Exception as e:
+        if _is_upstream_failure(e):
+            calendar_breaker.record_failure()
+        else:
+            calendar_breaker.record_success()
+        raise
+
+    calendar_breaker.record_success()
+    return result
+
+
+async def _execute(request):
+    """Выполняет запрос Google API в пуле потоков через circuit breaker"""
+    _check_breaker()
+    # Проба half-open, не сообщившая результат (отмена), освобождается на любом выходе
+    try:
+        return await _call(request)
+    finally:
+        calendar_breaker.release_probe()
+
+
+def _load_credentials():
+    creds_raw = GOOGLE_CALENDAR_CREDENTIALS.strip()
+
+    if (creds_raw.startswith("'") and creds_raw.endswith("'")) or \
+       (creds_raw.startswith('"') and creds_raw.endswith('"')):
+        creds_raw = creds_raw[1:-1]
+
+    try:
+        creds_dict = json.loads(creds_raw)
+    except json.JSONDecodeError:
+        creds_dict = ast.literal_eval(creds_raw)
+
+    return service_account.Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+
+
 def get_calendar_service():
+    """
+    Сервис Google Calendar (создаётся один раз)
+
+    Discovery-документ берётся из пакета (static_discovery), без запроса в сеть.
+    """
+    global _service, _credentials
+
+    if _service is not None:
+        return _service
+
     if not GOOGLE_CALENDAR_CREDENTIALS:
         logger.error("GOOGLE_CALENDAR_CREDENTIALS not set!")
         return None
-    
-    try:
-        creds_raw = GOOGLE_CALENDAR_CREDENTIALS.strip()
-        
-        if (creds_raw.startswith("'") and creds_raw.endswith("'")) or \
-           (creds_raw.startswith('"') and creds_raw.endswith('"')):
-            creds_raw = creds_raw[1:-1]
 
+    with _service_lock:
+        if _service is None:
+            try:
+                _credentials = _load_credentials()
+                _service = build(
+                    'calendar', 'v3', credentials=_credentials,
+                    static_discovery=True, cache_discovery=False
+                )
+            except Exception as e:
+                logger.error(f"❌ Error connecting to Google Calendar: {e}")
+                return None
+    return _service
+
+
+async def list_calendars(service, force_refresh: bool = False) -> List[Dict]:
+    """Список календарей с кэшированием (TTL CALENDAR_LIST_TTL)"""
+    if not force_refresh and _calendar_list_cache["items"] is not None \
+            and time.monotonic() < _calendar_list_cache["expire_at"]:
+        return _calendar_list_cache["items"]
+
+    calendar_list = await _execute(service.calendarList().list())
+    items = calendar_list.get('items', [])
+    _calendar_list_cache["items"] = items
+    _calendar_list_cache["expire_at"] = time.monotonic() + CALENDAR_LIST_TTL
+    return items
+
+
+def invalidate_calendar_list():
+    _calendar_list_cache["items"] = None
+    _calendar_list_cache["expire_at"] = 0.0
+
+
+async def fetch_calendar_events(service, calendars: List[Dict], **params) -> List[Tuple[Dict, Optional[List[Dict]]]]:
+    """
+    Запрашивает события всех календарей параллельно
+
+    Breaker проверяется один раз на весь набор: в half-open единственная
+    проба иначе досталась бы первому календарю, а остальные молча выпали бы.
+    Ошибка одного календаря не мешает остальным: вместо событий для него
+    None — результат неполный, кэшировать его нельзя.
+
+    Raises:
+        CalendarError: circuit breaker открыт
+
+    Returns:
+        [(календарь, события или None), ...] в порядке calendars
+    """
+    async def fetch_one(entry):
         try:
-            creds_dict = json.loads(creds_raw)
-        except json.JSONDecodeError:
-            creds_dict = ast.literal_eval(creds_raw)
+            result = await _call(service.events().list(calendarId=entry['id'], **params))
+            return entry, result.get('items', [])
+        except Exception as e:
+            logger.error(f"Ошибка получения событий из {entry['id']}: {e}")
+            return entry, None
 
-        creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        return build('calendar', 'v3', credentials=creds, static_discovery=False)
-    except Exception as e:
-        logger.error(f"❌ Error connecting to Google Calendar: {e}")
-        return None
+    _check_breaker()
+    try:
+        return await asyncio.gather(*(fetch_one(entry) for entry in calendars))
+    finally:
+        calendar_breaker.release_probe()
 
 async def add_calendar(calendar_id):
     """Принудительно добавляет календарь в список доступных"""
@@ -49,7 +205,8 @@ async def add_calendar(calendar_id):
     if not service: return False
     try:
         # Исправлено: выполняем блокирующий вызов в отдельном потоке
-        await asyncio.to_thread(service.calendarList().insert(body={'id': calendar_id}).execute)
+        await _execute(service.calendarList().insert(body={'id': calendar_id}))
+        invalidate_calendar_list()
         logger.info(f"✅ Календарь {calendar_id} успешно добавлен в список.")
         return True
     except Exception as e:
@@ -66,42 +223,43 @@ async def get_upcoming_events(max_results=10, force_refresh=False):
             logger.debug("📅 Календарь: используем кэш")
             return _calendar_cache["events"]
     
+    # Фоновая синхронизация держит события локально — API не нужен
+    if store_ready():
+        events = calendar_sync.store.between(now)[:max_results]
+        if not events:
+            return "На ближайшее время планов нет."
+        return "\n".join(
+            f"📅 {e.start.astimezone(MOSCOW_TZ).strftime('%d.%m %H:%M')} — {e.summary} (в: {e.calendar_name})"
+            for e in events
+        )
+
     service = get_calendar_service()
     if not service: return "Не удалось подключиться к календарю."
 
     try:
         now_iso = now.isoformat().replace('+00:00', 'Z')
         
-        # Исправлено: выполняем блокирующий вызов в отдельном потоке
-        calendar_list = await asyncio.to_thread(service.calendarList().list().execute)
-        calendars = calendar_list.get('items', [])
+        calendars = await list_calendars(service)
 
         if not calendars:
             return "Я не вижу твоих календарей. Пожалуйста, напиши мне свой email, чтобы я могла 'подключиться' к твоим планам. 😊"
 
         all_events = []
-        for entry in calendars:
-            cal_id = entry['id']
+        fetched = await fetch_calendar_events(
+            service, calendars, timeMin=now_iso,
+            maxResults=5, singleEvents=True, orderBy='startTime'
+        )
+        for entry, items in fetched:
             cal_name = entry.get('summary', 'Календарь')
-
-            try:
-                # Исправлено: выполняем блокирующий вызов в отдельном потоке
-                events_result = await asyncio.to_thread(
-                    service.events().list(
-                        calendarId=cal_id, timeMin=now_iso,
-                        maxResults=5, singleEvents=True,
-                        orderBy='startTime'
-                    ).execute
-                )
-
-                for event in events_result.get('items', []):
+            for event in items or []:
+                try:
                     start = event['start'].get('dateTime', event['start'].get('date'))
                     dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
                     dt_msk = dt.astimezone(timezone(timedelta(hours=3)))
                     formatted_start = dt_msk.strftime('%d.%m %H:%M')
                     all_events.append((dt_msk, f"📅 {formatted_start} — {event['summary']} (в: {cal_name})"))
-            except:
-                continue
+                except (KeyError, ValueError):
+                    continue
 
         if not all_events:
             result = "На ближайшее время планов нет."
@@ -109,9 +267,10 @@ async def get_upcoming_events(max_results=10, force_refresh=False):
             all_events.sort(key=lambda x: x[0])
             result = "\n".join([e[1] for e in all_events[:max_results]])
         
-        # Сохранение в кэш
-        _calendar_cache["events"] = result
-        _calendar_cache["expire_at"] = now + timedelta(minutes=5)
+        # Сохранение в кэш (неполный ответ не кэшируем — следующий запрос повторит)
+        if all(items is not None for _, items in fetched):
+            _calendar_cache["events"] = result
+            _calendar_cache["expire_at"] = now + timedelta(minutes=5)
         
         return result
         
@@ -139,13 +298,13 @@ async def create_event(summary, start_time, duration_minutes=30, description=Non
         return False
 
     try:
-        # Исправлено: выполняем блокирующий вызов в отдельном потоке
-        calendar_list = await asyncio.to_thread(service.calendarList().list().execute)
-        calendars = calendar_list.get('items', [])
+        calendars = await list_calendars(service)
         cal_id = 'primary'
+        cal_name = 'Календарь'
         for cal in calendars:
             if 'iam.gserviceaccount.com' not in cal['id']:
                 cal_id = cal['id']
+                cal_name = cal.get('summary', cal_name)
                 break
 
         if start_time.tzinfo is None:
@@ -159,9 +318,13 @@ async def create_event(summary, start_time, duration_minutes=30, description=Non
         }
 
         # Исправлено: выполняем блокирующий вызов в отдельном потоке
-        await asyncio.to_thread(service.events().insert(calendarId=cal_id, body=event).execute)
+        created = await _execute(service.events().insert(calendarId=cal_id, body=event))
         
         logger.info(f"✅ Событие '{summary}' создано в календаре")
+
+        # Новое событие видно сразу, не дожидаясь следующей синхронизации
+        if store_ready() and isinstance(created, dict):
+            await calendar_sync.apply_and_notify(cal_id, cal_name, [created])
         
         # Автоматическое создание напоминания
         if create_reminder:
@@ -206,7 +369,37 @@ async def create_event(summary, start_time, duration_minutes=30, description=Non
         logger.error(f"Error creating event: {e}")
         return False
 
+def find_conflicts(all_events: List[Dict]) -> List[Dict]:
+    """Все пары наложившихся событий (словари с summary, calendar, start, end)"""
+    pairs = find_overlaps(
+        (e['start'].timestamp(), e['end'].timestamp(), i) for i, e in enumerate(all_events)
+    )
+    # Порядок отчёта — по началу наложения
+    pairs = sorted(pairs, key=lambda pair: (all_events[pair[1]]['start'], all_events[pair[0]]['start']))
+    conflicts = []
+    for i, j in pairs:
+        current, next_event = all_events[i], all_events[j]
+        if current['summary'] == next_event['summary']:
+            continue
+        overlap = (min(current['end'], next_event['end']) - next_event['start']).total_seconds() / 60
+        conflicts.append({
+            'event1': f"{current['summary']} ({current['calendar']})",
+            'event2': f"{next_event['summary']} ({next_event['calendar']})",
+            'overlap_minutes': round(overlap),
+            'time1': current['start'].strftime('%d.%m %H:%M'),
+            'time2': next_event['start'].strftime('%d.%m %H:%M')
+        })
+    return conflicts
+
+
 async def check_calendar_conflicts():
+    if store_ready():
+        now = datetime.now(timezone.utc)
+        return [
+            conflict_dict(first, second)
+            for first, second in conflict_index.conflicts(now, now + timedelta(days=7))
+        ]
+
     service = get_calendar_service()
     if not service: return []
     
@@ -214,60 +407,38 @@ async def check_calendar_conflicts():
         now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
         end_week = (datetime.now(timezone.utc) + timedelta(days=7)).isoformat().replace('+00:00', 'Z')
         
-        # Исправлено: выполняем блокирующий вызов в отдельном потоке
-        calendar_list = await asyncio.to_thread(service.calendarList().list().execute)
-        calendars = calendar_list.get('items', [])
+        calendars = await list_calendars(service)
         
         if not calendars: return []
         
         all_events = []
-        for entry in calendars:
-            cal_id = entry['id']
+        fetched = await fetch_calendar_events(
+            service, calendars, timeMin=now, timeMax=end_week,
+            maxResults=50, singleEvents=True, orderBy='startTime'
+        )
+        for entry, items in fetched:
             cal_name = entry.get('summary', 'Календарь')
-            
-            try:
-                # Исправлено: выполняем блокирующий вызов в отдельном потоке
-                events_result = await asyncio.to_thread(
-                    service.events().list(
-                        calendarId=cal_id, timeMin=now, timeMax=end_week,
-                        maxResults=50, singleEvents=True,
-                        orderBy='startTime'
-                    ).execute
-                )
-                
-                for event in events_result.get('items', []):
+            for event in items or []:
+                try:
                     start = event['start'].get('dateTime', event['start'].get('date'))
                     end = event['end'].get('dateTime', event['end'].get('date'))
+                    if 'T' not in start:
+                        continue  # События на весь день конфликтами не считаем
                     if not end: end = start
                     start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
                     end_dt = datetime.fromisoformat(end.replace('Z', '+00:00'))
-                    
-                    all_events.append({
-                        'summary': event['summary'],
-                        'calendar': cal_name,
-                        'start': start_dt,
-                        'end': end_dt
-                    })
-            except Exception as e:
-                logger.error(f"Ошибка получения событий из {cal_id}: {e}")
-                continue
+                except (KeyError, ValueError) as e:
+                    logger.error(f"Ошибка разбора события из {entry['id']}: {e}")
+                    continue
+                
+                all_events.append({
+                    'summary': event.get('summary', ''),
+                    'calendar': cal_name,
+                    'start': start_dt,
+                    'end': end_dt
+                })
         
-        all_events.sort(key=lambda x: x['start'])
-        conflicts = []
-        for i in range(len(all_events) - 1):
-            current = all_events[i]
-            next_event = all_events[i + 1]
-            if current['end'] > next_event['start']:
-                overlap = (current['end'] - next_event['start']).total_seconds() / 60
-                if overlap > 0 and current['summary'] != next_event['summary']:
-                    conflicts.append({
-                        'event1': f"{current['summary']} ({current['calendar']})",
-                        'event2': f"{next_event['summary']} ({next_event['calendar']})",
-                        'overlap_minutes': round(overlap),
-                        'time1': current['start'].strftime('%d.%m %H:%M'),
-                        'time2': next_event['start'].strftime('%d.%m %H:%M')
-                    })
-        return conflicts
+        return find_conflicts(all_events)
     except Exception as e:
         logger.error(f"Error checking calendar conflicts: {e}")
         return []
@@ -287,78 +458,81 @@ async def get_today_calendar_events() -> list:
     Получает список событий на сегодня (с 00:00 до 23:59 по МСК)
     Возвращает список словарей: [{'summary': str, 'start': datetime, 'end': datetime, 'calendar': str}]
     """
+    moscow_tz = MOSCOW_TZ
+    now = datetime.now(moscow_tz)
+
+    # Начало и конец текущего дня по МСК
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+    if store_ready():
+        return [
+            {
+                'summary': e.summary,
+                'calendar': e.calendar_name,
+                'start': e.start.astimezone(moscow_tz),
+                'end': e.end.astimezone(moscow_tz),
+                'id': e.event_id,
+                'description': e.description
+            }
+            for e in calendar_sync.store.between(day_start, day_end)
+            if not e.all_day and 'iam.gserviceaccount.com' not in e.calendar_id
+        ]
+
     service = get_calendar_service()
     if not service:
         logger.error("❌ Calendar service unavailable")
         return []
 
     try:
-        moscow_tz = timezone(timedelta(hours=3))
-        now = datetime.now(moscow_tz)
-        
-        # Начало и конец текущего дня по МСК
-        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
         # Конвертируем в UTC для API
         day_start_utc = day_start.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
         day_end_utc = day_end.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
 
-        # Исправлено: выполняем блокирующий вызов в отдельном потоке
-        calendar_list = await asyncio.to_thread(service.calendarList().list().execute)
-        calendars = calendar_list.get('items', [])
+        # Пропускаем календари сервисных аккаунтов
+        calendars = [
+            entry for entry in await list_calendars(service)
+            if 'iam.gserviceaccount.com' not in entry['id']
+        ]
 
         if not calendars:
             return []
 
         all_events = []
-        for entry in calendars:
-            cal_id = entry['id']
+        fetched = await fetch_calendar_events(
+            service, calendars, timeMin=day_start_utc, timeMax=day_end_utc,
+            singleEvents=True, orderBy='startTime'
+        )
+        for entry, items in fetched:
             cal_name = entry.get('summary', 'Календарь')
-            
-            # Пропускаем календари сервисных аккаунтов
-            if 'iam.gserviceaccount.com' in cal_id:
-                continue
-
-            try:
-                # Исправлено: выполняем блокирующий вызов в отдельном потоке
-                events_result = await asyncio.to_thread(
-                    service.events().list(
-                        calendarId=cal_id,
-                        timeMin=day_start_utc,
-                        timeMax=day_end_utc,
-                        singleEvents=True,
-                        orderBy='startTime'
-                    ).execute
-                )
-
-                for event in events_result.get('items', []):
+            for event in items or []:
+                # Одно битое событие не должно ронять весь день
+                try:
                     start = event['start'].get('dateTime', event['start'].get('date'))
                     end = event['end'].get('dateTime', event['end'].get('date'))
-                    
+                
                     # Для全天 событий (без времени) используем начало дня
                     if 'T' not in start:
                         continue  # Пропускаем全天 события
-                    
+                
                     start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
                     end_dt = datetime.fromisoformat(end.replace('Z', '+00:00')) if end else start_dt + timedelta(hours=1)
-                    
+                
                     # Конвертируем в МСК для удобства
                     start_msk = start_dt.astimezone(moscow_tz)
                     end_msk = end_dt.astimezone(moscow_tz)
-                    
+                
                     all_events.append({
-                        'summary': event['summary'],
+                        'summary': event.get('summary', ''),
                         'calendar': cal_name,
                         'start': start_msk,
                         'end': end_msk,
                         'id': event.get('id', ''),
                         'description': event.get('description', '')
                     })
-                    
-            except Exception as e:
-                logger.error(f"Ошибка получения событий из {cal_id}: {e}")
-                continue
+                except (KeyError, ValueError) as e:
+                    logger.warning(f"⚠️ Пропущено событие {event.get('id', '?')} из {cal_name}: {e}")
+                    continue
 
         # Сортируем по времени начала
         all_events.sort(key=lambda x: x['start'])
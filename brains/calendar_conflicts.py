@@ -0,0 +1,168 @@
+"""
+Поиск конфликтов в расписании по всем календарям
+
+Раньше сравнивались только соседние после сортировки события — длинное
+событие, перекрывающее несколько следующих, находило лишь первое из них.
+
+- find_overlaps: заметающая прямая с кучей активных интервалов —
+  все пересекающиеся пары за O(n log n + k), k — число пар
+- ConflictIndex: пары поверх хранилища calendar_sync, обновляются
+  по изменению одного события без полного пересчёта
+
+Бенчмарк: python scripts/bench_calendar_conflicts.py
+"""
+import heapq
+import logging
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from brains.calendar_sync import CalendarEvent, EventChange, EventStore, calendar_sync
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[float, float, Hashable]
+
+
+def find_overlaps(intervals: Iterable[Interval]) -> List[Tuple[Hashable, Hashable]]:
+    """
+    Все пары пересекающихся интервалов (начало, конец, ключ)
+
+    Интервалы полуоткрытые: встреча 10:00–11:00 не конфликтует с 11:00–12:00.
+    Пара возвращается в порядке начала (раньше начавшееся — первым).
+    """
+    pairs = []
+    # Куча активных интервалов по концу: закончившиеся выталкиваются,
+    # все оставшиеся пересекаются с текущим
+    active: List[Tuple[float, int, Hashable]] = []
+    ordered = sorted(intervals, key=lambda item: (item[0], item[1]))
+    for order, (start, end, key) in enumerate(ordered):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        if end > start:
+            pairs.extend((other, key) for _, _, other in active)
+            heapq.heappush(active, (end, order, key))
+    return pairs
+
+
+def _overlaps(a: CalendarEvent, b: CalendarEvent) -> bool:
+    """Наложение ненулевой длины (как в find_overlaps)"""
+    return max(a.start, b.start) < min(a.end, b.end)
+
+
+def _counts_as_conflict(a: CalendarEvent, b: CalendarEvent) -> bool:
+    # События на весь день (отпуск, дни рождения) пересекаются со всем днём,
+    # одноимённые — обычно одна встреча в двух календарях
+    return not a.all_day and not b.all_day and a.summary != b.summary and _overlaps(a, b)
+
+
+class ConflictIndex:
+    """
+    Пересечения событий хранилища с инкрементальным обновлением
+
+    Использование:
+        index = ConflictIndex(calendar_sync.store)
+        calendar_sync.subscribe(index.on_changes)
+        conflicts = index.conflicts(now, now + timedelta(days=7))
+    """
+
+    def __init__(self, store: EventStore):
+        self.store = store
+        self._pairs: Dict[str, Set[str]] = {}
+        self.built = False
+
+    def __len__(self) -> int:
+        return sum(len(others) for others in self._pairs.values()) // 2
+
+    def _link(self, a: str, b: str):
+        self._pairs.setdefault(a, set()).add(b)
+        self._pairs.setdefault(b, set()).add(a)
+
+    def _unlink(self, key: str):
+        for other in self._pairs.pop(key, ()):
+            others = self._pairs.get(other)
+            if others:
+                others.discard(key)
+                if not others:
+                    del self._pairs[other]
+
+    def rebuild(self):
+        """Полный пересчёт заметающей прямой"""
+        self._pairs.clear()
+        events = [e for e in self.store.all() if not e.all_day]
+        by_key = {e.key: e for e in events}
+        for a, b in find_overlaps((e.start.timestamp(), e.end.timestamp(), e.key) for e in events):
+            if by_key[a].summary != by_key[b].summary:
+                self._link(a, b)
+        self.built = True
+
+    def update(self, change: EventChange):
+        """Пересчитывает пары одного события (хранилище уже обновлено)"""
+        key = change.event.key
+        self._unlink(key)
+        if change.kind == "cancelled":
+            return
+        event = self.store.get(key)
+        if event is None or event.all_day:
+            return
+        for other in self.store.between(event.start, event.end):
+            if other.key != key and _counts_as_conflict(event, other):
+                self._link(key, other.key)
+
+    async def on_changes(self, changes: List[EventChange]):
+        """Подписчик calendar_sync"""
+        if not self.built:
+            self.rebuild()
+            return
+        for change in changes:
+            self.update(change)
+
+    def conflicts(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Tuple[CalendarEvent, CalendarEvent]]:
+        """
+        Конфликтующие пары, чьё наложение попадает в [start, end)
+
+        Returns:
+            [(раньше начавшееся, позже начавшееся), ...] по времени наложения
+        """
+        if not self.built:
+            self.rebuild()
+
+        result = []
+        for a_key, others in list(self._pairs.items()):
+            a = self.store.get(a_key)
+            if a is None:
+                # Событие вычищено из хранилища (prune) без уведомления
+                self._unlink(a_key)
+                continue
+            for b_key in others:
+                if b_key < a_key:
+                    continue
+                b = self.store.get(b_key)
+                if b is None:
+                    continue
+                first, second = (a, b) if (a.start, a.end) <= (b.start, b.end) else (b, a)
+                overlap_start, overlap_end = second.start, min(first.end, second.end)
+                if start and overlap_end <= start:
+                    continue
+                if end and overlap_start >= end:
+                    continue
+                result.append((first, second))
+
+        result.sort(key=lambda pair: (pair[1].start, pair[0].start))
+        return result
+
+
+def conflict_dict(first: CalendarEvent, second: CalendarEvent) -> Dict:
+    """Конфликт в формате check_calendar_conflicts"""
+    overlap = (min(first.end, second.end) - second.start).total_seconds() / 60
+    return {
+        'event1': f"{first.summary} ({first.calendar_name})",
+        'event2': f"{second.summary} ({second.calendar_name})",
+        'overlap_minutes': round(overlap),
+        'time1': first.start.strftime('%d.%m %H:%M'),
+        'time2': second.start.strftime('%d.%m %H:%M')
+    }
+
+
+# Глобальный индекс поверх хранилища синхронизации
+conflict_index = ConflictIndex(calendar_sync.store)
+calendar_sync.subscribe(conflict_index.on_changes)
@@ -0,0 +1,580 @@
+"""
+Инкрементальная синхронизация Google Calendar
+
+Вместо полного перезапроса на каждый вопрос — фоновая синхронизация:
+- первый проход по календарю полный, дальше только изменения (syncToken)
+- 410 Gone (токен протух) — полная пересинхронизация календаря
+- события лежат в локальном хранилище, отсортированном по началу
+- запросы «что сегодня», «ближайшие встречи», конфликты читают хранилище
+- изменения (создано / изменено / отменено) рассылаются подписчикам;
+  подписчик по умолчанию ставит и снимает напоминания о встречах
+
+Использование:
+    start_calendar_sync()
+    events = calendar_sync.store.between(day_start, day_end)
+    await stop_calendar_sync()
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from brains.config import (
+    GOOGLE_CALENDAR_CREDENTIALS, CALENDAR_SYNC_INTERVAL, CALENDAR_STORE_PATH,
+    CALENDAR_REMINDER_MINUTES, CALENDAR_REMINDER_HORIZON_HOURS
+)
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+# Насколько в прошлое держим события (и с какого момента начинаем полную синхронизацию)
+SYNC_LOOKBACK_DAYS = 1
+PAGE_SIZE = 250
+# Хранилище считается устаревшим, если последний полный проход старше стольких интервалов
+STALE_SYNC_INTERVALS = 3
+
+
+# ============================================================================
+# СОБЫТИЯ
+# ============================================================================
+
+@dataclass
+class CalendarEvent:
+    """Событие календаря в локальном хранилище"""
+    calendar_id: str
+    event_id: str
+    calendar_name: str
+    summary: str
+    start: datetime
+    end: datetime
+    all_day: bool = False
+    description: str = ""
+    updated: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.calendar_id}:{self.event_id}"
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["start"] = self.start.isoformat()
+        data["end"] = self.end.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CalendarEvent":
+        data = dict(data)
+        data["start"] = datetime.fromisoformat(data["start"])
+        data["end"] = datetime.fromisoformat(data["end"])
+        return cls(**data)
+
+
+@dataclass
+class EventChange:
+    """Изменение события после синхронизации"""
+    kind: str  # created | updated | cancelled
+    event: CalendarEvent
+    previous: Optional[CalendarEvent] = None
+
+
+def _parse_time(value: Dict) -> Tuple[datetime, bool]:
+    """Время события Google: dateTime или date (событие на весь день)"""
+    if value.get("dateTime"):
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")), False
+    day = date.fromisoformat(value["date"])
+    return datetime(day.year, day.month, day.day, tzinfo=MOSCOW_TZ), True
+
+
+def parse_event(item: Dict, calendar_id: str, calendar_name: str) -> Optional[CalendarEvent]:
+    """Событие из ответа events().list (None если разобрать нельзя)"""
+    try:
+        start, all_day = _parse_time(item["start"])
+        end, _ = _parse_time(item["end"]) if item.get("end") else (start, all_day)
+    except (KeyError, ValueError):
+        return None
+    return CalendarEvent(
+        calendar_id=calendar_id,
+        event_id=item["id"],
+        calendar_name=calendar_name,
+        summary=item.get("summary", ""),
+        start=start,
+        end=max(end, start),
+        all_day=all_day,
+        description=item.get("description", ""),
+        updated=item.get("updated", ""),
+    )
+
+
+# ============================================================================
+# ХРАНИЛИЩЕ
+# ============================================================================
+
+class EventStore:
+    """
+    События всех календарей, проиндексированные по времени начала
+
+    Индекс — отсортированный список (начало, ключ); выборка по интервалу
+    через bisect. Чтобы найти события, начавшиеся раньше окна, но ещё
+    идущие, поиск начинается на максимальную длительность события раньше.
+    """
+
+    def __init__(self):
+        self._events: Dict[str, CalendarEvent] = {}
+        self._index: List[Tuple[float, str]] = []
+        self._max_duration = 0.0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._events
+
+    def get(self, key: str) -> Optional[CalendarEvent]:
+        return self._events.get(key)
+
+    def all(self) -> List[CalendarEvent]:
+        return [self._events[key] for _, key in self._index]
+
+    def upsert(self, event: CalendarEvent) -> Optional[EventChange]:
+        """Добавляет или обновляет событие. None если ничего не изменилось"""
+        previous = self._events.get(event.key)
+        if previous == event:
+            return None
+        if previous is not None:
+            self._unindex(previous)
+        self._events[event.key] = event
+        insort(self._index, (event.start.timestamp(), event.key))
+        self._max_duration = max(self._max_duration, (event.end - event.start).total_seconds())
+        return EventChange("updated" if previous else "created", event, previous)
+
+    def remove(self, key: str) -> Optional[EventChange]:
+        event = self._events.pop(key, None)
+        if event is None:
+            return None
+        self._unindex(event)
+        return EventChange("cancelled", event, event)
+
+    def _unindex(self, event: CalendarEvent):
+        entry = (event.start.timestamp(), event.key)
+        position = bisect_left(self._index, entry)
+        if position < len(self._index) and self._index[position] == entry:
+            del self._index[position]
+
+    def keys_for_calendar(self, calendar_id: str) -> List[str]:
+        return [key for key, event in self._events.items() if event.calendar_id == calendar_id]
+
+    def between(self, start: datetime, end: Optional[datetime] = None) -> List[CalendarEvent]:
+        """События, пересекающие [start, end), по возрастанию начала"""
+        start_ts = start.timestamp()
+        end_ts = end.timestamp() if end else float("inf")
+        position = bisect_left(self._index, (start_ts - self._max_duration, ""))
+
+        result = []
+        for ts, key in self._index[position:]:
+            if ts >= end_ts:
+                break
+            event = self._events[key]
+            # Нулевая длительность: событие «в точке» start тоже попадает в окно
+            if event.end.timestamp() > start_ts or ts >= start_ts:
+                result.append(event)
+        return result
+
+    def prune(self, before: datetime) -> int:
+        """Удаляет события, закончившиеся до before"""
+        stale = [key for key, event in self._events.items() if event.end < before]
+        for key in stale:
+            self.remove(key)
+        if stale:
+            self._max_duration = max(
+                ((e.end - e.start).total_seconds() for e in self._events.values()), default=0.0
+            )
+        return len(stale)
+
+    def clear(self):
+        self._events.clear()
+        self._index.clear()
+        self._max_duration = 0.0
+
+
+# ============================================================================
+# СИНХРОНИЗАЦИЯ
+# ============================================================================
+
+ChangeListener = Callable[[List[EventChange]], Awaitable[None]]
+
+
+class CalendarSyncEngine:
+    """
+    Синхронизация всех календарей в локальное хранилище
+
+    Токены синхронизации и события сохраняются в файл — после перезапуска
+    первый проход сразу инкрементальный.
+    """
+
+    def __init__(self, path: Optional[str] = CALENDAR_STORE_PATH):
+        self.path = path
+        self.store = EventStore()
+        self.sync_tokens: Dict[str, str] = {}
+        self.last_sync: Optional[float] = None  # Время, к которому синхронизированы все календари
+        self.synced_at: Dict[str, float] = {}  # calendar_id -> последняя успешная синхронизация
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self._listeners: List[ChangeListener] = []
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def ready(self) -> bool:
+        """Каждый календарь из списка хотя бы раз синхронизирован в этом процессе"""
+        return self.last_sync is not None
+
+    def is_fresh(self, max_age: float) -> bool:
+        """Все календари синхронизированы не раньше max_age секунд назад"""
+        return self.last_sync is not None and time.time() - self.last_sync <= max_age
+
+    def subscribe(self, listener: ChangeListener):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def apply(self, calendar_id: str, calendar_name: str, items: Iterable[Dict]) -> List[EventChange]:
+        """Применяет события из ответа API к хранилищу"""
+        changes = []
+        for item in items:
+            key = f"{calendar_id}:{item.get('id')}"
+            if item.get("status") == "cancelled":
+                change = self.store.remove(key)
+            else:
+                event = parse_event(item, calendar_id, calendar_name)
+                change = self.store.upsert(event) if event else None
+            if change:
+                changes.append(change)
+        return changes
+
+    async def apply_and_notify(self, calendar_id: str, calendar_name: str, items: Iterable[Dict]) -> List[EventChange]:
+        """Применяет события, созданные ботом, и рассылает изменения подписчикам"""
+        changes = self.apply(calendar_id, calendar_name, items)
+        await self._notify(changes)
+        return changes
+
+    async def sync_calendar(self, service, entry: Dict) -> List[EventChange]:
+        """Синхронизирует один календарь (инкрементально, если есть токен)"""
+        from brains.calendar import _execute
+
+        calendar_id = entry["id"]
+        calendar_name = entry.get("summary", "Календарь")
+        token = self.sync_tokens.get(calendar_id)
+
+        params = {"calendarId": calendar_id, "singleEvents": True, "showDeleted": True, "maxResults": PAGE_SIZE}
+        if token:
+            params["syncToken"] = token
+        else:
+            since = datetime.now(timezone.utc) - timedelta(days=SYNC_LOOKBACK_DAYS)
+            params["timeMin"] = since.isoformat().replace("+00:00", "Z")
+
+        items: List[Dict] = []
+        next_token = None
+        page_token = None
+        try:
+            while True:
+                if page_token:
+                    params["pageToken"] = page_token
+                result = await _execute(service.events().list(**params))
+                items.extend(result.get("items", []))
+                page_token = result.get("nextPageToken")
+                if not page_token:
+                    next_token = result.get("nextSyncToken")
+                    break
+        except HttpError as e:
+            if token and e.resp.status == 410:
+                logger.info(f"📅 Токен синхронизации {calendar_name} устарел, полная синхронизация")
+                self.sync_tokens.pop(calendar_id, None)
+                return await self.sync_calendar(service, entry)
+            raise
+
+        changes = self.apply(calendar_id, calendar_name, items)
+        if token:
+            self.incremental_syncs += 1
+        else:
+            # Полная синхронизация: всё, чего нет в ответе, удалено
+            seen = {f"{calendar_id}:{item.get('id')}" for item in items if item.get("status") != "cancelled"}
+            for key in self.store.keys_for_calendar(calendar_id):
+                if key not in seen:
+                    changes.append(self.store.remove(key))
+            self.full_syncs += 1
+
+        if next_token:
+            self.sync_tokens[calendar_id] = next_token
+        return changes
+
+    async def sync(self) -> List[EventChange]:
+        """Синхронизирует все календари параллельно и рассылает изменения"""
+        from brains.calendar import get_calendar_service, list_calendars
+
+        service = get_calendar_service()
+        if not service:
+            return []
+
+        async with self._get_lock():
+            calendars = await list_calendars(service)
+            results = await asyncio.gather(
+                *(self.sync_calendar(service, entry) for entry in calendars),
+                return_exceptions=True
+            )
+
+            changes: List[EventChange] = []
+            now = time.time()
+            for entry, result in zip(calendars, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Ошибка синхронизации календаря {entry['id']}: {result}")
+                else:
+                    self.synced_at[entry["id"]] = now
+                    changes.extend(result)
+
+            # Календари, пропавшие из списка
+            known = {entry["id"] for entry in calendars}
+            for calendar_id in [c for c in self.synced_at if c not in known]:
+                del self.synced_at[calendar_id]
+            for calendar_id in [c for c in self.sync_tokens if c not in known]:
+                del self.sync_tokens[calendar_id]
+                for key in self.store.keys_for_calendar(calendar_id):
+                    changes.append(self.store.remove(key))
+
+            self.store.prune(datetime.now(timezone.utc) - timedelta(days=SYNC_LOOKBACK_DAYS))
+
+            # Готово только когда синхронизирован каждый календарь; время — самого старого
+            if all(c in self.synced_at for c in known):
+                self.last_sync = min((self.synced_at[c] for c in known), default=now)
+            else:
+                self.last_sync = None
+            if changes:
+                logger.info(f"📅 Календарь синхронизирован: изменений {len(changes)}, событий {len(self.store)}")
+                await asyncio.to_thread(self.save)
+
+        await self._notify(changes)
+        return changes
+
+    async def _notify(self, changes: List[EventChange]):
+        if not changes:
+            return
+        for listener in self._listeners:
+            try:
+                await listener(changes)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика изменений календаря: {e}")
+
+    # ------------------------------------------------------------------
+    # Сохранение
+    # ------------------------------------------------------------------
+
+    def load(self) -> bool:
+        """Загружает токены и события из файла. False если файла нет или он битый"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.store.clear()
+            for item in data.get("events", []):
+                self.store.upsert(CalendarEvent.from_dict(item))
+            self.sync_tokens = dict(data.get("sync_tokens", {}))
+            logger.info(f"📅 Хранилище календаря загружено: {len(self.store)} событий")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить хранилище календаря: {e}")
+            self.store.clear()
+            self.sync_tokens = {}
+            return False
+
+    def save(self):
+        """Сохраняет токены и события в файл (атомарно через временный файл)"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            data = {
+                "sync_tokens": dict(self.sync_tokens),
+                "events": [event.to_dict() for event in self.store.all()],
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить хранилище календаря: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "events": len(self.store),
+            "calendars": len(self.sync_tokens),
+            "calendars_synced": len(self.synced_at),
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "last_sync": self.last_sync,
+        }
+
+
+# Глобальный движок
+calendar_sync = CalendarSyncEngine()
+
+
+# ============================================================================
+# НАПОМИНАНИЯ О ВСТРЕЧАХ
+# ============================================================================
+
+def _reminder_id(event: CalendarEvent) -> str:
+    # Тот же формат, что у create_event — напоминание не задвоится
+    return f"meeting_{int(event.start.timestamp())}"
+
+
+def _wants_reminder(event: CalendarEvent) -> bool:
+    return not event.all_day and "iam.gserviceaccount.com" not in event.calendar_id
+
+
+async def schedule_meeting_reminder(event: CalendarEvent, now: Optional[datetime] = None) -> bool:
+    """Ставит напоминание за CALENDAR_REMINDER_MINUTES до встречи (если в горизонте)"""
+    from brains.reminders import reminder_manager, Reminder, ReminderType
+
+    if not _wants_reminder(event):
+        return False
+
+    now = now or datetime.now(MOSCOW_TZ)
+    start = event.start.astimezone(MOSCOW_TZ)
+    reminder_time = start - timedelta(minutes=CALENDAR_REMINDER_MINUTES)
+    if reminder_time <= now or start > now + timedelta(hours=CALENDAR_REMINDER_HORIZON_HOURS):
+        return False
+
+    reminder_id = _reminder_id(event)
+    if reminder_id in reminder_manager.reminders:
+        return False
+
+    await reminder_manager.add_reminder(Reminder(
+        id=reminder_id,
+        type=ReminderType.MEETING,
+        message=f"Встреча: {event.summary}",
+        scheduled_time=reminder_time,
+        escalate_after=[5, 10],
+        context={
+            "title": event.summary,
+            "minutes": CALENDAR_REMINDER_MINUTES,
+            "source": "calendar_sync",
+            "event_start": start.isoformat(),
+            "event_key": event.key,
+            "calendar": event.calendar_name
+        }
+    ))
+    logger.info(f"🔔 Напоминание о встрече '{event.summary}' на {reminder_time.strftime('%d.%m %H:%M')}")
+    return True
+
+
+async def cancel_meeting_reminder(event: CalendarEvent) -> bool:
+    """Снимает напоминание, поставленное синхронизацией для этого события"""
+    from brains.reminders import reminder_manager
+
+    reminder_id = _reminder_id(event)
+    reminder = reminder_manager.reminders.get(reminder_id)
+    if not reminder or reminder.context.get("event_key") != event.key or not reminder.is_active:
+        return False
+    await reminder_manager.cancel_reminder(reminder_id)
+    return True
+
+
+async def sync_meeting_reminders(changes: List[EventChange]):
+    """Подписчик синхронизации: изменения событий → напоминания"""
+    for change in changes:
+        moved = change.previous is not None and change.previous.start != change.event.start
+        if change.kind == "cancelled" or moved:
+            await cancel_meeting_reminder(change.previous)
+        if change.kind != "cancelled":
+            await schedule_meeting_reminder(change.event)
+
+
+async def schedule_upcoming_reminders(now: Optional[datetime] = None) -> int:
+    """Напоминания для встреч, вошедших в горизонт с прошлой синхронизации"""
+    now = now or datetime.now(MOSCOW_TZ)
+    created = 0
+    for event in calendar_sync.store.between(now, now + timedelta(hours=CALENDAR_REMINDER_HORIZON_HOURS)):
+        if await schedule_meeting_reminder(event, now):
+            created += 1
+    return created
+
+
+calendar_sync.subscribe(sync_meeting_reminders)
+
+
+# ============================================================================
+# ФОНОВАЯ ЗАДАЧА
+# ============================================================================
+
+_sync_task: Optional[asyncio.Task] = None
+_sync_interval: float = CALENDAR_SYNC_INTERVAL
+
+
+async def _sync_loop(interval: float):
+    """Держит хранилище календаря в актуальном состоянии"""
+    await asyncio.to_thread(calendar_sync.load)
+    while True:
+        try:
+            await calendar_sync.sync()
+            await schedule_upcoming_reminders()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка синхронизации календаря: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_calendar_sync(interval: float = CALENDAR_SYNC_INTERVAL) -> Optional[asyncio.Task]:
+    """Запускает фоновую синхронизацию (повторный вызов не создаёт вторую задачу)"""
+    global _sync_task, _sync_interval
+    if not GOOGLE_CALENDAR_CREDENTIALS:
+        logger.info("📅 Календарь не подключён — синхронизация не запущена")
+        return None
+    if _sync_task is None or _sync_task.done():
+        _sync_interval = interval
+        _sync_task = asyncio.create_task(_sync_loop(interval))
+        logger.info(f"📅 Синхронизация календаря: каждые {interval:.0f} сек")
+    return _sync_task
+
+
+async def stop_calendar_sync():
+    """Останавливает фоновую синхронизацию"""
+    global _sync_task
+    task, _sync_task = _sync_task, None
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await asyncio.to_thread(calendar_sync.save)
+
+
+def is_sync_running() -> bool:
+    return _sync_task is not None and not _sync_task.done()
+
+
+def store_ready() -> bool:
+    """
+    Можно ли отвечать из локального хранилища: все календари
+    синхронизированы и не раньше STALE_SYNC_INTERVALS интервалов назад
+    (иначе — запрос к API)
+    """
+    return (
+        is_sync_running()
+        and calendar_sync.ready
+        and calendar_sync.is_fresh(_sync_interval * STALE_SYNC_INTERVALS)
+    )
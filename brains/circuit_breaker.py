@@ -0,0 +1,448 @@
+"""
+Circuit Breaker Registry
+Отдельный circuit breaker и retry budget на каждый внешний сервис
+
+Состояния breaker'а:
+    closed    — запросы идут, ошибки считаются
+    open      — запросы отклоняются до истечения recovery_time
+    half_open — пропускается ограниченное число пробных запросов;
+                успех закрывает breaker, ошибка снова открывает
+
+Retry budget ограничивает долю повторов относительно обычных запросов,
+чтобы при деградации сервиса повторы не умножали нагрузку.
+
+Использование:
+    breaker = breaker_registry.get(MISTRAL_EMBED)
+    budget = breaker_registry.budget(MISTRAL_EMBED)
+
+    if not breaker.allow_request():
+        return None
+    budget.record_request()
+    ...
+    delay = budget.next_delay(attempt)
+    if delay is None:
+        return None  # бюджет повторов исчерпан
+    await asyncio.sleep(delay)
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from brains.shared_state import StateBackend, MemoryStateBackend, get_state_backend
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# ВНЕШНИЕ СЕРВИСЫ
+# ============================================================================
+
+MISTRAL_CHAT = "mistral_chat"
+MISTRAL_EMBED = "mistral_embed"
+PIXTRAL_VISION = "pixtral_vision"
+MARZBAN = "marzban"
+GOOGLE_CALENDAR = "google_calendar"
+HF_STT = "hf_stt"
+RSS_PREFIX = "rss:"
+
+# Настройки breaker'ов и бюджетов повторов по сервисам
+UPSTREAM_SETTINGS: Dict[str, Dict[str, Any]] = {
+    MISTRAL_CHAT: {"max_failures": 3, "recovery_time": 60, "half_open_max_calls": 1,
+                   "base_delay": 2.0, "max_delay": 10.0},
+    MISTRAL_EMBED: {"max_failures": 3, "recovery_time": 60, "half_open_max_calls": 1,
+                    "base_delay": 2.0, "max_delay": 10.0},
+    PIXTRAL_VISION: {"max_failures": 3, "recovery_time": 120, "half_open_max_calls": 1,
+                     "base_delay": 2.0, "max_delay": 10.0},
+    MARZBAN: {"max_failures": 3, "recovery_time": 30, "half_open_max_calls": 1,
+              "base_delay": 2.0, "max_delay": 6.0},
+    GOOGLE_CALENDAR: {"max_failures": 5, "recovery_time": 120, "half_open_max_calls": 1,
+                      "base_delay": 1.0, "max_delay": 5.0},
+    HF_STT: {"max_failures": 3, "recovery_time": 120, "half_open_max_calls": 1,
+             "base_delay": 5.0, "max_delay": 20.0},
+    RSS_PREFIX: {"max_failures": 3, "recovery_time": 900, "half_open_max_calls": 1,
+                 "base_delay": 2.0, "max_delay": 10.0},
+}
+
+DEFAULT_SETTINGS: Dict[str, Any] = {"max_failures": 3, "recovery_time": 60, "half_open_max_calls": 1,
+                                    "base_delay": 2.0, "max_delay": 10.0}
+
+
+class BreakerState(Enum):
+    """Состояние circuit breaker'а"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+# Числовые значения для gauge-метрик
+STATE_GAUGE = {
+    BreakerState.CLOSED: 0,
+    BreakerState.HALF_OPEN: 1,
+    BreakerState.OPEN: 2,
+}
+
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    Circuit breaker с half-open пробами и состоянием в StateBackend.
+
+    По умолчанию состояние хранится в памяти процесса;
+    SharedCircuitBreaker держит его в общем хранилище воркеров.
+    """
+
+    def __init__(self, max_failures=3, recovery_time=60, name="ai",
+                 backend: Optional[StateBackend] = None, half_open_max_calls: int = 1):
+        self.max_failures = max_failures
+        self.recovery_time = recovery_time
+        self.half_open_max_calls = half_open_max_calls
+        self.name = name
+        self._backend = backend
+
+    @property
+    def backend(self) -> StateBackend:
+        if self._backend is None:
+            self._backend = MemoryStateBackend()
+        return self._backend
+
+    def _load(self) -> Dict[str, Any]:
+        return self.backend.get_breaker(self.name)
+
+    @property
+    def state(self) -> BreakerState:
+        return BreakerState(self._load().get("state", BreakerState.CLOSED.value))
+
+    @property
+    def failures(self) -> int:
+        return self._load().get("failures", 0)
+
+    @property
+    def last_failure_time(self) -> float:
+        return self._load().get("last_failure_time", 0)
+
+    @property
+    def is_open(self) -> bool:
+        """True если breaker не в закрытом состоянии (open или half-open)"""
+        return self.state != BreakerState.CLOSED
+
+    def _probe_expired(self, state: Dict[str, Any], now: float) -> bool:
+        # Проба, не сообщившая результат (упал воркер), не должна держать breaker вечно
+        return now - state.get("half_open_since", 0) > self.recovery_time
+
+    def allow_request(self) -> bool:
+        """
+        Проверяет, можно ли выполнить запрос.
+
+        В half-open резервирует один из half_open_max_calls пробных вызовов,
+        поэтому результат запроса обязательно сообщается через
+        record_success() / record_failure().
+        """
+        # Быстрый путь без записи в общее хранилище
+        if self._load().get("state", BreakerState.CLOSED.value) == BreakerState.CLOSED.value:
+            return True
+
+        now = time.time()
+        decision = {}
+
+        def mutate(state):
+            current = state.get("state", BreakerState.CLOSED.value)
+            state = dict(state)
+            allowed = True
+
+            if current == BreakerState.OPEN.value:
+                if now - state.get("opened_at", 0) > self.recovery_time:
+                    state.update(state=BreakerState.HALF_OPEN.value, half_open_since=now, probes=1)
+                    decision["transition"] = True
+                else:
+                    allowed = False
+            elif current == BreakerState.HALF_OPEN.value:
+                if self._probe_expired(state, now):
+                    state.update(half_open_since=now, probes=1)
+                elif state.get("probes", 0) < self.half_open_max_calls:
+                    state["probes"] = state.get("probes", 0) + 1
+                else:
+                    allowed = False
+
+            if not allowed:
+                state["rejected"] = state.get("rejected", 0) + 1
+            decision["allowed"] = allowed
+            return state
+
+        self.backend.update_breaker(self.name, mutate)
+        if decision.get("transition"):
+            logger.info(f"🔄 Circuit Breaker [{self.name}] HALF-OPEN: пробный запрос")
+        return decision["allowed"]
+
+    def can_proceed(self):
+        """Синоним allow_request() для обратной совместимости"""
+        return self.allow_request()
+
+    def is_available(self) -> bool:
+        """Проверка без резервирования пробного вызова (для UI и быстрых отказов)"""
+        state = self._load()
+        current = state.get("state", BreakerState.CLOSED.value)
+        now = time.time()
+
+        if current == BreakerState.OPEN.value:
+            return now - state.get("opened_at", 0) > self.recovery_time
+        if current == BreakerState.HALF_OPEN.value:
+            return self._probe_expired(state, now) or state.get("probes", 0) < self.half_open_max_calls
+        return True
+
+    def record_failure(self):
+        now = time.time()
+        result = {}
+
+        def mutate(state):
+            state = dict(state)
+            current = state.get("state", BreakerState.CLOSED.value)
+            state["failures"] = state.get("failures", 0) + 1
+            state["last_failure_time"] = now
+
+            if current == BreakerState.HALF_OPEN.value or (
+                current == BreakerState.CLOSED.value and state["failures"] >= self.max_failures
+            ):
+                state.update(state=BreakerState.OPEN.value, opened_at=now, probes=0)
+                state["trips"] = state.get("trips", 0) + 1
+                result["opened"] = True
+            return state
+
+        state = self.backend.update_breaker(self.name, mutate)
+        if result.get("opened"):
+            logger.error(f"🚨 Circuit Breaker [{self.name}] OPENED (failures: {state['failures']})")
+
+    def release_probe(self):
+        """
+        Возвращает пробный вызов, не сообщивший результат (429, исчерпан
+        бюджет повторов, отмена).
+
+        Безопасно вызывать в finally: после record_success()/record_failure()
+        breaker уже не в half-open и освобождать нечего.
+        """
+        if self._load().get("state", BreakerState.CLOSED.value) != BreakerState.HALF_OPEN.value:
+            return
+
+        def mutate(state):
+            if state.get("state") != BreakerState.HALF_OPEN.value or not state.get("probes"):
+                return state
+            state = dict(state)
+            state["probes"] -= 1
+            return state
+
+        self.backend.update_breaker(self.name, mutate)
+
+    def record_success(self):
+        # Быстрый путь: breaker и так закрыт и чист — без записи в общее хранилище
+        current = self._load()
+        if (current.get("state", BreakerState.CLOSED.value) == BreakerState.CLOSED.value
+                and not current.get("failures") and not current.get("probes")):
+            return
+
+        previous = {}
+
+        def mutate(state):
+            previous.update(state)
+            state = dict(state)
+            state.update(state=BreakerState.CLOSED.value, failures=0, probes=0)
+            return state
+
+        self.backend.update_breaker(self.name, mutate)
+        if previous.get("state", BreakerState.CLOSED.value) != BreakerState.CLOSED.value:
+            logger.info(f"✅ Circuit Breaker [{self.name}] CLOSED (recovered)")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние для метрик"""
+        state = self._load()
+        breaker_state = BreakerState(state.get("state", BreakerState.CLOSED.value))
+        return {
+            "state": breaker_state.value,
+            "state_gauge": STATE_GAUGE[breaker_state],
+            "failures": state.get("failures", 0),
+            "trips": state.get("trips", 0),
+            "rejected": state.get("rejected", 0),
+            "last_failure_time": state.get("last_failure_time", 0),
+        }
+
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """Circuit breaker, общий для всех воркеров (STATE_BACKEND)"""
+
+    @property
+    def backend(self) -> StateBackend:
+        if self._backend is None:
+            self._backend = get_state_backend()
+        return self._backend
+
+
+# ============================================================================
+# RETRY BUDGET
+# ============================================================================
+
+class RetryBudget:
+    """
+    Бюджет повторов в скользящем окне.
+
+    Повтор разрешён, пока число повторов за ttl секунд меньше
+    min_retries + retry_ratio * число обычных запросов за то же окно.
+    Задержка — экспоненциальная с полным джиттером.
+    """
+
+    def __init__(self, ttl: float = 60.0, min_retries: int = 3, retry_ratio: float = 0.2,
+                 base_delay: float = 2.0, max_delay: float = 10.0):
+        self.ttl = ttl
+        self.min_retries = min_retries
+        self.retry_ratio = retry_ratio
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._denied = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        cutoff = now - self.ttl
+        for window in (self._requests, self._retries):
+            while window and window[0] <= cutoff:
+                window.popleft()
+
+    def _allowance(self) -> float:
+        return self.min_retries + self.retry_ratio * len(self._requests)
+
+    def record_request(self):
+        """Учитывает обычный (первый) запрос — пополняет бюджет"""
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        """Списывает один повтор из бюджета (False — бюджет исчерпан)"""
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) < self._allowance():
+                self._retries.append(now)
+                return True
+            self._denied += 1
+            return False
+
+    def backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def next_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Задержка перед повтором или None если повторять нельзя.
+
+        Args:
+            attempt: Номер неудачной попытки (с 0)
+            retry_after: Подсказка сервиса (Retry-After / estimated_time)
+        """
+        if not self.try_retry():
+            return None
+        if retry_after is not None:
+            return min(self.max_delay, max(0.0, retry_after))
+        return self.backoff(attempt)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние для метрик"""
+        with self._lock:
+            self._trim(time.time())
+            return {
+                "requests": len(self._requests),
+                "retries": len(self._retries),
+                "retry_allowance": round(self._allowance(), 2),
+                "retries_denied": self._denied,
+            }
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Читает Retry-After (в секундах) из заголовков ответа"""
+    value = headers.get("retry-after") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ============================================================================
+# РЕЕСТР
+# ============================================================================
+
+class BreakerRegistry:
+    """Реестр breaker'ов и бюджетов повторов по внешним сервисам"""
+
+    def __init__(self, settings: Optional[Dict[str, Dict[str, Any]]] = None,
+                 backend: Optional[StateBackend] = None):
+        self._settings = settings if settings is not None else UPSTREAM_SETTINGS
+        self._backend = backend
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._budgets: Dict[str, RetryBudget] = {}
+        self._lock = threading.Lock()
+
+    def _settings_for(self, name: str) -> Dict[str, Any]:
+        if name in self._settings:
+            return self._settings[name]
+        if name.startswith(RSS_PREFIX) and RSS_PREFIX in self._settings:
+            return self._settings[RSS_PREFIX]
+        return DEFAULT_SETTINGS
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Circuit breaker сервиса (создаётся при первом обращении)"""
+        with self._lock:
+            if name not in self._breakers:
+                settings = self._settings_for(name)
+                self._breakers[name] = SharedCircuitBreaker(
+                    max_failures=settings["max_failures"],
+                    recovery_time=settings["recovery_time"],
+                    half_open_max_calls=settings["half_open_max_calls"],
+                    name=name,
+                    backend=self._backend
+                )
+            return self._breakers[name]
+
+    def budget(self, name: str) -> RetryBudget:
+        """Бюджет повторов сервиса (локальный для процесса)"""
+        with self._lock:
+            if name not in self._budgets:
+                settings = self._settings_for(name)
+                self._budgets[name] = RetryBudget(
+                    base_delay=settings["base_delay"],
+                    max_delay=settings["max_delay"]
+                )
+            return self._budgets[name]
+
+    def gauges(self) -> Dict[str, Dict[str, Any]]:
+        """Метрики всех известных breaker'ов: {name: {state, state_gauge, failures, ...}}"""
+        with self._lock:
+            names = sorted(set(self._breakers) | set(self._budgets))
+        result = {}
+        for name in names:
+            result[name] = self.get(name).snapshot()
+            result[name].update(self.budget(name).snapshot())
+        return result
+
+    def format_report(self) -> str:
+        """Отчёт о состоянии сервисов для Telegram"""
+        gauges = self.gauges()
+        if not gauges:
+            return "🔌 Внешние сервисы ещё не вызывались."
+
+        icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+        lines = ["🔌 **Circuit breakers:**\n"]
+        for name, g in gauges.items():
+            lines.append(
+                f"{icons[g['state']]} `{name}` — {g['state']}, ошибок: {g['failures']}, "
+                f"срабатываний: {g['trips']}, повторов: {g['retries']}/{g['retry_allowance']}"
+            )
+        return "\n".join(lines)
+
+
+# Глобальный реестр
+breaker_registry = BreakerRegistry()
@@ -1,12 +1,14 @@
 """
 Глобальные клиенты для Karina AI
-- HTTP клиент (httpx)
+- HTTP клиенты (httpx) — реестр пулов по внешним сервисам
 - Supabase клиент
 - Mistral API endpoints
 """
+import importlib.util
 import httpx
 import logging
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 from supabase import create_client, Client
 
 from brains.config import SUPABASE_URL, SUPABASE_KEY, MISTRAL_API_KEY
@@ -14,16 +16,108 @@ from brains.config import SUPABASE_URL, SUPABASE_KEY, MISTRAL_API_KEY
 logger = logging.getLogger(__name__)
 
 # ============================================================================
-# HTTP КЛИЕНТ
+# HTTP КЛИЕНТЫ
 # ============================================================================
 
-# Глобальный клиент для переиспользования соединений
-# Настроен с правильными таймаутами и retry
-http_client = httpx.AsyncClient(
-    timeout=httpx.Timeout(30.0, connect=10.0, read=60.0, write=10.0),
-    limits=httpx.Limits(max_keepalive_connections=10, max_connections=50),
-    follow_redirects=True
-)
+# HTTP/2 требует пакет h2 (httpx[http2]); без него работаем по HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+MISTRAL = "mistral"
+MARZBAN = "marzban"
+HUGGINGFACE = "huggingface"
+RSS = "rss"
+WEATHER = "weather"
+CRYPTO_PAY = "crypto_pay"
+DEFAULT = "default"
+
+
+@dataclass
+class UpstreamProfile:
+    """Параметры пула соединений внешнего сервиса"""
+    max_connections: int = 10
+    max_keepalive: int = 5
+    # Держим соединения тёплыми: повторный запрос не платит за DNS и TLS handshake
+    keepalive_expiry: float = 120.0
+    timeout: httpx.Timeout = field(default_factory=lambda: httpx.Timeout(30.0, connect=10.0))
+    http2: bool = False
+
+
+UPSTREAM_PROFILES: Dict[str, UpstreamProfile] = {
+    MISTRAL: UpstreamProfile(
+        max_connections=50, max_keepalive=10, http2=True,
+        timeout=httpx.Timeout(30.0, connect=10.0, read=60.0, write=10.0)
+    ),
+    MARZBAN: UpstreamProfile(max_connections=10, max_keepalive=5, timeout=httpx.Timeout(30.0, connect=10.0)),
+    HUGGINGFACE: UpstreamProfile(
+        max_connections=5, max_keepalive=2, http2=True,
+        timeout=httpx.Timeout(60.0, connect=10.0)
+    ),
+    # Много разных хостов по 1-2 запроса — пул шире, keepalive на каждый хост
+    RSS: UpstreamProfile(max_connections=20, max_keepalive=10, timeout=httpx.Timeout(15.0, connect=5.0)),
+    WEATHER: UpstreamProfile(max_connections=2, max_keepalive=1, timeout=httpx.Timeout(10.0, connect=5.0)),
+    CRYPTO_PAY: UpstreamProfile(max_connections=5, max_keepalive=2, http2=True),
+    DEFAULT: UpstreamProfile(timeout=httpx.Timeout(60.0, connect=10.0)),
+}
+
+
+class HTTPClientRegistry:
+    """
+    Реестр httpx клиентов: один долгоживущий пул на внешний сервис.
+    
+    Использование:
+        client = http_clients.get(MISTRAL)
+        response = await client.post(url, json=payload)
+        ...
+        await http_clients.aclose()  # при остановке бота
+    """
+    
+    def __init__(self, profiles: Optional[Dict[str, UpstreamProfile]] = None):
+        self._profiles = profiles if profiles is not None else UPSTREAM_PROFILES
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+    
+    def _create(self, upstream: str) -> httpx.AsyncClient:
+        profile = self._profiles.get(upstream) or self._profiles[DEFAULT]
+        return httpx.AsyncClient(
+            timeout=profile.timeout,
+            limits=httpx.Limits(
+                max_connections=profile.max_connections,
+                max_keepalive_connections=profile.max_keepalive,
+                keepalive_expiry=profile.keepalive_expiry
+            ),
+            http2=profile.http2 and HTTP2_AVAILABLE,
+            follow_redirects=True
+        )
+    
+    def get(self, upstream: str = DEFAULT) -> httpx.AsyncClient:
+        """Клиент сервиса (создаётся при первом обращении)"""
+        client = self._clients.get(upstream)
+        if client is None or client.is_closed:
+            client = self._create(upstream)
+            self._clients[upstream] = client
+        return client
+    
+    async def aclose(self):
+        """Закрывает все пулы соединений"""
+        clients, self._clients = self._clients, {}
+        for upstream, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка закрытия HTTP клиента {upstream}: {e}")
+        if clients:
+            logger.info(f"🔌 Закрыто HTTP клиентов: {len(clients)}")
+
+
+# Глобальный реестр
+http_clients = HTTPClientRegistry()
+
+if not HTTP2_AVAILABLE:
+    logger.info("ℹ️ Пакет h2 не установлен — HTTP клиенты работают по HTTP/1.1")
+
+async def close_http_clients():
+    """Закрывает все HTTP клиенты (вызывается из main при остановке)"""
+    await http_clients.aclose()
+
 
 # ============================================================================
 # SUPABASE КЛИЕНТ
@@ -106,7 +200,7 @@ async def check_all_connections() -> dict:
     # Проверка Mistral
     try:
         if MISTRAL_API_KEY:
-            response = await http_client.get(
+            response = await http_clients.get(MISTRAL).get(
                 "https://api.mistral.ai/v1/models",
                 headers={"Authorization": f"Bearer {MISTRAL_API_KEY}"},
                 timeout=5.0
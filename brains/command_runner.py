@@ -0,0 +1,366 @@
+"""
+Песочница для shell-команд ReAct агента
+
+create_subprocess_shell + communicate() держали весь вывод в памяти,
+а команда после таймаута продолжала работать. Здесь:
+- не больше COMMAND_MAX_CONCURRENT команд одновременно, ожидающие
+  сверх COMMAND_QUEUE_SIZE отклоняются (CommandOverloadedError)
+- rlimit на CPU, память (адресное пространство), число открытых файлов,
+  размер записываемых файлов и число процессов. Лимиты выставляет
+  exec-обёртка (python -c ... затем exec /bin/sh), а не preexec_fn:
+  код между fork и exec в многопоточном процессе бота небезопасен
+- вывод читается потоком, сохраняются первые COMMAND_MAX_OUTPUT_KB каждого
+  потока, остальное вычитывается и отбрасывается
+- команда — лидер своей группы процессов: по таймауту, отмене или
+  завершению группа гасится целиком (SIGTERM, затем SIGKILL)
+- окружение без секретов бота (API ключей из .env)
+
+Использование:
+    result = await command_runner.run("ls -la", timeout=30)
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from brains.config import (
+    COMMAND_MAX_CONCURRENT, COMMAND_QUEUE_SIZE, COMMAND_QUEUE_TIMEOUT, COMMAND_MAX_TIMEOUT,
+    COMMAND_CPU_SECONDS, COMMAND_MEMORY_MB, COMMAND_MAX_FILES, COMMAND_MAX_FILE_MB, COMMAND_MAX_PROCS,
+    COMMAND_MAX_OUTPUT_KB
+)
+from brains.exceptions import CommandOverloadedError
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Windows: лимиты недоступны, остаются таймаут и обрезка вывода
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Переменные окружения, которые видит команда
+SAFE_ENV_KEYS = ("PATH", "HOME", "LANG", "LC_ALL", "TZ", "TMPDIR", "USER")
+
+KILL_GRACE_SECONDS = 2.0
+
+SIGNAL_REASONS = {
+    signal.SIGKILL: "процесс убит (лимит памяти или CPU)",
+    signal.SIGSEGV: "ошибка памяти",
+}
+if hasattr(signal, "SIGXCPU"):
+    SIGNAL_REASONS[signal.SIGXCPU] = "превышен лимит CPU"
+    SIGNAL_REASONS[signal.SIGXFSZ] = "превышен лимит размера файла"
+
+
+# Обёртка: выставляет rlimit и заменяет себя на /bin/sh -c command.
+# RLIMIT_NPROC считается по всем процессам и потокам пользователя, поэтому
+# к лимиту прибавляется уже занятое ботом (по /proc).
+_LIMITS_WRAPPER = """
+import os, resource, sys
+
+cpu, memory, files, fsize, procs = (int(v) for v in sys.argv[1:6])
+
+def user_tasks():
+    uid, total = os.getuid(), 0
+    for pid in os.listdir('/proc'):
+        if pid.isdigit():
+            try:
+                if os.stat('/proc/' + pid).st_uid == uid:
+                    total += len(os.listdir('/proc/' + pid + '/task'))
+            except OSError:
+                pass
+    return total
+
+limits = [
+    (resource.RLIMIT_CPU, cpu),
+    (resource.RLIMIT_AS, memory),
+    (resource.RLIMIT_NOFILE, files),
+    (resource.RLIMIT_FSIZE, fsize),
+]
+if procs > 0 and hasattr(resource, 'RLIMIT_NPROC'):
+    limits.append((resource.RLIMIT_NPROC, procs + (user_tasks() if os.path.isdir('/proc') else 0)))
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+for limit, value in limits:
+    if value <= 0:
+        continue
+    hard = resource.getrlimit(limit)[1]
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    new_hard = value
+    if limit == resource.RLIMIT_CPU and (hard == resource.RLIM_INFINITY or hard > value):
+        # Сначала SIGXCPU (можно обработать), через секунду — SIGKILL
+        new_hard = value + 1
+    resource.setrlimit(limit, (value, new_hard))
+
+os.execv('/bin/sh', ['/bin/sh', '-c', sys.argv[6]])
+"""
+
+
+def _limited_argv(command: str, cpu_seconds: int, memory_mb: int, max_files: int,
+                  max_file_mb: int, max_procs: int) -> List[str]:
+    """Команда под exec-обёрткой с rlimit (0 — лимит не выставляется)"""
+    limits = (cpu_seconds, memory_mb * 1024 * 1024, max_files, max_file_mb * 1024 * 1024, max_procs)
+    return [sys.executable, "-I", "-S", "-c", _LIMITS_WRAPPER, *(str(v) for v in limits), command]
+
+
+class OutputBuffer:
+    """Первые max_bytes потока; остальное только считается"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.kept = 0
+        self.total = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.kept
+
+    def feed(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.max_bytes - self.kept
+        if room > 0:
+            part = chunk[:room]
+            self.chunks.append(part)
+            self.kept += len(part)
+
+    def text(self) -> str:
+        text = b"".join(self.chunks).decode("utf-8", errors="replace")
+        if self.truncated:
+            text += f"\n… [вывод обрезан: показано {self.kept} из {self.total} байт]"
+        return text
+
+
+class _CommandProtocol(asyncio.SubprocessProtocol):
+    """
+    Вывод приходит кусками сразу в OutputBuffer
+
+    process_exited срабатывает при выходе shell, даже если фоновые потомки
+    ещё держат pipe (Process.wait() в этом случае ждал бы закрытия pipe).
+    """
+
+    def __init__(self, max_bytes: int, loop: asyncio.AbstractEventLoop):
+        self.output = {1: OutputBuffer(max_bytes), 2: OutputBuffer(max_bytes)}
+        self.exited = loop.create_future()
+        self.closed = loop.create_future()
+
+    def pipe_data_received(self, fd: int, data: bytes):
+        self.output[fd].feed(data)
+
+    def process_exited(self):
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+def _kill_group(pgid: int, sig: int) -> bool:
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+class CommandRunner:
+    """
+    Ограниченный пул shell-команд с лимитами ресурсов
+
+    Одновременно выполняется max_concurrent команд, ещё queue_size ждут.
+    Остальные ждут место до queue_timeout секунд, затем отклоняются.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = COMMAND_MAX_CONCURRENT,
+        queue_size: int = COMMAND_QUEUE_SIZE,
+        queue_timeout: float = COMMAND_QUEUE_TIMEOUT,
+        max_timeout: float = COMMAND_MAX_TIMEOUT,
+        cpu_seconds: int = COMMAND_CPU_SECONDS,
+        memory_mb: int = COMMAND_MEMORY_MB,
+        max_files: int = COMMAND_MAX_FILES,
+        max_file_mb: int = COMMAND_MAX_FILE_MB,
+        max_procs: int = COMMAND_MAX_PROCS,
+        max_output_kb: int = COMMAND_MAX_OUTPUT_KB,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.capacity = self.max_concurrent + max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.max_timeout = max_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_files = max_files
+        self.max_file_mb = max_file_mb
+        self.max_procs = max_procs
+        self.max_output_bytes = max_output_kb * 1024
+        self._admission: Optional[asyncio.Semaphore] = None
+        self._running_slots: Optional[asyncio.Semaphore] = None
+        self._groups: Dict[int, float] = {}  # pgid -> время старта
+        self.stats = {
+            "running": 0,
+            "queued": 0,
+            "peak_running": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "orphans_killed": 0,  # Группы с оставшимися фоновыми потомками
+            "rejected": 0,
+            "truncated": 0,
+        }
+
+    def _get_semaphores(self) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self.capacity)
+            self._running_slots = asyncio.Semaphore(self.max_concurrent)
+        return self._admission, self._running_slots
+
+    def _env(self) -> Dict[str, str]:
+        return {key: os.environ[key] for key in SAFE_ENV_KEYS if key in os.environ}
+
+    async def run(self, command: str, timeout: float = 60, cwd: Optional[str] = None) -> Dict:
+        """
+        Выполняет команду в песочнице
+
+        Returns:
+            {"success", "stdout", "stderr", "returncode", "truncated", "elapsed"}
+            и "error" при таймауте или завершении по лимиту
+
+        Raises:
+            CommandOverloadedError: очередь команд переполнена
+        """
+        timeout = min(max(float(timeout or 0), 1.0), self.max_timeout)
+        admission, running_slots = self._get_semaphores()
+        try:
+            await asyncio.wait_for(admission.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            logger.warning(f"⚠️ Очередь команд переполнена ({self.capacity}), команда отклонена")
+            raise CommandOverloadedError("Command queue full: temporary overload")
+
+        try:
+            self.stats["queued"] += 1
+            try:
+                await running_slots.acquire()
+            finally:
+                self.stats["queued"] -= 1
+            self.stats["running"] += 1
+            self.stats["peak_running"] = max(self.stats["peak_running"], self.stats["running"])
+            try:
+                return await self._execute(command, timeout, cwd)
+            finally:
+                self.stats["running"] -= 1
+                running_slots.release()
+        finally:
+            admission.release()
+
+    async def _execute(self, command: str, timeout: float, cwd: Optional[str]) -> Dict:
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        options = dict(
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=self._env(),
+            start_new_session=True,
+        )
+        factory = lambda: _CommandProtocol(self.max_output_bytes, loop)
+        if RESOURCE_AVAILABLE:
+            argv = _limited_argv(command, self.cpu_seconds, self.memory_mb, self.max_files,
+                                 self.max_file_mb, self.max_procs)
+            transport, protocol = await loop.subprocess_exec(factory, *argv, **options)
+        else:
+            transport, protocol = await loop.subprocess_shell(factory, command, **options)
+        pgid = transport.get_pid()
+        self._groups[pgid] = started
+        timed_out = False
+
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(protocol.exited), timeout=timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                self.stats["timeouts"] += 1
+                await self._terminate(protocol, pgid)
+        except BaseException:
+            # Отмена задачи агента — команда не должна пережить её
+            _kill_group(pgid, signal.SIGKILL)
+            transport.close()
+            raise
+        finally:
+            # Фоновые потомки (cmd &) держат pipe открытым — гасим всю группу
+            if _kill_group(pgid, signal.SIGKILL) and not timed_out:
+                self.stats["orphans_killed"] += 1
+            self._groups.pop(pgid, None)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(protocol.closed), timeout=KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        returncode = transport.get_returncode()
+        transport.close()
+
+        elapsed = time.monotonic() - started
+        stdout, stderr = protocol.output[1], protocol.output[2]
+        truncated = stdout.truncated or stderr.truncated
+        if truncated:
+            self.stats["truncated"] += 1
+
+        result = {
+            "success": not timed_out and returncode == 0,
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "returncode": returncode,
+            "truncated": truncated,
+            "elapsed": round(elapsed, 3),
+        }
+        if timed_out:
+            result["error"] = f"Timeout after {timeout:g}s"
+            result["returncode"] = None
+        elif returncode is not None and returncode < 0:
+            reason = SIGNAL_REASONS.get(-returncode, f"сигнал {-returncode}")
+            result["error"] = f"Команда завершена: {reason}"
+        elif returncode is not None and returncode - 128 in SIGNAL_REASONS:
+            # shell сообщает о сигнале потомка кодом 128 + N
+            result["error"] = f"Команда завершена: {SIGNAL_REASONS[returncode - 128]}"
+
+        self.stats["completed" if result["success"] else "failed"] += 1
+        logger.info(
+            f"🖥 Команда: код {result['returncode']}, {elapsed:.2f} сек, "
+            f"вывод {stdout.total + stderr.total} байт{' (обрезан)' if truncated else ''}"
+        )
+        return result
+
+    async def _terminate(self, protocol: _CommandProtocol, pgid: int):
+        """SIGTERM группе, через KILL_GRACE_SECONDS — SIGKILL"""
+        if not _kill_group(pgid, signal.SIGTERM):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(protocol.exited), timeout=KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            _kill_group(pgid, signal.SIGKILL)
+            await protocol.exited
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "max_concurrent": self.max_concurrent,
+            "capacity": self.capacity,
+        }
+
+    async def shutdown(self):
+        """Гасит группы всех ещё работающих команд"""
+        for pgid in list(self._groups):
+            _kill_group(pgid, signal.SIGKILL)
+        self._groups.clear()
+
+
+# Глобальный пул команд
+command_runner = CommandRunner()
@@ -40,3 +40,79 @@ EMOJI_MAP = {
 MARZBAN_URL = os.environ.get('MARZBAN_URL', 'http://108.165.174.164:8000')
 MARZBAN_USER = os.environ.get('MARZBAN_USER', 'root')
 MARZBAN_PASS = os.environ.get('MARZBAN_PASS', '')
+
+# Общее состояние rate limiter'ов и circuit breaker'ов (между воркерами)
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'sqlite')  # sqlite | memory
+STATE_DB_PATH = os.environ.get('STATE_DB_PATH', 'data/karina_state.db')
+STATE_BUSY_TIMEOUT_MS = int(os.environ.get('STATE_BUSY_TIMEOUT_MS', 50))  # Ожидание блокировки SQLite (вызовы идут из event loop)
+
+# Пул процессов синтеза речи (TTS)
+TTS_WORKERS = int(os.environ.get('TTS_WORKERS', 1))  # 0 — синтез в потоке основного процесса
+TTS_QUEUE_SIZE = int(os.environ.get('TTS_QUEUE_SIZE', 4))  # Ожидающих задач сверх числа воркеров
+TTS_QUEUE_TIMEOUT = float(os.environ.get('TTS_QUEUE_TIMEOUT', 10))  # Сколько ждать места в очереди, сек
+TTS_TORCH_THREADS = int(os.environ.get('TTS_TORCH_THREADS', 2))  # Потоков torch на воркер
+TTS_PRELOAD_VOICES = os.environ.get('TTS_PRELOAD_VOICES', 'v3_1_ru')  # Через запятую
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', 'temp/tts_cache')  # Кэш готовых фраз
+TTS_CACHE_MAX_MB = int(os.environ.get('TTS_CACHE_MAX_MB', 200))
+
+# Синхронизация Google Calendar (syncToken) в локальное хранилище
+CALENDAR_SYNC_INTERVAL = float(os.environ.get('CALENDAR_SYNC_INTERVAL', 120))  # Сек между проходами
+CALENDAR_STORE_PATH = os.environ.get('CALENDAR_STORE_PATH', 'data/calendar_store.json')
+CALENDAR_REMINDER_MINUTES = int(os.environ.get('CALENDAR_REMINDER_MINUTES', 15))  # За сколько минут напоминать
+CALENDAR_REMINDER_HORIZON_HOURS = int(os.environ.get('CALENDAR_REMINDER_HORIZON_HOURS', 24))
+
+# Распознавание речи (STT): порядок бэкендов local (faster-whisper) и remote (HF)
+STT_BACKENDS = os.environ.get('STT_BACKENDS', 'local,remote')
+STT_LOCAL_MODEL = os.environ.get('STT_LOCAL_MODEL', 'small')  # tiny | base | small | medium
+STT_LOCAL_COMPUTE_TYPE = os.environ.get('STT_LOCAL_COMPUTE_TYPE', 'int8')  # Квантование CTranslate2
+STT_LOCAL_THREADS = int(os.environ.get('STT_LOCAL_THREADS', 2))
+STT_LOCAL_TIMEOUT = float(os.environ.get('STT_LOCAL_TIMEOUT', 60))  # Сек, затем следующий бэкенд
+STT_LOCAL_COOLDOWN = float(os.environ.get('STT_LOCAL_COOLDOWN', 300))  # Сек без локального STT после таймаута или сбоя воркера
+STT_REMOTE_TIMEOUT = float(os.environ.get('STT_REMOTE_TIMEOUT', 45))
+STT_LANGUAGE = os.environ.get('STT_LANGUAGE', 'ru')  # Пусто — автоопределение
+
+# ReAct агент: сколько независимых шагов плана выполнять одновременно
+REACT_MAX_PARALLEL_STEPS = int(os.environ.get('REACT_MAX_PARALLEL_STEPS', 3))
+
+# Кэш планов ReAct агента: повторные задачи без запроса к планировщику
+PLAN_CACHE_PATH = os.environ.get('PLAN_CACHE_PATH', 'data/plan_cache.json')
+PLAN_CACHE_SIZE = int(os.environ.get('PLAN_CACHE_SIZE', 200))  # Планов, дальше вытесняются давно не использованные
+PLAN_CACHE_SIMILARITY = float(os.environ.get('PLAN_CACHE_SIMILARITY', 0.95))  # Косинусная близость шаблонов задач
+PLAN_CACHE_MIN_SUCCESS_RATE = float(os.environ.get('PLAN_CACHE_MIN_SUCCESS_RATE', 0.7))  # Ниже — провалившийся план удаляется
+
+# Песочница команд ReAct агента (run_command)
+COMMAND_MAX_CONCURRENT = int(os.environ.get('COMMAND_MAX_CONCURRENT', 2))  # Команд одновременно
+COMMAND_QUEUE_SIZE = int(os.environ.get('COMMAND_QUEUE_SIZE', 4))  # Ожидающих сверх выполняемых
+COMMAND_QUEUE_TIMEOUT = float(os.environ.get('COMMAND_QUEUE_TIMEOUT', 30))  # Сколько ждать места в очереди, сек
+COMMAND_MAX_TIMEOUT = float(os.environ.get('COMMAND_MAX_TIMEOUT', 120))  # Потолок таймаута из плана, сек
+COMMAND_CPU_SECONDS = int(os.environ.get('COMMAND_CPU_SECONDS', 60))  # RLIMIT_CPU
+COMMAND_MEMORY_MB = int(os.environ.get('COMMAND_MEMORY_MB', 512))  # RLIMIT_AS
+COMMAND_MAX_FILES = int(os.environ.get('COMMAND_MAX_FILES', 256))  # RLIMIT_NOFILE
+COMMAND_MAX_FILE_MB = int(os.environ.get('COMMAND_MAX_FILE_MB', 100))  # RLIMIT_FSIZE
+COMMAND_MAX_PROCS = int(os.environ.get('COMMAND_MAX_PROCS', 64))  # RLIMIT_NPROC сверх уже запущенных пользователем бота
+COMMAND_MAX_OUTPUT_KB = int(os.environ.get('COMMAND_MAX_OUTPUT_KB', 256))  # Сохраняемый вывод на поток
+
+# Аналитика продуктивности: кэш колонок и агрегатов по (пользователь, окно)
+PRODUCTIVITY_CACHE_TTL = float(os.environ.get('PRODUCTIVITY_CACHE_TTL', 600))  # Сек, запись сбрасывает сразу
+
+# Дневные агрегаты (daily_rollups): локальный кэш прочитанных дней
+ROLLUP_CACHE_TTL = float(os.environ.get('ROLLUP_CACHE_TTL', 300))  # Сек, записи бота обновляют кэш сразу
+
+# Статистика здоровья: окна 7/30/90 дней одним запросом, кэш по пользователю
+HEALTH_STATS_CACHE_TTL = float(os.environ.get('HEALTH_STATS_CACHE_TTL', 300))  # Сек, новая запись сбрасывает сразу
+
+# Справочник сотрудников в памяти (индекс дней рождения)
+EMPLOYEE_REFRESH_INTERVAL = float(os.environ.get('EMPLOYEE_REFRESH_INTERVAL', 6 * 3600))  # Сек, правки через бота — сразу
+
+# Еженедельный отчёт: расписание (МСК), предрасчёт разделов ночью и таймауты
+SUMMARY_WEEKDAY = int(os.environ.get('SUMMARY_WEEKDAY', 6))  # 0=Пн … 6=Вс
+SUMMARY_HOUR = int(os.environ.get('SUMMARY_HOUR', 10))
+SUMMARY_PRECOMPUTE_HOUR = int(os.environ.get('SUMMARY_PRECOMPUTE_HOUR', 4))  # Тяжёлые разделы в день отправки
+SUMMARY_PRECOMPUTE_MAX_AGE = float(os.environ.get('SUMMARY_PRECOMPUTE_MAX_AGE', 12 * 3600))  # Сек, старше — пересчёт
+SUMMARY_SECTION_TIMEOUT = float(os.environ.get('SUMMARY_SECTION_TIMEOUT', 15))  # Сек на раздел, затем заглушка
+SUMMARY_AI_TIMEOUT = float(os.environ.get('SUMMARY_AI_TIMEOUT', 60))  # Сек на AI-резюме
+SUMMARY_CATCHUP_HOURS = float(os.environ.get('SUMMARY_CATCHUP_HOURS', 6))  # Отправить позже, если бот был выключен
+SUMMARY_STATE_PATH = os.environ.get('SUMMARY_STATE_PATH', 'data/weekly_summary.json')  # Последняя доставка (без повтора после рестарта)
+
+# Кэш результатов Vision: порог расстояния Хэмминга dHash (из 64 бит)
+VISION_HASH_THRESHOLD = int(os.environ.get('VISION_HASH_THRESHOLD', 4))
@@ -1,31 +1,226 @@
+"""
+Сотрудники и дни рождения
+
+Раньше get_todays_birthdays и get_upcoming_birthdays на каждый вызов
+скачивали всю таблицу employees и резали birthday[5:] в цикле.
+Здесь справочник держится в памяти с индексом, отсортированным по
+(месяц, день): сегодня и ближайшие N дней — это bisect по индексу
+(с переходом через Новый год). Индекс обновляется при add/update/delete
+и периодически (EMPLOYEE_REFRESH_INTERVAL).
+"""
+import asyncio
+import bisect
+import calendar
 import logging
-from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Optional
+import time
+from datetime import date, datetime, timezone, timedelta
+from typing import List, Dict, Optional, Tuple
 from brains.clients import supabase_client
+from brains.config import EMPLOYEE_REFRESH_INTERVAL
 
 logger = logging.getLogger(__name__)
 
+MOSCOW_TZ = timezone(timedelta(hours=3))
 
-async def get_todays_birthdays() -> List[Dict]:
-    """Проверяет, у кого сегодня день рождения (по московскому времени)"""
-    moscow_tz = timezone(timedelta(hours=3))
-    today = datetime.now(moscow_tz)
-    today_str = today.strftime('%m-%d')  # MM-DD формат
 
+def _birthday_key(employee: Dict) -> Optional[Tuple[int, int]]:
+    """(месяц, день) из YYYY-MM-DD; None если даты нет или она битая"""
+    birthday = employee.get("birthday")
+    if not birthday:
+        return None
     try:
-        # Получаем всех сотрудников из таблицы
-        response = supabase_client.table("employees").select("*").execute()
+        month, day = int(birthday[5:7]), int(birthday[8:10])
+    except (TypeError, ValueError):
+        return None
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    return month, day
 
-        if response.data:
-            celebrants = []
-            for emp in response.data:
-                if emp.get('birthday'):
-                    # Извлекаем месяц и день из даты рождения
-                    emp_bd = emp['birthday'][5:]  # MM-DD из YYYY-MM-DD
-                    if emp_bd == today_str:
-                        celebrants.append(emp)
-            return celebrants
-        return []
+
+def _occurrence(year: int, month: int, day: int) -> date:
+    """День рождения в году year; 29 февраля в невисокосный год — 28-е"""
+    if month == 2 and day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return date(year, month, day)
+
+
+def _upper_key(day: date) -> Tuple[int, int]:
+    """Верхняя граница диапазона: 28 февраля невисокосного года включает 29-е"""
+    if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+        return 2, 29
+    return day.month, day.day
+
+
+class EmployeeDirectory:
+    """
+    Справочник сотрудников в памяти с индексом дней рождения
+
+    Использование:
+        celebrants = await employee_directory.todays_birthdays()
+        upcoming = await employee_directory.upcoming_birthdays(days=7)
+    """
+
+    def __init__(self, refresh_interval: float = EMPLOYEE_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._employees: Dict[int, Dict] = {}
+        self._index: List[Tuple[int, int, int]] = []  # (месяц, день, id), отсортирован
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.stats = {"refreshes": 0, "lookups": 0, "updates": 0}
+
+    async def _fetch(self) -> List[Dict]:
+        query = supabase_client.table("employees").select("*")
+        response = await asyncio.to_thread(query.execute)
+        return response.data or []
+
+    def _load(self, rows: List[Dict]):
+        self._employees = {row["id"]: row for row in rows if row.get("id") is not None}
+        self._index = sorted(
+            key + (emp_id,)
+            for emp_id, key in ((emp_id, _birthday_key(emp)) for emp_id, emp in self._employees.items())
+            if key
+        )
+
+    def _remove(self, employee_id: int):
+        employee = self._employees.pop(employee_id, None)
+        key = _birthday_key(employee) if employee else None
+        if key:
+            entry = key + (employee_id,)
+            i = bisect.bisect_left(self._index, entry)
+            if i < len(self._index) and self._index[i] == entry:
+                del self._index[i]
+
+    def _put(self, employee: Dict):
+        self._remove(employee["id"])
+        self._employees[employee["id"]] = employee
+        key = _birthday_key(employee)
+        if key:
+            bisect.insort(self._index, key + (employee["id"],))
+
+    async def _reload(self):
+        rows = await self._fetch()
+        self._load(rows)
+        self._loaded_at = time.monotonic()
+        self.stats["refreshes"] += 1
+        logger.debug(f"👥 Справочник сотрудников: {len(self._employees)}, с датой рождения: {len(self._index)}")
+
+    def _stale(self) -> bool:
+        # Запас x2: обычно справочник обновляет фоновая задача
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval * 2
+
+    async def refresh(self) -> int:
+        """Перечитывает таблицу employees; возвращает число сотрудников"""
+        async with self._lock:
+            await self._reload()
+        return len(self._employees)
+
+    async def ensure_loaded(self):
+        """Загружает справочник, если его ещё нет или фоновое обновление отстало"""
+        if self._stale():
+            async with self._lock:
+                if self._stale():
+                    await self._reload()
+
+    async def apply_change(self, employee: Optional[Dict] = None, deleted_id: Optional[int] = None):
+        """Обновляет индекс после записи в employees"""
+        async with self._lock:
+            if deleted_id is not None:
+                self._remove(deleted_id)
+            if employee and employee.get("id") is not None:
+                self._put(employee)
+            self.stats["updates"] += 1
+
+    def _range(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int, int]]:
+        """Записи индекса с ключом в [start, end] (включительно)"""
+        lo = bisect.bisect_left(self._index, start + (float("-inf"),))
+        hi = bisect.bisect_right(self._index, end + (float("inf"),))
+        return self._index[lo:hi]
+
+    def birthdays_on(self, day: date) -> List[Dict]:
+        """Сотрудники с днём рождения в day (без обращения к базе)"""
+        start = (day.month, day.day)
+        return [dict(self._employees[entry[2]]) for entry in self._range(start, _upper_key(day))]
+
+    def birthdays_between(self, today: date, days: int) -> List[Dict]:
+        """Дни рождения в [today, today + days] с полем days_until, ближайшие первыми"""
+        # Не больше 364 дней: в окне из 365 дней сегодняшний день рождения попал бы дважды
+        days = max(0, min(days, 364))
+        end = today + timedelta(days=days)
+        if end.year == today.year:
+            segments = [(today.year, self._range((today.month, today.day), _upper_key(end)))]
+        else:
+            # Переход через Новый год: конец года + начало следующего
+            segments = [
+                (today.year, self._range((today.month, today.day), (12, 31))),
+                (end.year, self._range((1, 1), _upper_key(end))),
+            ]
+
+        upcoming = []
+        for year, entries in segments:
+            for month, day, emp_id in entries:
+                days_until = (_occurrence(year, month, day) - today).days
+                if 0 <= days_until <= days:
+                    employee = dict(self._employees[emp_id])
+                    employee["days_until"] = days_until
+                    upcoming.append(employee)
+        upcoming.sort(key=lambda x: x["days_until"])
+        return upcoming
+
+    async def todays_birthdays(self, today: Optional[date] = None) -> List[Dict]:
+        await self.ensure_loaded()
+        self.stats["lookups"] += 1
+        return self.birthdays_on(today or datetime.now(MOSCOW_TZ).date())
+
+    async def upcoming_birthdays(self, days: int = 7, today: Optional[date] = None) -> List[Dict]:
+        await self.ensure_loaded()
+        self.stats["lookups"] += 1
+        return self.birthdays_between(today or datetime.now(MOSCOW_TZ).date(), days)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "employees": len(self._employees), "with_birthday": len(self._index)}
+
+
+# Глобальный справочник сотрудников
+employee_directory = EmployeeDirectory()
+
+_refresher_task: Optional[asyncio.Task] = None
+
+
+async def _refresher_loop(interval: float):
+    """Держит справочник сотрудников свежим"""
+    while True:
+        try:
+            await employee_directory.refresh()
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления справочника сотрудников: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_employee_refresher(interval: float = EMPLOYEE_REFRESH_INTERVAL) -> asyncio.Task:
+    """Запускает периодическое обновление справочника (повторный вызов не создаёт вторую задачу)"""
+    global _refresher_task
+    if _refresher_task is None or _refresher_task.done():
+        _refresher_task = asyncio.create_task(_refresher_loop(interval))
+        logger.info(f"👥 Обновление справочника сотрудников: каждые {interval:.0f} сек")
+    return _refresher_task
+
+
+async def stop_employee_refresher():
+    """Останавливает периодическое обновление справочника"""
+    global _refresher_task
+    task, _refresher_task = _refresher_task, None
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def get_todays_birthdays() -> List[Dict]:
+    """Проверяет, у кого сегодня день рождения (по московскому времени)"""
+    try:
+        return await employee_directory.todays_birthdays()
     except Exception as e:
         logger.error(f"Error checking birthdays: {e}")
         return []
@@ -56,6 +251,7 @@ async def add_employee(employee_data: dict) -> bool:
     try:
         response = supabase_client.table("employees").insert(employee_data).execute()
         if response.data:
+            await employee_directory.apply_change(response.data[0])
             logger.info(f"✅ Сотрудник {employee_data['full_name']} добавлен")
             return True
         return False
@@ -69,6 +265,7 @@ async def update_employee(employee_id: int, update_data: dict) -> bool:
     try:
         response = supabase_client.table("employees").update(update_data).eq("id", employee_id).execute()
         if response.data:
+            await employee_directory.apply_change(response.data[0])
             logger.info(f"✅ Сотрудник {employee_id} обновлен")
             return True
         return False
@@ -82,6 +279,7 @@ async def delete_employee(employee_id: int) -> bool:
     try:
         response = supabase_client.table("employees").delete().eq("id", employee_id).execute()
         if response.data:
+            await employee_directory.apply_change(deleted_id=employee_id)
             logger.info(f"🗑️ Сотрудник {employee_id} удален")
             return True
         return False
@@ -92,50 +290,8 @@ async def delete_employee(employee_id: int) -> bool:
 
 async def get_upcoming_birthdays(days: int = 7) -> List[Dict]:
     """Получает список предстоящих дней рождения"""
-    moscow_tz = timezone(timedelta(hours=3))
-    today = datetime.now(moscow_tz)
-    
     try:
-        response = supabase_client.table("employees").select("*").execute()
-        
-        if not response.data:
-            return []
-        
-        upcoming = []
-        for emp in response.data:
-            if not emp.get('birthday'):
-                continue
-            
-            # Создаем дату ДР в текущем году
-            bd_month = int(emp['birthday'][5:7])
-            bd_day = int(emp['birthday'][8:10])
-            
-            try:
-                bd_this_year = today.replace(month=bd_month, day=bd_day)
-            except ValueError:
-                # Для 29 февраля используем 28 февраля
-                bd_this_year = today.replace(month=2, day=28)
-            
-            # Вычисляем разницу в днях
-            days_until = (bd_this_year - today).days
-            
-            # Если в этом году уже прошел, берем следующий год
-            if days_until < 0:
-                try:
-                    bd_next_year = today.replace(year=today.year + 1, month=bd_month, day=bd_day)
-                except ValueError:
-                    bd_next_year = today.replace(year=today.year + 1, month=2, day=28)
-                days_until = (bd_next_year - today).days
-            
-            if 0 <= days_until <= days:
-                emp_copy = emp.copy()
-                emp_copy['days_until'] = days_until
-                upcoming.append(emp_copy)
-        
-        # Сортируем по возрастанию дней
-        upcoming.sort(key=lambda x: x['days_until'])
-        return upcoming
-    
+        return await employee_directory.upcoming_birthdays(days)
     except Exception as e:
         logger.error(f"Error getting upcoming birthdays: {e}")
         return []
@@ -83,6 +83,31 @@ class VisionInvalidImageError(VisionError):
     pass
 
 
+class MediaTooLargeError(KarinaError):
+    """Медиафайл больше допустимого размера"""
+    pass
+
+
+class TTSError(KarinaError):
+    """Ошибки синтеза речи"""
+    pass
+
+
+class TTSOverloadedError(TTSError):
+    """Очередь синтеза переполнена"""
+    pass
+
+
+class CommandError(KarinaError):
+    """Ошибки выполнения команд ReAct агента"""
+    pass
+
+
+class CommandOverloadedError(CommandError):
+    """Очередь команд переполнена"""
+    pass
+
+
 class ConfigError(KarinaError):
     """Ошибки конфигурации"""
     pass
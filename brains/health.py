@@ -1,29 +1,50 @@
+"""
+Здоровье: записи об уколах и статистика
+
+Статистика считается по дневным агрегатам (brains/rollups.py) одним
+запросом за HEALTH_WINDOWS[-1] дней: процент и серии для окон 7/30/90
+готовы сразу, результат кэшируется по пользователю на HEALTH_STATS_CACHE_TTL
+и сбрасывается новой записью.
+"""
+import asyncio
 import logging
-from datetime import datetime, timezone, timedelta
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
 from brains.clients import supabase_client
-from brains.config import MY_ID
+from brains.config import MY_ID, HEALTH_STATS_CACHE_TTL
+from brains.rollups import DailyRollup, RollupStore, rollups
 
 logger = logging.getLogger(__name__)
 
+MOSCOW_TZ = timezone(timedelta(hours=3))
 
-async def save_health_record(confirmed: bool, timestamp: datetime = None):
+# Окна, которые считаются за один запрос
+HEALTH_WINDOWS = (7, 30, 90)
+
+
+async def save_health_record(confirmed: bool, timestamp: datetime = None, user_id: int = None):
     """Сохраняет запись о здоровье (укол) в Supabase"""
+    user_id = user_id or MY_ID
     if not timestamp:
-        moscow_tz = timezone(timedelta(hours=3))
-        timestamp = datetime.now(moscow_tz)
+        timestamp = datetime.now(MOSCOW_TZ)
 
     try:
         data = {
-            "user_id": MY_ID,
+            "user_id": user_id,
             "confirmed": confirmed,
             "timestamp": timestamp.isoformat(),
             "date": timestamp.strftime('%Y-%m-%d'),
             "time": timestamp.strftime('%H:%M:%S')
         }
-        
-        response = supabase_client.table("health_records").insert(data).execute()
-        
+
+        query = supabase_client.table("health_records").insert(data)
+        response = await asyncio.to_thread(query.execute)
+
         if response.data:
+            await rollups.record_health(user_id, confirmed, timestamp)
+            health_stats.invalidate(user_id)
             logger.info("✅ Здоровье: запись сохранена")
             return True
         else:
@@ -34,75 +55,175 @@ async def save_health_record(confirmed: bool, timestamp: datetime = None):
         return False
 
 
-def get_health_stats(days: int = 7) -> dict:
-    """Получает статистику по здоровью за последние N дней"""
-    start_date = (datetime.now(timezone(timedelta(hours=3))) - timedelta(days=days)).strftime('%Y-%m-%d')
+def _daily_stats(days_rollups: List[DailyRollup]) -> List[Dict]:
+    """Статус дня — самая свежая запись за день; новые первыми"""
+    return [
+        {
+            "date": r.date,
+            "confirmed": bool(r.health_last_confirmed),
+            "time": r.health_last_time or "N/A"
+        }
+        for r in sorted(days_rollups, key=lambda r: r.date, reverse=True)
+        if r.health_records
+    ]
 
-    try:
-        # Фильтруем по user_id и дате, сортируем по timestamp
-        response = supabase_client.table("health_records")\
-            .select("*")\
-            .eq("user_id", MY_ID)\
-            .gte("date", start_date)\
-            .order("timestamp", desc=True)\
-            .execute()
-
-        if not response.data:
-            return {
-                "total_days": 0, "confirmed_days": 0, "missed_days": 0,
-                "success_rate": 0, "daily_stats": [],
-                "message": "Нет данных"
-            }
-
-        records = response.data
-
-        # Группируем по датам (берем самую свежую запись за день)
-        daily_data = {}
-        for record in records:
-            date = record.get('date')
-            if date and date not in daily_data:
-                daily_data[date] = {
-                    "date": date,
-                    "confirmed": record.get('confirmed', False),
-                    "time": record.get('time', 'N/A')
-                }
-
-        # Сортируем результат по дате
-        daily_stats = sorted(daily_data.values(), key=lambda x: x['date'], reverse=True)
-
-        confirmed_days = sum(1 for d in daily_stats if d['confirmed'])
-        total_days = len(daily_stats)
-
-        return {
-            "total_days": total_days,
-            "confirmed_days": confirmed_days,
-            "missed_days": total_days - confirmed_days,
-            "success_rate": round((confirmed_days / total_days * 100) if total_days > 0 else 0, 1),
-            "daily_stats": daily_stats
+
+def _best_streak(daily: List[Dict]) -> int:
+    """Самая длинная серия подтверждённых дней подряд (daily — новые первыми)"""
+    best = current = 0
+    previous = None
+    for day in reversed(daily):
+        day_date = date.fromisoformat(day["date"])
+        if not day["confirmed"]:
+            current = 0
+        elif previous is not None and current and (day_date - previous).days == 1:
+            current += 1
+        else:
+            current = 1
+        best = max(best, current)
+        previous = day_date
+    return best
+
+
+def current_streak(daily: List[Dict], today: date) -> int:
+    """Подтверждённые дни подряд до сегодня; сегодня без записи серию не рвёт"""
+    expected = today
+    if daily and daily[0]["date"] != today.isoformat():
+        expected = today - timedelta(days=1)
+    streak = 0
+    for day in daily:
+        if day["date"] != expected.isoformat() or not day["confirmed"]:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+
+def window_stats(daily: List[Dict], days: int, today: date) -> Dict:
+    """Статистика окна в формате get_health_stats"""
+    since = (today - timedelta(days=days)).isoformat()
+    selected = [d for d in daily if d["date"] >= since]
+    confirmed_days = sum(1 for d in selected if d["confirmed"])
+    total_days = len(selected)
+    return {
+        "total_days": total_days,
+        "confirmed_days": confirmed_days,
+        "missed_days": total_days - confirmed_days,
+        "success_rate": round((confirmed_days / total_days * 100) if total_days > 0 else 0, 1),
+        "best_streak": _best_streak(selected),
+    }
+
+
+@dataclass
+class HealthSnapshot:
+    """Дни и готовые окна пользователя"""
+    daily: List[Dict]
+    windows: Dict[int, Dict]
+    streak: int
+    today: date
+    computed_at: float
+
+
+class HealthStatsService:
+    """
+    Статистика здоровья по пользователям с TTL-кэшем
+
+    Использование:
+        stats = await health_stats.get(user_id, days=7)
+        health_stats.invalidate(user_id)  # после новой записи
+    """
+
+    def __init__(self, ttl: float = HEALTH_STATS_CACHE_TTL, store: Optional[RollupStore] = None):
+        self.ttl = ttl
+        self.store = store if store is not None else rollups
+        self._cache: Dict[Tuple[int, int], HealthSnapshot] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "computed": 0}
+
+    async def snapshot(self, user_id: int, days: int = HEALTH_WINDOWS[-1]) -> HealthSnapshot:
+        """Все окна за один запрос; окно шире HEALTH_WINDOWS[-1] — отдельный снимок"""
+        horizon = max(days, HEALTH_WINDOWS[-1])
+        key = (user_id, horizon)
+        today = datetime.now(MOSCOW_TZ).date()
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            cached = self._cache.get(key)
+            if cached and cached.today == today and time.time() - cached.computed_at < self.ttl:
+                self.stats["hits"] += 1
+                return cached
+
+            since = (today - timedelta(days=horizon)).isoformat()
+            daily = _daily_stats(await self.store.get_range(user_id, since))
+            windows = {window: window_stats(daily, window, today) for window in HEALTH_WINDOWS}
+            snapshot = HealthSnapshot(
+                daily=daily,
+                windows=windows,
+                streak=current_streak(daily, today),
+                today=today,
+                computed_at=time.time(),
+            )
+            self._cache[key] = snapshot
+            self.stats["computed"] += 1
+            return snapshot
+
+    async def get(self, user_id: int, days: int = 7) -> Dict:
+        """Статистика окна в формате get_health_stats + серия и все окна"""
+        snapshot = await self.snapshot(user_id, days)
+        window = snapshot.windows.get(days) or window_stats(snapshot.daily, days, snapshot.today)
+        since = (snapshot.today - timedelta(days=days)).isoformat()
+        stats = {
+            **window,
+            "daily_stats": [d for d in snapshot.daily if d["date"] >= since],
+            "current_streak": snapshot.streak,
+            "windows": snapshot.windows,
         }
-        
+        if not window["total_days"]:
+            stats["message"] = "Нет данных"
+        return stats
+
+    def invalidate(self, user_id: int):
+        for key in [k for k in self._cache if k[0] == user_id]:
+            del self._cache[key]
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "cached": len(self._cache)}
+
+
+# Глобальный сервис статистики здоровья
+health_stats = HealthStatsService()
+
+
+async def get_health_stats(days: int = 7, user_id: int = None) -> dict:
+    """Получает статистику по здоровью за последние N дней"""
+    try:
+        return await health_stats.get(user_id or MY_ID, days)
     except Exception as e:
         logger.error(f"Get stats failed: {e}")
         return {"error": str(e), "daily_stats": []}
 
 
-async def get_health_report_text(days: int = 7) -> str:
+async def get_health_report_text(days: int = 7, user_id: int = None) -> str:
     """Форматирует отчет для Telegram"""
-    # get_health_stats - синхронная функция
-    stats = get_health_stats(days)
+    stats = await get_health_stats(days, user_id)
 
     if "error" in stats:
         return f"❌ Ошибка получения статистики: {stats['error']}"
 
     if not stats.get("daily_stats"):
-        return "📊 Нет данных за последние 7 дней. Напиши 'сделал', когда уколешься! ❤️"
+        return f"📊 Нет данных за последние {days} дней. Напиши 'сделал', когда уколешься! ❤️"
 
     lines = [
         "📊 **Статистика здоровья**\n",
         f"📅 Период: {stats['total_days']} дн.",
         f"✅ Подтверждено: {stats['confirmed_days']}",
         f"❌ Пропущено: {stats['missed_days']}",
-        f"📈 Успешность: {stats['success_rate']}%\n",
+        f"📈 Успешность: {stats['success_rate']}%",
+        f"🔥 Серия: {stats['current_streak']} дн. подряд",
+        " • ".join(
+            f"{window} дн.: {info['success_rate']}%"
+            for window, info in stats["windows"].items() if info["total_days"]
+        ) + "\n",
         "**Последние записи:**"
     ]
 
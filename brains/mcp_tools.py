@@ -105,6 +105,11 @@ async def mcp_save_health_record(user_id: int, confirmed: bool = True) -> bool:
             "confirmed": confirmed
         }
         response = supabase_client.table("health_records").insert(data).execute()
+        if response.data:
+            from brains.rollups import rollups
+            from brains.health import health_stats
+            await rollups.record_health(user_id, confirmed)
+            health_stats.invalidate(user_id)
         return bool(response.data)
     except Exception as e:
         logger.error(f"Failed to save health record: {e}")
@@ -124,18 +129,15 @@ async def mcp_get_health_stats(user_id: int, days: int = 7) -> Dict:
     """
     try:
         from datetime import datetime, timedelta
+        from brains.rollups import rollups
         
         start_date = datetime.now() - timedelta(days=days)
         
-        # Получаем все записи
-        response = supabase_client.table("health_records")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .gte("date", start_date.strftime('%Y-%m-%d'))\
-            .order("date", desc=True)\
-            .execute()
+        # Дневные агрегаты вместо всех записей за период
+        days_rollups = await rollups.get_range(user_id, start_date.strftime('%Y-%m-%d'))
+        total = sum(r.health_records for r in days_rollups)
         
-        if not response.data:
+        if not total:
             return {
                 "total": 0,
                 "confirmed": 0,
@@ -143,9 +145,7 @@ async def mcp_get_health_stats(user_id: int, days: int = 7) -> Dict:
                 "compliance_rate": 0
             }
         
-        records = response.data
-        total = len(records)
-        confirmed = sum(1 for r in records if r.get("confirmed", True))
+        confirmed = sum(r.health_confirmed for r in days_rollups)
         missed = total - confirmed
         compliance_rate = round((confirmed / total * 100) if total > 0 else 0, 1)
         
@@ -0,0 +1,101 @@
+"""
+Загрузка медиа из Telegram без лишних обращений к диску
+
+- Небольшие файлы (фото, голосовые) скачиваются прямо в память
+  (download_media(file=bytes)) и уходят в STT/Vision из буфера
+- Крупные файлы — в уникальный временный файл, который удаляется после обработки
+- Файлы больше лимита не скачиваются вовсе (MediaTooLargeError)
+
+Использование:
+    async with download_event_media(event, max_bytes=10 * 1024 * 1024) as media:
+        result = await analyze_image(media.payload, prompt)
+"""
+import os
+import logging
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional, Union
+
+from brains.exceptions import MediaTooLargeError
+
+logger = logging.getLogger(__name__)
+
+# Файлы до этого размера держим в памяти
+MEMORY_LIMIT_BYTES = 8 * 1024 * 1024
+
+# Каталог для крупных файлов
+MEDIA_TEMP_DIR = Path("temp/media")
+
+
+@dataclass
+class DownloadedMedia:
+    """Скачанный файл: байты в памяти или путь к временному файлу"""
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    size: int = 0
+    mime_type: Optional[str] = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    @property
+    def payload(self) -> Union[bytes, str]:
+        """То, что принимают analyze_image и transcribe_voice"""
+        return self.data if self.data is not None else self.path
+
+
+def _media_info(event):
+    """(размер, mime, расширение) по метаданным сообщения, без скачивания"""
+    file = getattr(event, "file", None)
+    if file is None:
+        return None, None, ""
+    return getattr(file, "size", None), getattr(file, "mime_type", None), getattr(file, "ext", None) or ""
+
+
+@asynccontextmanager
+async def download_event_media(
+    event,
+    max_bytes: int,
+    memory_limit: int = MEMORY_LIMIT_BYTES
+) -> AsyncIterator[DownloadedMedia]:
+    """
+    Скачивает медиа сообщения
+
+    Raises:
+        MediaTooLargeError: файл больше max_bytes
+    """
+    size, mime_type, ext = _media_info(event)
+
+    if size is not None and size > max_bytes:
+        raise MediaTooLargeError(
+            f"Файл слишком большой ({size / 1024 / 1024:.1f} МБ). "
+            f"Максимум: {max_bytes / 1024 / 1024:.0f} МБ"
+        )
+
+    # Размер неизвестен или небольшой — в память
+    if size is None or size <= memory_limit:
+        data = await event.download_media(file=bytes)
+        if data is None:
+            raise ValueError("Не удалось скачать файл")
+        if len(data) > max_bytes:
+            raise MediaTooLargeError(f"Файл слишком большой ({len(data) / 1024 / 1024:.1f} МБ)")
+        logger.debug(f"📥 Медиа в памяти: {len(data) / 1024:.0f} КБ")
+        yield DownloadedMedia(data=data, size=len(data), mime_type=mime_type)
+        return
+
+    # Крупный файл — уникальный временный файл (никаких общих имён)
+    MEDIA_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="tg_", suffix=ext, dir=MEDIA_TEMP_DIR)
+    os.close(fd)
+    try:
+        await event.download_media(file=path)
+        logger.debug(f"📥 Медиа во временном файле: {path} ({size / 1024 / 1024:.1f} МБ)")
+        yield DownloadedMedia(path=path, size=size, mime_type=mime_type)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -4,16 +4,23 @@ RAG Память Karina AI
 """
 import logging
 import asyncio
+import httpx
 from typing import Optional, List, Dict, Any
-from brains.clients import supabase_client, http_client, MISTRAL_EMBED_URL
+from brains.clients import supabase_client, http_clients, MISTRAL, MISTRAL_EMBED_URL
 from brains.config import MISTRAL_API_KEY
+from brains.rate_limiter import mistral_limiter
+from brains.circuit_breaker import breaker_registry, parse_retry_after, MISTRAL_EMBED
 
 logger = logging.getLogger(__name__)
 
+embed_breaker = breaker_registry.get(MISTRAL_EMBED)
+embed_retry_budget = breaker_registry.budget(MISTRAL_EMBED)
+
 
 async def get_embedding(text: str, max_retries: int = 3) -> Optional[List[float]]:
     """
-    Генерирует векторное представление текста через Mistral с retry для 429.
+    Генерирует векторное представление текста через Mistral.
+    Ошибки учитываются в circuit breaker'е эмбеддингов, повторы — по retry budget.
     
     Args:
         text: Текст для эмбеддинга
@@ -26,61 +33,78 @@ async def get_embedding(text: str, max_retries: int = 3) -> Optional[List[float]
         logger.error("❌ MISTRAL_API_KEY не установлен")
         return None
 
+    if not embed_breaker.allow_request():
+        logger.warning("⚠️ Mistral Embed Circuit Breaker открыт. Запрос отклонён.")
+        return None
+    embed_retry_budget.record_request()
+
     headers = {"Authorization": f"Bearer {MISTRAL_API_KEY}", "Content-Type": "application/json"}
     payload = {"model": "mistral-embed", "input": [text]}
 
-    for attempt in range(max_retries):
-        try:
-            response = await http_client.post(MISTRAL_EMBED_URL, json=payload, headers=headers)
-
-            if response.status_code == 200:
-                data = response.json()
-                if 'data' in data and len(data['data']) > 0:
-                    return data['data'][0]['embedding']
-                else:
-                    logger.error(f"❌ Mistral Embed: пустой ответ")
+    # Проба half-open, не сообщившая результат (429, бюджет), освобождается на любом выходе
+    try:
+        for attempt in range(max_retries):
+            retry_after = None
+            try:
+                await mistral_limiter.wait_if_needed()
+                response = await http_clients.get(MISTRAL).post(MISTRAL_EMBED_URL, json=payload, headers=headers)
+
+                if response.status_code == 200:
+                    embed_breaker.record_success()
+                    data = response.json()
+                    if 'data' in data and len(data['data']) > 0:
+                        return data['data'][0]['embedding']
+                    else:
+                        logger.error(f"❌ Mistral Embed: пустой ответ")
+                        return None
+
+                elif response.status_code == 429:
+                    # Rate limit — не считаем за failure, ждём сколько просит сервер
+                    retry_after = parse_retry_after(response.headers)
+                    logger.warning(f"⚠️ Mistral Embed rate limit (429). Попытка {attempt + 1}/{max_retries}.")
+
+                elif response.status_code == 401:
+                    logger.error("🔐 Mistral Embed Authentication Error (401). Проверьте API ключ.")
+                    embed_breaker.record_failure()
                     return None
 
-            elif response.status_code == 429:
-                # Rate limit — экспоненциальная задержка
-                wait_time = (attempt + 1) * 2
-                logger.warning(f"⚠️ Mistral Embed rate limit (429). Попытка {attempt + 1}/{max_retries}. Жду {wait_time}s...")
-                await asyncio.sleep(wait_time)
-                # Не считаем за failure, продолжаем retry
-
-            elif response.status_code == 401:
-                logger.error("🔐 Mistral Embed Authentication Error (401). Проверьте API ключ.")
-                return None
-
-            elif response.status_code == 400:
-                logger.error(f"❌ Mistral Embed Bad Request (400): {response.text[:200]}")
-                return None
+                elif response.status_code == 400:
+                    logger.error(f"❌ Mistral Embed Bad Request (400): {response.text[:200]}")
+                    embed_breaker.record_success()
+                    return None
 
-            else:
-                logger.error(f"❌ Mistral Embed Error: {response.status_code} - {response.text[:200]}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
+                else:
+                    logger.error(f"❌ Mistral Embed Error: {response.status_code} - {response.text[:200]}")
+                    embed_breaker.record_failure()
 
-        except httpx.TimeoutException as e:
-            logger.error(f"⌛️ Mistral Embed Timeout (attempt {attempt + 1}/{max_retries}): {type(e).__name__}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
+            except httpx.TimeoutException as e:
+                logger.error(f"⌛️ Mistral Embed Timeout (attempt {attempt + 1}/{max_retries}): {type(e).__name__}")
+                embed_breaker.record_failure()
 
-        except httpx.ConnectError as e:
-            logger.error(f"🔌 Mistral Embed Connect Error (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(3)
+            except httpx.ConnectError as e:
+                logger.error(f"🔌 Mistral Embed Connect Error (attempt {attempt + 1}/{max_retries}): {e}")
+                embed_breaker.record_failure()
 
-        except httpx.RequestError as e:
-            logger.error(f"❌ Mistral Embed Request Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
+            except httpx.RequestError as e:
+                logger.error(f"❌ Mistral Embed Request Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
+                embed_breaker.record_failure()
 
-        except Exception as e:
-            logger.exception(f"💥 Mistral Embed Unexpected Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
-            return None
+            except Exception as e:
+                logger.exception(f"💥 Mistral Embed Unexpected Error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
+                embed_breaker.record_failure()
+                return None
 
-    logger.error(f"❌ Mistral Embed: Превышено количество попыток ({max_retries})")
+            if attempt == max_retries - 1 or embed_breaker.is_open:
+                break
+            delay = embed_retry_budget.next_delay(attempt, retry_after)
+            if delay is None:
+                logger.warning("⚠️ Mistral Embed: бюджет повторов исчерпан")
+                break
+            await asyncio.sleep(delay)
+    finally:
+        embed_breaker.release_probe()
+
+    logger.error(f"❌ Mistral Embed: не удалось получить эмбеддинг")
     return None
 
 
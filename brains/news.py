@@ -7,17 +7,25 @@
 
 Особенности:
 - Сохранение истории показанных новостей в БД
-- Фильтрация дублей по URL
+- Фильтрация дублей по URL и похожим заголовкам (локальный индекс)
 - Показ только новых новостей
 - Кэширование на 1 час
+- Условный GET (ETag/Last-Modified), TTL и пауза для падающих источников
+- Инкрементальный парсинг фида (первые 15 новостей)
+- Фоновое обновление пула новостей
 """
 import httpx
 import logging
 import xml.etree.ElementTree as ET
 import asyncio
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional
-from brains.clients import supabase_client
+from urllib.parse import urlparse
+from brains.clients import supabase_client, http_clients, RSS
+from brains.circuit_breaker import breaker_registry, RSS_PREFIX
+from brains.news_dedup import NewsDedupIndex, NEWS_DEDUP_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +82,37 @@ NEWS_CACHE = {
     "expire_at": None
 }
 
+# Параметры загрузки фидов (TTL источника можно задать ключом "ttl")
+FEED_DEFAULT_TTL = 900          # 15 минут между запросами к источнику
+FEED_MAX_BACKOFF = 6 * 3600     # Максимальная пауза для падающего источника
+FEED_MAX_ITEMS = 15             # Берём максимум 15 последних
+FEED_REFRESH_INTERVAL = 300     # Период фонового обновления
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+FEED_ITEM_TAGS = {"item", f"{ATOM_NS}entry"}
+
+
+@dataclass
+class FeedState:
+    """Состояние фида: валидаторы условного GET и последние новости"""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    items: List[Dict] = field(default_factory=list)
+    fetched_at: float = 0.0
+    next_fetch_at: float = 0.0
+    failures: int = 0
+    not_modified: int = 0
+
+
+# Состояние фидов по URL источника
+FEED_STATES: Dict[str, FeedState] = {}
+
+# Индекс уже показанных новостей
+_dedup_index: Optional[NewsDedupIndex] = None
+
+# Текущее обновление фидов (общее для всех вызывающих)
+_refresh_inflight: Optional[asyncio.Task] = None
+
 
 # ============================================================================
 # РАБОТА С БД
@@ -96,6 +135,36 @@ async def get_shown_news_links(limit: int = 100) -> set:
         return set()
 
 
+async def get_dedup_index() -> NewsDedupIndex:
+    """
+    Индекс дедупликации (ленивая инициализация).
+    
+    Загружается из файла; если файла нет — один раз наполняется из news_history.
+    """
+    global _dedup_index
+    
+    if _dedup_index is not None:
+        return _dedup_index
+    
+    index = NewsDedupIndex(NEWS_DEDUP_PATH)
+    if not await asyncio.to_thread(index.load):
+        try:
+            response = supabase_client.table("news_history")\
+                .select("link, title")\
+                .order("shown_at", desc=True)\
+                .limit(index.max_entries)\
+                .execute()
+            # Старые первыми — при переполнении вытесняются они
+            index.add_many(reversed(response.data or []))
+            await asyncio.to_thread(index.save)
+            logger.info(f"📰 Индекс новостей наполнен из истории: {len(index)} записей")
+        except Exception as e:
+            logger.error(f"Error seeding news index: {e}")
+    
+    _dedup_index = index
+    return _dedup_index
+
+
 async def get_news_history_count(days: int = 7) -> int:
     """Получает количество новостей за период"""
     try:
@@ -130,14 +199,10 @@ async def save_news_to_history(news_items: List[Dict], user_id: int = 0):
                 "user_id": user_id
             })
         
-        # Используем upsert чтобы избежать дублей
-        for record in records:
-            try:
-                supabase_client.table("news_history")\
-                    .upsert(record, on_conflict="link")\
-                    .execute()
-            except Exception:
-                logger.debug(f"News already exists: {record['link']}")
+        # Один upsert на всю пачку, on_conflict избавляет от дублей
+        supabase_client.table("news_history")\
+            .upsert(records, on_conflict="link")\
+            .execute()
         
         logger.info(f"💾 Сохранено {len(records)} новостей в историю")
     except Exception as e:
@@ -170,8 +235,8 @@ def extract_publication_date(item) -> Optional[datetime]:
     """Извлекает дату публикации из RSS элемента"""
     date_fields = ['pubDate', 'published', 'updated', 'created']
     
-    for field in date_fields:
-        date_elem = item.find(field)
+    for field_name in date_fields:
+        date_elem = _find(item, field_name)
         if date_elem is not None and date_elem.text:
             try:
                 # Пробуем разные форматы
@@ -187,63 +252,280 @@ def extract_publication_date(item) -> Optional[datetime]:
     return datetime.now(timezone.utc)
 
 
-async def fetch_rss(client: httpx.AsyncClient, source: Dict) -> List[Dict]:
-    """Загружает и парсит один RSS источник"""
-    try:
-        response = await client.get(source["url"], timeout=15.0, follow_redirects=True)
-        
-        if response.status_code != 200:
-            logger.warning(f"❌ Источник {source['name']} вернул {response.status_code}")
-            return []
-        
-        root = ET.fromstring(response.text)
-        items = []
-        
-        # Ищем элементы item или entry (для разных форматов RSS)
-        rss_items = root.findall('.//item') or root.findall('.//{http://www.w3.org/2005/Atom}entry')
-        
-        for item in rss_items[:15]:  # Берём максимум 15 последних
-            title_elem = item.find('title')
-            link_elem = item.find('link')
-            
-            # Для Atom формата link это элемент с атрибутом href
-            if link_elem is not None and link_elem.text is None:
-                link_elem = item.find('{http://www.w3.org/2005/Atom}link')
-                if link_elem is not None and 'href' in link_elem.attrib:
-                    link = link_elem.attrib['href']
-                else:
-                    continue
-            else:
-                link = link_elem.text if link_elem is not None else None
-            
-            if title_elem is None or not title_elem.text or not link:
+def get_source_breaker(source: Dict):
+    """Circuit breaker RSS-хоста источника"""
+    return breaker_registry.get(f"{RSS_PREFIX}{urlparse(source['url']).netloc}")
+
+
+def get_feed_state(source: Dict) -> FeedState:
+    """Состояние фида источника (создаётся при первом обращении)"""
+    state = FEED_STATES.get(source["url"])
+    if state is None:
+        state = FeedState()
+        FEED_STATES[source["url"]] = state
+    return state
+
+
+def _conditional_headers(state: FeedState) -> Dict[str, str]:
+    """Заголовки условного GET по сохранённым валидаторам"""
+    headers = {}
+    if state.etag:
+        headers["If-None-Match"] = state.etag
+    if state.last_modified:
+        headers["If-Modified-Since"] = state.last_modified
+    return headers
+
+
+def _mark_failed(source: Dict, state: FeedState, now: float):
+    """Экспоненциальная пауза для падающего источника"""
+    state.failures += 1
+    ttl = source.get("ttl", FEED_DEFAULT_TTL)
+    delay = min(ttl * (2 ** (state.failures - 1)), FEED_MAX_BACKOFF)
+    state.next_fetch_at = now + delay
+    logger.info(f"⏳ Источник {source['name']}: пауза {delay:.0f} сек (ошибок подряд: {state.failures})")
+
+
+def _find(item, name: str):
+    """Ищет дочерний элемент RSS или Atom"""
+    elem = item.find(name)
+    if elem is None:
+        elem = item.find(f"{ATOM_NS}{name}")
+    return elem
+
+
+def parse_item(item, source: Dict) -> Optional[Dict]:
+    """Преобразует элемент item/entry в новость"""
+    title_elem = _find(item, 'title')
+    link_elem = _find(item, 'link')
+    
+    # Для Atom формата link это элемент с атрибутом href
+    if link_elem is not None and link_elem.text is None:
+        link = link_elem.attrib.get('href')
+    else:
+        link = link_elem.text if link_elem is not None else None
+    
+    if title_elem is None or not title_elem.text or not link:
+        return None
+    
+    title = title_elem.text.strip()
+    
+    # Проверяем на ключевые слова
+    match_score = sum(1 for kw in KEYWORDS if kw.lower() in title.lower())
+    
+    # Извлекаем дату публикации
+    pub_date = extract_publication_date(item)
+    
+    return {
+        "title": title,
+        "link": link.strip(),
+        "source": source["name"],
+        "category": source["category"],
+        "score": match_score,
+        "published_at": pub_date.isoformat() if pub_date else None
+    }
+
+
+class FeedParser:
+    """
+    Инкрементальный парсер RSS/Atom.
+    
+    Принимает документ кусками по мере загрузки и собирает не больше
+    max_items новостей — остаток фида можно не скачивать.
+    """
+    
+    def __init__(self, source: Dict, max_items: int = FEED_MAX_ITEMS):
+        self.source = source
+        self.max_items = max_items
+        self.items: List[Dict] = []
+        self._parser = ET.XMLPullParser(events=("end",))
+    
+    @property
+    def done(self) -> bool:
+        return len(self.items) >= self.max_items
+    
+    def feed(self, chunk: bytes):
+        """Скармливает очередной кусок документа"""
+        self._parser.feed(chunk)
+        for _, elem in self._parser.read_events():
+            if elem.tag not in FEED_ITEM_TAGS:
                 continue
+            news = parse_item(elem, self.source)
+            # Разобранный элемент больше не нужен
+            elem.clear()
+            if news:
+                self.items.append(news)
+            if self.done:
+                break
+
+
+def parse_feed(content: bytes, source: Dict, max_items: int = FEED_MAX_ITEMS) -> List[Dict]:
+    """Парсит готовый документ фида"""
+    parser = FeedParser(source, max_items)
+    parser.feed(content)
+    return parser.items
+
+
+async def fetch_rss(client: httpx.AsyncClient, source: Dict, force: bool = False) -> List[Dict]:
+    """
+    Загружает один RSS источник с учётом TTL и условного GET
+    
+    Args:
+        client: HTTP клиент
+        source: Источник из NEWS_SOURCES
+        force: Игнорировать TTL (пауза после ошибок всё равно действует)
+    
+    Returns:
+        Новости источника (из кэша фида, если он не изменился)
+    """
+    state = get_feed_state(source)
+    now = time.time()
+    
+    if now < state.next_fetch_at and (not force or state.failures):
+        return state.items
+    
+    breaker = get_source_breaker(source)
+    if not breaker.allow_request():
+        logger.info(f"⏭️ Источник {source['name']} пропущен (circuit breaker открыт)")
+        return state.items
+
+    parser = FeedParser(source)
+    # Проба half-open, не сообщившая результат (битый фид, отмена), освобождается на любом выходе
+    try:
+        async with client.stream(
+            "GET", source["url"], headers=_conditional_headers(state), timeout=15.0
+        ) as response:
+            if response.status_code == 304:
+                breaker.record_success()
+                state.failures = 0
+                state.fetched_at = now
+                state.next_fetch_at = now + source.get("ttl", FEED_DEFAULT_TTL)
+                state.not_modified += 1
+                logger.debug(f"📰 {source['name']}: не изменился (304)")
+                return state.items
             
-            title = title_elem.text.strip()
+            if response.status_code != 200:
+                logger.warning(f"❌ Источник {source['name']} вернул {response.status_code}")
+                breaker.record_failure()
+                _mark_failed(source, state, now)
+                return state.items
             
-            # Проверяем на ключевые слова
-            match_score = sum(1 for kw in KEYWORDS if kw.lower() in title.lower())
+            breaker.record_success()
             
-            # Извлекаем дату публикации
-            pub_date = extract_publication_date(item)
+            async for chunk in response.aiter_bytes():
+                parser.feed(chunk)
+                if parser.done:
+                    # Остаток фида не скачиваем
+                    break
             
-            items.append({
-                "title": title,
-                "link": link,
-                "source": source["name"],
-                "category": source["category"],
-                "score": match_score,
-                "published_at": pub_date.isoformat() if pub_date else None
-            })
+            state.etag = response.headers.get("etag")
+            state.last_modified = response.headers.get("last-modified")
         
-        return items
+        state.items = parser.items
+        state.failures = 0
+        state.fetched_at = now
+        state.next_fetch_at = now + source.get("ttl", FEED_DEFAULT_TTL)
+        return state.items
         
     except httpx.TimeoutException:
         logger.warning(f"⌛️ Таймаут источника {source['name']}")
-        return []
+        breaker.record_failure()
+    except httpx.RequestError as e:
+        logger.warning(f"🔌 Источник {source['name']} недоступен: {type(e).__name__}")
+        breaker.record_failure()
+    except ET.ParseError as e:
+        logger.warning(f"❌ Битый XML источника {source['name']}: {e}")
+        # Без валидаторов следующий запрос скачает фид целиком
+        state.etag = state.last_modified = None
+        if parser.items:
+            state.items = parser.items
     except Exception as e:
         logger.warning(f"❌ Ошибка источника {source['name']}: {e}")
-        return []
+    finally:
+        breaker.release_probe()
+    
+    _mark_failed(source, state, now)
+    return state.items
+
+
+async def refresh_all_feeds(force: bool = False) -> List[Dict]:
+    """
+    Обновляет все включённые источники и возвращает общий пул новостей
+
+    Пока идёт обновление (например, фоновое), повторный вызов ждёт его,
+    а не запрашивает фиды второй раз. force всегда запускает своё обновление.
+    """
+    global _refresh_inflight
+    if force:
+        return await _refresh_feeds(force=True)
+    if _refresh_inflight is None or _refresh_inflight.done():
+        _refresh_inflight = asyncio.create_task(_refresh_feeds())
+    # shield: отмена одного ожидающего не прерывает обновление для остальных
+    return list(await asyncio.shield(_refresh_inflight))
+
+
+async def _refresh_feeds(force: bool = False) -> List[Dict]:
+    enabled_sources = [s for s in NEWS_SOURCES if s.get("enabled", True)]
+    
+    client = http_clients.get(RSS)
+    tasks = [fetch_rss(client, source, force=force) for source in enabled_sources]
+    results = await asyncio.gather(*tasks)
+    
+    all_news = []
+    for res in results:
+        all_news.extend(res)
+    return all_news
+
+
+def get_pooled_news() -> List[Dict]:
+    """Новости из уже загруженных фидов (без сетевых запросов)"""
+    all_news = []
+    for source in NEWS_SOURCES:
+        if source.get("enabled", True):
+            all_news.extend(get_feed_state(source).items)
+    return all_news
+
+
+# ============================================================================
+# ФОНОВОЕ ОБНОВЛЕНИЕ
+# ============================================================================
+
+_refresher_task: Optional[asyncio.Task] = None
+
+
+async def _refresher_loop(interval: float):
+    """Держит пул новостей тёплым"""
+    while True:
+        try:
+            news = await refresh_all_feeds()
+            logger.debug(f"📰 Фоновое обновление: в пуле {len(news)} новостей")
+        except Exception as e:
+            logger.error(f"❌ Ошибка фонового обновления новостей: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_news_refresher(interval: float = FEED_REFRESH_INTERVAL) -> asyncio.Task:
+    """Запускает фоновое обновление фидов (повторный вызов не создаёт вторую задачу)"""
+    global _refresher_task
+    if _refresher_task is None or _refresher_task.done():
+        _refresher_task = asyncio.create_task(_refresher_loop(interval))
+        logger.info(f"📰 Фоновое обновление новостей: каждые {interval:.0f} сек")
+    return _refresher_task
+
+
+async def stop_news_refresher():
+    """Останавливает фоновое обновление фидов"""
+    global _refresher_task
+    task, _refresher_task = _refresher_task, None
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def is_refresher_running() -> bool:
+    return _refresher_task is not None and not _refresher_task.done()
 
 
 # ============================================================================
@@ -269,37 +551,30 @@ async def get_latest_news(limit: int = 5, force_refresh: bool = False, user_id:
             logger.debug("📰 Новости: используем кэш")
             return NEWS_CACHE["news"]
     
-    # Получаем список уже показанных URL
-    shown_links = await get_shown_news_links(limit=200)
-    logger.info(f"📰 Найдено {len(shown_links)} уже показанных новостей")
-    
-    # Собираем новости из всех источников
-    all_news = []
-    enabled_sources = [s for s in NEWS_SOURCES if s.get("enabled", True)]
+    # Локальный индекс уже показанных новостей (без запросов к БД)
+    index = await get_dedup_index()
     
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        tasks = [fetch_rss(client, source) for source in enabled_sources]
-        results = await asyncio.gather(*tasks)
-        
-        for res in results:
-            all_news.extend(res)
+    # Собираем новости: при работающем фоновом обновлении берём готовый пул,
+    # чтобы не ждать медленные RSS хосты; пул ещё пуст — ждём текущее
+    # обновление фоновой задачи, а не запускаем второе
+    all_news = get_pooled_news() if is_refresher_running() and not force_refresh else []
+    if not all_news:
+        all_news = await refresh_all_feeds(force=force_refresh)
     
     logger.info(f"📰 Всего собрано новостей: {len(all_news)}")
     
-    # Фильтруем дубли и уже показанные
+    # Фильтруем уже показанные и дубли внутри выборки (в т.ч. перепосты
+    # с другим URL — по похожему заголовку)
     unique_news = []
-    seen_links = set()
+    batch = NewsDedupIndex()
     
     for news in all_news:
-        # Пропускаем если URL уже есть в текущей выборке
-        if news["link"] in seen_links:
+        if index.is_duplicate(news["link"], news["title"]):
             continue
-        
-        # Пропускаем если уже показывали
-        if news["link"] in shown_links:
+        if batch.is_duplicate(news["link"], news["title"]):
             continue
         
-        seen_links.add(news["link"])
+        batch.add(news["link"], news["title"])
         unique_news.append(news)
     
     logger.info(f"📰 Новых новостей после фильтрации: {len(unique_news)}")
@@ -323,7 +598,9 @@ async def get_latest_news(limit: int = 5, force_refresh: bool = False, user_id:
     # Берём топ
     top_news = unique_news[:limit]
     
-    # Сохраняем в историю
+    # Запоминаем показанные и сохраняем в историю
+    index.add_many(top_news)
+    await asyncio.to_thread(index.save)
     await save_news_to_history(top_news, user_id)
     
     # Формируем отчёт
@@ -444,4 +721,7 @@ def clear_news_cache():
     """Очищает кэш новостей"""
     NEWS_CACHE["news"] = None
     NEWS_CACHE["expire_at"] = None
+    # Валидаторы сохраняем — повторная загрузка обойдётся ответом 304
+    for state in FEED_STATES.values():
+        state.next_fetch_at = 0.0
     logger.info("🧹 Кэш новостей очищен")
@@ -0,0 +1,212 @@
+"""
+Локальный индекс дедупликации новостей
+
+- Хэши нормализованных URL (без utm-меток, www и завершающего слэша)
+- SimHash заголовков для поиска перепостов с другими URL
+- Сохранение в файл, однократное наполнение из news_history
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+NEWS_DEDUP_PATH = "data/news_dedup.json"
+
+SIMHASH_BITS = 64
+# Порог расстояния Хэмминга для «того же» заголовка
+SIMHASH_THRESHOLD = 6
+# 8 полос по 8 бит: при расстоянии <= 7 хотя бы одна полоса совпадает
+SIMHASH_BANDS = 8
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+# Сколько последних новостей помним
+MAX_ENTRIES = 5000
+
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "from", "ref"}
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_url(url: str) -> str:
+    """Приводит URL к каноническому виду для сравнения"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("", host, path, urlencode(sorted(query)), ""))
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def url_hash(url: str) -> int:
+    """64-битный хэш нормализованного URL"""
+    return _hash64(normalize_url(url))
+
+
+def simhash(text: str) -> int:
+    """
+    SimHash заголовка по символьным триграммам слов.
+
+    Похожие заголовки дают хэши с малым расстоянием Хэмминга.
+    """
+    words = _WORD_RE.findall(text.lower())
+    features = []
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    if not features:
+        return 0
+
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    result = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            result |= 1 << bit
+    return result
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(value: int) -> List[int]:
+    return [(i << _BAND_BITS) | (value >> (i * _BAND_BITS) & _BAND_MASK) for i in range(SIMHASH_BANDS)]
+
+
+class NewsDedupIndex:
+    """
+    Индекс уже показанных новостей.
+
+    Использование:
+        index = NewsDedupIndex(path)
+        if not index.is_duplicate(news["link"], news["title"]):
+            ...
+        index.add_many(shown)
+        index.save()
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # url_hash -> simhash заголовка (порядок вставки = возраст)
+        self._entries: Dict[int, int] = {}
+        self._bands: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _index_bands(self, key: int, fingerprint: int):
+        for band in _bands(fingerprint):
+            self._bands.setdefault(band, set()).add(key)
+
+    def _unindex_bands(self, key: int, fingerprint: int):
+        for band in _bands(fingerprint):
+            keys = self._bands.get(band)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    def has_link(self, link: str) -> bool:
+        return url_hash(link) in self._entries
+
+    def find_similar_title(self, title: str) -> bool:
+        """Есть ли заголовок в пределах SIMHASH_THRESHOLD"""
+        fingerprint = simhash(title)
+        if not fingerprint:
+            return False
+        for band in _bands(fingerprint):
+            for key in self._bands.get(band, ()):
+                if hamming(self._entries[key], fingerprint) <= SIMHASH_THRESHOLD:
+                    return True
+        return False
+
+    def is_duplicate(self, link: str, title: str = "") -> bool:
+        """Новость уже показывалась (тот же URL или почти тот же заголовок)"""
+        with self._lock:
+            return self.has_link(link) or (bool(title) and self.find_similar_title(title))
+
+    def add(self, link: str, title: str = ""):
+        with self._lock:
+            key = url_hash(link)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._unindex_bands(key, old)
+            fingerprint = simhash(title) if title else 0
+            self._entries[key] = fingerprint
+            if fingerprint:
+                self._index_bands(key, fingerprint)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._unindex_bands(oldest, self._entries.pop(oldest))
+            self._dirty = True
+
+    def add_many(self, items: Iterable[Dict]):
+        for item in items:
+            self.add(item["link"], item.get("title", ""))
+
+    # ------------------------------------------------------------------
+    # Сохранение
+    # ------------------------------------------------------------------
+
+    def load(self) -> bool:
+        """Загружает индекс из файла. False если файла нет или он битый"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                self._entries.clear()
+                self._bands.clear()
+                for key, fingerprint in data.get("entries", []):
+                    self._entries[key] = fingerprint
+                    if fingerprint:
+                        self._index_bands(key, fingerprint)
+                self._dirty = False
+            logger.info(f"📰 Индекс новостей загружен: {len(self._entries)} записей")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить индекс новостей: {e}")
+            return False
+
+    def save(self):
+        """Сохраняет индекс в файл (атомарно через временный файл)"""
+        if not self.path or not self._dirty:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                data = {"entries": list(self._entries.items())}
+                self._dirty = False
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self._dirty = True
+            logger.warning(f"⚠️ Не удалось сохранить индекс новостей: {e}")
@@ -1,8 +1,9 @@
-import aiohttp
 import logging
 import os
 from typing import Optional, Dict, Any
 
+from brains.clients import http_clients, CRYPTO_PAY
+
 # Рекомендуется добавить CRYPTO_PAY_TOKEN в .env
 CRYPTO_PAY_TOKEN = os.environ.get("CRYPTO_PAY_TOKEN", "YOUR_TOKEN_HERE")
 IS_TESTNET = True # Поменяйте на False для продакшна
@@ -33,13 +34,12 @@ class CryptoPayManager:
         }
         
         try:
-            async with aiohttp.ClientClientSession() as session:
-                async with session.post(url, headers=self.headers, json=payload) as resp:
-                    result = await resp.json()
-                    if result.get("ok"):
-                        return result["result"]
-                    else:
-                        logging.error(f"CryptoPay error: {result}")
+            resp = await http_clients.get(CRYPTO_PAY).post(url, headers=self.headers, json=payload)
+            result = resp.json()
+            if result.get("ok"):
+                return result["result"]
+            else:
+                logging.error(f"CryptoPay error: {result}")
         except Exception as e:
             logging.error(f"Failed to create invoice: {e}")
         return None
@@ -50,12 +50,11 @@ class CryptoPayManager:
         params = {"invoice_ids": str(invoice_id)}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers, params=params) as resp:
-                    result = await resp.json()
-                    if result.get("ok") and result["result"]["items"]:
-                        status = result["result"]["items"][0]["status"]
-                        return status == "paid"
+            resp = await http_clients.get(CRYPTO_PAY).get(url, headers=self.headers, params=params)
+            result = resp.json()
+            if result.get("ok") and result["result"]["items"]:
+                status = result["result"]["items"][0]["status"]
+                return status == "paid"
         except Exception as e:
             logging.error(f"Failed to check invoice: {e}")
         return False
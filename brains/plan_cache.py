@@ -0,0 +1,380 @@
+"""
+Кэш планов ReAct агента
+
+Повторяющиеся задачи ("проверь календарь на завтра и создай задачи",
+"подведи итоги недели") раньше каждый раз планировались через Mistral.
+
+- Задача разбирается на шаблон и слоты: даты (в том числе "сегодня",
+  "завтра"), URL, пути и файлы, строки в кавычках, числа
+- В сохранённом плане значения слотов заменяются на {{N}} и при
+  повторном использовании подставляются из новой задачи
+- Поиск: точное совпадение шаблона, иначе косинусная близость
+  эмбеддингов шаблонов (mistral-embed) с тем же набором слотов.
+  По близости переиспользуются только планы без побочных эффектов:
+  "удали файл" и "прочитай файл" близки, но план удаления нельзя
+  выполнять вместо чтения
+- Для каждого плана считается доля успешных запусков; план, который
+  провалился и опустился ниже порога, удаляется
+"""
+import os
+import re
+import json
+import math
+import time
+import logging
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from brains.config import (
+    PLAN_CACHE_PATH, PLAN_CACHE_SIZE, PLAN_CACHE_SIMILARITY, PLAN_CACHE_MIN_SUCCESS_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[Optional[List[float]]]]
+
+_RELATIVE_DAYS = {
+    "позавчера": -2, "вчера": -1, "сегодня": 0, "завтра": 1, "послезавтра": 2,
+    "yesterday": -1, "today": 0, "tomorrow": 1,
+}
+
+# Порядок важен: более специфичные шаблоны забирают текст первыми
+_SLOT_PATTERNS: List[Tuple[str, re.Pattern]] = [
+    ("url", re.compile(r"https?://[^\s\"'«»]+")),
+    ("str", re.compile(r'"([^"]+)"|«([^»]+)»|`([^`]+)`')),
+    ("date", re.compile(r"\b\d{4}-\d{2}-\d{2}\b")),
+    ("date", re.compile(r"\b\d{1,2}\.\d{1,2}(?:\.\d{4})?\b")),
+    ("date", re.compile(r"\b(?:" + "|".join(_RELATIVE_DAYS) + r")\b", re.IGNORECASE)),
+    ("path", re.compile(r"(?:~|\.{1,2})?/[\w.\-/]+|\b[\w\-]+\.[A-Za-z][A-Za-z0-9]{0,5}\b")),
+    ("num", re.compile(r"\b\d+\b")),
+]
+
+_PLACEHOLDER_RE = re.compile(r"\{\{(\d+)(:raw)?\}\}")
+
+# Инструменты без побочных эффектов (api_call — только GET/HEAD)
+READ_ONLY_TOOLS = {"read_file", "get_calendar"}
+READ_ONLY_METHODS = {"GET", "HEAD"}
+
+
+@dataclass
+class Slot:
+    """Изменяемая часть задачи"""
+    kind: str
+    value: str  # Нормализованное значение (дата — YYYY-MM-DD)
+    raw: str    # Как написано в задаче
+
+
+def _normalize_date(text: str, today: datetime) -> str:
+    lowered = text.lower()
+    if lowered in _RELATIVE_DAYS:
+        return (today + timedelta(days=_RELATIVE_DAYS[lowered])).strftime("%Y-%m-%d")
+    if "." in text:
+        parts = [int(p) for p in text.split(".")]
+        year = parts[2] if len(parts) == 3 else today.year
+        try:
+            return datetime(year, parts[1], parts[0]).strftime("%Y-%m-%d")
+        except ValueError:
+            return text
+    return text
+
+
+def extract_slots(task: str, now: Optional[datetime] = None) -> Tuple[str, List[Slot]]:
+    """
+    Разбирает задачу на шаблон и слоты
+
+    Returns:
+        ("проверь календарь на <date>", [Slot("date", "2026-10-20", "завтра")])
+    """
+    today = now or datetime.now()
+    taken: List[Tuple[int, int, str, Slot]] = []
+
+    def free(start: int, end: int) -> bool:
+        return all(end <= s or start >= e for s, e, _, _ in taken)
+
+    for kind, pattern in _SLOT_PATTERNS:
+        for match in pattern.finditer(task):
+            if not free(match.start(), match.end()):
+                continue
+            raw = next((g for g in match.groups() if g), None) if match.groups() else None
+            raw = raw or match.group()
+            value = _normalize_date(raw, today) if kind == "date" else raw
+            taken.append((match.start(), match.end(), kind, Slot(kind, value, raw)))
+
+    taken.sort(key=lambda item: item[0])
+    template, position = [], 0
+    for start, end, kind, _ in taken:
+        template.append(task[position:start])
+        template.append(f"<{kind}>")
+        position = end
+    template.append(task[position:])
+    text = re.sub(r"\s+", " ", "".join(template)).strip().lower()
+    return text, [slot for _, _, _, slot in taken]
+
+
+def _implicit_slots(now: datetime) -> List[Slot]:
+    # Планировщик подставляет текущую дату даже без неё в тексте задачи
+    today = now.strftime("%Y-%m-%d")
+    return [Slot("today", today, today)]
+
+
+def _value_pattern(value: str) -> str:
+    escaped = re.escape(value)
+    # Число "5" не должно совпадать внутри "2026" или "15"
+    return rf"(?<!\d){escaped}(?!\d)" if value[:1].isdigit() or value[-1:].isdigit() else escaped
+
+
+def templatize(steps: List[Dict], slots: List[Slot]) -> List[Dict]:
+    """Заменяет значения слотов в строках плана на {{N}} / {{N:raw}}"""
+    forms: Dict[str, str] = {}
+    for index, slot in enumerate(slots):
+        forms.setdefault(slot.value, f"{{{{{index}}}}}")
+        if slot.raw != slot.value:
+            forms.setdefault(slot.raw, f"{{{{{index}:raw}}}}")
+    forms = {value: marker for value, marker in forms.items() if value}
+    if not forms:
+        return json.loads(json.dumps(steps))
+
+    # Один проход: подставленные маркеры не матчатся повторно
+    ordered = sorted(forms, key=len, reverse=True)
+    pattern = re.compile("|".join(_value_pattern(value) for value in ordered))
+    return _map_strings(steps, lambda text: pattern.sub(lambda m: forms[m.group()], text))
+
+
+def bind(steps: List[Dict], slots: List[Slot]) -> List[Dict]:
+    """Подставляет значения новых слотов вместо {{N}}"""
+    def substitute(match: re.Match) -> str:
+        slot = slots[int(match.group(1))]
+        return slot.raw if match.group(2) else slot.value
+    return _map_strings(steps, lambda text: _PLACEHOLDER_RE.sub(substitute, text))
+
+
+def _map_strings(value: Any, func: Callable[[str], str]) -> Any:
+    if isinstance(value, str):
+        return func(value)
+    if isinstance(value, list):
+        return [_map_strings(item, func) for item in value]
+    if isinstance(value, dict):
+        return {key: _map_strings(item, func) for key, item in value.items()}
+    return value
+
+
+def is_read_only(steps: List[Dict]) -> bool:
+    """План только читает: его можно переиспользовать по похожести задачи"""
+    for step in steps:
+        tool = step.get("tool")
+        if tool == "api_call":
+            method = str((step.get("parameters") or {}).get("method", "GET")).upper()
+            if method not in READ_ONLY_METHODS:
+                return False
+        elif tool not in READ_ONLY_TOOLS:
+            return False
+    return True
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class CachedPlan:
+    """Сохранённый план с маркерами слотов"""
+    template: str
+    signature: List[str]  # Виды слотов задачи по порядку
+    steps: List[Dict]
+    embedding: Optional[List[float]] = None
+    uses: int = 0
+    successes: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.uses if self.uses else 0.0
+
+
+@dataclass
+class PlanLookup:
+    """Результат поиска: план (если найден) и всё, что нужно для сохранения"""
+    task: str
+    template: str
+    slots: List[Slot]
+    embedding: Optional[List[float]] = None
+    entry: Optional[CachedPlan] = None
+    steps: Optional[List[Dict]] = None
+    similarity: float = 0.0
+
+    @property
+    def hit(self) -> bool:
+        return self.steps is not None
+
+
+class PlanCache:
+    """
+    Кэш планов по шаблону и эмбеддингу задачи
+
+    Использование:
+        lookup = await plan_cache.lookup(task)
+        steps = lookup.steps or await planner.create_plan(task)
+        ...
+        plan_cache.record(lookup, executed_steps, success)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = PLAN_CACHE_PATH,
+        max_entries: int = PLAN_CACHE_SIZE,
+        similarity: float = PLAN_CACHE_SIMILARITY,
+        min_success_rate: float = PLAN_CACHE_MIN_SUCCESS_RATE,
+        embed: Optional[Embedder] = None,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.min_success_rate = min_success_rate
+        self._embed = embed
+        self.entries: Dict[str, CachedPlan] = {}
+        self.stats = {"hits": 0, "exact_hits": 0, "misses": 0, "stored": 0, "evicted_failed": 0, "evicted_lru": 0}
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        if self._embed is None:
+            from brains.memory import get_embedding
+            self._embed = get_embedding
+        try:
+            return await self._embed(text)
+        except Exception as e:
+            logger.warning(f"⚠️ Plan cache: эмбеддинг не получен: {e}")
+            return None
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self.load()
+
+    async def lookup(self, task: str, now: Optional[datetime] = None) -> PlanLookup:
+        """Ищет план для задачи и подставляет в него её слоты"""
+        self._ensure_loaded()
+        now = now or datetime.now()
+        template, slots = extract_slots(task, now)
+        slots = slots + _implicit_slots(now)
+        signature = [slot.kind for slot in slots]
+        lookup = PlanLookup(task=task, template=template, slots=slots)
+
+        entry = self.entries.get(template)
+        if entry is not None and entry.signature == signature:
+            lookup.similarity = 1.0
+            self.stats["exact_hits"] += 1
+        else:
+            entry = None
+            lookup.embedding = await self.embed(template)
+            if lookup.embedding:
+                for candidate in self.entries.values():
+                    if candidate.signature != signature or not candidate.embedding:
+                        continue
+                    if not is_read_only(candidate.steps):
+                        continue
+                    score = cosine(lookup.embedding, candidate.embedding)
+                    if score >= self.similarity and score > lookup.similarity:
+                        entry, lookup.similarity = candidate, score
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return lookup
+
+        self.stats["hits"] += 1
+        entry.last_used = time.time()
+        lookup.entry = entry
+        lookup.steps = bind(entry.steps, slots)
+        logger.info(
+            f"♻️ План из кэша ({lookup.similarity:.2f}): «{entry.template}», "
+            f"успешно {entry.successes}/{entry.uses}"
+        )
+        return lookup
+
+    def record(self, lookup: PlanLookup, steps: List[Dict], success: bool):
+        """
+        Учитывает результат выполнения плана
+
+        Новый план сохраняется только после успешного выполнения.
+        Кэшированный план удаляется, если провалился и доля успехов ниже порога.
+        """
+        entry = lookup.entry
+        if entry is not None:
+            entry.uses += 1
+            entry.successes += int(success)
+            if not success and entry.success_rate < self.min_success_rate:
+                self.entries.pop(entry.template, None)
+                self.stats["evicted_failed"] += 1
+                logger.info(f"🗑 План удалён из кэша: «{entry.template}» ({entry.successes}/{entry.uses})")
+            self.save()
+            return
+
+        if not success or not steps:
+            return
+
+        self.entries[lookup.template] = CachedPlan(
+            template=lookup.template,
+            signature=[slot.kind for slot in lookup.slots],
+            steps=templatize(steps, lookup.slots),
+            embedding=lookup.embedding,
+            uses=1,
+            successes=1,
+        )
+        self.stats["stored"] += 1
+        while len(self.entries) > self.max_entries:
+            oldest = min(self.entries.values(), key=lambda e: e.last_used)
+            del self.entries[oldest.template]
+            self.stats["evicted_lru"] += 1
+        self.save()
+
+    def load(self) -> bool:
+        """Загружает кэш из файла. False если файла нет или он битый"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.entries = {item["template"]: CachedPlan(**item) for item in data.get("plans", [])}
+            logger.info(f"♻️ Кэш планов загружен: {len(self.entries)} планов")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить кэш планов: {e}")
+            self.entries = {}
+            return False
+
+    def save(self):
+        """Сохраняет кэш в файл (атомарно через временный файл)"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"plans": [asdict(entry) for entry in self.entries.values()]}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить кэш планов: {e}")
+
+    def clear(self):
+        self.entries.clear()
+        self.save()
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "plans": len(self.entries),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+# Глобальный кэш планов
+plan_cache = PlanCache()
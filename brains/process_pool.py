@@ -0,0 +1,64 @@
+"""
+Пулы процессов-воркеров для тяжёлых моделей (TTS, локальный STT)
+
+spawn-процесс по умолчанию заново исполняет главный модуль родителя:
+main.py импортируется как __mp_main__ — load_dotenv, проверка .env,
+Telethon и все brains в каждом воркере, а без .env воркер сразу
+завершается. Здесь каждый процесс пула запускается со скрытым __main__:
+дочерний процесс стартует с точки входа multiprocessing и импортирует
+только модуль с функциями воркера.
+"""
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.context import SpawnContext, SpawnProcess
+from typing import Callable, Optional, Tuple
+
+# Подмена __main__ глобальна для процесса — запуски воркеров по очереди
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def _main_hidden():
+    """Подменяет __main__ пустым модулем на время запуска процесса"""
+    with _main_lock:
+        main_module = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main_module
+
+
+class _WorkerProcess(SpawnProcess):
+    """spawn-процесс, не импортирующий главный модуль родителя"""
+
+    def start(self):
+        with _main_hidden():
+            super().start()
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+def spawn_pool(
+    max_workers: int,
+    initializer: Optional[Callable] = None,
+    initargs: Tuple = ()
+) -> ProcessPoolExecutor:
+    """
+    Создаёт spawn-пул, воркеры которого не импортируют main.py
+
+    fork процесса с потоками event loop и torch небезопасен, поэтому spawn.
+    Пул поднимает процессы по мере поступления задач (и заменяет упавшие) —
+    __main__ скрывается при запуске каждого из них.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=_WorkerContext(),
+        initializer=initializer,
+        initargs=initargs
+    )
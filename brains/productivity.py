@@ -11,6 +11,8 @@ from typing import Dict, List, Optional
 from brains.clients import supabase_client
 from brains.ai import ask_karina
 from brains.calendar import get_today_calendar_events
+from brains.productivity_analytics import ProductivityAnalytics
+from brains.rollups import rollups
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,9 @@ DEFAULT_HABITS = [
     {"name": "Планирование", "target": "С вечера на завтра", "category": "work"},
 ]
 
+# Колоночные агрегаты с кэшем по (пользователь, окно) поверх daily_rollups
+analytics = ProductivityAnalytics()
+
 # ============================================================================
 # РАБОТА С БД
 # ============================================================================
@@ -66,6 +71,12 @@ async def save_work_session(user_id: int, start_time: datetime, end_time: dateti
         }
         
         response = supabase_client.table("work_sessions").insert(data).execute()
+        if response.data:
+            await rollups.record_work_session(
+                user_id, start_time, end_time, data["duration_hours"], meetings,
+                max_work_hours=MAX_WORK_HOURS, night_start=OVERWORK_NIGHT_START
+            )
+        analytics.invalidate(user_id)
         logger.info(f"💾 Рабочая сессия сохранена: {duration_hours}ч")
         return bool(response.data)
     except Exception as e:
@@ -114,6 +125,9 @@ async def save_habit_track(user_id: int, habit_name: str, completed: bool,
         }
         
         response = supabase_client.table("habits").insert(data).execute()
+        if response.data:
+            await rollups.record_habit(user_id, data["date"], habit_name, completed)
+        analytics.invalidate(user_id)
         logger.info(f"💾 Привычка '{habit_name}' отмечена: {'✅' if completed else '❌'}")
         return bool(response.data)
     except Exception as e:
@@ -129,37 +143,7 @@ async def get_habit_stats(user_id: int, days: int = 7) -> Dict[str, Dict]:
         Словарь: {habit_name: {"total": int, "completed": int, "rate": float}}
     """
     try:
-        from datetime import timedelta
-        cutoff = datetime.now() - timedelta(days=days)
-        
-        response = supabase_client.table("habits")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .gte("date", cutoff.strftime('%Y-%m-%d'))\
-            .execute()
-        
-        if not response.data:
-            return {}
-        
-        # Группируем по привычкам
-        stats = {}
-        for record in response.data:
-            habit = record["habit_name"]
-            if habit not in stats:
-                stats[habit] = {"total": 0, "completed": 0, "rate": 0}
-            
-            stats[habit]["total"] += 1
-            if record.get("completed", False):
-                stats[habit]["completed"] += 1
-        
-        # Считаем процент
-        for habit in stats:
-            if stats[habit]["total"] > 0:
-                stats[habit]["rate"] = round(
-                    (stats[habit]["completed"] / stats[habit]["total"]) * 100, 1
-                )
-        
-        return stats
+        return (await analytics.get(user_id, days)).habits
     except Exception as e:
         logger.error(f"Error getting habit stats: {e}")
         return {}
@@ -173,28 +157,7 @@ async def get_overwork_days(user_id: int, days: int = 30) -> List[Dict]:
         Список дней где длительность > MAX_WORK_HOURS
     """
     try:
-        from datetime import timedelta
-        cutoff = datetime.now() - timedelta(days=days)
-        
-        response = supabase_client.table("work_sessions")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .gte("date", cutoff.strftime('%Y-%m-%d'))\
-            .execute()
-        
-        if not response.data:
-            return []
-        
-        overwork_days = []
-        for session in response.data:
-            if session.get("duration_hours", 0) > MAX_WORK_HOURS:
-                overwork_days.append({
-                    "date": session["date"],
-                    "duration": session["duration_hours"],
-                    "end_time": session["end_time"]
-                })
-        
-        return overwork_days
+        return (await analytics.get(user_id, days)).overwork
     except Exception as e:
         logger.error(f"Error getting overwork days: {e}")
         return []
@@ -219,65 +182,11 @@ async def analyze_work_patterns(user_id: int, days: int = 14) -> Dict:
             "total_meetings": 15
         }
     """
-    sessions = await get_work_sessions(user_id, days)
-    
-    if not sessions:
+    try:
+        return (await analytics.get(user_id, days)).patterns
+    except Exception as e:
+        logger.error(f"Error analyzing work patterns: {e}")
         return {"error": "Недостаточно данных"}
-    
-    total_duration = 0
-    start_times = []
-    end_times = []
-    overwork_count = 0
-    weekend_count = 0
-    late_night_count = 0
-    total_meetings = 0
-    
-    for session in sessions:
-        duration = session.get("duration_hours", 0)
-        total_duration += duration
-        
-        if duration > MAX_WORK_HOURS:
-            overwork_count += 1
-        
-        # Извлекаем время
-        start = datetime.fromisoformat(session["start_time"])
-        end = datetime.fromisoformat(session["end_time"])
-        
-        start_times.append(start)
-        end_times.append(end)
-        
-        # Выходные (5=Сб, 6=Вс)
-        if start.weekday() >= 5:
-            weekend_count += 1
-        
-        # Поздняя ночь
-        if end.hour >= OVERWORK_NIGHT_START:
-            late_night_count += 1
-        
-        total_meetings += session.get("meetings_count", 0)
-    
-    # Средние значения
-    avg_start = None
-    avg_end = None
-    
-    if start_times:
-        avg_start_minutes = sum(t.hour * 60 + t.minute for t in start_times) / len(start_times)
-        avg_start = f"{int(avg_start_minutes // 60):02d}:{int(avg_start_minutes % 60):02d}"
-    
-    if end_times:
-        avg_end_minutes = sum(t.hour * 60 + t.minute for t in end_times) / len(end_times)
-        avg_end = f"{int(avg_end_minutes // 60):02d}:{int(avg_end_minutes % 60):02d}"
-    
-    return {
-        "avg_start_time": avg_start or "Н/Д",
-        "avg_end_time": avg_end or "Н/Д",
-        "avg_duration": round(total_duration / len(sessions), 1) if sessions else 0,
-        "overwork_days": overwork_count,
-        "weekend_work_days": weekend_count,
-        "late_night_days": late_night_count,
-        "total_meetings": total_meetings,
-        "total_days": len(sessions)
-    }
 
 
 async def analyze_habits_with_ai(user_id: int, days: int = 7) -> str:
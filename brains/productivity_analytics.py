@@ -0,0 +1,262 @@
+"""
+Колоночная аналитика продуктивности
+
+analyze_work_patterns, get_habit_stats, get_overwork_days и отчёт
+раньше каждый раз тянули строки из Supabase и считали их в цикле
+с datetime.fromisoformat на каждую строку, причём отчёт делал это трижды.
+
+- дневные агрегаты (brains/rollups.py) раскладываются в массивы NumPy:
+  окно в N дней — не больше N строк при любой длине истории
+- все метрики окна считаются векторно за один проход
+- результат кэшируется по (user_id, days); колонки — по пользователю
+  на самое широкое загруженное окно, узкие окна берутся маской
+- save_work_session / save_habit_track сбрасывают кэш пользователя
+
+Бенчмарк: python scripts/bench_productivity_analytics.py
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from brains.config import PRODUCTIVITY_CACHE_TTL
+from brains.rollups import DailyRollup, RollupStore, rollups
+
+logger = logging.getLogger(__name__)
+
+# Дней на запрос колонок минимум: /productivity 7, затем /overwork 30 — один запрос
+MIN_LOAD_DAYS = 30
+MAX_CACHED_USERS = 64
+
+
+def _format_minutes(minutes: float) -> str:
+    return f"{int(minutes // 60):02d}:{int(minutes % 60):02d}"
+
+
+@dataclass
+class WorkColumns:
+    """Рабочие дни по колонкам (одна строка — один день с сессиями)"""
+    day: np.ndarray        # datetime64[D]
+    sessions: np.ndarray
+    hours: np.ndarray
+    meetings: np.ndarray
+    start_min: np.ndarray  # Суммы минут от полуночи по сессиям дня
+    end_min: np.ndarray
+    weekend: np.ndarray    # Сессий, начатых в выходной
+    late: np.ndarray       # Сессий, закончившихся ночью
+    overwork: np.ndarray   # Сессий длиннее MAX_WORK_HOURS
+    max_hours: np.ndarray
+    dates: np.ndarray      # Исходные строки для вывода
+    max_end: np.ndarray
+
+    @classmethod
+    def from_rollups(cls, rollups: List[DailyRollup]) -> "WorkColumns":
+        days = [r for r in rollups if r.work_sessions]
+        return cls(
+            day=np.array([r.date for r in days], dtype="datetime64[D]"),
+            sessions=np.array([r.work_sessions for r in days], dtype=np.int64),
+            hours=np.array([r.work_hours for r in days], dtype=np.float64),
+            meetings=np.array([r.work_meetings for r in days], dtype=np.int64),
+            start_min=np.array([r.work_start_min for r in days], dtype=np.int64),
+            end_min=np.array([r.work_end_min for r in days], dtype=np.int64),
+            weekend=np.array([r.work_weekend for r in days], dtype=np.int64),
+            late=np.array([r.work_late for r in days], dtype=np.int64),
+            overwork=np.array([r.work_overwork for r in days], dtype=np.int64),
+            max_hours=np.array([r.work_max_hours for r in days], dtype=np.float64),
+            dates=np.array([r.date for r in days], dtype=object),
+            max_end=np.array([r.work_max_end for r in days], dtype=object),
+        )
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+
+@dataclass
+class HabitColumns:
+    """Привычки по (день, привычка): имя — код в names"""
+    day: np.ndarray
+    code: np.ndarray
+    total: np.ndarray
+    completed: np.ndarray
+    names: np.ndarray
+
+    @classmethod
+    def from_rollups(cls, rollups: List[DailyRollup]) -> "HabitColumns":
+        index: Dict[str, int] = {}
+        day, code, total, completed = [], [], [], []
+        for rollup in rollups:
+            for name, (habit_total, habit_completed) in rollup.habits.items():
+                day.append(rollup.date)
+                code.append(index.setdefault(name, len(index)))
+                total.append(habit_total)
+                completed.append(habit_completed)
+        return cls(
+            day=np.array(day, dtype="datetime64[D]"),
+            code=np.array(code, dtype=np.int64),
+            total=np.array(total, dtype=np.int64),
+            completed=np.array(completed, dtype=np.int64),
+            names=np.array(list(index), dtype=object),
+        )
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+
+def work_patterns(work: WorkColumns, mask: np.ndarray) -> Dict:
+    """Метрики в формате analyze_work_patterns"""
+    count = int(work.sessions[mask].sum())
+    if not count:
+        return {"error": "Недостаточно данных"}
+
+    return {
+        "avg_start_time": _format_minutes(work.start_min[mask].sum() / count),
+        "avg_end_time": _format_minutes(work.end_min[mask].sum() / count),
+        "avg_duration": round(float(work.hours[mask].sum()) / count, 1),
+        "overwork_days": int(work.overwork[mask].sum()),
+        "weekend_work_days": int(work.weekend[mask].sum()),
+        "late_night_days": int(work.late[mask].sum()),
+        "total_meetings": int(work.meetings[mask].sum()),
+        "total_days": count,
+    }
+
+
+def overwork_days(work: WorkColumns, mask: np.ndarray) -> List[Dict]:
+    """Дни с сессией длиннее MAX_WORK_HOURS (самая длинная за день), новые первыми"""
+    selected = np.flatnonzero(mask & (work.overwork > 0))
+    selected = selected[np.argsort(work.day[selected], kind="stable")[::-1]]
+    return [
+        {"date": work.dates[i], "duration": float(work.max_hours[i]), "end_time": work.max_end[i]}
+        for i in selected
+    ]
+
+
+def habit_stats(habits: HabitColumns, mask: np.ndarray) -> Dict[str, Dict]:
+    """{habit_name: {"total", "completed", "rate"}} одним bincount"""
+    if not mask.any():
+        return {}
+    size = len(habits.names)
+    codes = habits.code[mask]
+    total = np.bincount(codes, weights=habits.total[mask], minlength=size).astype(np.int64)
+    completed = np.bincount(codes, weights=habits.completed[mask], minlength=size).astype(np.int64)
+    return {
+        str(habits.names[i]): {
+            "total": int(total[i]),
+            "completed": int(completed[i]),
+            "rate": round(float(completed[i]) / int(total[i]) * 100, 1),
+        }
+        for i in np.flatnonzero(total)
+    }
+
+
+@dataclass
+class ProductivityAggregates:
+    """Все метрики окна"""
+    patterns: Dict
+    habits: Dict[str, Dict]
+    overwork: List[Dict]
+    computed_at: float
+
+
+def compute_aggregates(work: WorkColumns, habits: HabitColumns, since: np.datetime64) -> ProductivityAggregates:
+    work_mask = work.day >= since
+    return ProductivityAggregates(
+        patterns=work_patterns(work, work_mask),
+        habits=habit_stats(habits, habits.day >= since),
+        overwork=overwork_days(work, work_mask),
+        computed_at=time.time(),
+    )
+
+
+@dataclass
+class _UserColumns:
+    days: int
+    loaded_at: float
+    work: WorkColumns
+    habits: HabitColumns
+
+
+class ProductivityAnalytics:
+    """
+    Кэш колонок и агрегатов продуктивности по пользователям
+
+    Использование:
+        aggregates = await analytics.get(user_id, days=7)
+        aggregates.patterns, aggregates.habits, aggregates.overwork
+        analytics.invalidate(user_id)  # после новой сессии/привычки
+    """
+
+    def __init__(self, ttl: float = PRODUCTIVITY_CACHE_TTL, store: Optional[RollupStore] = None):
+        self.store = store if store is not None else rollups
+        self.ttl = ttl
+        self._columns: Dict[int, _UserColumns] = {}
+        self._aggregates: Dict[Tuple[int, int], ProductivityAggregates] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # Счётчик сбросов: загрузка, начатая до записи, не попадает в кэш
+        self._generation: Dict[int, int] = {}
+        self.stats = {"hits": 0, "computed": 0, "loads": 0}
+
+    async def _fetch(self, user_id: int, since: str) -> List[DailyRollup]:
+        """Дневные агрегаты за окно (по строке на день)"""
+        return await self.store.get_range(user_id, since)
+
+    async def _load(self, user_id: int, days: int) -> _UserColumns:
+        cached = self._columns.get(user_id)
+        if cached and cached.days >= days and time.time() - cached.loaded_at < self.ttl:
+            return cached
+
+        load_days = max(days, MIN_LOAD_DAYS)
+        since = (datetime.now() - timedelta(days=load_days)).strftime('%Y-%m-%d')
+        days_rollups = await self._fetch(user_id, since)
+        self.stats["loads"] += 1
+
+        columns = _UserColumns(
+            days=load_days,
+            loaded_at=time.time(),
+            work=WorkColumns.from_rollups(days_rollups),
+            habits=HabitColumns.from_rollups(days_rollups),
+        )
+        if len(self._columns) >= MAX_CACHED_USERS and user_id not in self._columns:
+            oldest = min(self._columns, key=lambda uid: self._columns[uid].loaded_at)
+            self.invalidate(oldest)
+        self._columns[user_id] = columns
+        return columns
+
+    async def get(self, user_id: int, days: int) -> ProductivityAggregates:
+        """Метрики за последние days дней (из кэша, если он свежий)"""
+        key = (user_id, days)
+        cached = self._aggregates.get(key)
+        if cached and time.time() - cached.computed_at < self.ttl:
+            self.stats["hits"] += 1
+            return cached
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            cached = self._aggregates.get(key)
+            if cached and time.time() - cached.computed_at < self.ttl:
+                self.stats["hits"] += 1
+                return cached
+
+            generation = self._generation.get(user_id, 0)
+            columns = await self._load(user_id, days)
+            since = np.datetime64((datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d'), "D")
+            aggregates = compute_aggregates(columns.work, columns.habits, since)
+            self.stats["computed"] += 1
+            if self._generation.get(user_id, 0) == generation:
+                self._aggregates[key] = aggregates
+            else:
+                self._columns.pop(user_id, None)
+            return aggregates
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает колонки и агрегаты пользователя"""
+        self._generation[user_id] = self._generation.get(user_id, 0) + 1
+        self._columns.pop(user_id, None)
+        for key in [k for k in self._aggregates if k[0] == user_id]:
+            del self._aggregates[key]
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "users": len(self._columns), "windows": len(self._aggregates)}
@@ -8,11 +8,11 @@ Rate Limiter Utility
         ...
 """
 import asyncio
-import time
 import logging
 from functools import wraps
-from typing import Dict, Optional
-from collections import defaultdict
+from typing import Optional
+
+from brains.shared_state import StateBackend, MemoryStateBackend, get_state_backend
 
 logger = logging.getLogger(__name__)
 
@@ -25,21 +25,33 @@ class RateLimiter:
         calls: Максимальное количество вызовов
         period: Период времени в секундах
         key_func: Функция для получения ключа (по умолчанию None — глобальный лимит)
+        name: Пространство имён ключей в общем хранилище
+        backend: Хранилище окон (по умолчанию — память процесса)
     """
     
-    def __init__(self, calls: int, period: float, key_func: Optional[callable] = None):
+    def __init__(self, calls: int, period: float, key_func: Optional[callable] = None,
+                 name: str = "default", backend: Optional[StateBackend] = None):
         self.calls = calls
         self.period = period
         self.key_func = key_func or (lambda *args, **kwargs: "global")
-        
-        # Хранилище timestamps вызовов: {key: [timestamp1, timestamp2, ...]}
-        self._timestamps: Dict[str, list] = defaultdict(list)
-        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.name = name
+        self._backend = backend
+    
+    @property
+    def backend(self) -> StateBackend:
+        """Хранилище окон (создаётся лениво, чтобы не открывать БД при импорте)"""
+        if self._backend is None:
+            self._backend = MemoryStateBackend()
+        return self._backend
     
-    def _clean_old_timestamps(self, key: str, now: float):
-        """Удаляет устаревшие timestamps"""
-        cutoff = now - self.period
-        self._timestamps[key] = [ts for ts in self._timestamps[key] if ts > cutoff]
+    def _storage_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+    
+    async def _try_acquire(self, key: str):
+        """try_acquire вне event loop, если хранилище блокирующее (SQLite)"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.try_acquire, key, self.calls, self.period)
+        return self.backend.try_acquire(key, self.calls, self.period)
     
     async def acquire(self, *args, **kwargs) -> bool:
         """
@@ -48,17 +60,9 @@ class RateLimiter:
         Returns:
             True если вызов разрешён, False если лимит превышен
         """
-        key = self.key_func(*args, **kwargs)
-        now = time.time()
-        
-        async with self._locks[key]:
-            self._clean_old_timestamps(key, now)
-            
-            if len(self._timestamps[key]) < self.calls:
-                self._timestamps[key].append(now)
-                return True
-            
-            return False
+        key = self._storage_key(self.key_func(*args, **kwargs))
+        allowed, _ = await self._try_acquire(key)
+        return allowed
     
     async def wait_if_needed(self, *args, **kwargs) -> float:
         """
@@ -67,29 +71,18 @@ class RateLimiter:
         Returns:
             Время ожидания в секундах (0 если не нужно ждать)
         """
-        key = self.key_func(*args, **kwargs)
-        now = time.time()
+        key = self._storage_key(self.key_func(*args, **kwargs))
+        waited = 0.0
         
-        async with self._locks[key]:
-            self._clean_old_timestamps(key, now)
-            
-            if len(self._timestamps[key]) < self.calls:
-                self._timestamps[key].append(now)
-                return 0.0
-            
-            # Ждём пока освободится слот
-            oldest = min(self._timestamps[key])
-            wait_time = oldest + self.period - now
+        while True:
+            allowed, retry_after = await self._try_acquire(key)
+            if allowed:
+                return waited
             
-            if wait_time > 0:
-                logger.debug(f"⏳ Rate limit: ждём {wait_time:.2f}s")
-                await asyncio.sleep(wait_time)
-                
-                # Очищаем и добавляем новый timestamp
-                self._clean_old_timestamps(key, time.time())
-                self._timestamps[key].append(time.time())
-            
-            return max(0, wait_time)
+            # Слот могут занять другие воркеры, поэтому после сна проверяем заново
+            logger.debug(f"⏳ Rate limit: ждём {retry_after:.2f}s")
+            await asyncio.sleep(retry_after)
+            waited += retry_after
     
     def get_remaining(self, *args, **kwargs) -> int:
         """
@@ -98,18 +91,27 @@ class RateLimiter:
         Returns:
             Количество оставшихся вызовов в текущем окне
         """
-        key = self.key_func(*args, **kwargs)
-        now = time.time()
-        
-        # Не блокируем, просто считаем
-        self._clean_old_timestamps(key, now)
-        return max(0, self.calls - len(self._timestamps[key]))
+        key = self._storage_key(self.key_func(*args, **kwargs))
+        return max(0, self.calls - self.backend.count(key, self.period))
     
     def reset(self, key: str = "global"):
         """Сбрасывает лимит для ключа"""
-        if key in self._timestamps:
-            del self._timestamps[key]
-            logger.info(f"🔄 Rate limit сброшен для: {key}")
+        self.backend.reset(self._storage_key(key))
+        logger.info(f"🔄 Rate limit сброшен для: {key}")
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Rate limiter с окнами в общем хранилище (STATE_BACKEND).
+    
+    Бюджет делится между всеми воркерами и сохраняется после рестарта.
+    """
+    
+    @property
+    def backend(self) -> StateBackend:
+        if self._backend is None:
+            self._backend = get_state_backend()
+        return self._backend
 
 
 def rate_limit(calls: int, period: float, key_func: Optional[callable] = None, 
@@ -177,15 +179,15 @@ def rate_limit(calls: int, period: float, key_func: Optional[callable] = None,
 # ============================================================================
 
 # API лимиты (для внешних API)
-mistral_limiter = RateLimiter(calls=30, period=60)  # 30 запросов в минуту
+mistral_limiter = SharedRateLimiter(calls=30, period=60, name="mistral")  # 30 запросов в минуту
 supabase_limiter = RateLimiter(calls=100, period=60)  # 100 запросов в минуту
 telegram_limiter = RateLimiter(calls=30, period=1)  # 30 сообщений в секунду
 
 # Пользовательские лимиты (для защиты от злоупотреблений)
-user_command_limiter = RateLimiter(calls=10, period=60, 
-                                    key_func=lambda user_id, **kwargs: str(user_id))  # 10 команд в минуту на пользователя
-vpn_key_limiter = RateLimiter(calls=5, period=3600,
-                               key_func=lambda user_id, **kwargs: str(user_id))  # 5 ключей в час на пользователя
+user_command_limiter = SharedRateLimiter(calls=10, period=60, name="user_command",
+                                          key_func=lambda user_id, **kwargs: str(user_id))  # 10 команд в минуту на пользователя
+vpn_key_limiter = SharedRateLimiter(calls=5, period=3600, name="vpn_key",
+                                     key_func=lambda user_id, **kwargs: str(user_id))  # 5 ключей в час на пользователя
 
 
 # ============================================================================
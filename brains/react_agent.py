@@ -2,21 +2,22 @@
 ReAct Agent — Karina AI v5.0
 Автономный агент с архитектурой Reason + Act
 """
+import re
 import json
+import time
 import asyncio
 import logging
-import httpx
 from datetime import datetime
-from typing import Dict, Any, List
-from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+from dataclasses import dataclass, asdict, field
 
-from brains.config import MISTRAL_API_KEY
+from brains.config import MISTRAL_API_KEY, REACT_MAX_PARALLEL_STEPS
+from brains.clients import http_clients, MISTRAL, DEFAULT
+from brains.command_runner import command_runner
+from brains.plan_cache import PlanCache, plan_cache as default_plan_cache
 
 logger = logging.getLogger(__name__)
 
-# Глобальный HTTP клиент
-http_client = httpx.AsyncClient(timeout=60.0)
-
 MISTRAL_URL = "https://api.mistral.ai/v1/chat/completions"
 MISTRAL_EMBED_URL = "https://api.mistral.ai/v1/embeddings"
 MODEL_NAME = "mistral-small-latest"
@@ -36,7 +37,7 @@ async def mistral_chat(prompt: str) -> str:
     }
     
     try:
-        result = await http_client.post(MISTRAL_URL, headers=headers, json=payload)
+        result = await http_clients.get(MISTRAL).post(MISTRAL_URL, headers=headers, json=payload)
         result.raise_for_status()
         data = result.json()
         return data['choices'][0]['message']['content']
@@ -53,6 +54,7 @@ class Step:
     tool: str
     parameters: Dict[str, Any]
     expected_result: str
+    depends_on: List[int] = field(default_factory=list)  # id шагов, которые должны завершиться раньше
 
 
 @dataclass
@@ -63,6 +65,40 @@ class TaskResult:
     steps: List[Dict]
     errors: List[str]
     lessons_learned: List[str]
+    elapsed: float = 0.0  # Общее время выполнения плана, сек
+    plan_cached: bool = False  # План взят из кэша, без запроса к планировщику
+
+
+VALID_TOOLS = {"write_file", "read_file", "run_command", "api_call", "database_query", "get_calendar"}
+
+
+def steps_from_data(steps_data: List[Dict], valid_tools: Optional[set] = None) -> List[Step]:
+    """
+    Шаги плана из JSON ответа LLM
+
+    Если depends_on не указан, шаг зависит от предыдущего (последовательное
+    выполнение, как раньше). Ссылки на несуществующие шаги отбрасываются.
+    """
+    raw = [step for step in steps_data if valid_tools is None or step.get("tool") in valid_tools]
+    known_ids = {step["id"] for step in raw}
+
+    steps = []
+    previous_id = None
+    for step in raw:
+        if "depends_on" in step and isinstance(step["depends_on"], list):
+            depends_on = [d for d in step["depends_on"] if d in known_ids and d != step["id"]]
+        else:
+            depends_on = [previous_id] if previous_id is not None else []
+        steps.append(Step(
+            id=step["id"],
+            description=step["description"],
+            tool=step["tool"],
+            parameters=step["parameters"],
+            expected_result=step["expected_result"],
+            depends_on=list(dict.fromkeys(depends_on))
+        ))
+        previous_id = step["id"]
+    return steps
 
 
 class LLMEngine:
@@ -124,7 +160,7 @@ class TaskPlanner:
 
 Контекст: {context or 'Нет дополнительного контекста'}
 
-Разбей задачу на последовательные выполнимые шаги.
+Разбей задачу на выполнимые шаги.
 
 ДОСТУПНЫЕ ИНСТРУМЕНТЫ (использовать ТОЛЬКО эти названия):
 - write_file (параметры: path, content) — Создать/записать файл
@@ -138,6 +174,8 @@ class TaskPlanner:
 - Для get_calendar используй ТОЛЬКО реальные даты
 - Для api_call используй ТОЛЬКО существующие URL
 - Не выдумывай несуществующие API
+- depends_on — id шагов, которые должны завершиться до этого шага
+  (например, файл читается после записи). Независимые шаги ([]) выполняются параллельно
 
 Ответь ТОЛЬКО JSON массивом шагов в формате:
 [
@@ -146,7 +184,8 @@ class TaskPlanner:
     "description": "Описание шага",
     "tool": "get_calendar",
     "parameters": {{"date": "2026-02-28"}},
-    "expected_result": "События календаря"
+    "expected_result": "События календаря",
+    "depends_on": []
   }}
 ]
 
@@ -180,19 +219,7 @@ class TaskPlanner:
                     return []
             
             # Фильтруем только допустимые инструменты
-            valid_tools = {"write_file", "read_file", "run_command", "api_call", "database_query", "get_calendar"}
-            
-            return [
-                Step(
-                    id=step["id"],
-                    description=step["description"],
-                    tool=step["tool"],
-                    parameters=step["parameters"],
-                    expected_result=step["expected_result"]
-                )
-                for step in steps_data
-                if step.get("tool") in valid_tools
-            ]
+            return steps_from_data(steps_data, VALID_TOOLS)
         except Exception as e:
             logger.error(f"Planner error: {e}")
             return []
@@ -214,16 +241,7 @@ class TaskPlanner:
             response = await mistral_chat(prompt)
             plan_data = json.loads(response)
             
-            return [
-                Step(
-                    id=step["id"],
-                    description=step["description"],
-                    tool=step["tool"],
-                    parameters=step["parameters"],
-                    expected_result=step["expected_result"]
-                )
-                for step in plan_data.get("steps", [])
-            ]
+            return steps_from_data(plan_data.get("steps", []))
         except Exception as e:
             logger.error(f"Plan adjustment error: {e}")
             return plan
@@ -299,30 +317,9 @@ class ToolRegistry:
             }
     
     async def run_command(self, command: str, timeout: int = 60) -> dict:
-        """Выполняет команду в shell"""
+        """Выполняет команду в shell (песочница command_runner)"""
         try:
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=timeout
-            )
-            
-            return {
-                "success": process.returncode == 0,
-                "stdout": stdout.decode('utf-8'),
-                "stderr": stderr.decode('utf-8'),
-                "returncode": process.returncode
-            }
-        except asyncio.TimeoutError:
-            return {
-                "success": False,
-                "error": f"Timeout after {timeout}s"
-            }
+            return await command_runner.run(command, timeout=timeout)
         except Exception as e:
             logger.error(f"run_command error: {e}")
             return {
@@ -333,17 +330,14 @@ class ToolRegistry:
     async def api_call(self, url: str, method: str = "GET", **kwargs) -> dict:
         """Вызывает HTTP API"""
         try:
-            import aiohttp
+            response = await http_clients.get(DEFAULT).request(method, url, **kwargs)
+            data = response.json()
             
-            async with aiohttp.ClientSession() as session:
-                async with session.request(method, url, **kwargs) as response:
-                    data = await response.json()
-                    
-                    return {
-                        "success": response.status == 200,
-                        "data": data,
-                        "status_code": response.status
-                    }
+            return {
+                "success": response.status_code == 200,
+                "data": data,
+                "status_code": response.status_code
+            }
         except Exception as e:
             logger.error(f"api_call error: {e}")
             return {
@@ -398,47 +392,163 @@ class ToolRegistry:
             }
 
 
+# ========== ПРОВЕРКА РЕЗУЛЬТАТОВ БЕЗ LLM ==========
+
+# Ошибки, после которых имеет смысл повторить попытку
+RETRYABLE_ERRORS = ("timeout", "connection", "rate limit", "temporary", "locked")
+# Ошибки, которые повтор не исправит
+PERMANENT_ERRORS = (
+    "no such file", "not found", "permission denied", "is a directory",
+    "неизвестный инструмент", "unexpected keyword", "required positional",
+    "invalid", "401", "403", "404",
+)
+
+# Обязательные поля успешного ответа инструмента
+TOOL_SCHEMAS = {
+    "write_file": {"message": str},
+    "read_file": {"content": str},
+    "run_command": {"returncode": int, "stdout": str, "stderr": str},
+    "api_call": {"status_code": int, "data": object},
+    "database_query": {"data": object},
+    "get_calendar": {"data": object},
+}
+# Основной вывод инструмента: пустой отмечается в verified_by
+OUTPUT_FIELDS = {
+    "read_file": "content",
+    "run_command": "stdout",
+    "api_call": "data",
+    "database_query": "data",
+    "get_calendar": "data",
+}
+
+_QUOTED_RE = re.compile(r'"([^"]{2,})"|«([^»]{2,})»|`([^`]{2,})`')
+
+# Сколько результатов оценено правилами и сколько ушло в LLM
+VERIFIER_STATS = {
+    "rules": 0,
+    "llm": 0
+}
+
+
+def get_verifier_stats() -> Dict:
+    """Доля проверок результатов, обошедшихся без LLM"""
+    stats = dict(VERIFIER_STATS)
+    total = stats["rules"] + stats["llm"]
+    stats["skipped_share"] = stats["rules"] / total if total else 0.0
+    return stats
+
+
+def _verdict(success: bool, issues: List[str] = None, needs_retry: bool = False, rule: str = "") -> dict:
+    return {
+        "success": success,
+        "issues": issues or [],
+        "recommendations": ["Повторить попытку"] if needs_retry else [],
+        "needs_retry": needs_retry,
+        "alternative_approach": "",
+        "verified_by": f"rules:{rule}" if rule else "rules"
+    }
+
+
+class ResultVerifier:
+    """
+    Детерминированная проверка результата инструмента
+
+    Успех инструмента с чистым кодом возврата засчитывается на месте
+    (пустой вывод, ответ не по схеме, не найденная подстрока — только
+    пометка в verified_by). Известные ошибки тоже решаются правилами.
+    None — неклассифицированная ошибка, решает LLM.
+    """
+
+    def verify(self, tool: Optional[str], expected: str, actual: Any) -> Optional[dict]:
+        if not actual or not isinstance(actual, dict):
+            return _verdict(False, ["Нет результата"], needs_retry=True, rule="empty")
+
+        if not actual.get("success"):
+            return self._verify_failure(actual)
+        return self._verify_success(tool, expected or "", actual)
+
+    def _verify_failure(self, actual: dict) -> Optional[dict]:
+        returncode = actual.get("returncode")
+        if isinstance(returncode, int) and returncode != 0:
+            stderr = (actual.get("stderr") or "").strip()
+            issues = [f"Код возврата {returncode}"] + ([stderr[-300:]] if stderr else [])
+            return _verdict(False, issues, rule="returncode")
+
+        error = str(actual.get("error") or "")
+        error_lower = error.lower()
+        if any(marker in error_lower for marker in RETRYABLE_ERRORS):
+            return _verdict(False, [error], needs_retry=True, rule="retryable_error")
+        if any(marker in error_lower for marker in PERMANENT_ERRORS):
+            return _verdict(False, [error], rule="permanent_error")
+
+        status_code = actual.get("status_code")
+        if isinstance(status_code, int) and status_code >= 400:
+            return _verdict(False, [f"HTTP {status_code}"], needs_retry=status_code == 429 or status_code >= 500, rule="status_code")
+        return None
+
+    def _verify_success(self, tool: Optional[str], expected: str, actual: dict) -> dict:
+        returncode = actual.get("returncode")
+        if isinstance(returncode, int) and returncode != 0:
+            return _verdict(False, [f"Код возврата {returncode}"], rule="returncode")
+
+        for name, kind in TOOL_SCHEMAS.get(tool, {}).items():
+            if name not in actual or not isinstance(actual[name], kind):
+                logger.debug(f"Verifier: {tool} без поля {name}, успех по флагу инструмента")
+                return _verdict(True, rule="schema_miss")
+
+        output_field = OUTPUT_FIELDS.get(tool)
+        output = actual.get(output_field) if output_field else None
+        if output_field and output in (None, "", [], {}):
+            # Пустой вывод — норма для многих команд (пустой файл, тихий скрипт)
+            return _verdict(True, rule="empty_output")
+
+        wanted = [next(g for g in match if g) for match in _QUOTED_RE.findall(expected)]
+        if wanted:
+            haystack = output if isinstance(output, str) else json.dumps(actual, ensure_ascii=False, default=str)
+            if all(w in haystack for w in wanted):
+                return _verdict(True, rule="expected_substring")
+            return _verdict(True, rule="substring_missing")
+
+        return _verdict(True, rule="success")
+
+
 class FeedbackLoop:
     """
     Анализ результатов и самоисправление
     """
+
+    def __init__(self):
+        self.verifier = ResultVerifier()
     
-    async def analyze_result(self, expected: str, actual: dict) -> dict:
+    async def analyze_result(self, expected: str, actual: dict, tool: str = None) -> dict:
         """
         Оценивает результат выполнения
+
+        Сначала правила ResultVerifier; LLM — только для неоднозначных случаев.
         """
-        if not actual:
-            return {
-                "success": False,
-                "issues": ["Нет результата"],
-                "recommendations": ["Повторить попытку"],
-                "needs_retry": True,
-                "alternative_approach": ""
-            }
-        
-        if actual.get("success"):
-            return {
-                "success": True,
-                "issues": [],
-                "recommendations": [],
-                "needs_retry": False,
-                "alternative_approach": ""
-            }
-        
-        # Если ошибка — пытаемся получить JSON от LLM
+        verdict = self.verifier.verify(tool, expected, actual)
+        if verdict is not None:
+            VERIFIER_STATS["rules"] += 1
+            return verdict
+
+        VERIFIER_STATS["llm"] += 1
+        tool_succeeded = bool(actual.get("success"))
         error_msg = actual.get("error", "Неизвестная ошибка")
+        result_text = json.dumps(actual, ensure_ascii=False, default=str)[:1500]
         
         prompt = f"""
-Произошла ошибка при выполнении: {error_msg}
+Инструмент: {tool or 'неизвестен'}
 
 Ожидалось: {expected}
 
-Нужно ли повторить попытку или скорректировать стратегию?
+Результат: {result_text}
+
+Выполнен ли шаг? Если нет — нужно ли повторить попытку или скорректировать стратегию?
 
 Ответь ТОЛЬКО JSON:
 {{
   "success": false,
-  "issues": ["{error_msg}"],
+  "issues": ["Описание проблемы"],
   "recommendations": ["Попробовать другой подход"],
   "needs_retry": true,
   "alternative_approach": "Описание"
@@ -458,16 +568,19 @@ class FeedbackLoop:
                 response = response[:-3]
             response = response.strip()
             
-            return json.loads(response)
+            verdict = json.loads(response)
+            verdict["verified_by"] = "llm"
+            return verdict
         except Exception as e:
             logger.error(f"Feedback analysis error: {e}")
-            # Fallback — возвращаем безопасный ответ
+            # Fallback — доверяем флагу инструмента
             return {
-                "success": False,
-                "issues": [error_msg],
-                "recommendations": ["Повторить"],
-                "needs_retry": True,
-                "alternative_approach": ""
+                "success": tool_succeeded,
+                "issues": [] if tool_succeeded else [error_msg],
+                "recommendations": [] if tool_succeeded else ["Повторить"],
+                "needs_retry": not tool_succeeded,
+                "alternative_approach": "",
+                "verified_by": "fallback"
             }
     
     async def decide_retry(self, error: str, attempts: int) -> bool:
@@ -482,16 +595,8 @@ class FeedbackLoop:
             return False
         
         # Анализ типа ошибки
-        retryable_errors = [
-            "timeout",
-            "connection",
-            "rate limit",
-            "temporary",
-            "locked"
-        ]
-        
         error_lower = error.lower()
-        for retryable in retryable_errors:
+        for retryable in RETRYABLE_ERRORS:
             if retryable in error_lower:
                 return True
         
@@ -538,11 +643,9 @@ class FeedbackLoop:
             response = response.strip()
             
             # Проверяем что инструмент допустимый
-            valid_tools = {"write_file", "read_file", "run_command", "api_call", "database_query", "get_calendar"}
-            
             try:
                 data = json.loads(response)
-                if data.get("tool") not in valid_tools:
+                if data.get("tool") not in VALID_TOOLS:
                     logger.warning(f"Invalid tool in adjustment: {data.get('tool')}")
                     return ""
                 return response
@@ -553,23 +656,111 @@ class FeedbackLoop:
             return ""
 
 
+StepRunner = Callable[[Step], Awaitable[Dict]]
+
+
+def topological_order(plan: List[Step]) -> Optional[List[Step]]:
+    """Шаги в порядке зависимостей (None если в графе есть цикл)"""
+    by_id = {step.id: step for step in plan}
+    pending = {step.id: set(step.depends_on) & by_id.keys() for step in plan}
+    ordered = []
+    while pending:
+        ready = [step_id for step_id, deps in pending.items() if not deps]
+        if not ready:
+            return None
+        for step_id in ready:
+            del pending[step_id]
+            ordered.append(by_id[step_id])
+            for deps in pending.values():
+                deps.discard(step_id)
+    return ordered
+
+
+class PlanExecutor:
+    """
+    Выполняет план по графу зависимостей
+
+    Шаг запускается, когда завершились все шаги из depends_on; независимые
+    шаги идут параллельно, не больше max_parallel одновременно. Если шаг
+    провален, все зависящие от него (и дальше по цепочке) пропускаются.
+    """
+
+    def __init__(self, max_parallel: int = REACT_MAX_PARALLEL_STEPS):
+        self.max_parallel = max(1, max_parallel)
+
+    async def run(self, plan: List[Step], run_step: StepRunner) -> List[Dict]:
+        """
+        Returns:
+            Результаты шагов в порядке плана: step_id, success, elapsed,
+            started_at (от начала плана), skipped
+        """
+        if plan and topological_order(plan) is None:
+            logger.warning("⚠️ В плане циклические зависимости — выполняю шаги последовательно")
+            plan[0].depends_on = []
+            for previous, step in zip(plan, plan[1:]):
+                step.depends_on = [previous.id]
+
+        plan_started = time.monotonic()
+        slots = asyncio.Semaphore(self.max_parallel)
+        tasks: Dict[int, asyncio.Task] = {}
+
+        async def run_one(step: Step) -> Dict:
+            failed = []
+            for dep in step.depends_on:
+                if not (await tasks[dep])["success"]:
+                    failed.append(dep)
+            if failed:
+                logger.info(f"⏭ Шаг {step.id} пропущен: не выполнен шаг {failed[0]}")
+                return {
+                    "step_id": step.id,
+                    "success": False,
+                    "skipped": True,
+                    "error": f"Пропущен: шаг {failed[0]} не выполнен",
+                    "elapsed": 0.0,
+                    "started_at": time.monotonic() - plan_started
+                }
+
+            async with slots:
+                started = time.monotonic()
+                try:
+                    outcome = await run_step(step)
+                except Exception as e:
+                    logger.error(f"Step execution error: {e}")
+                    outcome = {"step_id": step.id, "success": False, "error": str(e)}
+                outcome["elapsed"] = time.monotonic() - started
+                outcome["started_at"] = started - plan_started
+                outcome.setdefault("skipped", False)
+                return outcome
+
+        for step in plan:
+            tasks[step.id] = asyncio.create_task(run_one(step))
+        results = await asyncio.gather(*tasks.values())
+        return list(results)
+
+
 class ReActAgent:
     """
     Автономный агент с ReAct архитектурой
     """
     
-    def __init__(self):
+    def __init__(self, max_parallel: int = REACT_MAX_PARALLEL_STEPS, plan_cache: Optional[PlanCache] = None):
         self.llm = LLMEngine()
         self.planner = TaskPlanner()
+        self.plan_cache = plan_cache if plan_cache is not None else default_plan_cache
         self.tools = ToolRegistry()
         self.feedback = FeedbackLoop()
+        self.executor = PlanExecutor(max_parallel)
         self.short_term_memory = []
+        # Корректировки стратегии — общий бюджет на задачу
+        self.strategy_adjustments = 0
+        self.max_adjustments = 5
     
     async def execute_task(self, task: str, user_id: int = None) -> TaskResult:
         """
         Выполняет задачу используя ReAct подход
         """
         logger.info(f"🚀 ReAct Agent: Начинаю выполнение задачи: {task}")
+        started = time.monotonic()
         
         # 1. Загрузить контекст из памяти (если есть)
         context = {
@@ -577,9 +768,13 @@ class ReActAgent:
             "timestamp": datetime.now().isoformat()
         }
         
-        # 2. Создать план
-        logger.info("📋 Создаю план...")
-        plan = await self.planner.create_plan(task, context)
+        # 2. Взять план из кэша или создать
+        lookup = await self.plan_cache.lookup(task)
+        if lookup.hit:
+            plan = steps_from_data(lookup.steps, VALID_TOOLS)
+        else:
+            logger.info("📋 Создаю план...")
+            plan = await self.planner.create_plan(task, context)
         
         if not plan:
             return TaskResult(
@@ -592,94 +787,27 @@ class ReActAgent:
         
         logger.info(f"✅ План создан: {len(plan)} шагов")
         
-        # 3. Выполнить план по шагам
-        results = []
+        # 3. Выполнить план: независимые шаги — параллельно
+        self.strategy_adjustments = 0
+        results = await self.executor.run(plan, lambda step: self._run_step(step, context))
+
         errors = []
-        strategy_adjustments = 0  # Счётчик корректировок стратегии
-        max_adjustments = 5  # Максимум 5 корректировок
+        for outcome in results:
+            if outcome["success"]:
+                continue
+            if outcome.get("skipped"):
+                errors.append(f"Шаг {outcome['step_id']} пропущен: зависит от проваленного шага")
+            else:
+                errors.append(outcome.get("error") or f"Шаг {outcome['step_id']} не выполнен")
         
-        for step in plan:
-            logger.info(f"🔧 Выполняю шаг {step.id}: {step.description}")
-
-            success = False
-            attempts = 0
-            max_attempts = 3
-
-            while not success and attempts < max_attempts and strategy_adjustments < max_adjustments:
-                # 4. Выполнить действие
-                try:
-                    result = await self.tools.execute(
-                        step.tool,
-                        **step.parameters
-                    )
-                except Exception as e:
-                    logger.error(f"Step execution error: {e}")
-                    result = {"success": False, "error": str(e)}
-                
-                # 5. Оценить результат
-                feedback = await self.feedback.analyze_result(
-                    step.expected_result,
-                    result
-                )
-                
-                # Конвертируем "true"/"false" в bool
-                success_result = feedback.get("success", False)
-                if isinstance(success_result, str):
-                    success_result = success_result.lower() == "true"
-                
-                if success_result:
-                    success = True
-                    results.append({
-                        "step_id": step.id,
-                        "success": True,
-                        "result": result,
-                        "attempts": attempts + 1
-                    })
-                    logger.info(f"✅ Шаг {step.id} выполнен успешно")
-                else:
-                    attempts += 1  # Увеличиваем только при ошибке
-                    error_msg = result.get("error") if result else "Неизвестная ошибка"
-                    logger.warning(f"❌ Шаг {step.id} не выполнен: {error_msg}")
-                    
-                    # 6. Самоисправление
-                    if await self.feedback.decide_retry(error_msg, attempts):
-                        logger.info(f"🔄 Попытка {attempts}/{max_attempts}")
-                        continue
-                    else:
-                        # Корректировка стратегии
-                        strategy_adjustments += 1
-                        if strategy_adjustments >= max_adjustments:
-                            logger.error("🚨 Превышено количество корректировок стратегии")
-                            errors.append(f"Превышено количество корректировок ({max_adjustments})")
-                            break
-                        
-                        new_strategy = await self.feedback.adjust_strategy(
-                            error_msg,
-                            context
-                        )
-                        
-                        if new_strategy:
-                            logger.info(f"🔄 Стратегия скорректирована (попытка {strategy_adjustments}/{max_adjustments})")
-                            # Обновляем шаг
-                            try:
-                                strategy_data = json.loads(new_strategy)
-                                step.tool = strategy_data.get("tool", step.tool)
-                                step.parameters = strategy_data.get("parameters", step.parameters)
-                            except:
-                                pass
-                        
-                        attempts = 0  # Сброс попыток для нового подхода
-            
-            if not success:
-                errors.append(f"Шаг {step.id} не выполнен после {max_attempts} попыток")
-                logger.error(f"❌ Шаг {step.id} провален")
-                break
+        # Выполненный план (с учётом корректировок) — в кэш
+        self.plan_cache.record(lookup, [asdict(step) for step in plan], not errors)
         
         # 7. Сохранить урок в память
         lessons = []
         if errors:
             lessons.append(f"Избегать: {', '.join(errors)}")
-        if success:
+        else:
             lessons.append("Успешная стратегия выполнения")
         
         # 8. Добавить в краткосрочную память
@@ -692,14 +820,109 @@ class ReActAgent:
         # Ограничиваем размер памяти
         if len(self.short_term_memory) > 50:
             self.short_term_memory = self.short_term_memory[-50:]
+
+        elapsed = time.monotonic() - started
+        verifier = get_verifier_stats()
+        logger.info(
+            f"🏁 ReAct Agent: {len(results)} шагов за {elapsed:.1f} сек "
+            f"(сумма шагов {sum(r['elapsed'] for r in results):.1f} сек), "
+            f"проверок без LLM: {verifier['skipped_share']:.0%}"
+        )
         
         return TaskResult(
             task=task,
             success=len(errors) == 0,
             steps=results,
             errors=errors,
-            lessons_learned=lessons
+            lessons_learned=lessons,
+            elapsed=elapsed,
+            plan_cached=lookup.hit
         )
+
+    async def _run_step(self, step: Step, context: dict) -> Dict:
+        """Один шаг: действие, оценка, повторы и корректировка стратегии"""
+        logger.info(f"🔧 Выполняю шаг {step.id}: {step.description}")
+
+        attempts = 0
+        max_attempts = 3
+        result = None
+
+        while attempts < max_attempts and self.strategy_adjustments < self.max_adjustments:
+            # 4. Выполнить действие
+            try:
+                result = await self.tools.execute(
+                    step.tool,
+                    **step.parameters
+                )
+            except Exception as e:
+                logger.error(f"Step execution error: {e}")
+                result = {"success": False, "error": str(e)}
+            
+            # 5. Оценить результат
+            feedback = await self.feedback.analyze_result(
+                step.expected_result,
+                result,
+                step.tool
+            )
+            
+            # Конвертируем "true"/"false" в bool
+            success_result = feedback.get("success", False)
+            if isinstance(success_result, str):
+                success_result = success_result.lower() == "true"
+            
+            if success_result:
+                logger.info(f"✅ Шаг {step.id} выполнен успешно")
+                return {
+                    "step_id": step.id,
+                    "success": True,
+                    "result": result,
+                    "attempts": attempts + 1
+                }
+
+            attempts += 1  # Увеличиваем только при ошибке
+            error_msg = result.get("error") if result else "Неизвестная ошибка"
+            logger.warning(f"❌ Шаг {step.id} не выполнен: {error_msg}")
+            
+            # 6. Самоисправление
+            if await self.feedback.decide_retry(error_msg, attempts):
+                logger.info(f"🔄 Попытка {attempts}/{max_attempts}")
+                continue
+
+            # Корректировка стратегии
+            self.strategy_adjustments += 1
+            if self.strategy_adjustments >= self.max_adjustments:
+                logger.error("🚨 Превышено количество корректировок стратегии")
+                return {
+                    "step_id": step.id,
+                    "success": False,
+                    "result": result,
+                    "error": f"Превышено количество корректировок ({self.max_adjustments})"
+                }
+            
+            new_strategy = await self.feedback.adjust_strategy(
+                error_msg,
+                context
+            )
+            
+            if new_strategy:
+                logger.info(f"🔄 Стратегия скорректирована (попытка {self.strategy_adjustments}/{self.max_adjustments})")
+                # Обновляем шаг
+                try:
+                    strategy_data = json.loads(new_strategy)
+                    step.tool = strategy_data.get("tool", step.tool)
+                    step.parameters = strategy_data.get("parameters", step.parameters)
+                except:
+                    pass
+            
+            attempts = 0  # Сброс попыток для нового подхода
+
+        logger.error(f"❌ Шаг {step.id} провален")
+        return {
+            "step_id": step.id,
+            "success": False,
+            "result": result,
+            "error": f"Шаг {step.id} не выполнен после {max_attempts} попыток"
+        }
     
     def get_memory_context(self) -> str:
         """Возвращает контекст из краткосрочной памяти"""
@@ -733,10 +956,13 @@ async def ask_karina_react(prompt: str, chat_id: int = None) -> str:
         response += f"Выполнено шагов: {len(result.steps)}\n"
         
         for step in result.steps:
-            response += f"• Шаг {step['step_id']}: OK"
+            response += f"• Шаг {step['step_id']}: OK ({step.get('elapsed', 0):.1f} сек)"
             if step.get('attempts', 1) > 1:
                 response += f" (с попытки {step['attempts']})"
             response += "\n"
+        response += f"\n⏱ Всего: {result.elapsed:.1f} сек\n"
+        if result.plan_cached:
+            response += "♻️ План из кэша\n"
     else:
         response = "❌ Задача не выполнена\n\n"
         response += "Ошибки:\n"
@@ -5,10 +5,10 @@
 - Непредсказуемые формулировки
 - Мотивация и забота
 """
-import httpx
 import logging
 import json
 from brains.config import MISTRAL_API_KEY
+from brains.clients import http_clients, MISTRAL
 
 logger = logging.getLogger(__name__)
 
@@ -174,18 +174,17 @@ async def generate_creative_reminder(
     }
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(MISTRAL_URL, json=payload, headers=headers)
-            
-            if response.status_code == 200:
-                result = response.json()
-                reminder_text = result['choices'][0]['message']['content'].strip()
-                reminder_text = reminder_text.strip('"\'')
-                logger.info(f"✨ Сгенерировано напоминание: {reminder_text[:50]}...")
-                return reminder_text
-            else:
-                logger.error(f"Mistral API Error: {response.status_code}")
-                return None
+        response = await http_clients.get(MISTRAL).post(MISTRAL_URL, json=payload, headers=headers, timeout=10.0)
+        
+        if response.status_code == 200:
+            result = response.json()
+            reminder_text = result['choices'][0]['message']['content'].strip()
+            reminder_text = reminder_text.strip('"\'')
+            logger.info(f"✨ Сгенерировано напоминание: {reminder_text[:50]}...")
+            return reminder_text
+        else:
+            logger.error(f"Mistral API Error: {response.status_code}")
+            return None
     except Exception as e:
         logger.error(f"Generate reminder failed: {e}")
         return None
@@ -221,11 +220,10 @@ async def generate_aura_phrase(phrase_type: str, context: dict = None) -> str:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(MISTRAL_URL, json=payload, headers=headers)
-            if response.status_code == 200:
-                text = response.json()['choices'][0]['message']['content'].strip()
-                return text.strip('"\'')
+        response = await http_clients.get(MISTRAL).post(MISTRAL_URL, json=payload, headers=headers, timeout=10.0)
+        if response.status_code == 200:
+            text = response.json()['choices'][0]['message']['content'].strip()
+            return text.strip('"\'')
     except Exception as e:
         logger.error(f"Generate aura phrase failed: {e}")
     return None
@@ -315,6 +315,17 @@ class ReminderManager:
         self.reminders[reminder.id] = reminder
         await self._save_to_db(reminder)
 
+    async def cancel_reminder(self, reminder_id: str):
+        """Отменяет напоминание (например, встречу удалили из календаря)"""
+        reminder = self.reminders.pop(reminder_id, None)
+        if reminder is None:
+            return
+        reminder.is_active = False
+        if reminder_id in self.active_escalations:
+            self.active_escalations.pop(reminder_id).cancel()
+        await self._save_to_db(reminder)
+        logger.info(f"🗑 Напоминание отменено: {reminder_id}")
+
     def create_health_reminder(self, time_str: str = "22:00") -> Reminder:
         now = datetime.now(timezone(timedelta(hours=3)))
         hour, minute = map(int, time_str.split(':'))
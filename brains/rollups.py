@@ -0,0 +1,327 @@
+"""
+Дневные агрегаты (daily_rollups)
+
+Статистика здоровья, привычек, рабочих сессий и целей раньше на каждый
+запрос перечитывала сырые строки за весь период. Здесь на каждый
+(пользователь, день) хранится одна строка со счётчиками:
+- запись в health_records / habits / work_sessions сразу прибавляется
+  к строке дня в БД: функция increment_daily_rollup складывает счётчики
+  внутри INSERT ... ON CONFLICT DO UPDATE, поэтому параллельные записи
+  нескольких воркеров не теряются; цели дня (daily_goals) задаются upsert'ом
+- отчёт за неделю или месяц читает 7/30 строк независимо от истории
+- прочитанные дни держатся в локальном кэше по пользователю
+- пороги переработки (MAX_WORK_HOURS, OVERWORK_NIGHT_START) применяются
+  при записи; после их смены нужен пересчёт
+
+Заполнение по существующим данным: python scripts/backfill_rollups.py
+"""
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from brains.config import ROLLUP_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+# Дней на загрузку минимум: отчёт за 7 дней, затем за 30 — один запрос
+MIN_LOAD_DAYS = 30
+MAX_CACHED_USERS = 64
+
+# Доли секунды в ISO строке
+_FRACTION = re.compile(r"\.(\d+)")
+
+
+def _local_time(value: str) -> datetime:
+    """ISO строка → время по часам записи (смещение отбрасывается)"""
+    return datetime.fromisoformat(value[:19])
+
+
+def _timestamp(value: str) -> datetime:
+    """
+    ISO строка PostgREST (timestamptz) → datetime
+
+    fromisoformat в Python 3.10 не принимает "Z" и доли секунды короче
+    6 знаков ("08:00:00.12+00:00") — нормализуем до разбора.
+    """
+    value = _FRACTION.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), value.replace("Z", "+00:00"), count=1)
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=MOSCOW_TZ)
+
+
+@dataclass
+class DailyRollup:
+    """Агрегаты пользователя за один день (строка daily_rollups)"""
+    user_id: int
+    date: str
+    health_records: int = 0
+    health_confirmed: int = 0
+    health_last_at: Optional[str] = None
+    health_last_confirmed: Optional[bool] = None
+    health_last_time: Optional[str] = None
+    habits: Dict[str, List[int]] = field(default_factory=dict)  # {имя: [всего, выполнено]}
+    work_sessions: int = 0
+    work_hours: float = 0.0
+    work_meetings: int = 0
+    work_start_min: int = 0  # Сумма минут от полуночи начала сессий
+    work_end_min: int = 0
+    work_weekend: int = 0
+    work_late: int = 0
+    work_overwork: int = 0
+    work_max_hours: float = 0.0
+    work_max_end: Optional[str] = None
+    goals_total: int = 0
+    goals_completed: int = 0
+
+    def add_health(self, confirmed: bool, timestamp: str, time_str: Optional[str] = None):
+        """Запись health_records; последняя по времени определяет статус дня"""
+        self.health_records += 1
+        self.health_confirmed += bool(confirmed)
+        if self.health_last_at is None or _timestamp(timestamp) >= _timestamp(self.health_last_at):
+            self.health_last_at = timestamp
+            self.health_last_confirmed = bool(confirmed)
+            self.health_last_time = time_str or _timestamp(timestamp).strftime('%H:%M:%S')
+
+    def add_habit(self, name: str, completed: bool):
+        counts = self.habits.setdefault(name, [0, 0])
+        counts[0] += 1
+        counts[1] += bool(completed)
+
+    def add_work(self, start_time: str, end_time: str, duration_hours: float, meetings: int,
+                 max_work_hours: float, night_start: int):
+        """Рабочая сессия; пороги переработки применяются здесь"""
+        start, end = _local_time(start_time), _local_time(end_time)
+        duration = duration_hours or 0
+        self.work_sessions += 1
+        self.work_hours = round(self.work_hours + duration, 2)
+        self.work_meetings += meetings or 0
+        self.work_start_min += start.hour * 60 + start.minute
+        self.work_end_min += end.hour * 60 + end.minute
+        self.work_weekend += start.weekday() >= 5
+        self.work_late += end.hour >= night_start
+        self.work_overwork += duration > max_work_hours
+        if duration > self.work_max_hours:
+            self.work_max_hours = duration
+            self.work_max_end = end_time
+
+    def merge(self, delta: "DailyRollup"):
+        """Прибавляет приращение — то же, что increment_daily_rollup в БД"""
+        self.health_records += delta.health_records
+        self.health_confirmed += delta.health_confirmed
+        if delta.health_last_at is not None and (
+            self.health_last_at is None or _timestamp(delta.health_last_at) >= _timestamp(self.health_last_at)
+        ):
+            self.health_last_at = delta.health_last_at
+            self.health_last_confirmed = delta.health_last_confirmed
+            self.health_last_time = delta.health_last_time
+        for name, (total, completed) in delta.habits.items():
+            counts = self.habits.setdefault(name, [0, 0])
+            counts[0] += total
+            counts[1] += completed
+        for name in ("work_sessions", "work_meetings", "work_start_min", "work_end_min",
+                     "work_weekend", "work_late", "work_overwork"):
+            setattr(self, name, getattr(self, name) + getattr(delta, name))
+        self.work_hours = round(self.work_hours + delta.work_hours, 2)
+        if delta.work_max_hours > self.work_max_hours:
+            self.work_max_hours = delta.work_max_hours
+            self.work_max_end = delta.work_max_end
+
+    def set_goals(self, total: int, completed: int):
+        self.goals_total = total
+        self.goals_completed = completed
+
+    def to_row(self) -> Dict:
+        row = {f.name: getattr(self, f.name) for f in fields(self)}
+        row["updated_at"] = datetime.now(timezone.utc).isoformat()
+        return row
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "DailyRollup":
+        known = {f.name for f in fields(cls)}
+        rollup = cls(**{k: v for k, v in row.items() if k in known and v is not None})
+        # NUMERIC приходит строкой или числом
+        rollup.work_hours = float(rollup.work_hours)
+        rollup.work_max_hours = float(rollup.work_max_hours)
+        rollup.habits = {name: [int(c[0]), int(c[1])] for name, c in (rollup.habits or {}).items()}
+        return rollup
+
+
+def build_rollups(
+    user_id: int,
+    health_rows: Iterable[Dict] = (),
+    habit_rows: Iterable[Dict] = (),
+    work_rows: Iterable[Dict] = (),
+    goal_rows: Iterable[Dict] = (),
+    max_work_hours: float = 9,
+    night_start: int = 22,
+) -> Dict[str, DailyRollup]:
+    """Агрегаты по сырым строкам (для пересчёта истории): {дата: DailyRollup}"""
+    days: Dict[str, DailyRollup] = {}
+
+    def day(value: str) -> DailyRollup:
+        return days.setdefault(value, DailyRollup(user_id=user_id, date=value))
+
+    for row in health_rows:
+        timestamp = row.get("timestamp") or row.get("created_at")
+        row_date = row.get("date") or (timestamp or "")[:10]
+        if row_date and timestamp:
+            day(row_date).add_health(row.get("confirmed", True), timestamp, row.get("time"))
+    for row in habit_rows:
+        day(row["date"]).add_habit(row["habit_name"], row.get("completed"))
+    for row in work_rows:
+        day(row["date"]).add_work(
+            row["start_time"], row["end_time"], row.get("duration_hours"),
+            row.get("meetings_count"), max_work_hours, night_start,
+        )
+    for row in goal_rows:
+        day(row["date"]).set_goals(len(row.get("goals") or []), sum(1 for c in row.get("completed") or [] if c))
+    return days
+
+
+@dataclass
+class _UserDays:
+    since: str
+    loaded_at: float
+    days: Dict[str, DailyRollup]
+
+
+class RollupStore:
+    """
+    daily_rollups с локальным кэшем по пользователям
+
+    Использование:
+        days = await rollups.get_range(user_id, "2026-10-01")
+        await rollups.record_health(user_id, confirmed=True)
+    """
+
+    def __init__(self, ttl: float = ROLLUP_CACHE_TTL, max_users: int = MAX_CACHED_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._cache: Dict[int, _UserDays] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "loads": 0, "writes": 0, "errors": 0}
+
+    async def _select(self, user_id: int, since: str, until: Optional[str] = None) -> List[Dict]:
+        from brains.clients import supabase_client
+
+        query = supabase_client.table("daily_rollups").select("*")\
+            .eq("user_id", user_id).gte("date", since)
+        if until:
+            query = query.lte("date", until)
+        response = await asyncio.to_thread(query.execute)
+        return response.data or []
+
+    async def _upsert(self, row: Dict) -> Dict:
+        """Записывает переданные колонки (остальные в строке не меняются)"""
+        from brains.clients import supabase_client
+
+        query = supabase_client.table("daily_rollups").upsert(row, on_conflict="user_id,date")
+        response = await asyncio.to_thread(query.execute)
+        return response.data[0]
+
+    async def _increment(self, delta: Dict) -> Dict:
+        """Атомарно прибавляет приращение к строке дня, возвращает итоговую строку"""
+        from brains.clients import supabase_client
+
+        query = supabase_client.rpc("increment_daily_rollup", {"delta": delta})
+        response = await asyncio.to_thread(query.execute)
+        return response.data[0] if isinstance(response.data, list) else response.data
+
+    def _fresh(self, cached: Optional[_UserDays], since: str) -> bool:
+        return bool(cached) and cached.since <= since and time.time() - cached.loaded_at < self.ttl
+
+    async def get_range(self, user_id: int, since: str) -> List[DailyRollup]:
+        """Дни с данными начиная с since (YYYY-MM-DD), по возрастанию даты"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            cached = self._cache.get(user_id)
+            if self._fresh(cached, since):
+                self.stats["hits"] += 1
+            else:
+                floor = (date.today() - timedelta(days=MIN_LOAD_DAYS)).isoformat()
+                load_since = min(since, floor)
+                rows = await self._select(user_id, load_since)
+                self.stats["loads"] += 1
+                cached = _UserDays(
+                    since=load_since,
+                    loaded_at=time.time(),
+                    days={row["date"]: DailyRollup.from_row(row) for row in rows},
+                )
+                if len(self._cache) >= self.max_users and user_id not in self._cache:
+                    oldest = min(self._cache, key=lambda uid: self._cache[uid].loaded_at)
+                    self._cache.pop(oldest)
+                self._cache[user_id] = cached
+            return [cached.days[d] for d in sorted(cached.days) if d >= since]
+
+    async def _write(self, user_id: int, day: str, write: Callable[[], Awaitable[Dict]]) -> Optional[DailyRollup]:
+        """
+        Выполняет запись и кладёт итоговую строку из БД в кэш
+
+        Ошибка не пробрасывается: сырая запись уже сохранена, а агрегат
+        восстанавливается пересчётом (scripts/backfill_rollups.py).
+        """
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            try:
+                rollup = DailyRollup.from_row(await write())
+            except Exception as e:
+                self.stats["errors"] += 1
+                self._cache.pop(user_id, None)
+                logger.warning(f"⚠️ Агрегат {day} для {user_id} не обновлён: {e}")
+                return None
+
+            self.stats["writes"] += 1
+            cached = self._cache.get(user_id)
+            if cached and cached.since <= day:
+                cached.days[day] = rollup
+            return rollup
+
+    async def update(self, user_id: int, day: str, apply: Callable[[DailyRollup], None]) -> Optional[DailyRollup]:
+        """
+        Прибавляет к строке дня приращение: apply применяется к пустой
+        строке, сложение выполняет БД (кэш не читается)
+        """
+        delta = DailyRollup(user_id=user_id, date=day)
+        apply(delta)
+        row = delta.to_row()
+        return await self._write(user_id, day, lambda: self._increment(row))
+
+    async def record_health(self, user_id: int, confirmed: bool, timestamp: Optional[datetime] = None):
+        timestamp = timestamp or datetime.now(MOSCOW_TZ)
+        return await self.update(
+            user_id, timestamp.strftime('%Y-%m-%d'),
+            lambda r: r.add_health(confirmed, timestamp.isoformat(), timestamp.strftime('%H:%M:%S')),
+        )
+
+    async def record_habit(self, user_id: int, day: str, habit_name: str, completed: bool):
+        return await self.update(user_id, day, lambda r: r.add_habit(habit_name, completed))
+
+    async def record_work_session(self, user_id: int, start_time: datetime, end_time: datetime,
+                                  duration_hours: float, meetings: int,
+                                  max_work_hours: float, night_start: int):
+        return await self.update(
+            user_id, start_time.strftime('%Y-%m-%d'),
+            lambda r: r.add_work(start_time.isoformat(), end_time.isoformat(), duration_hours,
+                                 meetings, max_work_hours, night_start),
+        )
+
+    async def set_goals(self, user_id: int, day: str, total: int, completed: int):
+        """Цели задаются целиком: upsert только колонок целей"""
+        row = {"user_id": user_id, "date": day, "goals_total": total, "goals_completed": completed,
+               "updated_at": datetime.now(timezone.utc).isoformat()}
+        return await self._write(user_id, day, lambda: self._upsert(row))
+
+    def invalidate(self, user_id: int):
+        self._cache.pop(user_id, None)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "users": len(self._cache)}
+
+
+# Глобальное хранилище агрегатов
+rollups = RollupStore()
@@ -0,0 +1,286 @@
+"""
+Shared State Backend
+Общее состояние rate limiter'ов и circuit breaker'ов между процессами
+
+Лимиты Mistral и состояние breaker'ов должны быть общими для всех
+воркеров бота и переживать рестарт — иначе каждый процесс получает
+собственный бюджет запросов.
+
+Бэкенды:
+    memory — в памяти процесса (тесты, одиночный воркер)
+    sqlite — локальный файл в режиме WAL (несколько воркеров на одном хосте)
+
+Для Redis достаточно реализовать StateBackend с теми же атомарными
+операциями (Lua-скрипт / MULTI) и добавить его в get_state_backend().
+
+Использование:
+    backend = get_state_backend()
+    allowed, retry_after = backend.try_acquire("mistral:global", calls=30, period=60)
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BreakerMutator = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class StateBackend(ABC):
+    """Базовый класс хранилища состояния лимитеров и breaker'ов"""
+
+    name: str = "base"
+    # Операции ходят в файл/сеть — асинхронный код вызывает их через asyncio.to_thread
+    blocking: bool = False
+
+    @abstractmethod
+    def try_acquire(self, key: str, calls: int, period: float,
+                    now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Атомарно проверяет скользящее окно и занимает слот.
+
+        Returns:
+            (True, 0.0) если слот занят, иначе (False, секунды до освобождения слота)
+        """
+
+    @abstractmethod
+    def count(self, key: str, period: float, now: Optional[float] = None) -> int:
+        """Количество вызовов в текущем окне"""
+
+    @abstractmethod
+    def reset(self, key: str):
+        """Сбрасывает окно для ключа"""
+
+    @abstractmethod
+    def update_breaker(self, name: str, mutate: Optional[BreakerMutator] = None) -> Dict[str, Any]:
+        """
+        Атомарно читает и (опционально) изменяет состояние breaker'а.
+
+        Args:
+            name: Имя breaker'а
+            mutate: Функция state -> new_state (None — только чтение)
+
+        Returns:
+            Актуальное состояние (пустой dict если breaker ещё не создан)
+        """
+
+    def get_breaker(self, name: str) -> Dict[str, Any]:
+        """Читает состояние breaker'а"""
+        return self.update_breaker(name)
+
+    def close(self):
+        """Освобождает ресурсы"""
+
+
+class MemoryStateBackend(StateBackend):
+    """Хранилище в памяти процесса"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._timestamps: Dict[str, List[float]] = defaultdict(list)
+        self._breakers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _clean(self, key: str, period: float, now: float) -> List[float]:
+        cutoff = now - period
+        timestamps = [ts for ts in self._timestamps[key] if ts > cutoff]
+        self._timestamps[key] = timestamps
+        return timestamps
+
+    def try_acquire(self, key: str, calls: int, period: float,
+                    now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.time() if now is None else now
+        with self._lock:
+            timestamps = self._clean(key, period, now)
+            if len(timestamps) < calls:
+                timestamps.append(now)
+                return True, 0.0
+            return False, max(0.0, min(timestamps) + period - now)
+
+    def count(self, key: str, period: float, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            return len(self._clean(key, period, now))
+
+    def reset(self, key: str):
+        with self._lock:
+            self._timestamps.pop(key, None)
+
+    def update_breaker(self, name: str, mutate: Optional[BreakerMutator] = None) -> Dict[str, Any]:
+        with self._lock:
+            state = dict(self._breakers.get(name, {}))
+            if mutate is not None:
+                state = mutate(state)
+                self._breakers[name] = dict(state)
+            return state
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    Хранилище в SQLite (WAL).
+
+    Каждая операция — одна транзакция BEGIN IMMEDIATE, поэтому
+    check-and-increment атомарен между процессами на одном хосте.
+
+    Breaker'ы вызываются синхронно из event loop, поэтому ожидание
+    блокировки ограничено миллисекундами (busy_timeout). Если файл занят
+    дольше (OperationalError), решение принимается намеренно:
+        try_acquire   — закрыто: слот не выдан, повтор через BUSY_RETRY_AFTER
+        update_breaker — открыто: изменение считается локально и не сохраняется
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    # Через сколько секунд повторить try_acquire, если файл занят
+    BUSY_RETRY_AFTER = 0.05
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rate_events (
+            key TEXT NOT NULL,
+            ts REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_rate_events_key_ts ON rate_events (key, ts);
+        CREATE TABLE IF NOT EXISTS breaker_state (
+            name TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.05):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=busy_timeout,
+            isolation_level=None,  # транзакции управляются вручную
+            check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def try_acquire(self, key: str, calls: int, period: float,
+                    now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.time() if now is None else now
+
+        def op(conn: sqlite3.Connection) -> Tuple[bool, float]:
+            conn.execute("DELETE FROM rate_events WHERE key = ? AND ts <= ?", (key, now - period))
+            used, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM rate_events WHERE key = ?", (key,)
+            ).fetchone()
+            if used < calls:
+                conn.execute("INSERT INTO rate_events (key, ts) VALUES (?, ?)", (key, now))
+                return True, 0.0
+            return False, max(0.0, oldest + period - now)
+
+        try:
+            return self._transaction(op)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ Shared state занят ({e}), слот {key} не выдан")
+            return False, self.BUSY_RETRY_AFTER
+
+    def count(self, key: str, period: float, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM rate_events WHERE key = ? AND ts > ?", (key, now - period)
+            ).fetchone()
+        return row[0]
+
+    def reset(self, key: str):
+        try:
+            self._transaction(lambda conn: conn.execute("DELETE FROM rate_events WHERE key = ?", (key,)))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ Shared state занят ({e}), окно {key} не сброшено")
+
+    def update_breaker(self, name: str, mutate: Optional[BreakerMutator] = None) -> Dict[str, Any]:
+        if mutate is None:
+            with self._lock:
+                row = self._conn.execute("SELECT state FROM breaker_state WHERE name = ?", (name,)).fetchone()
+            return json.loads(row[0]) if row else {}
+
+        def op(conn: sqlite3.Connection) -> Dict[str, Any]:
+            row = conn.execute("SELECT state FROM breaker_state WHERE name = ?", (name,)).fetchone()
+            state = mutate(json.loads(row[0]) if row else {})
+            conn.execute(
+                "INSERT INTO breaker_state (name, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (name, json.dumps(state), time.time())
+            )
+            return state
+
+        try:
+            return self._transaction(op)
+        except sqlite3.OperationalError as e:
+            # Чтение в WAL не ждёт писателя: решение по последнему сохранённому состоянию
+            logger.warning(f"⚠️ Shared state занят ({e}), breaker {name} обновлён только локально")
+            return mutate(self.update_breaker(name))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================================
+# ГЛОБАЛЬНЫЙ БЭКЕНД
+# ============================================================================
+
+_state_backend: Optional[StateBackend] = None
+
+
+def get_state_backend() -> StateBackend:
+    """
+    Возвращает общий бэкенд состояния (ленивая инициализация).
+
+    Выбирается переменной STATE_BACKEND (sqlite | memory).
+    При ошибке открытия SQLite откатывается на память процесса.
+    """
+    global _state_backend
+
+    if _state_backend is not None:
+        return _state_backend
+
+    from brains.config import STATE_BACKEND, STATE_DB_PATH, STATE_BUSY_TIMEOUT_MS
+
+    if STATE_BACKEND == "sqlite":
+        try:
+            _state_backend = SQLiteStateBackend(STATE_DB_PATH, busy_timeout=STATE_BUSY_TIMEOUT_MS / 1000)
+            logger.info(f"✅ Shared state: SQLite ({STATE_DB_PATH})")
+            return _state_backend
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"❌ Shared state: не удалось открыть {STATE_DB_PATH}: {e}. Используем память процесса")
+    elif STATE_BACKEND != "memory":
+        logger.warning(f"⚠️ Неизвестный STATE_BACKEND={STATE_BACKEND}, используем память процесса")
+
+    _state_backend = MemoryStateBackend()
+    return _state_backend
+
+
+def close_state_backend():
+    """Закрывает общий бэкенд (при остановке бота)"""
+    global _state_backend
+
+    if _state_backend is not None:
+        _state_backend.close()
+        _state_backend = None
@@ -1,15 +1,120 @@
 """
 Smart Summary для Karina AI
 Еженедельные отчёты о продуктивности, здоровье и событиях
+
+- разделы (здоровье, календарь, память) собираются параллельно,
+  каждый со своим таймаутом: зависший раздел заменяется заглушкой
+- тяжёлые разделы считаются заранее ночью (SUMMARY_PRECOMPUTE_HOUR),
+  к отправке остаётся только AI-резюме
+- планировщик спит до ближайшего события, а не опрашивает раз в час,
+  и досылает отчёт, если бот был выключен в момент отправки
+- задержки разделов и время доставки пишутся в статистику
 """
+import asyncio
+import json
 import logging
+import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 from brains.clients import supabase_client
 from brains.ai import ask_karina
+from brains.config import (
+    SUMMARY_WEEKDAY, SUMMARY_HOUR, SUMMARY_PRECOMPUTE_HOUR, SUMMARY_PRECOMPUTE_MAX_AGE,
+    SUMMARY_SECTION_TIMEOUT, SUMMARY_AI_TIMEOUT, SUMMARY_CATCHUP_HOURS, SUMMARY_STATE_PATH
+)
+from brains.rollups import rollups
 
 logger = logging.getLogger(__name__)
 
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+# Заглушки разделов: формат отчёта не меняется при таймауте или ошибке
+SECTION_DEFAULTS = {
+    "health": {"total_records": 0, "confirmed": 0, "missed": 0, "compliance_rate": 0, "trend": "no_data"},
+    "calendar": {"total_events": 0, "completed": 0, "upcoming": 0},
+    "memories": {"new_memories": 0, "categories": {}},
+}
+
+# Разделы, которые планировщик считает заранее
+HEAVY_SECTIONS = ("health", "memories")
+
+# (user_id, days) -> (время расчёта, {раздел: данные})
+_precomputed: Dict[Tuple[int, int], Tuple[float, Dict[str, Dict]]] = {}
+
+summary_stats = {
+    "sections": {},  # раздел -> {"last_ms", "avg_ms", "runs", "timeouts", "errors"}
+    "generated": 0,
+    "precomputed_used": 0,
+    "last_delivery": None,
+}
+
+
+def _sections(user_id: int, days: int) -> Dict[str, Callable[[], Awaitable[Dict]]]:
+    return {
+        "health": lambda: _get_health_summary(user_id, days),
+        "calendar": lambda: _get_calendar_summary(days),
+        "memories": lambda: _get_memories_summary(user_id, days),
+    }
+
+
+def _record_latency(name: str, elapsed_ms: float, outcome: str):
+    section = summary_stats["sections"].setdefault(
+        name, {"last_ms": 0.0, "avg_ms": 0.0, "runs": 0, "timeouts": 0, "errors": 0}
+    )
+    section["runs"] += 1
+    section["last_ms"] = round(elapsed_ms, 1)
+    section["avg_ms"] = round(section["avg_ms"] + (elapsed_ms - section["avg_ms"]) / section["runs"], 1)
+    if outcome != "ok":
+        section[outcome] += 1
+
+
+async def _run_section(name: str, build: Callable[[], Awaitable[Dict]],
+                       timeout: float) -> Tuple[Dict, float]:
+    """Раздел с таймаутом; при таймауте или ошибке — заглушка с полем error"""
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(build(), timeout=timeout)
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱ Раздел отчёта '{name}' не уложился в {timeout:g} сек")
+        result = {**SECTION_DEFAULTS[name], "error": "timeout"}
+        outcome = "timeouts"
+    except Exception as e:
+        logger.error(f"❌ Раздел отчёта '{name}': {e}")
+        result = {**SECTION_DEFAULTS[name], "error": str(e)}
+        outcome = "errors"
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _record_latency(name, elapsed_ms, outcome)
+    return result, elapsed_ms
+
+
+async def build_sections(user_id: int, days: int, names=None,
+                         timeout: float = SUMMARY_SECTION_TIMEOUT) -> Tuple[Dict[str, Dict], Dict[str, float]]:
+    """Разделы отчёта параллельно: ({раздел: данные}, {раздел: мс})"""
+    builders = _sections(user_id, days)
+    names = list(names or builders)
+    results = await asyncio.gather(*(_run_section(name, builders[name], timeout) for name in names))
+    sections = {name: result for name, (result, _) in zip(names, results)}
+    timings = {name: round(elapsed, 1) for name, (_, elapsed) in zip(names, results)}
+    return sections, timings
+
+
+async def precompute_sections(user_id: int, days: int = 7) -> Dict[str, float]:
+    """Считает тяжёлые разделы заранее; ошибочные не сохраняются"""
+    sections, timings = await build_sections(user_id, days, HEAVY_SECTIONS)
+    ready = {name: data for name, data in sections.items() if "error" not in data}
+    _precomputed[(user_id, days)] = (time.time(), ready)
+    logger.info(f"📊 Разделы отчёта посчитаны заранее: {', '.join(ready) or 'нет'} ({timings} мс)")
+    return timings
+
+
+def _take_precomputed(user_id: int, days: int, max_age: float) -> Dict[str, Dict]:
+    entry = _precomputed.pop((user_id, days), None)
+    if not entry or time.time() - entry[0] > max_age:
+        return {}
+    return entry[1]
+
 
 async def generate_weekly_summary(user_id: int, days: int = 7) -> Dict:
     """
@@ -25,20 +130,35 @@ async def generate_weekly_summary(user_id: int, days: int = 7) -> Dict:
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
     
+    # Заранее посчитанные разделы берутся один раз, остальные — параллельно
+    ready = _take_precomputed(user_id, days, SUMMARY_PRECOMPUTE_MAX_AGE)
+    if ready:
+        summary_stats["precomputed_used"] += 1
+    missing = [name for name in SECTION_DEFAULTS if name not in ready]
+    sections, timings = await build_sections(user_id, days, missing)
+    
     summary = {
         "period": {
             "start": start_date.strftime("%d.%m.%Y"),
             "end": end_date.strftime("%d.%m.%Y"),
             "days": days
         },
-        "health": await _get_health_summary(user_id, days),
-        "calendar": await _get_calendar_summary(days),
-        "memories": await _get_memories_summary(user_id, days),
-        "ai_summary": None
+        **ready,
+        **sections,
+        "ai_summary": None,
+        "timings": timings,
+        "precomputed": sorted(ready)
     }
     
     # Генерируем AI-резюме
-    summary["ai_summary"] = await _generate_ai_summary(summary)
+    started = time.perf_counter()
+    try:
+        summary["ai_summary"] = await asyncio.wait_for(_generate_ai_summary(summary), timeout=SUMMARY_AI_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱ AI-резюме не уложилось в {SUMMARY_AI_TIMEOUT:g} сек")
+        summary["ai_summary"] = "Не удалось сгенерировать отчёт 😔"
+    timings["ai_summary"] = round((time.perf_counter() - started) * 1000, 1)
+    summary_stats["generated"] += 1
     
     return summary
 
@@ -47,14 +167,16 @@ async def _get_health_summary(user_id: int, days: int) -> Dict:
     """Получает сводку по здоровью"""
     try:
         start_date = datetime.now() - timedelta(days=days)
+        prev_start = start_date - timedelta(days=days)
         
-        response = supabase_client.table("health_records")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .gte("date", start_date.strftime('%Y-%m-%d'))\
-            .execute()
+        # Один запрос дневных агрегатов на оба периода (для тренда)
+        days_rollups = await rollups.get_range(user_id, prev_start.strftime('%Y-%m-%d'))
+        boundary = start_date.strftime('%Y-%m-%d')
+        current = [r for r in days_rollups if r.date >= boundary]
+        previous = [r for r in days_rollups if r.date < boundary]
         
-        if not response.data:
+        total = sum(r.health_records for r in current)
+        if not total:
             return {
                 "total_records": 0,
                 "confirmed": 0,
@@ -63,25 +185,15 @@ async def _get_health_summary(user_id: int, days: int) -> Dict:
                 "trend": "no_data"
             }
         
-        records = response.data
-        total = len(records)
-        confirmed = sum(1 for r in records if r.get("confirmed", True))
+        confirmed = sum(r.health_confirmed for r in current)
         missed = total - confirmed
         compliance_rate = round((confirmed / total * 100) if total > 0 else 0, 1)
         
         # Определяем тренд (сравниваем с предыдущим периодом)
-        prev_start = start_date - timedelta(days=days)
-        prev_response = supabase_client.table("health_records")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .gte("date", prev_start.strftime('%Y-%m-%d'))\
-            .lt("date", start_date.strftime('%Y-%m-%d'))\
-            .execute()
-        
-        if prev_response.data:
-            prev_total = len(prev_response.data)
-            prev_confirmed = sum(1 for r in prev_response.data if r.get("confirmed", True))
-            prev_compliance = round((prev_confirmed / prev_total * 100) if prev_total > 0 else 0, 1)
+        prev_total = sum(r.health_records for r in previous)
+        if prev_total:
+            prev_confirmed = sum(r.health_confirmed for r in previous)
+            prev_compliance = round(prev_confirmed / prev_total * 100, 1)
             
             if compliance_rate > prev_compliance:
                 trend = "improving"
@@ -141,10 +253,11 @@ async def _get_memories_summary(user_id: int, days: int) -> Dict:
     try:
         start_date = datetime.now() - timedelta(days=days)
         
-        response = supabase_client.table("memories")\
-            .select("id, content, metadata, created_at")\
-            .gte("created_at", start_date.isoformat())\
-            .execute()
+        # Вне event loop: иначе таймаут раздела не сработает
+        query = supabase_client.table("memories")\
+            .select("metadata")\
+            .gte("created_at", start_date.isoformat())
+        response = await asyncio.to_thread(query.execute)
         
         if not response.data:
             return {
@@ -157,7 +270,7 @@ async def _get_memories_summary(user_id: int, days: int) -> Dict:
         # Подсчитываем по категориям
         categories = {}
         for memory in memories:
-            metadata = memory.get("metadata", {})
+            metadata = memory.get("metadata") or {}
             source = metadata.get("source", "unknown")
             categories[source] = categories.get(source, 0) + 1
         
@@ -209,19 +322,22 @@ async def _generate_ai_summary(summary_data: Dict) -> str:
         return "Произошла ошибка при генерации отчёта 😔"
 
 
-async def send_weekly_summary(user_id: int, bot_client) -> bool:
+async def send_weekly_summary(user_id: int, bot_client, scheduled_at: Optional[datetime] = None) -> bool:
     """
     Отправляет еженедельный отчёт пользователю
     
     Args:
         user_id: ID пользователя
         bot_client: Telegram bot клиент
+        scheduled_at: Плановое время отправки (для задержки доставки)
     
     Returns:
         True если успешно отправлено
     """
+    started = time.perf_counter()
     try:
         summary = await generate_weekly_summary(user_id)
+        summary["timings"]["total"] = round((time.perf_counter() - started) * 1000, 1)
         
         # Форматируем сообщение
         message = f"""
@@ -240,7 +356,7 @@ async def send_weekly_summary(user_id: int, bot_client) -> bool:
 """
         
         await bot_client.send_message(user_id, message)
-        logger.info(f"📊 Weekly summary sent to user {user_id}")
+        _record_delivery(user_id, summary, scheduled_at)
         return True
         
     except Exception as e:
@@ -248,28 +364,151 @@ async def send_weekly_summary(user_id: int, bot_client) -> bool:
         return False
 
 
-async def start_weekly_summary_scheduler(bot_client, user_id: int):
+def _record_delivery(user_id: int, summary: Dict, scheduled_at: Optional[datetime]):
+    now = datetime.now(MOSCOW_TZ)
+    delay = (now - scheduled_at).total_seconds() if scheduled_at else None
+    summary_stats["last_delivery"] = {
+        "user_id": user_id,
+        "delivered_at": now.isoformat(),
+        "scheduled_at": scheduled_at.isoformat() if scheduled_at else None,
+        "delay_sec": round(delay, 1) if delay is not None else None,
+        "timings_ms": summary.get("timings", {}),
+        "precomputed": summary.get("precomputed", []),
+    }
+    logger.info(
+        f"📊 Weekly summary sent to user {user_id}: {summary['timings'].get('total', 0):.0f} мс"
+        + (f", задержка {delay:.0f} сек" if delay is not None else "")
+        + f", разделы {summary['timings']}"
+    )
+
+
+def get_summary_stats() -> Dict:
+    return {**summary_stats, "precomputed_pending": len(_precomputed)}
+
+
+def next_occurrence(now: datetime, weekday: int, hour: int) -> datetime:
+    """Ближайшее (weekday, hour:00) не раньше now"""
+    candidate = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    candidate += timedelta(days=(weekday - now.weekday()) % 7)
+    if candidate < now:
+        candidate += timedelta(days=7)
+    return candidate
+
+
+def due_delivery(now: datetime, last_sent: Optional[datetime], catchup_hours: float = SUMMARY_CATCHUP_HOURS) -> Optional[datetime]:
+    """Плановое время отчёта, который пора отправить (или None)"""
+    # Последнее плановое время не позже now
+    scheduled = next_occurrence(now, SUMMARY_WEEKDAY, SUMMARY_HOUR)
+    if scheduled > now:
+        scheduled -= timedelta(days=7)
+    if last_sent and last_sent >= scheduled:
+        return None
+    if now - scheduled > timedelta(hours=catchup_hours):
+        return None
+    return scheduled
+
+
+def _load_last_sent(path: Optional[str]) -> Optional[datetime]:
+    """Плановое время последнего отправленного отчёта из файла состояния"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return datetime.fromisoformat(json.load(f)["last_sent"])
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось загрузить состояние отчёта: {e}")
+        return None
+
+
+def _save_last_sent(path: Optional[str], scheduled: datetime):
+    """Сохраняет состояние (атомарно через временный файл)"""
+    if not path:
+        return
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_sent": scheduled.isoformat(), "last_delivery": summary_stats["last_delivery"]},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось сохранить состояние отчёта: {e}")
+
+
+# Планировщик не опрашивает чаще, но и не спит дольше (смена времени, сон ОС)
+SCHEDULER_MAX_SLEEP = 900
+
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+async def _scheduler_loop(bot_client, user_id: int, days: int = 7, state_path: Optional[str] = SUMMARY_STATE_PATH):
+    last_sent = _load_last_sent(state_path)
+    last_precompute: Optional[datetime] = None
+
+    while True:
+        try:
+            now = datetime.now(MOSCOW_TZ)
+
+            # Доставка отчёта (SUMMARY_WEEKDAY, SUMMARY_HOUR:00)
+            scheduled = due_delivery(now, last_sent)
+            if scheduled:
+                if await send_weekly_summary(user_id, bot_client, scheduled_at=scheduled):
+                    last_sent = scheduled
+                    _save_last_sent(state_path, scheduled)
+                else:
+                    # Повтор на следующем пробуждении (в пределах окна досылки)
+                    await asyncio.sleep(300)
+                    continue
+
+            # Предрасчёт тяжёлых разделов в день отправки
+            precompute_at = next_occurrence(now, SUMMARY_WEEKDAY, SUMMARY_PRECOMPUTE_HOUR)
+            if precompute_at > now:
+                precompute_at -= timedelta(days=7)
+            delivery_at = next_occurrence(now, SUMMARY_WEEKDAY, SUMMARY_HOUR)
+            fresh_at_delivery = (delivery_at - now).total_seconds() <= SUMMARY_PRECOMPUTE_MAX_AGE
+            if precompute_at <= now and fresh_at_delivery and last_precompute != precompute_at:
+                await precompute_sections(user_id, days)
+                last_precompute = precompute_at
+
+            now = datetime.now(MOSCOW_TZ)
+            upcoming = min(
+                next_occurrence(now + timedelta(seconds=1), SUMMARY_WEEKDAY, SUMMARY_HOUR),
+                next_occurrence(now + timedelta(seconds=1), SUMMARY_WEEKDAY, SUMMARY_PRECOMPUTE_HOUR),
+            )
+            await asyncio.sleep(min(max((upcoming - now).total_seconds(), 1), SCHEDULER_MAX_SLEEP))
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in weekly summary scheduler: {e}")
+            await asyncio.sleep(300)
+
+
+def start_weekly_summary_scheduler(bot_client, user_id: int) -> asyncio.Task:
     """
-    Запускает планировщик еженедельных отчётов
+    Запускает планировщик еженедельных отчётов (повторный вызов не создаёт вторую задачу)
     
     Args:
         bot_client: Telegram bot клиент
         user_id: ID пользователя
     """
-    import asyncio
-    
-    while True:
+    global _scheduler_task
+    if _scheduler_task is None or _scheduler_task.done():
+        _scheduler_task = asyncio.create_task(_scheduler_loop(bot_client, user_id))
+        now = datetime.now(MOSCOW_TZ)
+        logger.info(f"📊 Еженедельный отчёт: следующий {next_occurrence(now, SUMMARY_WEEKDAY, SUMMARY_HOUR):%d.%m %H:%M}")
+    return _scheduler_task
+
+
+async def stop_weekly_summary_scheduler():
+    """Останавливает планировщик еженедельных отчётов"""
+    global _scheduler_task
+    task, _scheduler_task = _scheduler_task, None
+    if task and not task.done():
+        task.cancel()
         try:
-            # Отправляем отчёт каждое воскресенье в 10:00
-            now = datetime.now(timezone(timedelta(hours=3)))
-            
-            # Если воскресенье и 10:00
-            if now.weekday() == 6 and now.hour == 10 and now.minute == 0:
-                await send_weekly_summary(user_id, bot_client)
-            
-            # Проверяем каждый час
-            await asyncio.sleep(3600)
-            
-        except Exception as e:
-            logger.error(f"Error in weekly summary scheduler: {e}")
-            await asyncio.sleep(3600)
+            await task
+        except asyncio.CancelledError:
+            pass
@@ -10,6 +10,7 @@ from enum import Enum
 
 from brains.clients import supabase_client
 from brains.supabase_retry import safe_supabase_insert, safe_supabase_select, safe_supabase_update
+from brains.rollups import rollups
 
 logger = logging.getLogger(__name__)
 
@@ -424,6 +425,7 @@ async def create_daily_goals(
         ).execute()
 
         if response.data:
+            await rollups.set_goals(user_id, goal_date.isoformat(), len(goals), 0)
             logger.info(f"✅ Цели на {goal_date} созданы/обновлены")
             return DailyGoals.from_dict(response.data[0])
     except Exception as e:
@@ -464,6 +466,7 @@ async def update_daily_goal_completion(
     )
 
     if result and result.data:
+        await rollups.set_goals(user_id, goal_date.isoformat(), len(daily.goals), sum(1 for c in daily.completed if c))
         logger.info(f"✅ Цель {goal_index + 1} отмечена как {'выполненная' if completed else 'невыполненная'}")
         return DailyGoals.from_dict(result.data[0])
     
@@ -567,21 +570,11 @@ async def get_weekly_completion(user_id: int, days: int = 7) -> float:
     try:
         cutoff = date.today() - timedelta(days=days)
         
-        response = supabase_client.table("daily_goals")\
-            .select("goals, completed")\
-            .eq("user_id", user_id)\
-            .gte("date", cutoff.isoformat())\
-            .execute()
-
-        if response.data:
-            total_goals = 0
-            total_completed = 0
-            
-            for row in response.data:
-                goals = row.get("goals", [])
-                completed = row.get("completed", [])
-                total_goals += len(goals)
-                total_completed += sum(1 for c in completed if c)
+        # Дневные агрегаты вместо массивов целей за каждый день
+        days_rollups = await rollups.get_range(user_id, cutoff.isoformat())
+        if days_rollups:
+            total_goals = sum(r.goals_total for r in days_rollups)
+            total_completed = sum(r.goals_completed for r in days_rollups)
             
             if total_goals > 0:
                 return round(total_completed * 100 / total_goals, 2)
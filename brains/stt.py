@@ -1,7 +1,30 @@
+"""
+Распознавание голосовых сообщений (STT) для Karina AI
+
+Бэкенды перебираются в порядке STT_BACKENDS, пока один не вернёт текст:
+- local  — faster-whisper в процессе-воркере (brains.stt_local), без сети
+- remote — Whisper large-v3 через Hugging Face Inference
+
+Перед отправкой на удалённый бэкенд тишина в начале и конце голосового
+обрезается (локальный вырезает её сам встроенным VAD). Каждый бэкенд
+ограничен своим таймаутом: холодный старт HF не держит ответ бесконечно.
+"""
 import httpx
+import io
 import logging
 import os
 import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from brains.circuit_breaker import breaker_registry, HF_STT
+from brains.clients import http_clients, HUGGINGFACE
+from brains.config import STT_BACKENDS, STT_LOCAL_TIMEOUT, STT_REMOTE_TIMEOUT
+from brains.stt_local import local_whisper
 
 logger = logging.getLogger(__name__)
 
@@ -10,39 +33,321 @@ HF_TOKEN = os.environ.get('HF_TOKEN')
 MODEL_ID = "openai/whisper-large-v3"
 API_URL = f"https://router.huggingface.co/hf-inference/models/{MODEL_ID}"
 
-async def transcribe_voice(file_path: str) -> str:
-    """Транскрибирует голосовое сообщение через Hugging Face"""
-    if not HF_TOKEN:
-        logger.error("HF_TOKEN не установлен!")
+# Больше этого голосовые не скачиваем и не отправляем
+MAX_VOICE_SIZE_MB = 20
+
+stt_breaker = breaker_registry.get(HF_STT)
+stt_retry_budget = breaker_registry.budget(HF_STT)
+
+
+# ============================================================================
+# ОБРЕЗКА ТИШИНЫ
+# ============================================================================
+
+# Кадр анализа энергии и запас вокруг речи, сек
+VAD_FRAME = 0.02
+VAD_PADDING = 0.2
+# Кадр считается речью, если громче пика минус VAD_THRESHOLD_DB
+VAD_THRESHOLD_DB = 35
+# Абсолютный порог: ниже него — тишина даже в тихой записи
+VAD_FLOOR = 1e-3
+# Перекодируем только если срезали хотя бы столько, сек
+MIN_TRIM_SECONDS = 0.5
+# Частоты, которые поддерживает Opus
+_OPUS_RATES = {8000, 12000, 16000, 24000, 48000}
+
+
+def speech_bounds(audio: np.ndarray, sample_rate: int) -> Optional[tuple]:
+    """
+    Границы речи по энергии кадров (моно float32)
+
+    Returns:
+        (начало, конец) в сэмплах или None, если речи нет
+    """
+    frame = max(1, int(sample_rate * VAD_FRAME))
+    count = len(audio) // frame
+    if count == 0:
+        return None
+
+    frames = audio[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    peak = float(rms.max())
+    if peak < VAD_FLOOR:
         return None
 
-    # Явно указываем Content-Type для бинарных данных
-    headers = {
-        "Authorization": f"Bearer {HF_TOKEN}",
-        "Content-Type": "audio/ogg"
-    }
-    
+    threshold = max(VAD_FLOOR, peak * 10 ** (-VAD_THRESHOLD_DB / 20))
+    voiced = np.flatnonzero(rms > threshold)
+    padding = int(sample_rate * VAD_PADDING)
+    start = max(0, int(voiced[0]) * frame - padding)
+    end = min(len(audio), (int(voiced[-1]) + 1) * frame + padding)
+    return start, end
+
+
+def trim_silence(data: bytes) -> Optional[bytes]:
+    """
+    Обрезает тишину в начале и конце голосового (OGG Opus)
+
+    Returns:
+        Обрезанное аудио, исходное (если резать нечего или формат не читается)
+        или None, если в записи нет речи
+    """
     try:
-        with open(file_path, "rb") as f:
-            data = f.read()
+        import soundfile as sf
+        audio, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except Exception:
+        return data
+
+    mono = audio.mean(axis=1)
+    bounds = speech_bounds(mono, sample_rate)
+    if bounds is None:
+        return None
+
+    start, end = bounds
+    if (len(mono) - (end - start)) / sample_rate < MIN_TRIM_SECONDS or sample_rate not in _OPUS_RATES:
+        return data
+
+    buffer = io.BytesIO()
+    try:
+        sf.write(buffer, audio[start:end], sample_rate, format="OGG", subtype="OPUS")
+    except Exception:
+        return data
+    logger.debug(f"🎙 STT: тишина обрезана, {len(mono) / sample_rate:.1f} → {(end - start) / sample_rate:.1f} сек")
+    return buffer.getvalue()
+
+
+# ============================================================================
+# БЭКЕНДЫ
+# ============================================================================
+
+class STTBackend(ABC):
+    """Базовый класс бэкенда распознавания"""
+
+    name: str = "base"
+    timeout: float = 30.0
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        """Текст или None, если распознать не удалось"""
+        pass
+
+    def on_timeout(self):
+        """Вызывается роутером, когда бэкенд не ответил за timeout"""
+        pass
+
+
+class LocalWhisperSTT(STTBackend):
+    """faster-whisper в процессе-воркере"""
+
+    name = "local"
+
+    def __init__(self, engine=local_whisper, timeout: float = STT_LOCAL_TIMEOUT):
+        self.engine = engine
+        self.timeout = timeout
+
+    @property
+    def available(self) -> bool:
+        return self.engine.available
+
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        text, speech, elapsed = await self.engine.transcribe(audio)
+        logger.info(f"🎙 Локальный STT: {speech:.1f} сек речи за {elapsed:.1f} сек")
+        return text or None
+
+    def on_timeout(self):
+        # Задача в воркере продолжает работать — без перезапуска следующие ждали бы за ней
+        self.engine.disable(f"нет ответа за {self.timeout:.0f} сек")
+
+
+class HuggingFaceSTT(STTBackend):
+    """Whisper large-v3 через Hugging Face Inference"""
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+    name = "remote"
+
+    def __init__(self, timeout: float = STT_REMOTE_TIMEOUT):
+        self.timeout = timeout
+
+    @property
+    def available(self) -> bool:
+        return bool(HF_TOKEN)
+
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        if not stt_breaker.allow_request():
+            logger.warning("⚠️ HF STT Circuit Breaker открыт. Запрос отклонён.")
+            return None
+
+        # Проба half-open, не сообщившая результат (нет речи, отмена по таймауту
+        # роутера), освобождается на любом выходе
+        try:
+            return await self._request(audio)
+        finally:
+            stt_breaker.release_probe()
+
+    async def _request(self, audio: bytes) -> Optional[str]:
+        data = await asyncio.to_thread(trim_silence, audio)
+        if data is None:
+            logger.info("🎙 STT: в голосовом нет речи")
+            return None
+        stt_retry_budget.record_request()
+
+        # Явно указываем Content-Type для бинарных данных
+        headers = {
+            "Authorization": f"Bearer {HF_TOKEN}",
+            "Content-Type": "audio/ogg"
+        }
+
+        try:
+            client = http_clients.get(HUGGINGFACE)
             for attempt in range(3):
                 response = await client.post(API_URL, headers=headers, content=data)
-                
+
                 if response.status_code == 200:
+                    stt_breaker.record_success()
                     result = response.json()
                     if isinstance(result, list) and len(result) > 0:
                         return result[0].get('text')
                     return result.get('text')
-                
+
                 elif response.status_code == 503:
-                    logger.info("Модель HF загружается, ждем 10с...")
-                    await asyncio.sleep(10)
+                    # Модель загружается (cold start) — HF подсказывает сколько ждать
+                    try:
+                        estimated = float(response.json().get("estimated_time"))
+                    except Exception:
+                        estimated = None
+                    delay = stt_retry_budget.next_delay(attempt, estimated)
+                    if delay is None:
+                        logger.warning("⚠️ HF STT: бюджет повторов исчерпан")
+                        stt_breaker.record_failure()
+                        break
+                    logger.info(f"Модель HF загружается, ждем {delay:.0f}с...")
+                    await asyncio.sleep(delay)
                 else:
                     logger.error(f"Ошибка HF API: {response.status_code} - {response.text[:100]}")
+                    if response.status_code >= 500:
+                        stt_breaker.record_failure()
+                    else:
+                        stt_breaker.record_success()
                     break
-    except Exception as e:
-        logger.error(f"Ошибка при транскрибации через Hugging Face: {e}")
-    
-    return None
+            else:
+                # Модель так и не загрузилась
+                stt_breaker.record_failure()
+        except httpx.RequestError as e:
+            logger.error(f"Ошибка при транскрибации через Hugging Face: {e}")
+            stt_breaker.record_failure()
+
+        return None
+
+
+# ============================================================================
+# ВЫБОР БЭКЕНДА
+# ============================================================================
+
+class STTRouter:
+    """
+    Перебирает бэкенды в заданном порядке
+
+    Бэкенд, который недоступен (нет faster-whisper, нет HF_TOKEN), пропускается.
+    Ошибка или таймаут бэкенда — переход к следующему.
+    """
+
+    def __init__(self, backends: List[STTBackend]):
+        self.backends = backends
+        self.stats: Dict[str, Dict] = {
+            b.name: {"ok": 0, "failed": 0, "timeouts": 0, "latency": deque(maxlen=100)}
+            for b in backends
+        }
+
+    @property
+    def active(self) -> List[STTBackend]:
+        return [b for b in self.backends if b.available]
+
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        active = self.active
+        if not active:
+            logger.error("❌ Нет доступных бэкендов STT (проверьте STT_BACKENDS и HF_TOKEN)")
+            return None
+
+        for backend in active:
+            stats = self.stats[backend.name]
+            started = time.time()
+            try:
+                text = await asyncio.wait_for(backend.transcribe(audio), timeout=backend.timeout)
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                logger.warning(f"⚠️ STT {backend.name}: нет ответа за {backend.timeout:.0f} сек")
+                backend.on_timeout()
+                continue
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error(f"❌ STT {backend.name}: {e}")
+                continue
+
+            if text and text.strip():
+                stats["ok"] += 1
+                stats["latency"].append(time.time() - started)
+                return text.strip()
+            stats["failed"] += 1
+
+        return None
+
+    def get_stats(self) -> Dict:
+        result = {}
+        for backend in self.backends:
+            stats = self.stats[backend.name]
+            latency = sorted(stats["latency"])
+            result[backend.name] = {
+                "available": backend.available,
+                "ok": stats["ok"],
+                "failed": stats["failed"],
+                "timeouts": stats["timeouts"],
+                "latency_p50": latency[len(latency) // 2] if latency else 0.0,
+            }
+        return result
+
+
+BACKENDS = {
+    "local": LocalWhisperSTT,
+    "remote": HuggingFaceSTT,
+}
+
+
+def build_router(order: str = STT_BACKENDS) -> STTRouter:
+    """Роутер по строке вида 'local,remote'"""
+    backends = []
+    for name in (n.strip().lower() for n in order.split(",")):
+        if not name:
+            continue
+        if name not in BACKENDS:
+            logger.warning(f"⚠️ Неизвестный бэкенд STT: {name}")
+            continue
+        if name not in (b.name for b in backends):
+            backends.append(BACKENDS[name]())
+    return STTRouter(backends)
+
+
+# Глобальный роутер
+stt_router = build_router()
+
+
+async def start_stt():
+    """Поднимает локальный движок, если он в списке бэкендов"""
+    if any(b.name == "local" and b.available for b in stt_router.backends):
+        await local_whisper.start()
+
+
+async def transcribe_voice(file_path: Union[str, bytes]) -> Optional[str]:
+    """Транскрибирует голосовое сообщение (путь к файлу или байты OGG)"""
+    try:
+        if isinstance(file_path, (bytes, bytearray)):
+            data = bytes(file_path)
+        else:
+            with open(file_path, "rb") as f:
+                data = f.read()
+    except OSError as e:
+        logger.error(f"Ошибка чтения голосового: {e}")
+        return None
+
+    return await stt_router.transcribe(data)
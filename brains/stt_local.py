@@ -0,0 +1,197 @@
+"""
+Локальное распознавание речи (faster-whisper) в отдельном процессе
+
+Whisper на CPU занимает ядро на секунды — на event loop это замораживает
+все чаты, поэтому модель живёт в процессе-воркере:
+- модель (квантованная int8) загружается при старте воркера
+- потоки CTranslate2 ограничены STT_LOCAL_THREADS
+- тишина и паузы вырезаются встроенным VAD (Silero) до распознавания
+- таймаут или сбой воркера (в том числе загрузки модели) гасят процесс
+  вместе с зависшей задачей и выключают локальный STT на
+  STT_LOCAL_COOLDOWN секунд; по его истечении пул поднимается заново
+
+Зависимость опциональная: pip install faster-whisper
+"""
+import asyncio
+import importlib.util
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from brains.config import (
+    STT_LOCAL_MODEL, STT_LOCAL_COMPUTE_TYPE, STT_LOCAL_THREADS, STT_LOCAL_COOLDOWN, STT_LANGUAGE
+)
+from brains.process_pool import spawn_pool
+
+logger = logging.getLogger(__name__)
+
+FASTER_WHISPER_AVAILABLE = importlib.util.find_spec("faster_whisper") is not None
+
+# Куда faster-whisper скачивает модели
+MODEL_CACHE_DIR = "temp/stt_models"
+
+
+# ============================================================================
+# КОД ВОРКЕРА (выполняется в дочернем процессе)
+# ============================================================================
+
+_worker_model = None
+
+
+def _worker_init(model_name: str, compute_type: str, threads: int):
+    """Инициализация воркера: загрузка модели"""
+    global _worker_model
+    logging.basicConfig(level=logging.INFO)
+    from faster_whisper import WhisperModel
+
+    _worker_model = WhisperModel(
+        model_name,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=max(1, threads),
+        num_workers=1,
+        download_root=MODEL_CACHE_DIR,
+    )
+
+
+def _worker_ping() -> int:
+    """Пустая задача — заставляет пул поднять воркер"""
+    return os.getpid()
+
+
+def _worker_transcribe(audio: bytes, language: Optional[str]) -> Tuple[str, float, float]:
+    """
+    Распознавание в воркере
+
+    Returns:
+        (текст, длительность речи после VAD, время распознавания) — в секундах
+    """
+    started_at = time.time()
+    segments, info = _worker_model.transcribe(
+        io.BytesIO(audio),
+        language=language or None,
+        beam_size=1,
+        vad_filter=True,
+        vad_parameters={"min_silence_duration_ms": 500},
+        condition_on_previous_text=False,
+    )
+    text = " ".join(segment.text.strip() for segment in segments).strip()
+    speech = getattr(info, "duration_after_vad", None) or info.duration
+    return text, speech, time.time() - started_at
+
+
+# ============================================================================
+# ПУЛ
+# ============================================================================
+
+class LocalWhisperEngine:
+    """
+    Локальный Whisper в одном процессе-воркере
+
+    Использование:
+        await local_whisper.start()
+        text = await local_whisper.transcribe(ogg_bytes)
+        await local_whisper.shutdown()
+    """
+
+    def __init__(
+        self,
+        model_name: str = STT_LOCAL_MODEL,
+        compute_type: str = STT_LOCAL_COMPUTE_TYPE,
+        threads: int = STT_LOCAL_THREADS,
+        language: str = STT_LANGUAGE,
+        cooldown: float = STT_LOCAL_COOLDOWN
+    ):
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.threads = threads
+        self.language = language
+        self.cooldown = cooldown
+        self.unavailable_until = 0.0
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restart_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def available(self) -> bool:
+        return FASTER_WHISPER_AVAILABLE and time.monotonic() >= self.unavailable_until
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn без повторного импорта main.py в воркере
+            self._executor = spawn_pool(1, _worker_init, (self.model_name, self.compute_type, self.threads))
+        return self._executor
+
+    async def start(self):
+        """Поднимает воркер и загружает модель"""
+        if not self.available:
+            return
+        started = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._get_executor(), _worker_ping)
+            logger.info(
+                f"🎙 Локальный STT запущен: whisper {self.model_name} "
+                f"({self.compute_type}, {time.time() - started:.1f} сек)"
+            )
+        except Exception as e:
+            self.disable(f"не запустился: {e}")
+
+    async def transcribe(self, audio: bytes) -> Tuple[str, float, float]:
+        """
+        Распознаёт аудио вне event loop
+
+        Returns:
+            (текст, длительность речи, время распознавания)
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(), _worker_transcribe, audio, self.language
+            )
+        except BrokenProcessPool:
+            # Воркер упал (например, OOM или модель не загрузилась)
+            self.disable("воркер сломан")
+            raise
+
+    def disable(self, reason: str):
+        """
+        Гасит воркер вместе с текущей задачей и выключает локальный STT
+        на cooldown секунд, затем пул поднимается заново
+        """
+        self.unavailable_until = time.monotonic() + self.cooldown
+        self.restarts += 1
+        logger.error(f"❌ Локальный STT отключён на {self.cooldown:.0f} сек: {reason}")
+        self._reset()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._restart_handle:
+            self._restart_handle.cancel()
+        self._restart_handle = loop.call_later(self.cooldown, lambda: asyncio.ensure_future(self.start()))
+
+    def _reset(self):
+        executor, self._executor = self._executor, None
+        if executor:
+            # shutdown() не прерывает выполняющуюся задачу — завис воркер, гасим процесс
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def shutdown(self):
+        if self._restart_handle:
+            self._restart_handle.cancel()
+            self._restart_handle = None
+        executor, self._executor = self._executor, None
+        if executor:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+            logger.info("🎙 Локальный STT остановлен")
+
+
+# Глобальный движок
+local_whisper = LocalWhisperEngine()
@@ -8,17 +8,25 @@ https://github.com/snakers4/silero-models
 Особенности:
 - Женские голоса (Ксения, Елена, Ирина, Наталья)
 - Оффлайн работа (не нужен API)
-- Быстрый синтез (~1-2 сек на фразу)
-- Формат: OGG Vorbis (совместим с Telegram)
+- Быстрый синтез (~1-2 сек на фразу) в пуле процессов (brains.tts_pool)
+- Формат: OGG Opus (голосовые Telegram), кодирование в памяти
 """
+import io
+import time
+import asyncio
 import logging
-import os
 import re
+import subprocess
+import wave
 import numpy as np
 from pathlib import Path
-from typing import Optional, Dict, List
+from collections import deque
+from typing import AsyncIterator, Optional, Dict, List
 from datetime import datetime, timezone
 
+from brains.tts_pool import tts_pool
+from brains.tts_cache import tts_cache
+
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -68,6 +76,78 @@ AVAILABLE_VOICES = {
 DEFAULT_VOICE = "v3_1_ru"
 SAMPLE_RATE = 48000  # Частота дискретизации
 MAX_TEXT_LENGTH = 500  # Максимум символов в сообщении
+MAX_STREAM_TEXT_LENGTH = 3000  # Максимум символов при синтезе по предложениям
+MAX_CHUNK_LENGTH = 250  # Максимум символов в одном фрагменте
+
+# ============================================================================
+# КОДИРОВАНИЕ АУДИО
+# ============================================================================
+
+# Битрейт Opus для голосовых (речь, моно)
+OPUS_BITRATE = "32k"
+
+SOUNDFILE_OPUS = False
+try:
+    import soundfile
+    SOUNDFILE_OPUS = "OPUS" in soundfile.available_subtypes("OGG")
+except (ImportError, OSError):
+    soundfile = None
+
+
+def to_pcm16(audio_tensor) -> np.ndarray:
+    """
+    Нормализует громкость и переводит сигнал в int16
+    
+    Пик ищется двумя редукциями (без временного массива np.abs),
+    масштабирование выполняется на месте.
+    """
+    if hasattr(audio_tensor, 'cpu'):
+        audio_tensor = audio_tensor.detach().cpu().numpy()
+    audio = np.array(audio_tensor, dtype=np.float32, copy=True)
+    
+    if audio.size == 0:
+        return audio.astype(np.int16)
+    
+    peak = max(float(audio.max()), -float(audio.min()))
+    if peak > 0:
+        np.multiply(audio, 32767.0 / peak, out=audio)
+    return audio.astype(np.int16)
+
+
+def encode_wav(pcm: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """int16 моно → WAV в памяти"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(pcm, dtype="<i2").tobytes())
+    return buffer.getvalue()
+
+
+def encode_ogg_opus(pcm: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    int16 моно → OGG Opus в памяти
+    
+    Основной путь — libsndfile (soundfile) прямо в BytesIO, без диска и
+    дочерних процессов. Если libsndfile собран без Opus — ffmpeg через
+    stdin/stdout (тоже без временных файлов).
+    """
+    if SOUNDFILE_OPUS:
+        buffer = io.BytesIO()
+        soundfile.write(buffer, pcm, sample_rate, format="OGG", subtype="OPUS")
+        return buffer.getvalue()
+    
+    result = subprocess.run(
+        [
+            'ffmpeg', '-loglevel', 'error', '-f', 's16le', '-ar', str(sample_rate), '-ac', '1',
+            '-i', 'pipe:0', '-c:a', 'libopus', '-b:a', OPUS_BITRATE, '-f', 'ogg', 'pipe:1'
+        ],
+        input=np.ascontiguousarray(pcm, dtype="<i2").tobytes(),
+        capture_output=True, check=True, timeout=30
+    )
+    return result.stdout
+
 
 # ============================================================================
 # МОДЕЛЬ TTS
@@ -134,6 +214,9 @@ class KarinaTTS:
     ) -> bytes:
         """
         Конвертирует текст в аудио (Silero v3)
+        
+        Синтез выполняется в пуле процессов (brains.tts_pool) и не блокирует
+        event loop. При переполненной очереди — TTSOverloadedError.
         """
         # Очистка текста
         text = self._clean_text(text)
@@ -144,28 +227,9 @@ class KarinaTTS:
         # Выбор голоса
         target_voice = voice or self.voice
         
-        # Проверка/загрузка модели
-        if self._model is None or target_voice != self._model.get('speaker'):
-            logger.info(f"🔄 Смена голоса на {target_voice}")
-            if self._model:
-                del self._model
-            self._load_model()
-            self.voice = target_voice
-        
         try:
             logger.debug(f"🎤 Генерация аудио (длина: {len(text)} симв.)...")
-            
-            # Silero v5 API
-            model = self._model['model']
-            sample_rate = self._model['sample_rate']
-            
-            # v5: используем apply_text с параметрами
-            # model.apply_text(text, speaker, sample_rate, put_accent_on)
-            audio = model.apply_text(text, speaker=self.voice, sample_rate=sample_rate)
-            
-            # Конвертация в bytes
-            audio_bytes = self._convert_to_bytes(audio, sample_rate, format)
-            
+            audio_bytes = await synthesize_cached(text, target_voice, format)
             logger.info(f"✅ Аудио сгенерировано ({len(audio_bytes)} байт)")
             return audio_bytes
             
@@ -173,12 +237,82 @@ class KarinaTTS:
             logger.error(f"❌ Ошибка генерации аудио: {e}")
             raise
     
-    def _clean_text(self, text: str) -> str:
+    async def stream_speech(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        format: str = "ogg"
+    ) -> AsyncIterator[bytes]:
+        """
+        Синтезирует длинный текст по предложениям
+        
+        Фрагменты синтезируются параллельно в пуле, а отдаются по порядку:
+        первый — как только готов, не дожидаясь остальных.
+        
+        Пример:
+            async for audio in tts_engine.stream_speech(answer):
+                await send_voice_note(client, chat_id, audio)
+        """
+        text = self._clean_text(text, max_length=MAX_STREAM_TEXT_LENGTH)
+        if not text:
+            raise ValueError("Пустой текст для синтеза")
+        
+        target_voice = voice or self.voice
+        chunks = split_sentences(text)
+        # Не забиваем очередь пула одним ответом: впереди не больше prefetch задач
+        prefetch = max(1, tts_pool.workers) + 1
+        started = time.monotonic()
+        pending: deque = deque()
+        next_chunk = 0
+        
+        def schedule():
+            nonlocal next_chunk
+            while next_chunk < len(chunks) and len(pending) < prefetch:
+                pending.append(asyncio.create_task(
+                    synthesize_cached(chunks[next_chunk], target_voice, format)
+                ))
+                next_chunk += 1
+        
+        try:
+            schedule()
+            index = 0
+            while pending:
+                audio = await pending.popleft()
+                if index == 0:
+                    first_audio = time.monotonic() - started
+                    tts_pool.metrics.record_first_audio(first_audio)
+                    logger.info(f"🎤 Первый фрагмент за {first_audio:.2f} сек (всего {len(chunks)})")
+                index += 1
+                schedule()
+                yield audio
+        finally:
+            # Генератор закрыт раньше времени — отменяем оставшиеся фрагменты
+            for task in pending:
+                task.cancel()
+    
+    def synthesize(self, text: str, format: str = "ogg") -> bytes:
+        """
+        Синхронный синтез уже очищенного текста (блокирует поток)
+        
+        Вызывается из воркера пула, модель голоса загружается один раз.
+        """
+        # Silero v5 API
+        model = self.model
+        sample_rate = self._model['sample_rate']
+        
+        # v5: используем apply_text с параметрами
+        # model.apply_text(text, speaker, sample_rate, put_accent_on)
+        audio = model.apply_text(text, speaker=self.voice, sample_rate=sample_rate)
+        
+        # Конвертация в bytes
+        return self._convert_to_bytes(audio, sample_rate, format)
+    
+    def _clean_text(self, text: str, max_length: int = MAX_TEXT_LENGTH) -> str:
         """
         Очищает текст для синтеза
         
         - Удаляет эмодзи
-        - Сокращает до MAX_TEXT_LENGTH
+        - Сокращает до max_length
         - Убирает лишние пробелы
         """
         # Удаляем эмодзи (простой regex)
@@ -202,8 +336,8 @@ class KarinaTTS:
         text = re.sub(r'`(.+?)`', r'\1', text)        # `code`
         
         # Сокращаем
-        if len(text) > MAX_TEXT_LENGTH:
-            text = text[:MAX_TEXT_LENGTH-3] + "..."
+        if len(text) > max_length:
+            text = text[:max_length-3] + "..."
         
         # Убираем лишние пробелы
         text = ' '.join(text.split())
@@ -211,71 +345,24 @@ class KarinaTTS:
         return text.strip()
     
     def _convert_to_bytes(self, audio_tensor, sample_rate: int = 48000, format: str = "ogg") -> bytes:
-        """Конвертирует numpy/tensor array в bytes"""
-        try:
-            import numpy as np
-            from scipy.io.wavfile import write as write_wav
-            import subprocess
-            import tempfile
-            
-            # Конвертируем tensor в numpy array
-            if hasattr(audio_tensor, 'cpu'):
-                audio = audio_tensor.cpu().numpy()
-            else:
-                audio = np.array(audio_tensor)
-            
-            # Нормализуем аудио (конвертируем в int16)
-            audio = np.int16(audio / np.max(np.abs(audio)) * 32767)
-            
-            if format == "ogg":
-                # Telegram предпочитает OGG Vorbis
-                # Используем ffmpeg для конвертации
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as wav_file:
-                    wav_path = wav_file.name
-                
-                write_wav(wav_path, sample_rate, audio)
-                
-                # Конвертируем в OGG через ffmpeg
-                ogg_path = wav_path.replace(".wav", ".ogg")
-                
-                try:
-                    subprocess.run([
-                        'ffmpeg', '-i', wav_path, '-c:a', 'libvorbis',
-                        '-qscale:a', '5', '-y', ogg_path
-                    ], check=True, capture_output=True, timeout=30)
-                    
-                    with open(ogg_path, 'rb') as f:
-                        audio_bytes = f.read()
-                    
-                    # Cleanup
-                    os.unlink(wav_path)
-                    os.unlink(ogg_path)
-                    
-                    return audio_bytes
-                    
-                except subprocess.CalledProcessError as e:
-                    logger.error(f"FFmpeg error: {e.stderr.decode()}")
-                    # Fallback to WAV если ffmpeg не доступен
-                    os.unlink(wav_path)
-                    return self._to_wav_bytes(audio, sample_rate)
-                    
-            else:
-                # WAV формат
+        """Конвертирует numpy/tensor array в bytes (в памяти, без временных файлов)"""
+        audio = to_pcm16(audio_tensor)
+        
+        if format == "ogg":
+            # Telegram предпочитает OGG Opus для голосовых
+            try:
+                return encode_ogg_opus(audio, sample_rate)
+            except Exception as e:
+                logger.error(f"Ошибка кодирования OGG Opus: {e}")
+                # Fallback to WAV если кодировщик не доступен
                 return self._to_wav_bytes(audio, sample_rate)
-                
-        except ImportError as e:
-            logger.error(f"Missing dependency: {e}")
-            raise
+        
+        # WAV формат
+        return self._to_wav_bytes(audio, sample_rate)
     
     def _to_wav_bytes(self, audio: 'np.ndarray', sample_rate: int = 48000) -> bytes:
-        """Конвертирует numpy array в WAV bytes"""
-        from scipy.io.wavfile import write as write_wav
-        import io
-        
-        buffer = io.BytesIO()
-        write_wav(buffer, sample_rate, audio)
-        buffer.seek(0)
-        return buffer.read()
+        """Конвертирует int16 array в WAV bytes"""
+        return encode_wav(audio, sample_rate)
     
     def change_voice(self, voice: str) -> bool:
         """
@@ -348,6 +435,78 @@ async def text_to_speech(
     return await tts_engine.text_to_speech(text, voice, format)
 
 
+async def synthesize_cached(text: str, voice: str, format: str = "ogg") -> bytes:
+    """
+    Синтез очищенного текста через дисковый кэш
+    
+    Повторные фразы (напоминания, приветствия) отдаются без инференса.
+    """
+    audio = await asyncio.to_thread(tts_cache.get, text, voice, SAMPLE_RATE, format)
+    if audio is not None:
+        return audio
+    
+    audio = await tts_pool.synthesize(text, voice, format)
+    await asyncio.to_thread(tts_cache.put, text, voice, SAMPLE_RATE, format, audio)
+    return audio
+
+
+def split_sentences(text: str, max_length: int = MAX_CHUNK_LENGTH) -> List[str]:
+    """
+    Делит текст на фрагменты для синтеза
+    
+    Границы — концы предложений; короткие предложения склеиваются,
+    слишком длинные режутся по запятым и пробелам.
+    """
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?…;])\s+', text) if s.strip()]
+    
+    parts: List[str] = []
+    for sentence in sentences:
+        while len(sentence) > max_length:
+            # Запятая — естественная пауза; пробел, только если запятой нет
+            cut = sentence.rfind(', ', 0, max_length)
+            if cut <= 0:
+                cut = sentence.rfind(' ', 0, max_length)
+            if cut <= 0:
+                # Ни запятой, ни пробела — жёсткий разрез ровно по лимиту
+                cut = max_length - 1
+            parts.append(sentence[:cut + 1].strip())
+            sentence = sentence[cut + 1:].strip()
+        if sentence:
+            parts.append(sentence)
+    
+    chunks: List[str] = []
+    for part in parts:
+        # Первый фрагмент не склеиваем — он должен прозвучать как можно раньше
+        if len(chunks) > 1 and len(chunks[-1]) + len(part) + 1 <= max_length:
+            chunks[-1] = f"{chunks[-1]} {part}"
+        elif len(chunks) == 1 and len(chunks[0]) < 40 and len(chunks[0]) + len(part) + 1 <= max_length:
+            chunks[0] = f"{chunks[0]} {part}"
+        else:
+            chunks.append(part)
+    return chunks
+
+
+async def send_voice_note(client, chat_id: int, audio: bytes, format: str = "ogg"):
+    """Отправляет аудио как голосовое сообщение Telegram"""
+    buffer = io.BytesIO(audio)
+    buffer.name = f"voice.{format}"
+    await client.send_file(chat_id, buffer, voice_note=True)
+
+
+async def send_speech(client, chat_id: int, text: str, voice: Optional[str] = None) -> int:
+    """
+    Озвучивает текст последовательными голосовыми сообщениями
+    
+    Returns:
+        Количество отправленных фрагментов
+    """
+    sent = 0
+    async for audio in tts_engine.stream_speech(text, voice):
+        await send_voice_note(client, chat_id, audio)
+        sent += 1
+    return sent
+
+
 def get_available_voices() -> List[Dict]:
     """
     Возвращает список доступных голосов
@@ -0,0 +1,210 @@
+"""
+Дисковый кэш синтезированных фраз для Karina AI
+
+Напоминания, приветствия и дежурные фразы звучат постоянно — синтезировать
+их каждый раз заново незачем.
+
+- Ключ: sha256(голос, частота, формат, нормализованный текст)
+- Файлы: temp/tts_cache/<2 символа ключа>/<ключ>.<формат>
+- Ограничение по размеру с вытеснением давно не использованных (LRU по mtime)
+- Предрендер статичных фраз в простое
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from brains.config import TTS_CACHE_DIR, TTS_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_phrase(text: str) -> str:
+    """Нормализует текст для ключа кэша (регистр и пробелы не важны)"""
+    return " ".join(text.split()).lower()
+
+
+def cache_key(text: str, voice: str, sample_rate: int, format: str) -> str:
+    payload = f"{voice}|{sample_rate}|{format}|{normalize_phrase(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSAudioCache:
+    """
+    Content-addressed кэш аудио на диске
+
+    Использование:
+        audio = cache.get(text, voice, 48000, "ogg")
+        if audio is None:
+            audio = synthesize(...)
+            cache.put(text, voice, 48000, "ogg", audio)
+    """
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # путь -> размер, от давно использованных к недавним
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _path(self, key: str, format: str) -> Path:
+        return self.directory / key[:2] / f"{key}.{format}"
+
+    def _load(self):
+        """Сканирует каталог один раз (порядок LRU восстанавливается по mtime)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.directory.exists():
+            return
+        files = []
+        for path in self.directory.glob("*/*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+                files.append((stat.st_mtime, path, stat.st_size))
+            except OSError:
+                continue
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._total += size
+        self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def get(self, text: str, voice: str, sample_rate: int, format: str) -> Optional[bytes]:
+        path = self._path(cache_key(text, voice, sample_rate, format), format)
+        with self._lock:
+            self._load()
+            if path not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                audio = path.read_bytes()
+                # Отмечаем использование: mtime переживает перезапуск
+                os.utime(path)
+            except OSError:
+                self._total -= self._entries.pop(path)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return audio
+
+    def contains(self, text: str, voice: str, sample_rate: int, format: str) -> bool:
+        path = self._path(cache_key(text, voice, sample_rate, format), format)
+        with self._lock:
+            self._load()
+            return path in self._entries
+
+    def put(self, text: str, voice: str, sample_rate: int, format: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        path = self._path(cache_key(text, voice, sample_rate, format), format)
+        with self._lock:
+            self._load()
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_bytes(audio)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"⚠️ Не удалось сохранить аудио в кэш: {e}")
+                return
+            self._total += len(audio) - self._entries.pop(path, 0)
+            self._entries[path] = len(audio)
+            self._evict()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            self._load()
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": self._total / (1024 * 1024),
+                "max_mb": self.max_bytes / (1024 * 1024),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# Глобальный кэш
+tts_cache = TTSAudioCache()
+
+
+# ============================================================================
+# ПРЕДРЕНДЕР СТАТИЧНЫХ ФРАЗ
+# ============================================================================
+
+def get_static_phrases() -> List[str]:
+    """Фразы, которые Карина произносит постоянно"""
+    from auras.phrases import HEALTH_REMINDERS, HEALTH_SCOLDING, WORK_LIFE_BALANCE_PHRASES
+    from brains.reminders import reminder_manager
+
+    phrases: List[str] = [*HEALTH_REMINDERS, *HEALTH_SCOLDING, *WORK_LIFE_BALANCE_PHRASES]
+    for attr in ("health_phrases", "morning_phrases", "evening_phrases", "lunch_phrases", "break_phrases"):
+        phrases.extend(getattr(reminder_manager, attr, []))
+    # Шаблоны ({minutes}) заранее не отрендерить
+    return list(dict.fromkeys(p for p in phrases if "{" not in p))
+
+
+async def prerender_static_phrases(
+    voices: Iterable[str],
+    phrases: Optional[List[str]] = None,
+    idle_pause: float = 1.0
+) -> int:
+    """
+    Синтезирует статичные фразы в кэш, пока пул свободен
+
+    Пользовательские запросы в приоритете: если в пуле есть задачи,
+    предрендер ждёт.
+
+    Returns:
+        Количество отрендеренных фраз
+    """
+    from brains.tts import tts_engine, synthesize_cached, SAMPLE_RATE
+    from brains.tts_pool import tts_pool
+
+    phrases = phrases if phrases is not None else get_static_phrases()
+    rendered = 0
+    failures = 0
+
+    for voice in voices:
+        for phrase in phrases:
+            text = tts_engine._clean_text(phrase)
+            if not text or tts_cache.contains(text, voice, SAMPLE_RATE, "ogg"):
+                continue
+            while tts_pool.pending:
+                await asyncio.sleep(idle_pause)
+            try:
+                await synthesize_cached(text, voice, "ogg")
+                rendered += 1
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning(f"⚠️ Предрендер фразы не удался: {e}")
+                if failures >= 3:
+                    logger.error("❌ Предрендер фраз остановлен: синтез недоступен")
+                    return rendered
+            await asyncio.sleep(idle_pause)
+
+    if rendered:
+        logger.info(f"🎤 Предрендер: {rendered} фраз добавлено в кэш")
+    return rendered
@@ -0,0 +1,306 @@
+"""
+Пул процессов синтеза речи для Karina AI
+
+Silero (PyTorch) синтезирует на CPU по 1-2 секунды — на event loop это
+замораживает все чаты. Пул выносит синтез в отдельные процессы:
+- модели голосов загружаются при старте воркера и живут в нём
+- torch ограничен TTS_TORCH_THREADS потоками на воркер
+- очередь ограничена: при переполнении запрос отклоняется (TTSOverloadedError)
+- метрики ожидания в очереди и времени синтеза
+
+Использование:
+    await tts_pool.start()
+    audio = await tts_pool.synthesize("Привет!", voice="v3_1_ru")
+    await tts_pool.shutdown()
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from brains.config import (
+    TTS_WORKERS, TTS_QUEUE_SIZE, TTS_QUEUE_TIMEOUT,
+    TTS_TORCH_THREADS, TTS_PRELOAD_VOICES
+)
+from brains.exceptions import TTSError, TTSOverloadedError
+from brains.process_pool import spawn_pool
+
+logger = logging.getLogger(__name__)
+
+TORCH_AVAILABLE = importlib.util.find_spec("torch") is not None
+
+
+# ============================================================================
+# КОД ВОРКЕРА (выполняется в дочернем процессе)
+# ============================================================================
+
+# Движки по голосам внутри процесса воркера
+_worker_engines: Dict = {}
+
+
+def _tune_torch(threads: int):
+    """Ограничивает потоки torch, чтобы воркеры не дрались за ядра"""
+    import torch
+    torch.set_num_threads(max(1, threads))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Уже задано (interop потоки можно выставить только один раз)
+        pass
+
+
+def _get_engine(voice: str):
+    """Движок голоса (загружается один раз на процесс)"""
+    engine = _worker_engines.get(voice)
+    if engine is None:
+        from brains.tts import KarinaTTS
+        engine = KarinaTTS(voice=voice)
+        engine.model  # Загрузка модели
+        _worker_engines[voice] = engine
+    return engine
+
+
+def _worker_init(voices: List[str], torch_threads: int):
+    """Инициализация воркера: настройка torch и предзагрузка голосов"""
+    logging.basicConfig(level=logging.INFO)
+    _tune_torch(torch_threads)
+    for voice in voices:
+        try:
+            _get_engine(voice)
+        except Exception as e:
+            logger.error(f"❌ TTS воркер {os.getpid()}: не удалось загрузить голос {voice}: {e}")
+
+
+def _worker_ping() -> int:
+    """Пустая задача — заставляет пул поднять воркер"""
+    return os.getpid()
+
+
+def _worker_synthesize(text: str, voice: str, format: str, submitted_at: float) -> Tuple[bytes, float, float]:
+    """
+    Синтез в воркере
+
+    Returns:
+        (аудио, ожидание в очереди, время синтеза) — время в секундах
+    """
+    started_at = time.time()
+    audio = _get_engine(voice).synthesize(text, format)
+    return audio, started_at - submitted_at, time.time() - started_at
+
+
+# ============================================================================
+# МЕТРИКИ
+# ============================================================================
+
+class TTSMetrics:
+    """Метрики синтеза по последним запросам"""
+
+    def __init__(self, window: int = 200):
+        self.queue_wait = deque(maxlen=window)
+        self.synthesis = deque(maxlen=window)
+        self.first_audio = deque(maxlen=window)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def record(self, queue_wait: float, synthesis: float):
+        self.queue_wait.append(queue_wait)
+        self.synthesis.append(synthesis)
+        self.completed += 1
+
+    def record_first_audio(self, seconds: float):
+        """Время до первого фрагмента при синтезе по предложениям"""
+        self.first_audio.append(seconds)
+
+    @staticmethod
+    def _percentile(values, percent: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_wait_p50": self._percentile(self.queue_wait, 50),
+            "queue_wait_p95": self._percentile(self.queue_wait, 95),
+            "synthesis_p50": self._percentile(self.synthesis, 50),
+            "synthesis_p95": self._percentile(self.synthesis, 95),
+            "first_audio_p50": self._percentile(self.first_audio, 50),
+            "first_audio_p95": self._percentile(self.first_audio, 95),
+        }
+
+
+# ============================================================================
+# ПУЛ
+# ============================================================================
+
+class TTSWorkerPool:
+    """
+    Пул процессов синтеза с ограниченной очередью
+
+    Одновременно в работе и в очереди не больше workers + queue_size задач.
+    Остальные ждут место до queue_timeout секунд, затем получают
+    TTSOverloadedError — вызывающий код отвечает текстом.
+    """
+
+    def __init__(
+        self,
+        workers: int = TTS_WORKERS,
+        queue_size: int = TTS_QUEUE_SIZE,
+        queue_timeout: float = TTS_QUEUE_TIMEOUT,
+        torch_threads: int = TTS_TORCH_THREADS,
+        preload_voices: Optional[List[str]] = None
+    ):
+        self.workers = workers
+        self.capacity = max(1, workers) + queue_size
+        self.queue_timeout = queue_timeout
+        self.torch_threads = torch_threads
+        self.preload_voices = preload_voices if preload_voices is not None else [
+            v.strip() for v in TTS_PRELOAD_VOICES.split(",") if v.strip()
+        ]
+        self.metrics = TTSMetrics()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        # Движок для синтеза без процессов (workers=0)
+        self._local_engines: Dict = {}
+        self._local_lock = threading.Lock()
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.workers > 0 and TORCH_AVAILABLE
+
+    @property
+    def pending(self) -> int:
+        """Задач в работе и в очереди"""
+        return self._pending
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+        return self._slots
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn без повторного импорта main.py в воркерах
+        return spawn_pool(self.workers, _worker_init, (self.preload_voices, self.torch_threads))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self._create_executor()
+        return self._executor
+
+    async def start(self):
+        """Поднимает воркеры и предзагружает голоса"""
+        if not TORCH_AVAILABLE:
+            logger.warning("⚠️ Torch не установлен — TTS пул не запущен")
+            return
+        if not self.uses_processes:
+            logger.info("🎤 TTS: синтез в потоке основного процесса")
+            return
+
+        started = time.time()
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # По задаче на воркер: все процессы стартуют и загружают модели сразу
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(executor, _worker_ping) for _ in range(self.workers)
+        ], return_exceptions=True)
+        alive = {pid for pid in pids if isinstance(pid, int)}
+        logger.info(
+            f"🎤 TTS пул запущен: воркеров {len(alive)}/{self.workers}, "
+            f"голоса {', '.join(self.preload_voices) or '—'} ({time.time() - started:.1f} сек)"
+        )
+
+    async def synthesize(self, text: str, voice: str, format: str = "ogg") -> bytes:
+        """
+        Синтезирует речь вне event loop
+
+        Raises:
+            TTSOverloadedError: очередь переполнена
+            TTSError: ошибка синтеза
+        """
+        slots = self._get_slots()
+        # Ожидание в очереди считается с момента запроса, включая ожидание слота
+        submitted_at = time.time()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.rejected += 1
+            logger.warning(f"⚠️ TTS очередь переполнена ({self._pending} задач), запрос отклонён")
+            raise TTSOverloadedError("Очередь синтеза речи переполнена")
+
+        self._pending += 1
+        try:
+            audio, queue_wait, synthesis = await self._run(text, voice, format, submitted_at)
+        except TTSError:
+            self.metrics.failed += 1
+            raise
+        except Exception as e:
+            self.metrics.failed += 1
+            raise TTSError(f"Ошибка синтеза речи: {e}") from e
+        finally:
+            self._pending -= 1
+            slots.release()
+
+        self.metrics.record(queue_wait, synthesis)
+        logger.debug(f"🎤 TTS: очередь {queue_wait:.2f} сек, синтез {synthesis:.2f} сек")
+        return audio
+
+    async def _run(self, text: str, voice: str, format: str, submitted_at: float) -> Tuple[bytes, float, float]:
+        if not self.uses_processes:
+            return await asyncio.to_thread(self._run_local, text, voice, format, submitted_at)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(), _worker_synthesize, text, voice, format, submitted_at
+            )
+        except BrokenProcessPool:
+            # Воркер упал (например, OOM) — следующий запрос поднимет пул заново
+            logger.error("❌ TTS пул сломан, пересоздаю")
+            executor, self._executor = self._executor, None
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise TTSError("TTS воркер аварийно завершился")
+
+    def _run_local(self, text: str, voice: str, format: str, submitted_at: float) -> Tuple[bytes, float, float]:
+        """Синтез в потоке (TTS_WORKERS=0 или нет torch)"""
+        with self._local_lock:
+            started_at = time.time()
+            engine = self._local_engines.get(voice)
+            if engine is None:
+                from brains.tts import KarinaTTS
+                engine = KarinaTTS(voice=voice)
+                self._local_engines[voice] = engine
+            audio = engine.synthesize(text, format)
+        return audio, started_at - submitted_at, time.time() - started_at
+
+    def get_stats(self) -> Dict:
+        stats = self.metrics.snapshot()
+        stats.update({
+            "workers": self.workers if self.uses_processes else 0,
+            "pending": self._pending,
+            "capacity": self.capacity,
+        })
+        return stats
+
+    async def shutdown(self):
+        """Останавливает воркеры"""
+        executor, self._executor = self._executor, None
+        if executor:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+            logger.info("🎤 TTS пул остановлен")
+
+
+# Глобальный пул
+tts_pool = TTSWorkerPool()
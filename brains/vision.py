@@ -8,15 +8,22 @@
 
 Используется Mistral AI (Pixtral) для мультимодального анализа
 """
+import asyncio
 import base64
+import hashlib
+import io
 import logging
 import os
+import time
 import httpx
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
-from brains.clients import http_client, supabase_client
+from brains.clients import http_clients, supabase_client, MISTRAL
 from brains.config import MISTRAL_API_KEY
+from brains.circuit_breaker import breaker_registry, PIXTRAL_VISION
+from brains.vision_cache import vision_cache, ensure_vision_cache_seeded, dhash, prompt_key
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +37,14 @@ VISION_MODEL = "pixtral-12b-2409"  # Мультимодальная модель
 MAX_IMAGE_SIZE_MB = 10
 SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.webp', '.gif']
 
+# Pixtral всё равно уменьшает картинку до ~1024px по большей стороне —
+# отправлять оригинал с телефона бессмысленно
+VISION_MAX_SIDE = 1024
+VISION_JPEG_QUALITY = 85
+VISION_WEBP_QUALITY = 80
+
+vision_breaker = breaker_registry.get(PIXTRAL_VISION)
+
 # Папка для временного хранения
 TEMP_DIR = Path("temp/vision")
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
@@ -44,6 +59,124 @@ def encode_image_to_base64(image_path: str) -> str:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 
+@dataclass
+class PreparedImage:
+    """Изображение, готовое к отправке в Pixtral"""
+    base64_data: str
+    mime_type: str
+    original_bytes: int
+    encoded_bytes: int
+    size: Tuple[int, int]
+    elapsed_ms: float
+    # Перцептивный хэш для кэша результатов (None если не разобрали)
+    dhash: Optional[int] = None
+    # MD5 исходных байт (image_hash в vision_history)
+    md5: Optional[str] = None
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+
+
+# Накопительная статистика предобработки
+VISION_PREP_STATS = {
+    "images": 0,
+    "original_bytes": 0,
+    "upload_bytes": 0,
+    "prep_ms": 0.0,
+    "api_ms": 0.0
+}
+
+
+def prepare_image(raw: bytes, mime_type: str = "image/jpeg", max_side: int = VISION_MAX_SIDE) -> PreparedImage:
+    """
+    Уменьшает, перекодирует и кодирует изображение в base64 (в памяти)
+    
+    - Поворот по EXIF применяется, сами EXIF данные (GPS, модель телефона) отбрасываются
+    - Больше max_side по длинной стороне не отправляем
+    - Прозрачность → WebP, остальное → JPEG
+    
+    Блокирующая функция — вызывать через asyncio.to_thread.
+    """
+    from PIL import Image, ImageOps
+    
+    started = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            # JPEG умеет декодироваться сразу в уменьшенном масштабе
+            image.draft("RGB", (max_side, max_side))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            
+            has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+            buffer = io.BytesIO()
+            if has_alpha:
+                image.convert("RGBA").save(buffer, format="WEBP", quality=VISION_WEBP_QUALITY, method=4)
+                mime_type = "image/webp"
+            else:
+                image.convert("RGB").save(buffer, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+                mime_type = "image/jpeg"
+            size = image.size
+            image_hash = dhash(image)
+        data = buffer.getbuffer()
+    except Exception as e:
+        # Не смогли разобрать — отправляем как есть, пусть решает API
+        logger.warning(f"⚠️ Предобработка изображения не удалась, отправляю оригинал: {e}")
+        data = memoryview(raw)
+        size = (0, 0)
+        image_hash = None
+    
+    return PreparedImage(
+        base64_data=base64.b64encode(data).decode("ascii"),
+        mime_type=mime_type,
+        original_bytes=len(raw),
+        encoded_bytes=data.nbytes,
+        size=size,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        dhash=image_hash
+    )
+
+
+def _read_and_prepare(image: Union[str, bytes]) -> PreparedImage:
+    if isinstance(image, (bytes, bytearray)):
+        raw, mime_type = bytes(image), "image/jpeg"
+    else:
+        with open(image, "rb") as image_file:
+            raw = image_file.read()
+        mime_type = get_image_mime_type(image)
+    prepared = prepare_image(raw, mime_type)
+    prepared.md5 = hashlib.md5(raw).hexdigest()
+    return prepared
+
+
+async def prepare_image_async(image: Union[str, bytes]) -> PreparedImage:
+    """Готовит изображение (путь или байты) в пуле потоков — event loop не блокируется"""
+    prepared = await asyncio.to_thread(_read_and_prepare, image)
+    
+    VISION_PREP_STATS["images"] += 1
+    VISION_PREP_STATS["original_bytes"] += prepared.original_bytes
+    VISION_PREP_STATS["upload_bytes"] += prepared.encoded_bytes
+    VISION_PREP_STATS["prep_ms"] += prepared.elapsed_ms
+    
+    logger.info(
+        f"🖼 Изображение подготовлено: {prepared.original_bytes / 1024:.0f} КБ → "
+        f"{prepared.encoded_bytes / 1024:.0f} КБ {prepared.size[0]}x{prepared.size[1]} "
+        f"за {prepared.elapsed_ms:.0f} мс"
+    )
+    return prepared
+
+
+def get_vision_prep_stats() -> Dict:
+    """Экономия на предобработке: объём отправки и среднее время"""
+    stats = dict(VISION_PREP_STATS)
+    images = stats["images"] or 1
+    original = stats["original_bytes"] or 1
+    stats["size_reduction"] = 1 - stats["upload_bytes"] / original
+    stats["avg_prep_ms"] = stats["prep_ms"] / images
+    stats["avg_api_ms"] = stats["api_ms"] / images
+    return stats
+
+
 def get_image_mime_type(image_path: str) -> str:
     """Определяет MIME тип изображения"""
     ext = Path(image_path).suffix.lower()
@@ -78,24 +211,39 @@ def validate_image(image_path: str) -> Tuple[bool, str]:
     return True, "OK"
 
 
+def validate_image_bytes(data: bytes) -> Tuple[bool, str]:
+    """Проверяет изображение, скачанное в память"""
+    if not data:
+        return False, "Пустой файл"
+    
+    size_mb = len(data) / (1024 * 1024)
+    if size_mb > MAX_IMAGE_SIZE_MB:
+        return False, f"Файл слишком большой ({size_mb:.1f}МБ). Максимум: {MAX_IMAGE_SIZE_MB}МБ"
+    
+    return True, "OK"
+
+
 # ============================================================================
 # ОСНОВНОЙ АНАЛИЗ
 # ============================================================================
 
 async def analyze_image(
-    image_path: str,
+    image_path: Union[str, bytes],
     prompt: str = "Опиши что на этом изображении",
     user_id: int = 0,
-    save_to_history: bool = True
+    save_to_history: bool = True,
+    exact_cache: bool = False
 ) -> Dict:
     """
     Анализирует изображение через Mistral AI
     
     Args:
-        image_path: Путь к файлу изображения
+        image_path: Путь к файлу изображения или его байты (скачанные в память)
         prompt: Запрос к AI
         user_id: ID пользователя
         save_to_history: Сохранить ли в историю
+        exact_cache: Кэш только для точной копии (текстовые запросы: у разных
+            чеков и документов dHash совпадает)
     
     Returns:
         {
@@ -104,11 +252,15 @@ async def analyze_image(
             "text_content": str,  # если есть текст
             "objects": list,  # распознанные объекты
             "analysis": str,  # развёрнутый анализ
+            "cached": bool,  # ответ из кэша похожих изображений
             "error": str  # если ошибка
         }
     """
     # Проверка файла
-    valid, message = validate_image(image_path)
+    if isinstance(image_path, (bytes, bytearray)):
+        valid, message = validate_image_bytes(image_path)
+    else:
+        valid, message = validate_image(image_path)
     if not valid:
         return {"success": False, "error": message}
     
@@ -116,10 +268,32 @@ async def analyze_image(
         return {"success": False, "error": "Нет ключа Mistral API"}
     
     try:
-        # Кодируем изображение
-        base64_image = encode_image_to_base64(image_path)
-        mime_type = get_image_mime_type(image_path)
-        
+        # Уменьшаем и кодируем изображение (вне event loop)
+        prepared = await prepare_image_async(image_path)
+    except Exception as e:
+        logger.error(f"Vision image read error: {e}")
+        return {"success": False, "error": str(e)}
+    
+    # Похожее изображение с тем же запросом уже анализировали
+    request_key = prompt_key(prompt)
+    if prepared.dhash is not None or prepared.md5 is not None:
+        await ensure_vision_cache_seeded()
+        cached = vision_cache.lookup(user_id, request_key, prepared.dhash, prepared.md5, exact=exact_cache)
+        if cached is not None:
+            return {
+                "success": True,
+                "description": cached,
+                "text_content": await extract_text_from_analysis(cached),
+                "analysis": cached,
+                "cached": True
+            }
+    
+    if not vision_breaker.allow_request():
+        logger.warning("⚠️ Pixtral Circuit Breaker открыт. Запрос отклонён.")
+        return {"success": False, "error": "Сервис анализа изображений временно недоступен, попробуй через пару минут"}
+    
+    # Проба half-open, не сообщившая результат (ошибка разбора, отмена), освобождается на любом выходе
+    try:
         # Формируем запрос
         headers = {
             "Authorization": f"Bearer {MISTRAL_API_KEY}",
@@ -134,7 +308,7 @@ async def analyze_image(
                     "content": [
                         {
                             "type": "image_url",
-                            "image_url": f"data:{mime_type};base64,{base64_image}"
+                            "image_url": prepared.data_url
                         },
                         {
                             "type": "text",
@@ -148,25 +322,40 @@ async def analyze_image(
         }
         
         # Отправляем запрос
-        response = await http_client.post(MISTRAL_VISION_URL, json=payload, headers=headers, timeout=60.0)
+        started = time.perf_counter()
+        response = await http_clients.get(MISTRAL).post(MISTRAL_VISION_URL, json=payload, headers=headers, timeout=60.0)
+        VISION_PREP_STATS["api_ms"] += (time.perf_counter() - started) * 1000
         
         if response.status_code != 200:
             logger.error(f"Vision API error: {response.status_code} - {response.text[:200]}")
+            if response.status_code >= 500 or response.status_code == 401:
+                vision_breaker.record_failure()
+            else:
+                vision_breaker.record_success()
             return {
                 "success": False,
                 "error": f"API error: {response.status_code}"
             }
         
+        vision_breaker.record_success()
         result = response.json()
         analysis_text = result['choices'][0]['message']['content']
         
+        # Запоминаем результат для похожих изображений
+        metadata = None
+        vision_cache.add(user_id, request_key, prepared.dhash, analysis_text, prepared.md5)
+        if prepared.dhash is not None:
+            metadata = {"dhash": f"{prepared.dhash:016x}", "prompt_key": request_key}
+        
         # Сохраняем в историю
         if save_to_history:
             await save_vision_analysis(
                 user_id=user_id,
                 image_path=image_path,
                 prompt=prompt,
-                analysis=analysis_text
+                analysis=analysis_text,
+                metadata=metadata,
+                image_hash=prepared.md5
             )
         
         # Извлекаем текст если есть (для OCR)
@@ -181,10 +370,17 @@ async def analyze_image(
         
     except httpx.TimeoutException:
         logger.error("Vision API timeout")
+        vision_breaker.record_failure()
         return {"success": False, "error": "Превышено время ожидания ответа API"}
+    except httpx.RequestError as e:
+        logger.error(f"Vision API request error: {type(e).__name__} - {e}")
+        vision_breaker.record_failure()
+        return {"success": False, "error": str(e)}
     except Exception as e:
         logger.error(f"Vision analysis error: {e}")
         return {"success": False, "error": str(e)}
+    finally:
+        vision_breaker.release_probe()
 
 
 async def extract_text_from_analysis(analysis: str) -> Optional[str]:
@@ -224,7 +420,7 @@ async def ocr_image(image_path: str, user_id: int = 0) -> Dict:
 Если текста нет — напиши "Текст не обнаружен".
 """
     
-    result = await analyze_image(image_path, prompt, user_id)
+    result = await analyze_image(image_path, prompt, user_id, exact_cache=True)
     
     if not result["success"]:
         return result
@@ -269,7 +465,7 @@ async def analyze_document(image_path: str, user_id: int = 0) -> Dict:
 Верни ответ в структурированном формате JSON если возможно.
 """
     
-    result = await analyze_image(image_path, prompt, user_id)
+    result = await analyze_image(image_path, prompt, user_id, exact_cache=True)
     
     if not result["success"]:
         return result
@@ -316,7 +512,7 @@ async def analyze_receipt(image_path: str, user_id: int = 0) -> Dict:
 Верни в структурированном виде.
 """
     
-    result = await analyze_image(image_path, prompt, user_id)
+    result = await analyze_image(image_path, prompt, user_id, exact_cache=True)
     
     if not result["success"]:
         return result
@@ -390,7 +586,7 @@ async def analyze_screenshot(image_path: str, user_id: int = 0) -> Dict:
 Дай полезное объяснение что делать с этой информацией.
 """
     
-    result = await analyze_image(image_path, prompt, user_id)
+    result = await analyze_image(image_path, prompt, user_id, exact_cache=True)
     
     if not result["success"]:
         return result
@@ -407,22 +603,26 @@ async def analyze_screenshot(image_path: str, user_id: int = 0) -> Dict:
 
 async def save_vision_analysis(
     user_id: int,
-    image_path: str,
+    image_path: Union[str, bytes],
     prompt: str,
     analysis: str,
-    metadata: Dict = None
+    metadata: Dict = None,
+    image_hash: Optional[str] = None
 ):
     """Сохраняет анализ изображения в БД"""
     try:
-        # Создаём миниатюру или хэш для хранения
-        import hashlib
-        with open(image_path, "rb") as f:
-            image_hash = hashlib.md5(f.read()).hexdigest()
+        # Хэш для поиска дублей (если не посчитан при подготовке)
+        if image_hash is None:
+            if isinstance(image_path, (bytes, bytearray)):
+                image_hash = hashlib.md5(image_path).hexdigest()
+            else:
+                with open(image_path, "rb") as f:
+                    image_hash = hashlib.md5(f.read()).hexdigest()
         
         data = {
             "user_id": user_id,
             "image_hash": image_hash,
-            "original_filename": os.path.basename(image_path),
+            "original_filename": os.path.basename(image_path) if isinstance(image_path, str) else None,
             "prompt": prompt,
             "analysis": analysis,
             "metadata": metadata or {}
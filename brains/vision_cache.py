@@ -0,0 +1,184 @@
+"""
+Кэш результатов Vision по перцептивному хэшу изображения
+
+Пересланные скриншоты, чеки и документы часто приходят повторно — иногда
+пережатыми или с другим размером. dHash таких копий отличается на пару бит,
+поэтому результат ищется по расстоянию Хэмминга, а не по точному MD5.
+
+- Ключ: (user_id, тип запроса = хэш промпта, dHash изображения)
+- Для текстовых запросов (OCR, чек, документ, скриншот) похожести мало:
+  у двух разных чеков dHash 8×9 совпадает, поэтому там — только точное
+  совпадение MD5 содержимого (exact=True)
+- Локальный индекс в памяти, один раз наполняется из vision_history
+- В vision_history dHash и тип запроса лежат в metadata, MD5 — в image_hash
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from brains.config import VISION_HASH_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Сколько результатов помним на (пользователь, тип запроса)
+MAX_ENTRIES_PER_SCOPE = 500
+SEED_LIMIT = 2000
+
+
+def dhash(image, size: int = 8) -> int:
+    """
+    Разностный хэш (dHash) изображения PIL — 64 бита при size=8
+
+    Устойчив к масштабированию и перекодированию JPEG.
+    """
+    from PIL import Image
+
+    small = image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def prompt_key(prompt: str) -> str:
+    """Тип запроса: OCR, чек, документ и т.д. различаются промптом"""
+    return hashlib.sha1(" ".join(prompt.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class VisionResultCache:
+    """
+    Кэш анализа изображений с поиском похожих картинок
+
+    Использование:
+        analysis = vision_cache.lookup(user_id, key, image_hash, content_hash, exact=is_text)
+        if analysis is None:
+            analysis = await call_pixtral(...)
+            vision_cache.add(user_id, key, image_hash, analysis, content_hash)
+    """
+
+    def __init__(self, threshold: int = VISION_HASH_THRESHOLD, max_entries: int = MAX_ENTRIES_PER_SCOPE):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.seeded = False
+        self._scopes: Dict[Tuple[int, str], "OrderedDict[int, str]"] = {}
+        # Точные копии: MD5 содержимого -> результат
+        self._exact: Dict[Tuple[int, str], "OrderedDict[str, str]"] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._scopes.values())
+
+    def lookup(self, user_id: int, key: str, image_hash: Optional[int],
+               content_hash: Optional[str] = None, exact: bool = False) -> Optional[str]:
+        """
+        Результат для изображения (None если нет)
+
+        exact=True — только точная копия по content_hash, иначе ближайший
+        dHash в пределах порога.
+        """
+        with self._lock:
+            if exact or image_hash is None:
+                entries = self._exact.get((user_id, key))
+                if content_hash is None or not entries or content_hash not in entries:
+                    self.misses += 1
+                    return None
+                entries.move_to_end(content_hash)
+                self.hits += 1
+                logger.info("🖼 Vision кэш: точная копия изображения")
+                return entries[content_hash]
+
+            entries = self._scopes.get((user_id, key))
+            best, best_distance = None, self.threshold + 1
+            if entries:
+                if image_hash in entries:
+                    best, best_distance = image_hash, 0
+                else:
+                    for candidate in entries:
+                        distance = hamming(candidate, image_hash)
+                        if distance < best_distance:
+                            best, best_distance = candidate, distance
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            entries.move_to_end(best)
+            self.hits += 1
+            logger.info(f"🖼 Vision кэш: похожее изображение (расстояние {best_distance})")
+            return entries[best]
+
+    def add(self, user_id: int, key: str, image_hash: Optional[int], analysis: str,
+            content_hash: Optional[str] = None):
+        with self._lock:
+            indexes = []
+            if image_hash is not None:
+                indexes.append((self._scopes, image_hash))
+            if content_hash is not None:
+                indexes.append((self._exact, content_hash))
+            for index, entry_key in indexes:
+                entries = index.setdefault((user_id, key), OrderedDict())
+                entries[entry_key] = analysis
+                entries.move_to_end(entry_key)
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+
+    def seed(self, rows):
+        """Наполняет индекс строками vision_history (от старых к новым)"""
+        loaded = 0
+        for row in rows:
+            metadata = row.get("metadata") or {}
+            if "dhash" not in metadata or "prompt_key" not in metadata:
+                continue
+            try:
+                self.add(row.get("user_id", 0), metadata["prompt_key"], int(metadata["dhash"], 16),
+                         row["analysis"], row.get("image_hash"))
+                loaded += 1
+            except (ValueError, KeyError, TypeError):
+                continue
+        self.seeded = True
+        return loaded
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+# Глобальный кэш
+vision_cache = VisionResultCache()
+
+
+async def ensure_vision_cache_seeded():
+    """Один раз загружает недавние результаты из vision_history"""
+    if vision_cache.seeded:
+        return
+    vision_cache.seeded = True
+
+    try:
+        from brains.clients import supabase_client
+
+        response = supabase_client.table("vision_history")\
+            .select("user_id, analysis, metadata, image_hash")\
+            .order("analyzed_at", desc=True)\
+            .limit(SEED_LIMIT)\
+            .execute()
+        loaded = vision_cache.seed(reversed(response.data or []))
+        logger.info(f"🖼 Vision кэш наполнен из истории: {loaded} записей")
+    except Exception as e:
+        logger.error(f"Error seeding vision cache: {e}")
@@ -12,6 +12,8 @@ from datetime import datetime, timedelta
 from telethon import TelegramClient, events, Button, errors
 import httpx
 
+from brains.circuit_breaker import breaker_registry, MARZBAN
+from brains.clients import http_clients, MARZBAN as MARZBAN_UPSTREAM
 from brains.vpn_ui import (
     inline_main_menu, inline_back, inline_tariffs, inline_profile,
     inline_instructions, inline_support,
@@ -50,8 +52,8 @@ BANNER_PATHS = {
 # ========== VPN USERS (хранилище в памяти) ==========
 VPN_USERS = {}
 
-# ========== HTTP КЛИЕНТ ==========
-http = httpx.AsyncClient(timeout=30.0)
+marzban_breaker = breaker_registry.get(MARZBAN)
+marzban_retry_budget = breaker_registry.budget(MARZBAN)
 
 
 # ========== УТИЛИТЫ ==========
@@ -164,44 +166,68 @@ async def get_marzban_token() -> str | None:
     """
     start = time.time()
     max_retries = 2
+
+    if not marzban_breaker.allow_request():
+        logger.warning("⚠️ Marzban Circuit Breaker открыт. Запрос отклонён.")
+        return None
+    marzban_retry_budget.record_request()
     
-    for attempt in range(max_retries):
-        try:
-            resp = await http.post(
-                f"{MARZBAN_URL}/api/admin/token",
-                data={"username": MARZBAN_USER, "password": MARZBAN_PASS},
-                timeout=30.0
-            )
-            log_timing("Marzban: токен", start)
-            
-            if resp.status_code == 200:
-                return resp.json().get("access_token")
-            elif resp.status_code == 401:
-                logger.error("🔐 Marzban: Неверные учётные данные (401)")
-                return None
-            elif resp.status_code >= 500:
-                logger.warning(f"⚠️ Marzban: Server Error ({resp.status_code}), попытка {attempt + 1}/{max_retries}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
-            else:
-                logger.error(f"❌ Marzban token: {resp.status_code} - {resp.text[:100]}")
+    # Проба half-open, не сообщившая результат (ошибка, отмена), освобождается на любом выходе
+    try:
+        for attempt in range(max_retries):
+            try:
+                resp = await http_clients.get(MARZBAN_UPSTREAM).post(
+                    f"{MARZBAN_URL}/api/admin/token",
+                    data={"username": MARZBAN_USER, "password": MARZBAN_PASS},
+                    timeout=30.0
+                )
+                log_timing("Marzban: токен", start)
+
+                if resp.status_code == 200:
+                    marzban_breaker.record_success()
+                    return resp.json().get("access_token")
+                elif resp.status_code == 401:
+                    logger.error("🔐 Marzban: Неверные учётные данные (401)")
+                    marzban_breaker.record_failure()
+                    return None
+                elif resp.status_code >= 500:
+                    logger.warning(f"⚠️ Marzban: Server Error ({resp.status_code}), попытка {attempt + 1}/{max_retries}")
+                    marzban_breaker.record_failure()
+                else:
+                    logger.error(f"❌ Marzban token: {resp.status_code} - {resp.text[:100]}")
+                    marzban_breaker.record_success()
+                    return None
+
+            except httpx.TimeoutException:
+                logger.error(f"⌛️ Marzban token timeout (attempt {attempt + 1}/{max_retries})")
+                marzban_breaker.record_failure()
+            except httpx.ConnectError as e:
+                logger.error(f"🔌 Marzban connect error (attempt {attempt + 1}/{max_retries}): {e}")
+                marzban_breaker.record_failure()
+            except Exception as e:
+                logger.error(f"❌ Marzban token error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
                 return None
-                
-        except httpx.TimeoutException:
-            logger.error(f"⌛️ Marzban token timeout (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
-        except httpx.ConnectError as e:
-            logger.error(f"🔌 Marzban connect error (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(3)
-        except Exception as e:
-            logger.error(f"❌ Marzban token error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
-            return None
-    
+
+            if not await _marzban_retry_pause(attempt, max_retries):
+                break
+    finally:
+        marzban_breaker.release_probe()
+
     return None
 
 
+async def _marzban_retry_pause(attempt: int, max_retries: int) -> bool:
+    """Пауза перед повтором запроса к Marzban (False — повторять нельзя)"""
+    if attempt >= max_retries - 1 or marzban_breaker.is_open:
+        return False
+    delay = marzban_retry_budget.next_delay(attempt)
+    if delay is None:
+        logger.warning("⚠️ Marzban: бюджет повторов исчерпан")
+        return False
+    await asyncio.sleep(delay)
+    return True
+
+
 async def create_marzban_user(username: str, days: int = 30) -> dict | None:
     """
     Создаёт пользователя в Marzban.
@@ -221,49 +247,61 @@ async def create_marzban_user(username: str, days: int = 30) -> dict | None:
         logger.error("❌ Marzban: Не удалось получить токен")
         return None
 
+    if not marzban_breaker.allow_request():
+        logger.warning("⚠️ Marzban Circuit Breaker открыт. Запрос отклонён.")
+        return None
+    marzban_retry_budget.record_request()
+
     max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            expire = int((datetime.now() + timedelta(days=days)).timestamp())
-            resp = await http.post(
-                f"{MARZBAN_URL}/api/user",
-                headers={"Authorization": f"Bearer {token}"},
-                json={"username": username, "inbound_tags": ["VLESS"], "expire": expire, "data_limit": 0},
-                timeout=30.0
-            )
-            log_timing("Marzban: создание", start)
-
-            if resp.status_code == 200:
-                data = resp.json()
-                logger.info(f"✅ Marzban: пользователь создан")
-                return {
-                    "username": data.get("username"),
-                    "vless": data.get("links", {}).get("VLESS", ""),
-                    "expire": datetime.fromtimestamp(expire)
-                }
-            elif resp.status_code == 409:
-                logger.error(f"🔐 Marzban: Пользователь уже существует ({username})")
-                return None
-            elif resp.status_code >= 500:
-                logger.warning(f"⚠️ Marzban: Server Error ({resp.status_code}), попытка {attempt + 1}/{max_retries}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)
-            else:
-                logger.error(f"❌ Marzban: {resp.status_code} - {resp.text[:100]}")
+    # Проба half-open, не сообщившая результат (ошибка, отмена), освобождается на любом выходе
+    try:
+        for attempt in range(max_retries):
+            try:
+                expire = int((datetime.now() + timedelta(days=days)).timestamp())
+                resp = await http_clients.get(MARZBAN_UPSTREAM).post(
+                    f"{MARZBAN_URL}/api/user",
+                    headers={"Authorization": f"Bearer {token}"},
+                    json={"username": username, "inbound_tags": ["VLESS"], "expire": expire, "data_limit": 0},
+                    timeout=30.0
+                )
+                log_timing("Marzban: создание", start)
+
+                if resp.status_code == 200:
+                    marzban_breaker.record_success()
+                    data = resp.json()
+                    logger.info(f"✅ Marzban: пользователь создан")
+                    return {
+                        "username": data.get("username"),
+                        "vless": data.get("links", {}).get("VLESS", ""),
+                        "expire": datetime.fromtimestamp(expire)
+                    }
+                elif resp.status_code == 409:
+                    logger.error(f"🔐 Marzban: Пользователь уже существует ({username})")
+                    marzban_breaker.record_success()
+                    return None
+                elif resp.status_code >= 500:
+                    logger.warning(f"⚠️ Marzban: Server Error ({resp.status_code}), попытка {attempt + 1}/{max_retries}")
+                    marzban_breaker.record_failure()
+                else:
+                    logger.error(f"❌ Marzban: {resp.status_code} - {resp.text[:100]}")
+                    marzban_breaker.record_success()
+                    return None
+
+            except httpx.TimeoutException:
+                logger.error(f"⌛️ Marzban create timeout (attempt {attempt + 1}/{max_retries})")
+                marzban_breaker.record_failure()
+            except httpx.ConnectError as e:
+                logger.error(f"🔌 Marzban connect error (attempt {attempt + 1}/{max_retries}): {e}")
+                marzban_breaker.record_failure()
+            except Exception as e:
+                logger.error(f"❌ Marzban create error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
                 return None
 
-        except httpx.TimeoutException:
-            logger.error(f"⌛️ Marzban create timeout (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2)
-        except httpx.ConnectError as e:
-            logger.error(f"🔌 Marzban connect error (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(3)
-        except Exception as e:
-            logger.error(f"❌ Marzban create error (attempt {attempt + 1}/{max_retries}): {type(e).__name__} - {e}")
-            return None
-    
+            if not await _marzban_retry_pause(attempt, max_retries):
+                break
+    finally:
+        marzban_breaker.release_probe()
+
     return None
 
 
@@ -370,7 +408,7 @@ def register_vpn_handlers(bot: TelegramClient, my_id: int):
                 elif data == "ai_health":
                     try:
                         from brains.health import get_health_report_text
-                        health_report = await get_health_report_text(7)
+                        health_report = await get_health_report_text(7, user_id=user_id)
                         await event.edit(f"💉 **Здоровье:**\n\n{health_report}")
                     except Exception as e:
                         logger.error(f"❌ Ошибка здоровья: {type(e).__name__} - {e}")
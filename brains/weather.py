@@ -1,6 +1,6 @@
-import aiohttp
 import logging
 from brains.config import WEATHER_API_KEY, CITY
+from brains.clients import http_clients, WEATHER
 
 logger = logging.getLogger(__name__)
 
@@ -8,19 +8,19 @@ async def get_weather():
     if not WEATHER_API_KEY:
         return None
     
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={CITY}&appid={WEATHER_API_KEY}&units=metric&lang=ru"
+    url = "http://api.openweathermap.org/data/2.5/weather"
+    params = {"q": CITY, "appid": WEATHER_API_KEY, "units": "metric", "lang": "ru"}
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    temp = round(data['main']['temp'])
-                    desc = data['weather'][0]['description']
-                    return f"{temp}°C, {desc}"
-                else:
-                    logger.error(f"Ошибка погоды: статус {response.status}")
-                    return None
+        response = await http_clients.get(WEATHER).get(url, params=params)
+        if response.status_code == 200:
+            data = response.json()
+            temp = round(data['main']['temp'])
+            desc = data['weather'][0]['description']
+            return f"{temp}°C, {desc}"
+        else:
+            logger.error(f"Ошибка погоды: статус {response.status_code}")
+            return None
     except Exception as e:
         logger.error(f"Ошибка при запросе погоды: {e}")
         return None
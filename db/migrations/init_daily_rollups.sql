@@ -0,0 +1,106 @@
+-- ============================================================================
+-- Karina AI: Дневные агрегаты (rollups)
+-- ============================================================================
+-- Дата: Октябрь 2026
+-- Описание: По строке на (пользователь, день) со сводкой здоровья, привычек,
+-- рабочих сессий и целей. Обновляется при каждой записи (brains/rollups.py),
+-- недельные и месячные отчёты читают 7/30 строк вместо всей истории.
+-- Заполнение по существующим данным: python scripts/backfill_rollups.py
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id BIGINT NOT NULL,
+    date DATE NOT NULL,
+
+    -- Здоровье (health_records)
+    health_records INTEGER NOT NULL DEFAULT 0,
+    health_confirmed INTEGER NOT NULL DEFAULT 0,
+    health_last_at TIMESTAMPTZ,
+    health_last_confirmed BOOLEAN,
+    health_last_time TEXT,
+
+    -- Привычки (habits): {"Название": [всего, выполнено]}
+    habits JSONB NOT NULL DEFAULT '{}',
+
+    -- Рабочие сессии (work_sessions)
+    work_sessions INTEGER NOT NULL DEFAULT 0,
+    work_hours NUMERIC(7,2) NOT NULL DEFAULT 0,
+    work_meetings INTEGER NOT NULL DEFAULT 0,
+    work_start_min INTEGER NOT NULL DEFAULT 0,
+    work_end_min INTEGER NOT NULL DEFAULT 0,
+    work_weekend INTEGER NOT NULL DEFAULT 0,
+    work_late INTEGER NOT NULL DEFAULT 0,
+    work_overwork INTEGER NOT NULL DEFAULT 0,
+    work_max_hours NUMERIC(5,2) NOT NULL DEFAULT 0,
+    work_max_end TEXT,
+
+    -- Ежедневные цели (daily_goals)
+    goals_total INTEGER NOT NULL DEFAULT 0,
+    goals_completed INTEGER NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_daily_rollups_user_date ON daily_rollups(user_id, date DESC);
+
+-- Комментарии
+COMMENT ON TABLE daily_rollups IS 'Дневные агрегаты здоровья, привычек, работы и целей';
+COMMENT ON COLUMN daily_rollups.health_last_confirmed IS 'Статус самой свежей записи здоровья за день';
+COMMENT ON COLUMN daily_rollups.habits IS 'Привычки за день: {"Название": [всего, выполнено]}';
+COMMENT ON COLUMN daily_rollups.work_start_min IS 'Сумма минут от полуночи начала сессий (для среднего)';
+COMMENT ON COLUMN daily_rollups.work_end_min IS 'Сумма минут от полуночи конца сессий (для среднего)';
+COMMENT ON COLUMN daily_rollups.work_late IS 'Сессий, закончившихся после OVERWORK_NIGHT_START';
+COMMENT ON COLUMN daily_rollups.work_overwork IS 'Сессий длиннее MAX_WORK_HOURS';
+COMMENT ON COLUMN daily_rollups.work_max_hours IS 'Самая длинная сессия дня';
+
+-- ============================================================================
+-- Атомарное приращение строки дня
+-- ============================================================================
+-- Несколько воркеров пишут в один день: read-modify-upsert теряет записи.
+-- Клиент передаёт приращение (строку только с новой записью), счётчики
+-- складываются внутри INSERT ... ON CONFLICT DO UPDATE. Цели дня (goals_*)
+-- задаются целиком обычным upsert и здесь не меняются.
+
+CREATE OR REPLACE FUNCTION increment_daily_rollup(delta JSONB)
+RETURNS daily_rollups AS $$
+    INSERT INTO daily_rollups AS r
+    SELECT * FROM jsonb_populate_record(NULL::daily_rollups, delta || jsonb_build_object('updated_at', NOW()))
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        health_records = r.health_records + EXCLUDED.health_records,
+        health_confirmed = r.health_confirmed + EXCLUDED.health_confirmed,
+        health_last_at = CASE WHEN EXCLUDED.health_last_at >= r.health_last_at OR r.health_last_at IS NULL
+            THEN COALESCE(EXCLUDED.health_last_at, r.health_last_at) ELSE r.health_last_at END,
+        health_last_confirmed = CASE WHEN EXCLUDED.health_last_at >= r.health_last_at OR r.health_last_at IS NULL
+            THEN COALESCE(EXCLUDED.health_last_confirmed, r.health_last_confirmed) ELSE r.health_last_confirmed END,
+        health_last_time = CASE WHEN EXCLUDED.health_last_at >= r.health_last_at OR r.health_last_at IS NULL
+            THEN COALESCE(EXCLUDED.health_last_time, r.health_last_time) ELSE r.health_last_time END,
+        habits = r.habits || COALESCE((
+            SELECT jsonb_object_agg(e.key, jsonb_build_array(
+                COALESCE((r.habits -> e.key ->> 0)::INTEGER, 0) + (e.value ->> 0)::INTEGER,
+                COALESCE((r.habits -> e.key ->> 1)::INTEGER, 0) + (e.value ->> 1)::INTEGER
+            ))
+            FROM jsonb_each(EXCLUDED.habits) AS e
+        ), '{}'::JSONB),
+        work_sessions = r.work_sessions + EXCLUDED.work_sessions,
+        work_hours = r.work_hours + EXCLUDED.work_hours,
+        work_meetings = r.work_meetings + EXCLUDED.work_meetings,
+        work_start_min = r.work_start_min + EXCLUDED.work_start_min,
+        work_end_min = r.work_end_min + EXCLUDED.work_end_min,
+        work_weekend = r.work_weekend + EXCLUDED.work_weekend,
+        work_late = r.work_late + EXCLUDED.work_late,
+        work_overwork = r.work_overwork + EXCLUDED.work_overwork,
+        work_max_hours = GREATEST(r.work_max_hours, EXCLUDED.work_max_hours),
+        work_max_end = CASE WHEN EXCLUDED.work_max_hours > r.work_max_hours
+            THEN EXCLUDED.work_max_end ELSE r.work_max_end END,
+        updated_at = NOW()
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- ============================================================================
+-- Примеры запросов
+-- ============================================================================
+
+-- Здоровье за неделю:
+-- SELECT SUM(health_confirmed), SUM(health_records) FROM daily_rollups
+-- WHERE user_id = 123 AND date >= CURRENT_DATE - 7;
@@ -38,18 +38,22 @@ from brains.ai import ask_karina
 
 # Календарь
 from brains.calendar import get_upcoming_events
+from brains.calendar_sync import start_calendar_sync, stop_calendar_sync
 
 # Здоровье
 from brains.health import get_health_report_text
 
+# Еженедельный отчёт
+from brains.smart_summary import start_weekly_summary_scheduler, stop_weekly_summary_scheduler
+
 # Напоминания
 from brains.reminders import reminder_manager, start_reminder_loop, ReminderType, Reminder
 
 # Новости
-from brains.news import get_latest_news
+from brains.news import get_latest_news, start_news_refresher, stop_news_refresher
 
 # Сотрудники
-from brains.employees import get_todays_birthdays, get_upcoming_birthdays
+from brains.employees import get_todays_birthdays, get_upcoming_birthdays, start_employee_refresher, stop_employee_refresher
 
 # VPN магазин
 from brains.vpn_logic import register_vpn_handlers, preload_banners
@@ -60,6 +64,19 @@ from skills.task_commands import register_task_commands
 # Триггеры продуктивности
 from brains.triggers import start_triggers_loop
 
+# Общее состояние лимитеров и circuit breaker'ов
+from brains.shared_state import close_state_backend
+
+# Пулы HTTP соединений
+from brains.clients import close_http_clients
+
+# Пул процессов синтеза речи и кэш фраз
+from brains.tts_pool import tts_pool, TORCH_AVAILABLE
+from brains.stt import start_stt
+from brains.stt_local import local_whisper
+from brains.command_runner import command_runner
+from brains.tts_cache import prerender_static_phrases
+
 # ========== ГЛОБАЛЬНЫЕ СОСТОЯНИЯ ==========
 SHUTDOWN_EVENT = asyncio.Event()
 
@@ -202,6 +219,30 @@ async def main():
     # 5. ФОНОВЫЕ ЗАДАЧИ ВЛАДЕЛЬЦА
     background_task = asyncio.create_task(owner_background_tasks())
 
+    # 6. ФОНОВОЕ ОБНОВЛЕНИЕ НОВОСТЕЙ (утренний брифинг не ждёт RSS)
+    start_news_refresher()
+
+    # 7. СИНХРОНИЗАЦИЯ КАЛЕНДАРЯ (изменения по syncToken, напоминания о встречах)
+    start_calendar_sync()
+
+    # 8. TTS ВОРКЕРЫ (модели голосов грузятся в фоне, бот уже отвечает)
+    #    и предрендер частых фраз в кэш, пока пул простаивает
+    async def warm_up_tts():
+        await tts_pool.start()
+        if TORCH_AVAILABLE:
+            await prerender_static_phrases(tts_pool.preload_voices)
+
+    tts_task = asyncio.create_task(warm_up_tts())
+
+    # 9. ЛОКАЛЬНОЕ РАСПОЗНАВАНИЕ РЕЧИ (модель Whisper грузится в фоне)
+    stt_task = asyncio.create_task(start_stt())
+
+    # 10. ЕЖЕНЕДЕЛЬНЫЙ ОТЧЁТ (разделы считаются заранее ночью)
+    start_weekly_summary_scheduler(bot, MY_ID)
+
+    # 11. СПРАВОЧНИК СОТРУДНИКОВ (индекс дней рождения в памяти)
+    start_employee_refresher()
+
     logger.info("=" * 60)
     logger.info("🤖 KARINA AI — Dual Mode ЗАПУЩЕН")
     logger.info(f"👤 Владелец: {MY_ID}")
@@ -210,7 +251,23 @@ async def main():
     logger.info(f"🎯 Триггеры продуктивности: ✅")
     logger.info("=" * 60)
 
-    await bot.run_until_disconnected()
+    try:
+        await bot.run_until_disconnected()
+    finally:
+        await stop_news_refresher()
+        await stop_calendar_sync()
+        await stop_weekly_summary_scheduler()
+        await stop_employee_refresher()
+        # Прогрев не должен пережить остановку пулов: предрендер после
+        # shutdown() пересоздал бы пул воркеров
+        for task in (tts_task, stt_task):
+            task.cancel()
+        await asyncio.gather(tts_task, stt_task, return_exceptions=True)
+        await tts_pool.shutdown()
+        await local_whisper.shutdown()
+        await command_runner.shutdown()
+        await close_http_clients()
+        close_state_backend()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Пересчёт дневных агрегатов (daily_rollups)
+
+Читает health_records, habits, work_sessions и daily_goals целиком,
+строит агрегаты по (пользователь, день) и записывает их upsert'ом.
+Нужен один раз после миграции db/migrations/init_daily_rollups.sql,
+а также после смены MAX_WORK_HOURS / OVERWORK_NIGHT_START.
+Повторный запуск безопасен: строки дней перезаписываются целиком.
+
+Использование:
+    python scripts/backfill_rollups.py [--user 123] [--dry-run]
+"""
+import sys
+import logging
+import argparse
+from collections import defaultdict
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Добавляем корень проекта в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from supabase import create_client, Client
+from brains.config import SUPABASE_URL, SUPABASE_KEY
+from brains.productivity import MAX_WORK_HOURS, OVERWORK_NIGHT_START
+from brains.rollups import build_rollups
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SOURCE_TABLES = ["health_records", "habits", "work_sessions", "daily_goals"]
+PAGE_SIZE = 1000
+UPSERT_BATCH = 500
+
+
+def fetch_all(client: Client, table_name: str, user_id: int = None) -> list:
+    """Все строки таблицы постранично"""
+    rows, offset = [], 0
+    while True:
+        query = client.table(table_name).select("*")
+        if user_id:
+            query = query.eq("user_id", user_id)
+        response = query.order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+        if not response.data:
+            break
+        rows.extend(response.data)
+        offset += PAGE_SIZE
+    logger.info(f"📥 {table_name}: {len(rows)} записей")
+    return rows
+
+
+def backfill(user_id: int = None, dry_run: bool = False) -> int:
+    """Пересчитывает агрегаты; возвращает число строк daily_rollups"""
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        logger.error("❌ SUPABASE_URL или SUPABASE_KEY не установлены")
+        return 0
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    # {user_id: {таблица: [строки]}}
+    by_user = defaultdict(lambda: defaultdict(list))
+    for table_name in SOURCE_TABLES:
+        for row in fetch_all(client, table_name, user_id):
+            if row.get("user_id"):
+                by_user[row["user_id"]][table_name].append(row)
+
+    rows = []
+    for uid, tables in by_user.items():
+        days = build_rollups(
+            uid,
+            health_rows=tables["health_records"],
+            habit_rows=tables["habits"],
+            work_rows=tables["work_sessions"],
+            goal_rows=tables["daily_goals"],
+            max_work_hours=MAX_WORK_HOURS,
+            night_start=OVERWORK_NIGHT_START,
+        )
+        rows.extend(rollup.to_row() for rollup in days.values())
+        logger.info(f"📊 Пользователь {uid}: {len(days)} дней")
+
+    if dry_run:
+        logger.info(f"🔍 Dry run: записано бы {len(rows)} строк")
+        return len(rows)
+
+    for start in range(0, len(rows), UPSERT_BATCH):
+        client.table("daily_rollups").upsert(
+            rows[start:start + UPSERT_BATCH], on_conflict="user_id,date"
+        ).execute()
+
+    logger.info(f"✅ daily_rollups: {len(rows)} строк")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", type=int, default=None, help="Только этот user_id")
+    parser.add_argument("--dry-run", action="store_true", help="Посчитать без записи")
+    args = parser.parse_args()
+
+    backfill(args.user, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
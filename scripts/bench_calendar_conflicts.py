@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска конфликтов в календаре
+
+Сравнивает:
+- сравнение соседних событий (старый check_calendar_conflicts) — быстро, но
+  пропускает наложения с длинными событиями
+- перебор всех пар O(n²) — эталон (на части выборки)
+- заметающую прямую (brains.calendar_conflicts.find_overlaps)
+- инкрементальное обновление ConflictIndex при изменении одного события
+
+Использование:
+    python scripts/bench_calendar_conflicts.py [--events 10000] [--calendars 5]
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+# Добавляем корень проекта в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from brains.calendar_sync import CalendarEvent, EventStore
+from brains.calendar_conflicts import ConflictIndex, find_overlaps
+
+MSK = timezone(timedelta(hours=3))
+
+
+def make_events(count: int, calendars: int, seed: int = 0):
+    """Рабочие встречи по 15–90 минут и редкие длинные (конференции, выезды)"""
+    rng = random.Random(seed)
+    base = datetime(2030, 1, 1, 9, tzinfo=MSK)
+    days = max(1, count // (8 * calendars))
+    events = []
+    for i in range(count):
+        day = rng.randrange(days)
+        start = base + timedelta(days=day, minutes=rng.randrange(0, 9 * 60, 15))
+        minutes = rng.choice((15, 30, 30, 45, 60, 90)) if rng.random() > 0.02 else rng.randrange(240, 600, 30)
+        events.append(CalendarEvent(
+            calendar_id=f"cal{i % calendars}", event_id=f"e{i}", calendar_name=f"Календарь {i % calendars}",
+            summary=f"Встреча {i}", start=start, end=start + timedelta(minutes=minutes)
+        ))
+    return events
+
+
+def adjacent_pairs(events):
+    ordered = sorted(events, key=lambda e: e.start)
+    return {
+        (a.key, b.key) for a, b in zip(ordered, ordered[1:]) if a.end > b.start
+    }
+
+
+def brute_force_pairs(events):
+    return {
+        tuple(sorted((a.key, b.key)))
+        for i, a in enumerate(events) for b in events[i + 1:]
+        if max(a.start, b.start) < min(a.end, b.end)
+    }
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000, help="Число событий")
+    parser.add_argument("--calendars", type=int, default=5, help="Число календарей")
+    parser.add_argument("--brute", type=int, default=2000, help="Событий для перебора O(n²)")
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.calendars)
+    print(f"📅 Событий: {len(events)}, календарей: {args.calendars}\n")
+
+    intervals = [(e.start.timestamp(), e.end.timestamp(), e.key) for e in events]
+    sweep, sweep_ms = timed(find_overlaps, intervals)
+    sweep_set = {tuple(sorted(pair)) for pair in sweep}
+    adjacent, adjacent_ms = timed(adjacent_pairs, events)
+
+    print(f"{'соседние пары (старый способ)':<34} {adjacent_ms:9.1f} мс   пар {len(adjacent):7d}")
+    print(f"{'заметающая прямая':<34} {sweep_ms:9.1f} мс   пар {len(sweep_set):7d}")
+    print(f"   старый способ пропускает {len(sweep_set) - len(adjacent)} пар\n")
+
+    sample = events[:args.brute]
+    sample_intervals = [(e.start.timestamp(), e.end.timestamp(), e.key) for e in sample]
+    brute, brute_ms = timed(brute_force_pairs, sample)
+    sample_sweep, sample_ms = timed(find_overlaps, sample_intervals)
+    match = brute == {tuple(sorted(pair)) for pair in sample_sweep}
+    print(f"{f'перебор O(n²), {len(sample)} событий':<34} {brute_ms:9.1f} мс   пар {len(brute):7d}")
+    print(f"{f'заметающая прямая, {len(sample)} событий':<34} {sample_ms:9.1f} мс   совпадает: {'да' if match else 'НЕТ'}\n")
+
+    store = EventStore()
+    for event in events:
+        store.upsert(event)
+    index = ConflictIndex(store)
+    _, rebuild_ms = timed(index.rebuild)
+
+    rng = random.Random(1)
+    timings = []
+    for _ in range(200):
+        event = rng.choice(events)
+        shift = timedelta(minutes=rng.choice((-60, -30, 30, 60)))
+        moved = CalendarEvent(**{**event.__dict__, "start": event.start + shift, "end": event.end + shift})
+        change = store.upsert(moved)
+        if change is None:
+            continue
+        started = time.perf_counter()
+        index.update(change)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    print(f"{'ConflictIndex: полный пересчёт':<34} {rebuild_ms:9.1f} мс   пар {len(index):7d}")
+    print(f"{'ConflictIndex: изменение события':<34} {timings[len(timings) // 2]:9.3f} мс   p95 {timings[int(len(timings) * 0.95)]:.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк аналитики продуктивности
+
+Сравнивает на синтетических данных:
+- построчный расчёт (прежние analyze_work_patterns + get_habit_stats +
+  get_overwork_days, fromisoformat на каждую строку) — трижды на отчёт
+- колоночный (brains.productivity_analytics) поверх дневных агрегатов
+  (brains.rollups): построение массивов и расчёт всех метрик окна
+- повторный запрос окна из кэша
+
+Использование:
+    python scripts/bench_productivity_analytics.py [--days 365] [--repeat 20]
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Добавляем корень проекта в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from brains.productivity_analytics import HabitColumns, ProductivityAnalytics, WorkColumns, compute_aggregates
+from brains.rollups import build_rollups
+
+MAX_WORK_HOURS = 9
+NIGHT_START = 22
+HABITS = ["Здоровый сон", "Обед", "Перерывы", "Планирование", "Спорт", "Чтение"]
+
+
+def make_rows(days: int, seed: int = 0):
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    sessions, habits = [], []
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        start = day + timedelta(hours=rng.randint(6, 11), minutes=rng.randrange(0, 60, 5))
+        end = start + timedelta(hours=rng.uniform(4, 14))
+        sessions.append({
+            "date": day.strftime('%Y-%m-%d'),
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+            "duration_hours": round((end - start).total_seconds() / 3600, 2),
+            "meetings_count": rng.randint(0, 6),
+        })
+        for habit in HABITS:
+            habits.append({"date": day.strftime('%Y-%m-%d'), "habit_name": habit, "completed": rng.random() < 0.7})
+    return sessions, habits
+
+
+def row_by_row(sessions, habits):
+    """Прежний расчёт: паттерны, привычки, переработки"""
+    starts, ends = [], []
+    total, overwork, weekend, night, meetings = 0, 0, 0, 0, 0
+    for s in sessions:
+        total += s["duration_hours"]
+        overwork += s["duration_hours"] > MAX_WORK_HOURS
+        start = datetime.fromisoformat(s["start_time"])
+        end = datetime.fromisoformat(s["end_time"])
+        starts.append(start)
+        ends.append(end)
+        weekend += start.weekday() >= 5
+        night += end.hour >= NIGHT_START
+        meetings += s["meetings_count"]
+    sum(t.hour * 60 + t.minute for t in starts) / len(starts)
+    sum(t.hour * 60 + t.minute for t in ends) / len(ends)
+
+    stats = {}
+    for record in habits:
+        habit = stats.setdefault(record["habit_name"], {"total": 0, "completed": 0})
+        habit["total"] += 1
+        habit["completed"] += record["completed"]
+
+    return [s for s in sessions if s["duration_hours"] > MAX_WORK_HOURS]
+
+
+def timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+async def cached_lookup(days, repeat: int) -> float:
+    service = ProductivityAnalytics()
+
+    async def fetch(user_id, since):
+        return days
+
+    service._fetch = fetch
+    await service.get(1, len(days))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await service.get(1, len(days))
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="Дней истории")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов на замер")
+    args = parser.parse_args()
+
+    sessions, habits = make_rows(args.days)
+    print(f"📊 Сессий: {len(sessions)}, отметок привычек: {len(habits)}\n")
+
+    since = np.datetime64((datetime.now() - timedelta(days=args.days)).strftime('%Y-%m-%d'), "D")
+    days = build_rollups(1, habit_rows=habits, work_rows=sessions, max_work_hours=MAX_WORK_HOURS, night_start=NIGHT_START)
+    days = [days[d] for d in sorted(days)]
+    rows_ms = timed(lambda: row_by_row(sessions, habits), args.repeat)
+    build_ms = timed(lambda: (WorkColumns.from_rollups(days), HabitColumns.from_rollups(days)), args.repeat)
+    work, habit_columns = WorkColumns.from_rollups(days), HabitColumns.from_rollups(days)
+    compute_ms = timed(lambda: compute_aggregates(work, habit_columns, since), args.repeat)
+    cached_ms = asyncio.run(cached_lookup(days, args.repeat))
+
+    print(f"{'построчно, один расчёт':<34} {rows_ms:9.2f} мс")
+    print(f"{'построчно, отчёт (3 расчёта)':<34} {rows_ms * 3:9.2f} мс")
+    print(f"{'колонки: массивы из агрегатов':<34} {build_ms:9.2f} мс")
+    print(f"{'колонки: все метрики окна':<34} {compute_ms:9.2f} мс")
+    print(f"{'повторный запрос из кэша':<34} {cached_ms:9.4f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кодирования TTS аудио
+
+Сравнивает старый путь (WAV во временный файл → ffmpeg libvorbis → чтение
+OGG с диска) с кодированием OGG Opus в памяти (brains.tts.encode_ogg_opus).
+
+Использование:
+    python scripts/bench_tts_encoding.py [--seconds 5] [--runs 20]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем корень проекта в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from brains.tts import to_pcm16, encode_ogg_opus, SOUNDFILE_OPUS, SAMPLE_RATE
+
+
+def make_signal(seconds: float) -> np.ndarray:
+    """Речеподобный сигнал: несколько гармоник с огибающей слогов"""
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 540, 900)))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    noise = np.random.default_rng(0).normal(0, 0.02, t.size).astype(np.float32)
+    return (voice * envelope * 0.3 + noise).astype(np.float32)
+
+
+def legacy_encode(audio: np.ndarray) -> bytes:
+    """Старый путь: нормализация через np.abs, временные файлы и ffmpeg"""
+    from scipy.io.wavfile import write as write_wav
+
+    audio = np.int16(audio / np.max(np.abs(audio)) * 32767)
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as wav_file:
+        wav_path = wav_file.name
+    write_wav(wav_path, SAMPLE_RATE, audio)
+    ogg_path = wav_path.replace(".wav", ".ogg")
+    subprocess.run([
+        'ffmpeg', '-i', wav_path, '-c:a', 'libvorbis',
+        '-qscale:a', '5', '-y', ogg_path
+    ], check=True, capture_output=True, timeout=30)
+    with open(ogg_path, 'rb') as f:
+        audio_bytes = f.read()
+    os.unlink(wav_path)
+    os.unlink(ogg_path)
+    return audio_bytes
+
+
+def in_memory_encode(audio: np.ndarray) -> bytes:
+    return encode_ogg_opus(to_pcm16(audio), SAMPLE_RATE)
+
+
+def bench(name: str, func, audio: np.ndarray, runs: int):
+    func(audio)  # Прогрев
+    timings = []
+    size = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        size = len(func(audio))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(
+        f"{name:<28} p50 {timings[len(timings) // 2]:8.1f} мс   "
+        f"min {timings[0]:8.1f} мс   размер {size / 1024:7.1f} КБ"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Длина фразы, сек")
+    parser.add_argument("--runs", type=int, default=20, help="Повторов на вариант")
+    args = parser.parse_args()
+
+    audio = make_signal(args.seconds)
+    print(f"🎤 Фраза {args.seconds:.1f} сек, {SAMPLE_RATE} Гц, повторов: {args.runs}")
+    print(f"   libsndfile с Opus: {'да' if SOUNDFILE_OPUS else 'нет (ffmpeg через pipe)'}\n")
+
+    bench("in-memory OGG Opus", in_memory_encode, audio, args.runs)
+
+    if shutil.which("ffmpeg"):
+        bench("temp files + ffmpeg Vorbis", legacy_encode, audio, args.runs)
+    else:
+        print("temp files + ffmpeg Vorbis    пропущено: ffmpeg не найден")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк предобработки изображений перед отправкой в Pixtral
+
+Генерирует «фото с телефона» (4000x3000 JPEG с EXIF) и сравнивает тело
+запроса и время подготовки: оригинал в base64 против prepare_image.
+Время отправки оценивается для заданной скорости аплоада.
+
+Использование:
+    python scripts/bench_vision_preprocess.py [--uplink-mbit 10] [--runs 5]
+"""
+import io
+import sys
+import json
+import time
+import base64
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Добавляем корень проекта в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from brains.vision import prepare_image
+
+
+def make_photo(width: int = 4000, height: int = 3000) -> bytes:
+    """Шумная фотография с EXIF — близко к снимку с телефона по размеру"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 40, (height, width, 3)).astype(np.float32)
+    pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels, "RGB")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: поворот на 90°
+    exif[0x0110] = "Phone Model X"
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def body_size(data_url: str) -> int:
+    payload = {"messages": [{"role": "user", "content": [{"type": "image_url", "image_url": data_url}]}]}
+    return len(json.dumps(payload))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uplink-mbit", type=float, default=10.0, help="Скорость аплоада, Мбит/с")
+    parser.add_argument("--runs", type=int, default=5, help="Повторов")
+    args = parser.parse_args()
+
+    raw = make_photo()
+    bytes_per_sec = args.uplink_mbit * 1_000_000 / 8
+
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        original_url = f"data:image/jpeg;base64,{base64.b64encode(raw).decode()}"
+    original_ms = (time.perf_counter() - started) * 1000 / args.runs
+
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        prepared = prepare_image(raw)
+    prepared_ms = (time.perf_counter() - started) * 1000 / args.runs
+
+    original_body = body_size(original_url)
+    prepared_body = body_size(prepared.data_url)
+
+    print(f"🖼 Исходник: {len(raw) / 1024 / 1024:.1f} МБ, аплоад {args.uplink_mbit:.0f} Мбит/с\n")
+    print(f"{'':<14}{'тело запроса':>14}{'подготовка':>14}{'отправка':>12}{'итого':>12}")
+    for name, body, prep_ms in (("оригинал", original_body, original_ms), ("prepare_image", prepared_body, prepared_ms)):
+        send_ms = body / bytes_per_sec * 1000
+        print(f"{name:<14}{body / 1024:>11.0f} КБ{prep_ms:>11.0f} мс{send_ms:>9.0f} мс{prep_ms + send_ms:>9.0f} мс")
+    print(f"\nТело запроса меньше в {original_body / prepared_body:.0f} раз, размер {prepared.size[0]}x{prepared.size[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,10 @@ from brains.news import get_latest_news
 from brains.memory import save_memory
 from brains.calendar import get_upcoming_events, add_calendar, get_conflict_report
 from brains.health import get_health_report_text, save_health_record
-from brains.stt import transcribe_voice
+from brains.stt import transcribe_voice, MAX_VOICE_SIZE_MB
+from brains.media_download import download_event_media
+from brains.vision import MAX_IMAGE_SIZE_MB
+from brains.exceptions import MediaTooLargeError
 from brains.reminders import reminder_manager, ReminderType
 from brains.reminder_generator import clear_cache
 from brains.smart_summary import generate_weekly_summary
@@ -94,7 +97,7 @@ def register_karina_base_skills(client):
         if data == "confirm_health":
             await reminder_manager.confirm_reminder(f"health_{datetime.now().strftime('%Y%m%d')}")
             await confirm_health()
-            await save_health_record(True)  # Сохраняем в базу!
+            await save_health_record(True, user_id=event.chat_id)  # Сохраняем в базу!
             await event.answer("✅ Умничка! Я горжусь тобой! ❤️", alert=True)
             await event.edit(f"{message.text}\n\n✅ Подтверждено!")
             return
@@ -181,7 +184,7 @@ def register_karina_base_skills(client):
     async def health_handler(event):
         """Скилл: Статистика здоровья"""
         logger.info(f"📩 /health от пользователя {event.chat_id}")
-        report = await get_health_report_text(7)
+        report = await get_health_report_text(7, user_id=event.chat_id)
         await event.respond(report)
         raise events.StopPropagation
 
@@ -743,14 +746,12 @@ def register_karina_base_skills(client):
             raise events.StopPropagation
 
         # Скачиваем и анализируем
-        photo_path = await reply.download_media(file="temp/vision/ocr_{}.jpg".format(datetime.now().strftime('%Y%m%d_%H%M%S')))
-        
-        if photo_path:
-            try:
+        try:
+            async with download_event_media(reply, max_bytes=MAX_IMAGE_SIZE_MB * 1024 * 1024) as media:
                 await event.respond("🔍 Распознаю текст...")
                 
                 from brains.vision import ocr_image
-                result = await ocr_image(photo_path, user_id=event.chat_id)
+                result = await ocr_image(media.payload, user_id=event.chat_id)
                 
                 if result.get("success"):
                     response = f"📝 **Распознанный текст:**\n\n```\n{result.get('text', 'Текст не найден')}\n```\n\n"
@@ -762,13 +763,12 @@ def register_karina_base_skills(client):
                 else:
                     await event.respond(f"❌ Ошибка: {result.get('error', 'Неизвестная ошибка')}")
             
-            except Exception as e:
-                logger.error(f"OCR error: {e}")
-                await event.respond(f"❌ Ошибка OCR: {e}")
-            finally:
-                if os.path.exists(photo_path):
-                    os.remove(photo_path)
-        
+        except MediaTooLargeError as e:
+            await event.respond(f"❌ {e}")
+        except Exception as e:
+            logger.error(f"OCR error: {e}")
+            await event.respond(f"❌ Ошибка OCR: {e}")
+
         raise events.StopPropagation
 
     @client.on(events.NewMessage(pattern='/analyze'))
@@ -785,27 +785,24 @@ def register_karina_base_skills(client):
             await event.respond("❌ Это не фото!")
             raise events.StopPropagation
 
-        photo_path = await reply.download_media(file="temp/vision/analyze_{}.jpg".format(datetime.now().strftime('%Y%m%d_%H%M%S')))
-        
-        if photo_path:
-            try:
+        try:
+            async with download_event_media(reply, max_bytes=MAX_IMAGE_SIZE_MB * 1024 * 1024) as media:
                 await event.respond("🔍 Анализирую изображение...")
                 
                 from brains.vision import analyze_photo_scene
-                result = await analyze_photo_scene(photo_path, user_id=event.chat_id)
+                result = await analyze_photo_scene(media.payload, user_id=event.chat_id)
 
                 if result.get("success"):
                     await event.respond(f"🖼️ **Анализ:**\n\n{result.get('description', result.get('full_analysis', 'Анализ не удался'))}")
                 else:
                     await event.respond(f"❌ Ошибка: {result.get('error', 'Неизвестная ошибка')}")
             
-            except Exception as e:
-                logger.error(f"Analyze error: {e}")
-                await event.respond(f"❌ Ошибка анализа: {e}")
-            finally:
-                if os.path.exists(photo_path):
-                    os.remove(photo_path)
-        
+        except MediaTooLargeError as e:
+            await event.respond(f"❌ {e}")
+        except Exception as e:
+            logger.error(f"Analyze error: {e}")
+            await event.respond(f"❌ Ошибка анализа: {e}")
+
         raise events.StopPropagation
 
     @client.on(events.NewMessage(pattern='/doc'))
@@ -822,14 +819,12 @@ def register_karina_base_skills(client):
             await event.respond("❌ Это не фото!")
             raise events.StopPropagation
 
-        photo_path = await reply.download_media(file="temp/vision/doc_{}.jpg".format(datetime.now().strftime('%Y%m%d_%H%M%S')))
-        
-        if photo_path:
-            try:
+        try:
+            async with download_event_media(reply, max_bytes=MAX_IMAGE_SIZE_MB * 1024 * 1024) as media:
                 await event.respond("📄 Анализирую документ...")
                 
                 from brains.vision import analyze_document
-                result = await analyze_document(photo_path, user_id=event.chat_id)
+                result = await analyze_document(media.payload, user_id=event.chat_id)
                 
                 if result.get("success"):
                     response = f"📄 **Тип:** {result.get('document_type', 'Не определён')}\n\n"
@@ -842,13 +837,12 @@ def register_karina_base_skills(client):
                 else:
                     await event.respond(f"❌ Ошибка: {result.get('error', 'Неизвестная ошибка')}")
             
-            except Exception as e:
-                logger.error(f"Doc analysis error: {e}")
-                await event.respond(f"❌ Ошибка анализа документа: {e}")
-            finally:
-                if os.path.exists(photo_path):
-                    os.remove(photo_path)
-        
+        except MediaTooLargeError as e:
+            await event.respond(f"❌ {e}")
+        except Exception as e:
+            logger.error(f"Doc analysis error: {e}")
+            await event.respond(f"❌ Ошибка анализа документа: {e}")
+
         raise events.StopPropagation
 
     @client.on(events.NewMessage(pattern='/receipt'))
@@ -865,27 +859,24 @@ def register_karina_base_skills(client):
             await event.respond("❌ Это не фото!")
             raise events.StopPropagation
 
-        photo_path = await reply.download_media(file="temp/vision/receipt_{}.jpg".format(datetime.now().strftime('%Y%m%d_%H%M%S')))
-        
-        if photo_path:
-            try:
+        try:
+            async with download_event_media(reply, max_bytes=MAX_IMAGE_SIZE_MB * 1024 * 1024) as media:
                 await event.respond("🧾 Анализирую чек...")
                 
                 from brains.vision import analyze_receipt
-                result = await analyze_receipt(photo_path, user_id=event.chat_id)
+                result = await analyze_receipt(media.payload, user_id=event.chat_id)
                 
                 if result.get("success"):
                     await event.respond(f"🧾 **Анализ чека:**\n\n{result.get('full_analysis', 'Не удалось проанализировать чек')}")
                 else:
                     await event.respond(f"❌ Ошибка: {result.get('error', 'Неизвестная ошибка')}")
             
-            except Exception as e:
-                logger.error(f"Receipt analysis error: {e}")
-                await event.respond(f"❌ Ошибка анализа чека: {e}")
-            finally:
-                if os.path.exists(photo_path):
-                    os.remove(photo_path)
-        
+        except MediaTooLargeError as e:
+            await event.respond(f"❌ {e}")
+        except Exception as e:
+            logger.error(f"Receipt analysis error: {e}")
+            await event.respond(f"❌ Ошибка анализа чека: {e}")
+
         raise events.StopPropagation
 
     @client.on(events.NewMessage(pattern='/vision find'))
@@ -984,13 +975,12 @@ def register_karina_base_skills(client):
             voice = settings.get("voice", "ksenia")
 
             try:
-                from brains.tts import text_to_speech
+                from brains.tts import send_speech
 
                 test_text = f"Привет! Это тестовое сообщение. Мой голос — {voice}."
-                audio_data = await text_to_speech(test_text, voice=voice)
 
-                # Отправляем голосовое
-                await client.send_voice(event.chat_id, audio_data)
+                # Отправляем голосовое (по предложениям)
+                await send_speech(client, event.chat_id, test_text, voice=voice)
                 await event.respond("✅ Тест успешен!")
 
             except Exception as e:
@@ -1053,7 +1043,7 @@ def register_karina_base_skills(client):
         """Скилл: Быстрое тестирование TTS"""
         logger.info(f"📩 /ttstest от пользователя {event.chat_id}")
 
-        from brains.tts import get_tts_settings, text_to_speech
+        from brains.tts import get_tts_settings, send_speech
 
         await event.respond("🎤 Генерирую тестовое сообщение...")
 
@@ -1070,10 +1060,8 @@ def register_karina_base_skills(client):
         test_text = random.choice(test_phrases)
 
         try:
-            audio_data = await text_to_speech(test_text, voice=voice)
-
             # Отправляем голосовое
-            await client.send_voice(event.chat_id, audio_data)
+            await send_speech(client, event.chat_id, test_text, voice=voice)
 
         except Exception as e:
             logger.error(f"TTS test error: {e}")
@@ -1113,9 +1101,49 @@ def register_karina_base_skills(client):
         if not stats.get('voices'):
             message += "• Пока нет данных\n"
 
+        from brains.tts_pool import tts_pool
+        pool = tts_pool.get_stats()
+        message += f"""
+⚙️ Синтез:
+• Воркеров: {pool['workers']}, в очереди: {pool['pending']}/{pool['capacity']}
+• Готово: {pool['completed']}, ошибок: {pool['failed']}, отклонено: {pool['rejected']}
+• Ожидание p50/p95: {pool['queue_wait_p50']:.2f}/{pool['queue_wait_p95']:.2f} сек
+• Синтез p50/p95: {pool['synthesis_p50']:.2f}/{pool['synthesis_p95']:.2f} сек
+• До первого звука p50/p95: {pool['first_audio_p50']:.2f}/{pool['first_audio_p95']:.2f} сек
+"""
+        from brains.tts_cache import tts_cache
+        cache = tts_cache.get_stats()
+        message += f"""
+💾 Кэш фраз:
+• Фраз: {cache['entries']}, {cache['size_mb']:.1f}/{cache['max_mb']:.0f} МБ
+• Попаданий: {cache['hits']} ({cache['hit_rate']:.0%})
+"""
+        from brains.stt import stt_router
+        message += "\n🎙 Распознавание:\n"
+        for name, stt in stt_router.get_stats().items():
+            state = "✅" if stt['available'] else "❌"
+            message += (
+                f"• {state} {name}: {stt['ok']} ок, {stt['failed']} ошибок, "
+                f"{stt['timeouts']} таймаутов, p50 {stt['latency_p50']:.1f} сек\n"
+            )
+
         await event.respond(message)
         raise events.StopPropagation
 
+    @client.on(events.NewMessage(pattern='/breakers'))
+    async def breakers_handler(event):
+        """Скилл: Состояние circuit breaker'ов внешних сервисов (для админа)"""
+        logger.info(f"📩 /breakers от пользователя {event.chat_id}")
+
+        from brains.circuit_breaker import breaker_registry
+        from brains.config import MY_ID
+        if event.chat_id != MY_ID:
+            await event.respond("❌ Эта команда доступна только администратору.")
+            raise events.StopPropagation
+
+        await event.respond(breaker_registry.format_report())
+        raise events.StopPropagation
+
     @client.on(events.NewMessage(incoming=True))
     async def chat_handler(event):
         """Интеллектуальное общение (текст + голос + фото) + Обработка напоминаний"""
@@ -1140,20 +1168,17 @@ def register_karina_base_skills(client):
                 logger.info("⚠️ Пропуск (не личный чат)")
                 return
 
-            # Скачиваем фото
-            photo_path = await event.download_media(file="temp/vision/photo_{}.jpg".format(datetime.now().strftime('%Y%m%d_%H%M%S')))
-            
-            if photo_path:
-                try:
+            from brains.vision import analyze_image
+
+            try:
+                # Скачиваем фото в память (крупные — во временный файл)
+                async with download_event_media(event, max_bytes=MAX_IMAGE_SIZE_MB * 1024 * 1024) as media:
                     # Отправляем статус "думает"
                     async with client.action(event.chat_id, 'typing'):
-                        # Анализируем фото
-                        from brains.vision import analyze_image
-
                         # Определяем тип анализа по контексту
                         prompt = "Детально опиши что на этом изображении. Если есть текст — распиши его полностью."
 
-                        result = await analyze_image(photo_path, prompt, user_id=event.chat_id)
+                        result = await analyze_image(media.payload, prompt, user_id=event.chat_id)
 
                         if result.get("success"):
                             # Формируем ответ
@@ -1167,15 +1192,13 @@ def register_karina_base_skills(client):
                         else:
                             await event.respond(f"❌ Не удалось проанализировать фото: {result.get('error', 'Неизвестная ошибка')}")
 
-                except Exception as e:
-                    logger.error(f"Photo analysis error: {e}")
-                    await event.respond("❌ Ошибка при анализе фото. Попробуй ещё раз!")
-                finally:
-                    # Удаляем временный файл
-                    if os.path.exists(photo_path):
-                        os.remove(photo_path)
-                
-                raise events.StopPropagation
+            except MediaTooLargeError as e:
+                await event.respond(f"❌ {e}")
+            except Exception as e:
+                logger.error(f"Photo analysis error: {e}")
+                await event.respond("❌ Ошибка при анализе фото. Попробуй ещё раз!")
+
+            raise events.StopPropagation
 
         # ========== ОБРАБОТКА ГОЛОСА ==========
         is_voice_message = False
@@ -1189,9 +1212,13 @@ def register_karina_base_skills(client):
             is_voice_message = True
             
             async with client.action(event.chat_id, 'record-audio'):
-                path = await event.download_media(file="voice_msg.ogg")
-                text = await transcribe_voice(path)
-                if os.path.exists(path): os.remove(path)
+                # Скачиваем в память: у каждого сообщения свой буфер, без общего файла
+                try:
+                    async with download_event_media(event, max_bytes=MAX_VOICE_SIZE_MB * 1024 * 1024) as media:
+                        text = await transcribe_voice(media.payload)
+                except MediaTooLargeError as e:
+                    await event.reply(f"❌ {e}")
+                    return
 
                 if not text:
                     await event.reply("Ой, я не смогла разобрать, что ты сказал... 🎤")
@@ -1221,7 +1248,7 @@ def register_karina_base_skills(client):
             logger.info(f"✅ Подтверждение здоровья от {event.chat_id}")
             await reminder_manager.confirm_reminder(today_health_id)
             await confirm_health()
-            await save_health_record(True)  # Сохраняем в базу!
+            await save_health_record(True, user_id=event.chat_id)  # Сохраняем в базу!
             await event.respond(random.choice([
                 "Умничка! 🥰",
                 "Так держать! 👍",
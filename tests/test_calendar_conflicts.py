@@ -0,0 +1,113 @@
+"""
+Tests for sweep-line calendar conflict detection and incremental updates
+"""
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.calendar import find_conflicts
+from brains.calendar_conflicts import ConflictIndex, conflict_dict, find_overlaps
+from brains.calendar_sync import CalendarEvent, EventStore
+
+MSK = timezone(timedelta(hours=3))
+BASE = datetime(2030, 1, 1, 9, tzinfo=MSK)
+
+
+def event(event_id, start_min, minutes, summary=None, calendar="work", all_day=False):
+    start = BASE + timedelta(minutes=start_min)
+    return CalendarEvent(calendar, event_id, "Работа", summary or event_id, start, start + timedelta(minutes=minutes), all_day)
+
+
+def brute_force(intervals):
+    return {
+        frozenset((a[2], b[2]))
+        for i, a in enumerate(intervals) for b in intervals[i + 1:]
+        if max(a[0], b[0]) < min(a[1], b[1])
+    }
+
+
+class TestFindOverlaps:
+    def test_long_event_spanning_several(self):
+        intervals = [(0, 300, "day"), (60, 90, "a"), (120, 150, "b"), (200, 260, "c"), (300, 330, "after")]
+        assert sorted(find_overlaps(intervals)) == [("day", "a"), ("day", "b"), ("day", "c")]
+
+    def test_touching_events_do_not_conflict(self):
+        assert find_overlaps([(0, 60, "a"), (60, 120, "b")]) == []
+
+    def test_matches_brute_force(self):
+        rng = random.Random(42)
+        intervals = []
+        for i in range(400):
+            start = rng.randrange(0, 5000)
+            intervals.append((start, start + rng.choice((0, 15, 30, 60, 240)), i))
+        assert {frozenset(p) for p in find_overlaps(intervals)} == brute_force(intervals)
+
+
+class TestConflictIndex:
+    def make_index(self, events):
+        store = EventStore()
+        for e in events:
+            store.upsert(e)
+        index = ConflictIndex(store)
+        index.rebuild()
+        return store, index
+
+    def test_rules(self):
+        store, index = self.make_index([
+            event("standup", 0, 30),
+            event("copy", 0, 30, summary="standup", calendar="personal"),
+            event("vacation", 0, 24 * 60, all_day=True),
+            event("review", 15, 30),
+        ])
+        pairs = {frozenset((a.event_id, b.event_id)) for a, b in index.conflicts()}
+        assert pairs == {frozenset(("standup", "review")), frozenset(("copy", "review"))}
+
+    def test_incremental_update_matches_rebuild(self):
+        rng = random.Random(7)
+        events = [event(f"e{i}", rng.randrange(0, 3000, 15), rng.choice((15, 30, 60, 300))) for i in range(300)]
+        store, index = self.make_index(events)
+
+        for _ in range(100):
+            target = rng.choice(events)
+            if rng.random() < 0.2:
+                change = store.remove(target.key)
+            else:
+                current = store.get(target.key) or target
+                shift = timedelta(minutes=rng.choice((-45, 30, 90)))
+                change = store.upsert(CalendarEvent(**{**current.__dict__, "start": current.start + shift, "end": current.end + shift}))
+            if change:
+                index.update(change)
+
+        incremental = {frozenset((a.key, b.key)) for a, b in index.conflicts()}
+        fresh = ConflictIndex(store)
+        assert incremental == {frozenset((a.key, b.key)) for a, b in fresh.conflicts()}
+
+    def test_window_filter_and_format(self):
+        _, index = self.make_index([event("a", 0, 60), event("b", 30, 60), event("c", 24 * 60, 60), event("d", 24 * 60 + 30, 60)])
+        window = index.conflicts(BASE, BASE + timedelta(hours=12))
+        assert [(a.event_id, b.event_id) for a, b in window] == [("a", "b")]
+
+        conflict = conflict_dict(*window[0])
+        assert conflict["overlap_minutes"] == 30
+        assert conflict["time2"] == "01.01 09:30"
+
+
+def test_find_conflicts_reports_all_pairs():
+    events = [
+        {"summary": s, "calendar": "Работа", "start": BASE + timedelta(minutes=m), "end": BASE + timedelta(minutes=m + d)}
+        for s, m, d in (("Конференция", 0, 240), ("Созвон", 30, 30), ("Ревью", 120, 30))
+    ]
+    conflicts = find_conflicts(events)
+    assert [(c["event1"], c["event2"]) for c in conflicts] == [
+        ("Конференция (Работа)", "Созвон (Работа)"),
+        ("Конференция (Работа)", "Ревью (Работа)"),
+    ]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
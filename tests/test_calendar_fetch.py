@@ -0,0 +1,171 @@
+"""
+Tests for Google Calendar service reuse and parallel per-calendar fetch
+"""
+import time
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains import calendar
+from brains.circuit_breaker import CircuitBreaker
+
+
+class FakeRequest:
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+
+    def execute(self, http=None):
+        time.sleep(self.delay)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeService:
+    """Минимальный двойник googleapiclient: calendarList().list() и events().list()"""
+
+    def __init__(self, calendars, events, delay=0.2):
+        self.calendars = calendars
+        self.events_by_calendar = events
+        self.delay = delay
+        self.list_calls = 0
+
+    def calendarList(self):
+        return self
+
+    def events(self):
+        return self
+
+    def list(self, calendarId=None, **params):
+        if calendarId is None:
+            self.list_calls += 1
+            return FakeRequest({"items": self.calendars})
+        return FakeRequest(self.events_by_calendar[calendarId], self.delay)
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(calendar, "calendar_breaker", CircuitBreaker(name="calendar:test"))
+    monkeypatch.setattr(calendar, "_authorized_http", lambda: None)
+    calendar.invalidate_calendar_list()
+    yield
+    calendar.invalidate_calendar_list()
+
+
+def make_service(count=4, delay=0.2):
+    calendars = [{"id": f"cal{i}", "summary": f"Календарь {i}"} for i in range(count)]
+    events = {
+        f"cal{i}": {"items": [{
+            "summary": f"Встреча {i}",
+            "start": {"dateTime": f"2030-01-01T1{i}:00:00+03:00"},
+            "end": {"dateTime": f"2030-01-01T1{i}:30:00+03:00"},
+        }]}
+        for i in range(count)
+    }
+    return FakeService(calendars, events, delay)
+
+
+class TestParallelFetch:
+    @pytest.mark.asyncio
+    async def test_calendars_fetched_concurrently(self):
+        service = make_service(count=4, delay=0.2)
+        calendars = await calendar.list_calendars(service)
+
+        started = time.monotonic()
+        fetched = await calendar.fetch_calendar_events(service, calendars, singleEvents=True)
+        elapsed = time.monotonic() - started
+
+        assert [entry["id"] for entry, _ in fetched] == ["cal0", "cal1", "cal2", "cal3"]
+        assert all(len(items) == 1 for _, items in fetched)
+        assert elapsed < 0.6
+
+    @pytest.mark.asyncio
+    async def test_failed_calendar_does_not_break_others(self):
+        service = make_service(count=2, delay=0)
+        service.events_by_calendar["cal1"] = ValueError("bad request")
+
+        fetched = await calendar.fetch_calendar_events(service, service.calendars)
+        assert [items and len(items) for _, items in fetched] == [1, None]
+
+    @pytest.mark.asyncio
+    async def test_half_open_fetches_every_calendar(self, monkeypatch):
+        """Одна проба half-open на весь набор календарей, а не на первый"""
+        breaker = CircuitBreaker(name="calendar:test", max_failures=1, recovery_time=0.1, half_open_max_calls=1)
+        breaker.record_failure()
+        time.sleep(0.15)
+        monkeypatch.setattr(calendar, "calendar_breaker", breaker)
+        service = make_service(count=3, delay=0)
+
+        fetched = await calendar.fetch_calendar_events(service, service.calendars)
+        assert [len(items) for _, items in fetched] == [1, 1, 1]
+
+    @pytest.mark.asyncio
+    async def test_partial_result_not_cached(self, monkeypatch):
+        service = make_service(count=2, delay=0)
+        service.events_by_calendar["cal1"] = ValueError("bad request")
+        monkeypatch.setattr(calendar, "get_calendar_service", lambda: service)
+        monkeypatch.setattr(calendar, "store_ready", lambda: False)
+        monkeypatch.setattr(calendar, "_calendar_cache", {"events": None, "expire_at": None})
+
+        assert "Встреча 0" in await calendar.get_upcoming_events()
+        assert calendar._calendar_cache["events"] is None
+
+    @pytest.mark.asyncio
+    async def test_calendar_list_cached(self):
+        service = make_service(delay=0)
+        await calendar.list_calendars(service)
+        await calendar.list_calendars(service)
+        assert service.list_calls == 1
+
+        calendar.invalidate_calendar_list()
+        await calendar.list_calendars(service)
+        assert service.list_calls == 2
+
+    @pytest.mark.asyncio
+    async def test_conflicts_use_parallel_fetch(self, monkeypatch):
+        service = make_service(count=2, delay=0)
+        service.events_by_calendar["cal1"]["items"][0]["start"]["dateTime"] = "2030-01-01T10:15:00+03:00"
+        monkeypatch.setattr(calendar, "get_calendar_service", lambda: service)
+
+        conflicts = await calendar.check_calendar_conflicts()
+        assert len(conflicts) == 1
+        assert conflicts[0]["overlap_minutes"] == 15
+
+
+@pytest.mark.asyncio
+async def test_bad_event_does_not_drop_day(monkeypatch):
+    service = make_service(count=1, delay=0)
+    today = calendar.datetime.now(calendar.timezone(calendar.timedelta(hours=3))).strftime("%Y-%m-%d")
+    service.events_by_calendar["cal0"]["items"] = [
+        {"id": "ok", "summary": "Стендап", "start": {"dateTime": f"{today}T10:00:00+03:00"},
+         "end": {"dateTime": f"{today}T10:30:00+03:00"}},
+        {"id": "no-end", "summary": "Битое", "start": {"dateTime": f"{today}T11:00:00+03:00"}},
+        {"id": "bad-date", "summary": "Битое", "start": {"dateTime": f"{today}T25:00:00"}, "end": {"dateTime": f"{today}T26:00:00"}},
+    ]
+    monkeypatch.setattr(calendar, "get_calendar_service", lambda: service)
+    monkeypatch.setattr(calendar, "store_ready", lambda: False)
+
+    events = await calendar.get_today_calendar_events()
+    assert [e["id"] for e in events] == ["ok"]
+
+
+class TestServiceReuse:
+    def test_service_built_once(self, monkeypatch):
+        built = []
+        monkeypatch.setattr(calendar, "_service", None)
+        monkeypatch.setattr(calendar, "GOOGLE_CALENDAR_CREDENTIALS", "{}")
+        monkeypatch.setattr(calendar, "_load_credentials", lambda: object())
+        monkeypatch.setattr(calendar, "build", lambda *args, **kwargs: built.append(kwargs) or object())
+
+        first = calendar.get_calendar_service()
+        assert calendar.get_calendar_service() is first
+        assert len(built) == 1
+        assert built[0]["static_discovery"] is True
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
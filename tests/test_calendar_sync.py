@@ -0,0 +1,283 @@
+"""
+Tests for incremental calendar sync, the local event store and meeting reminders
+"""
+from datetime import datetime, timedelta, timezone
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.errors import HttpError
+
+from brains import calendar, calendar_sync as sync_module
+from brains.calendar_conflicts import ConflictIndex
+from brains.calendar_sync import (
+    CalendarEvent, CalendarSyncEngine, EventStore, parse_event,
+    sync_meeting_reminders, schedule_upcoming_reminders
+)
+from brains.circuit_breaker import CircuitBreaker
+from brains.reminders import reminder_manager
+
+MSK = timezone(timedelta(hours=3))
+
+
+def item(event_id, start, minutes=30, summary=None, status="confirmed"):
+    return {
+        "id": event_id,
+        "status": status,
+        "summary": summary or f"Встреча {event_id}",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+    }
+
+
+class FakeResponse:
+    status = 410
+    reason = "Gone"
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self, http=None):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeSyncService:
+    """events().list() с поведением syncToken: полная выдача, затем только изменения"""
+
+    def __init__(self, items):
+        self.items = {i["id"]: i for i in items}
+        self.changed = []
+        self.token_version = 0
+        self.requests = []
+        self.expire_token = False
+
+    def calendarList(self):
+        return self
+
+    def events(self):
+        return self
+
+    def change(self, new_item):
+        self.items[new_item["id"]] = new_item
+        self.changed.append(new_item)
+
+    def list(self, calendarId=None, **params):
+        if calendarId is None:
+            return FakeRequest({"items": [{"id": "work", "summary": "Работа"}]})
+        self.requests.append(params)
+        if "syncToken" in params:
+            if self.expire_token:
+                self.expire_token = False
+                return FakeRequest(HttpError(FakeResponse(), b"gone"))
+            result = {"items": list(self.changed)}
+        else:
+            result = {"items": [i for i in self.items.values() if i["status"] != "cancelled"]}
+        self.changed = []
+        self.token_version += 1
+        result["nextSyncToken"] = f"token-{self.token_version}"
+        return FakeRequest(result)
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(calendar, "calendar_breaker", CircuitBreaker(name="calendar:test"))
+    monkeypatch.setattr(calendar, "_authorized_http", lambda: None)
+    calendar.invalidate_calendar_list()
+    saved = []
+
+    async def fake_save(reminder):
+        saved.append(reminder)
+
+    monkeypatch.setattr(reminder_manager, "_save_to_db", fake_save)
+    monkeypatch.setattr(reminder_manager, "reminders", {})
+    yield
+    calendar.invalidate_calendar_list()
+
+
+def make_engine(monkeypatch, service):
+    engine = CalendarSyncEngine(path=None)
+    monkeypatch.setattr(calendar, "get_calendar_service", lambda: service)
+    return engine
+
+
+class TestEventStore:
+    def test_between_includes_long_running_events(self):
+        store = EventStore()
+        base = datetime(2030, 1, 1, 9, tzinfo=MSK)
+        store.upsert(parse_event(item("long", base, minutes=480), "c", "C"))
+        store.upsert(parse_event(item("short", base + timedelta(hours=3)), "c", "C"))
+        store.upsert(parse_event(item("later", base + timedelta(days=1)), "c", "C"))
+
+        window = store.between(base + timedelta(hours=4), base + timedelta(hours=5))
+        assert [e.event_id for e in window] == ["long"]
+        assert [e.event_id for e in store.between(base, base + timedelta(hours=12))] == ["long", "short"]
+
+    def test_upsert_reports_changes(self):
+        store = EventStore()
+        event = parse_event(item("a", datetime(2030, 1, 1, 9, tzinfo=MSK)), "c", "C")
+        assert store.upsert(event).kind == "created"
+        assert store.upsert(event) is None
+        moved = parse_event(item("a", datetime(2030, 1, 1, 10, tzinfo=MSK)), "c", "C")
+        change = store.upsert(moved)
+        assert change.kind == "updated" and change.previous.start.hour == 9
+        assert len(store.between(datetime(2030, 1, 1, tzinfo=MSK))) == 1
+
+
+class TestIncrementalSync:
+    @pytest.mark.asyncio
+    async def test_full_then_incremental(self, monkeypatch):
+        start = datetime.now(MSK) + timedelta(days=2)
+        service = FakeSyncService([item("a", start), item("b", start + timedelta(hours=2))])
+        engine = make_engine(monkeypatch, service)
+
+        changes = await engine.sync()
+        assert {c.kind for c in changes} == {"created"}
+        assert len(engine.store) == 2
+        assert "timeMin" in service.requests[0]
+
+        service.change(item("b", start + timedelta(hours=2), status="cancelled"))
+        service.change(item("c", start + timedelta(hours=5)))
+        changes = await engine.sync()
+
+        assert service.requests[-1]["syncToken"] == "token-1"
+        assert sorted((c.kind, c.event.event_id) for c in changes) == [("cancelled", "b"), ("created", "c")]
+        assert engine.incremental_syncs == 1
+        assert engine.ready
+
+    @pytest.mark.asyncio
+    async def test_expired_token_triggers_full_resync(self, monkeypatch):
+        start = datetime.now(MSK) + timedelta(days=1)
+        service = FakeSyncService([item("a", start), item("b", start + timedelta(hours=1))])
+        engine = make_engine(monkeypatch, service)
+        await engine.sync()
+
+        # Пока токен был недействителен, событие удалили
+        del service.items["b"]
+        service.expire_token = True
+        changes = await engine.sync()
+
+        assert [(c.kind, c.event.event_id) for c in changes] == [("cancelled", "b")]
+        assert engine.full_syncs == 2
+
+
+class TestMeetingReminders:
+    @pytest.mark.asyncio
+    async def test_changes_drive_reminders(self, monkeypatch):
+        start = datetime.now(MSK) + timedelta(hours=2)
+        service = FakeSyncService([item("a", start)])
+        engine = make_engine(monkeypatch, service)
+        engine.subscribe(sync_meeting_reminders)
+
+        await engine.sync()
+        reminder_id = f"meeting_{int(start.timestamp())}"
+        assert reminder_id in reminder_manager.reminders
+
+        # Встречу перенесли: старое напоминание снято, новое поставлено
+        moved = start + timedelta(hours=1)
+        service.change(item("a", moved))
+        await engine.sync()
+        assert reminder_id not in reminder_manager.reminders
+        assert f"meeting_{int(moved.timestamp())}" in reminder_manager.reminders
+
+        # Встречу отменили
+        service.change(item("a", moved, status="cancelled"))
+        await engine.sync()
+        assert not reminder_manager.reminders
+
+    @pytest.mark.asyncio
+    async def test_horizon_sweep(self, monkeypatch):
+        now = datetime.now(MSK)
+        engine = CalendarSyncEngine(path=None)
+        engine.store.upsert(CalendarEvent("work", "soon", "Работа", "Скоро", now + timedelta(hours=3), now + timedelta(hours=4)))
+        engine.store.upsert(CalendarEvent("work", "far", "Работа", "Потом", now + timedelta(days=3), now + timedelta(days=3, hours=1)))
+        monkeypatch.setattr(sync_module, "calendar_sync", engine)
+
+        assert await schedule_upcoming_reminders(now) == 1
+        assert await schedule_upcoming_reminders(now) == 0
+
+
+class TwoCalendarService(FakeSyncService):
+    """Два календаря; второй можно сломать"""
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.personal_broken = True
+
+    def list(self, calendarId=None, **params):
+        if calendarId is None:
+            return FakeRequest({"items": [{"id": "work", "summary": "Работа"}, {"id": "personal", "summary": "Личное"}]})
+        if calendarId == "personal":
+            if self.personal_broken:
+                return FakeRequest(ConnectionError("calendar down"))
+            return FakeRequest({"items": [], "nextSyncToken": "personal-1"})
+        return super().list(calendarId, **params)
+
+
+@pytest.mark.asyncio
+async def test_ready_only_after_every_calendar_synced_and_fresh(monkeypatch):
+    service = TwoCalendarService([item("a", datetime.now(MSK) + timedelta(hours=3))])
+    engine = make_engine(monkeypatch, service)
+
+    await engine.sync()
+    assert len(engine.store) == 1 and not engine.ready
+
+    service.personal_broken = False
+    await engine.sync()
+    assert engine.ready and engine.is_fresh(60)
+
+    # Фоновая задача жива, но давно не синхронизировала — отвечает API
+    monkeypatch.setattr(sync_module, "calendar_sync", engine)
+    monkeypatch.setattr(sync_module, "is_sync_running", lambda: True)
+    monkeypatch.setattr(sync_module, "_sync_interval", 120)
+    assert sync_module.store_ready()
+    engine.last_sync -= 120 * sync_module.STALE_SYNC_INTERVALS + 1
+    assert not sync_module.store_ready()
+
+
+class FakeInsertService(FakeSyncService):
+    """events().insert() возвращает созданное событие, как API"""
+
+    def insert(self, calendarId=None, body=None):
+        return FakeRequest({"id": "created", "status": "confirmed", **body})
+
+
+@pytest.mark.asyncio
+async def test_created_event_is_conflict_checked(monkeypatch):
+    start = (datetime.now(MSK) + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    service = FakeInsertService([item("a", start, minutes=60)])
+    engine = make_engine(monkeypatch, service)
+    index = ConflictIndex(engine.store)
+    engine.subscribe(index.on_changes)
+    await engine.sync()
+    assert index.conflicts() == []
+
+    monkeypatch.setattr(calendar, "calendar_sync", engine)
+    monkeypatch.setattr(calendar, "store_ready", lambda: True)
+    assert await calendar.create_event("Созвон", start + timedelta(minutes=30), create_reminder=False)
+
+    pairs = [(a.event_id, b.event_id) for a, b in index.conflicts()]
+    assert pairs == [("a", "created")]
+
+
+def test_store_roundtrip(tmp_path):
+    path = str(tmp_path / "store.json")
+    engine = CalendarSyncEngine(path=path)
+    engine.store.upsert(parse_event(item("a", datetime(2030, 1, 1, 9, tzinfo=MSK)), "work", "Работа"))
+    engine.sync_tokens["work"] = "token-7"
+    engine.save()
+
+    restored = CalendarSyncEngine(path=path)
+    assert restored.load()
+    assert restored.sync_tokens == {"work": "token-7"}
+    assert restored.store.all() == engine.store.all()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -10,6 +10,8 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from brains.ai import CircuitBreaker
+from brains.circuit_breaker import BreakerState, BreakerRegistry, RetryBudget, MISTRAL_EMBED
+from brains.shared_state import MemoryStateBackend
 
 
 class TestCircuitBreaker:
@@ -94,5 +96,171 @@ class TestCircuitBreaker:
         assert breaker.is_open == False
 
 
+class TestHalfOpen:
+    """Тесты для half-open состояния"""
+
+    def _tripped(self, **kwargs):
+        breaker = CircuitBreaker(max_failures=1, recovery_time=0.1, **kwargs)
+        breaker.record_failure()
+        time.sleep(0.15)
+        return breaker
+
+    def test_limited_probes(self):
+        """В half-open пропускается только half_open_max_calls запросов"""
+        breaker = self._tripped(half_open_max_calls=2)
+
+        assert breaker.allow_request() == True
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow_request() == True
+        assert breaker.allow_request() == False
+
+    def test_probe_failure_reopens(self):
+        """Неудачная проба снова открывает breaker"""
+        breaker = self._tripped()
+
+        assert breaker.allow_request() == True
+        breaker.record_failure()
+
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.allow_request() == False
+
+    def test_is_available_does_not_reserve_probe(self):
+        """is_available() не занимает пробный вызов"""
+        breaker = self._tripped()
+
+        assert breaker.is_available() == True
+        assert breaker.is_available() == True
+        assert breaker.allow_request() == True
+        assert breaker.is_available() == False
+
+
+    def test_release_probe_frees_slot(self):
+        """Проба без результата (429) возвращается и не держит breaker"""
+        breaker = self._tripped()
+
+        assert breaker.allow_request() == True
+        assert breaker.allow_request() == False
+        breaker.release_probe()
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow_request() == True
+
+        # После результата освобождать нечего
+        breaker.record_failure()
+        breaker.release_probe()
+        assert breaker.state == BreakerState.OPEN
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_probe_released(self, monkeypatch):
+        """429 в half-open не оставляет пробу занятой"""
+        import brains.ai as ai
+
+        class Response:
+            status_code = 429
+            headers = {"Retry-After": "0"}
+
+        async def post(*args, **kwargs):
+            return Response()
+
+        async def no_wait():
+            pass
+
+        breaker = self._tripped()
+        monkeypatch.setattr(ai, "ai_breaker", breaker)
+        monkeypatch.setattr(ai.http_clients.get(ai.MISTRAL), "post", post)
+        monkeypatch.setattr(ai.mistral_limiter, "wait_if_needed", no_wait)
+
+        assert await ai.mistral_request_with_retry("url", {}, {}) is None
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow_request() == True
+
+    @pytest.mark.asyncio
+    async def test_silent_voice_note_releases_probe(self, monkeypatch):
+        """Голосовое без речи в half-open не оставляет пробу HF STT занятой"""
+        import brains.stt as stt
+
+        breaker = self._tripped()
+        monkeypatch.setattr(stt, "stt_breaker", breaker)
+        monkeypatch.setattr(stt, "trim_silence", lambda audio: None)
+
+        assert await stt.HuggingFaceSTT().transcribe(b"ogg") is None
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow_request() == True
+
+
+class CountingBackend(MemoryStateBackend):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def update_breaker(self, name, mutate=None):
+        if mutate is not None:
+            self.writes += 1
+        return super().update_breaker(name, mutate)
+
+
+def test_success_on_clean_breaker_skips_write():
+    backend = CountingBackend()
+    breaker = CircuitBreaker(max_failures=3, name="clean", backend=backend)
+
+    breaker.record_success()
+    assert backend.writes == 0
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_success()
+    assert backend.writes == 2 and breaker.failures == 0
+
+
+class TestRetryBudget:
+    """Тесты для RetryBudget"""
+
+    def test_min_retries(self):
+        """Без трафика доступно min_retries повторов"""
+        budget = RetryBudget(min_retries=2, retry_ratio=0.0)
+
+        assert budget.try_retry() == True
+        assert budget.try_retry() == True
+        assert budget.try_retry() == False
+
+    def test_budget_grows_with_requests(self):
+        """Бюджет пополняется обычными запросами"""
+        budget = RetryBudget(min_retries=0, retry_ratio=0.5)
+        for _ in range(4):
+            budget.record_request()
+
+        assert budget.try_retry() == True
+        assert budget.try_retry() == True
+        assert budget.try_retry() == False
+        assert budget.snapshot()["retries_denied"] == 1
+
+    def test_next_delay(self):
+        """Задержка ограничена max_delay и учитывает Retry-After"""
+        budget = RetryBudget(min_retries=10, base_delay=1.0, max_delay=4.0)
+
+        assert 0 <= budget.next_delay(5) <= 4.0
+        assert budget.next_delay(0, retry_after=3.0) == 3.0
+        assert budget.next_delay(0, retry_after=60.0) == 4.0
+
+
+class TestBreakerRegistry:
+    """Тесты для BreakerRegistry"""
+
+    def test_breakers_per_upstream(self):
+        """Каждый сервис получает свой breaker"""
+        registry = BreakerRegistry(backend=MemoryStateBackend())
+        embed = registry.get(MISTRAL_EMBED)
+
+        assert registry.get(MISTRAL_EMBED) is embed
+        assert registry.get("rss:habr.com") is not embed
+
+        for _ in range(3):
+            embed.record_failure()
+
+        gauges = registry.gauges()
+        assert gauges[MISTRAL_EMBED]["state"] == "open"
+        assert gauges[MISTRAL_EMBED]["state_gauge"] == 2
+        assert gauges["rss:habr.com"]["state_gauge"] == 0
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
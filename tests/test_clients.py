@@ -0,0 +1,48 @@
+"""
+Tests for HTTP client registry
+"""
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.clients import HTTPClientRegistry, UPSTREAM_PROFILES, MISTRAL, RSS
+
+
+class TestHTTPClientRegistry:
+    """Тесты для HTTPClientRegistry"""
+
+    @pytest.mark.asyncio
+    async def test_client_reused(self):
+        """Один пул на сервис"""
+        registry = HTTPClientRegistry()
+        assert registry.get(MISTRAL) is registry.get(MISTRAL)
+        assert registry.get(MISTRAL) is not registry.get(RSS)
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_unknown_upstream_uses_default(self):
+        """Неизвестный сервис получает профиль по умолчанию"""
+        registry = HTTPClientRegistry()
+        client = registry.get("unknown")
+        assert client.timeout.read == UPSTREAM_PROFILES["default"].timeout.read
+        await registry.aclose()
+
+    @pytest.mark.asyncio
+    async def test_recreated_after_close(self):
+        """После закрытия клиент пересоздаётся"""
+        registry = HTTPClientRegistry()
+        first = registry.get(MISTRAL)
+        await registry.aclose()
+
+        assert first.is_closed
+        second = registry.get(MISTRAL)
+        assert second is not first
+        assert not second.is_closed
+        await registry.aclose()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,100 @@
+"""
+Tests for the sandboxed ReAct command runner: limits, output capping, group kill, queueing
+"""
+import asyncio
+import os
+import sys
+import time
+import pytest
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.command_runner import RESOURCE_AVAILABLE, CommandRunner
+from brains.exceptions import CommandOverloadedError
+
+pytestmark = pytest.mark.skipif(not RESOURCE_AVAILABLE, reason="rlimit и группы процессов только на POSIX")
+
+
+def pid_alive(pid: int) -> bool:
+    """Процесс работает (зомби без родителя-сборщика не считается)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.asyncio
+async def test_output_is_truncated_but_drained():
+    runner = CommandRunner(max_output_kb=1)
+    result = await runner.run("head -c 5000000 /dev/zero | tr '\\0' 'a'; echo done >&2")
+    assert result["success"] and result["truncated"]
+    assert result["stdout"].startswith("a" * 1024)
+    assert "показано 1024 из 5000000 байт" in result["stdout"]
+    assert result["stderr"] == "done\n"
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_whole_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    runner = CommandRunner()
+    started = time.monotonic()
+    result = await runner.run(f"sleep 30 & echo $! > {pid_file}; sleep 30", timeout=1)
+
+    assert time.monotonic() - started < 5
+    assert result["error"] == "Timeout after 1s" and result["returncode"] is None
+    await asyncio.sleep(0.1)
+    assert not pid_alive(int(pid_file.read_text()))
+    assert runner.get_stats()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_background_children_do_not_outlive_command(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    result = await CommandRunner().run(f"sleep 30 & echo $! > {pid_file}; echo ok", timeout=10)
+    assert result["success"], result
+    assert result["stdout"] == "ok\n"
+    await asyncio.sleep(0.1)
+    assert not pid_alive(int(pid_file.read_text()))
+
+
+@pytest.mark.asyncio
+async def test_cpu_limit_and_secret_free_env(monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "secret")
+    runner = CommandRunner(cpu_seconds=1)
+
+    result = await runner.run("echo \"key=$MISTRAL_API_KEY\"")
+    assert result["stdout"] == "key=\n"
+
+    result = await runner.run(f"{sys.executable} -c 'while True: pass'", timeout=20)
+    assert not result["success"]
+    assert "CPU" in result["error"]
+
+
+@pytest.mark.asyncio
+async def test_limits_applied_by_exec_wrapper():
+    """Лимиты видны в самой команде, включая число процессов"""
+    result = await CommandRunner(max_files=64, max_procs=16).run("cat /proc/self/limits")
+    assert result["success"], result
+    limits = {line[:26].strip(): line[26:].split() for line in result["stdout"].splitlines()[1:]}
+    assert limits["Max open files"][:2] == ["64", "64"]
+    assert limits["Max core file size"][:2] == ["0", "0"]
+    assert limits["Max processes"][0] != "unlimited"
+    assert int(limits["Max processes"][0]) >= 16
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_and_overflow_rejected():
+    runner = CommandRunner(max_concurrent=2, queue_size=1, queue_timeout=0.1)
+    tasks = [asyncio.create_task(runner.run("sleep 0.3")) for _ in range(4)]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert sum(isinstance(r, CommandOverloadedError) for r in results) == 1
+    assert sum(isinstance(r, dict) and r["success"] for r in results) == 3
+    stats = runner.get_stats()
+    assert stats["peak_running"] == 2 and stats["rejected"] == 1 and stats["running"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+"""
+Tests for the in-memory employee directory and its (month, day) birthday index
+"""
+import random
+from datetime import date, timedelta
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.employees import EmployeeDirectory, _occurrence
+
+
+def make_employees(count=200, seed=5):
+    rng = random.Random(seed)
+    employees = []
+    for emp_id in range(1, count + 1):
+        born = date(1970, 1, 1) + timedelta(days=rng.randrange(0, 365 * 30))
+        employees.append({"id": emp_id, "full_name": f"Сотрудник {emp_id}", "birthday": born.isoformat()})
+    employees.append({"id": 1001, "full_name": "Високосный", "birthday": "1992-02-29"})
+    employees.append({"id": 1002, "full_name": "Без даты", "birthday": None})
+    employees.append({"id": 1003, "full_name": "Битая дата", "birthday": "n/a"})
+    return employees
+
+
+def reference(employees, today, days):
+    """Перебор по календарю: кто празднует в каждый из дней окна"""
+    result = []
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        for emp in employees:
+            birthday = emp.get("birthday") or ""
+            if len(birthday) == 10 and birthday[4] == "-":
+                if _occurrence(day.year, int(birthday[5:7]), int(birthday[8:10])) == day:
+                    result.append((offset, emp["id"]))
+    return sorted(result)
+
+
+@pytest.fixture
+def directory(monkeypatch):
+    employees = make_employees()
+    service = EmployeeDirectory(refresh_interval=3600)
+    fetches = []
+
+    async def fake_fetch():
+        fetches.append(1)
+        return [dict(e) for e in employees]
+
+    monkeypatch.setattr(service, "_fetch", fake_fetch)
+    service.employees, service.fetches = employees, fetches
+    return service
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("today, days", [
+    (date(2026, 10, 19), 7),
+    (date(2026, 12, 28), 10),   # Переход через Новый год
+    (date(2026, 2, 20), 14),    # 29 февраля в невисокосный год — 28-е
+    (date(2028, 2, 27), 3),     # Високосный год
+    (date(2026, 3, 1), 364),
+])
+async def test_upcoming_matches_calendar_scan(directory, today, days):
+    upcoming = await directory.upcoming_birthdays(days, today=today)
+    assert sorted((e["days_until"], e["id"]) for e in upcoming) == reference(directory.employees, today, days)
+    assert [e["days_until"] for e in upcoming] == sorted(e["days_until"] for e in upcoming)
+
+    todays = await directory.todays_birthdays(today=today)
+    assert sorted(e["id"] for e in todays) == [i for offset, i in reference(directory.employees, today, 0)]
+    assert len(directory.fetches) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("today", [date(2026, 3, 1), date(2027, 12, 31), date(2028, 2, 29)])
+async def test_year_window_lists_each_employee_once(directory, today):
+    upcoming = await directory.upcoming_birthdays(365, today=today)
+    ids = [e["id"] for e in upcoming]
+    assert len(ids) == len(set(ids)) == 201
+    assert upcoming == await directory.upcoming_birthdays(364, today=today)
+
+
+@pytest.mark.asyncio
+async def test_leap_day_birthday_on_feb_28(directory):
+    assert 1001 in {e["id"] for e in await directory.todays_birthdays(today=date(2027, 2, 28))}
+    assert 1001 not in {e["id"] for e in await directory.todays_birthdays(today=date(2028, 2, 28))}
+    assert 1001 in {e["id"] for e in await directory.todays_birthdays(today=date(2028, 2, 29))}
+
+
+@pytest.mark.asyncio
+async def test_changes_update_index_without_refetch(directory):
+    today = date(2026, 10, 19)
+    await directory.ensure_loaded()
+
+    await directory.apply_change({"id": 2000, "full_name": "Новый", "birthday": "1990-10-19"})
+    assert 2000 in {e["id"] for e in await directory.todays_birthdays(today=today)}
+
+    await directory.apply_change({"id": 2000, "full_name": "Новый", "birthday": "1990-10-21"})
+    assert 2000 not in {e["id"] for e in await directory.todays_birthdays(today=today)}
+    upcoming = {e["id"]: e["days_until"] for e in await directory.upcoming_birthdays(3, today=today)}
+    assert upcoming[2000] == 2
+
+    await directory.apply_change(deleted_id=2000)
+    assert 2000 not in {e["id"] for e in await directory.upcoming_birthdays(3, today=today)}
+    assert len(directory.fetches) == 1
+
+    # Результаты — копии: правка не портит справочник
+    for emp in await directory.upcoming_birthdays(30, today=today):
+        emp["full_name"] = "x"
+    assert all(e["full_name"] != "x" for e in await directory.upcoming_birthdays(30, today=today))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
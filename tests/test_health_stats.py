@@ -0,0 +1,100 @@
+"""
+Tests for per-user health stats: 7/30/90-day windows, streaks and the TTL cache
+"""
+from datetime import datetime, timedelta
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.health import MOSCOW_TZ, HealthStatsService, current_streak, window_stats
+from brains.rollups import DailyRollup
+
+
+def day(offset, confirmed, today):
+    return {"date": (today - timedelta(days=offset)).isoformat(), "confirmed": confirmed, "time": "22:00:00"}
+
+
+class FakeStore:
+    """get_range поверх списка агрегатов"""
+
+    def __init__(self):
+        self.days = {}
+        self.calls = []
+
+    async def get_range(self, user_id, since):
+        self.calls.append((user_id, since))
+        return [r for (uid, d), r in sorted(self.days.items()) if uid == user_id and d >= since]
+
+    def add(self, user_id, offset, confirmed, records=1):
+        today = datetime.now(MOSCOW_TZ).date()
+        date = (today - timedelta(days=offset)).isoformat()
+        self.days[(user_id, date)] = DailyRollup(
+            user_id=user_id, date=date, health_records=records,
+            health_confirmed=int(confirmed), health_last_confirmed=confirmed, health_last_time="22:00:00",
+        )
+
+
+def test_streaks_and_windows():
+    today = datetime(2026, 10, 19).date()
+    # Новые первыми: сегодня ещё нет записи, 1-3 дня назад подтверждено, 4 — пропуск
+    daily = [day(1, True, today), day(2, True, today), day(3, True, today),
+             day(4, False, today), day(5, True, today), day(6, True, today), day(40, True, today)]
+
+    assert current_streak(daily, today) == 3
+    assert current_streak([day(0, False, today)] + daily, today) == 0
+    # Пропущенный без записи день рвёт серию
+    assert current_streak([day(2, True, today)], today) == 0
+
+    week = window_stats(daily, 7, today)
+    assert (week["total_days"], week["confirmed_days"], week["missed_days"]) == (6, 5, 1)
+    assert week["success_rate"] == 83.3 and week["best_streak"] == 3
+    assert window_stats(daily, 90, today)["total_days"] == 7
+
+
+@pytest.mark.asyncio
+async def test_one_query_for_all_windows_and_per_user():
+    store = FakeStore()
+    for offset in range(0, 60):
+        store.add(1, offset, confirmed=offset != 10)
+    store.add(2, 0, confirmed=False)
+    service = HealthStatsService(ttl=600, store=store)
+
+    week = await service.get(1, 7)
+    month = await service.get(1, 30)
+    quarter = await service.get(1, 90)
+    assert len(store.calls) == 1
+    assert week["success_rate"] == 100.0 and week["current_streak"] == 10
+    assert month["missed_days"] == 1 and month["best_streak"] == 20
+    assert quarter["total_days"] == 60 and set(quarter["windows"]) == {7, 30, 90}
+
+    other = await service.get(2, 7)
+    assert other["confirmed_days"] == 0 and other["current_streak"] == 0
+    assert len(store.calls) == 2
+
+    # Окно шире 90 дней — отдельная выборка
+    await service.get(1, 180)
+    assert store.calls[-1][0] == 1 and len(store.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_invalidate_after_new_record():
+    store = FakeStore()
+    service = HealthStatsService(ttl=600, store=store)
+
+    empty = await service.get(1, 7)
+    assert empty["message"] == "Нет данных" and empty["daily_stats"] == []
+
+    store.add(1, 0, confirmed=True)
+    assert (await service.get(1, 7))["total_days"] == 0  # Из кэша
+
+    service.invalidate(1)
+    fresh = await service.get(1, 7)
+    assert fresh["confirmed_days"] == 1 and fresh["current_streak"] == 1
+    assert service.get_stats()["hits"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
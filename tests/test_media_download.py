@@ -0,0 +1,66 @@
+"""
+Tests for zero-disk media download
+"""
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.exceptions import MediaTooLargeError
+from brains.media_download import download_event_media
+
+
+class FakeEvent:
+    """Сообщение Telegram с медиа заданного размера"""
+
+    def __init__(self, payload: bytes, size=None, ext=".ogg"):
+        self.payload = payload
+        self.file = SimpleNamespace(size=len(payload) if size is None else size, mime_type="audio/ogg", ext=ext)
+        self.targets = []
+
+    async def download_media(self, file=None):
+        self.targets.append(file)
+        if file is bytes:
+            return self.payload
+        with open(file, "wb") as f:
+            f.write(self.payload)
+        return file
+
+
+class TestDownloadEventMedia:
+    """Тесты для download_event_media"""
+
+    @pytest.mark.asyncio
+    async def test_small_file_in_memory(self):
+        event = FakeEvent(b"OggS" + b"x" * 100)
+        async with download_event_media(event, max_bytes=1024) as media:
+            assert media.in_memory
+            assert media.payload == event.payload
+        assert event.targets == [bytes]
+
+    @pytest.mark.asyncio
+    async def test_large_file_uses_unique_temp_file(self):
+        """Крупные файлы — в уникальный временный файл, который удаляется"""
+        first, second = FakeEvent(b"a" * 200), FakeEvent(b"b" * 200)
+        async with download_event_media(first, max_bytes=1024, memory_limit=100) as media_a:
+            async with download_event_media(second, max_bytes=1024, memory_limit=100) as media_b:
+                assert media_a.path != media_b.path
+                with open(media_a.path, "rb") as f:
+                    assert f.read() == b"a" * 200
+        assert not os.path.exists(media_a.path)
+        assert not os.path.exists(media_b.path)
+
+    @pytest.mark.asyncio
+    async def test_too_large_not_downloaded(self):
+        event = FakeEvent(b"", size=50 * 1024 * 1024)
+        with pytest.raises(MediaTooLargeError):
+            async with download_event_media(event, max_bytes=20 * 1024 * 1024):
+                pass
+        assert event.targets == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
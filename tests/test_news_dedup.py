@@ -0,0 +1,62 @@
+"""
+Tests for local news dedup index
+"""
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.news_dedup import NewsDedupIndex, normalize_url, simhash, hamming
+
+
+class TestNewsDedupIndex:
+    """Тесты для NewsDedupIndex"""
+
+    def test_normalized_links(self):
+        """utm-метки, www и слэш не делают новость новой"""
+        assert normalize_url("https://www.Example.com/a/?utm_source=tg") == normalize_url("http://example.com/a")
+
+        index = NewsDedupIndex()
+        index.add("https://example.com/a", "")
+        assert index.is_duplicate("https://www.example.com/a/?utm_campaign=x")
+        assert not index.is_duplicate("https://example.com/b")
+
+    def test_repost_with_other_url(self):
+        """Перепост с другим URL ловится по заголовку"""
+        index = NewsDedupIndex()
+        index.add("https://habr.com/1", "Минтранс утвердил новые правила установки тахографов")
+
+        assert index.is_duplicate("https://other.ru/x", "Минтранс утвердил новые правила установки тахографов с 1 марта")
+        assert not index.is_duplicate("https://other.ru/y", "Вебинар по цифровизации автопарка пройдёт 12 марта")
+
+    def test_simhash_distance(self):
+        """Разные заголовки далеко друг от друга"""
+        a = simhash("Новости телематики за неделю")
+        b = simhash("Вебинар по цифровизации автопарка")
+        assert hamming(a, a) == 0
+        assert hamming(a, b) > 6
+
+    def test_eviction(self):
+        """Старые записи вытесняются"""
+        index = NewsDedupIndex(max_entries=2)
+        index.add_many([{"link": f"https://example.com/{i}", "title": f"Заголовок номер {i}"} for i in range(3)])
+        assert len(index) == 2
+        assert not index.is_duplicate("https://example.com/0")
+
+    def test_persistence(self, tmp_path):
+        """Индекс переживает перезапуск"""
+        path = str(tmp_path / "dedup.json")
+        index = NewsDedupIndex(path)
+        index.add("https://example.com/a", "ГЛОНАСС: итоги года для рынка телематики")
+        index.save()
+
+        restored = NewsDedupIndex(path)
+        assert restored.load()
+        assert restored.is_duplicate("https://example.com/a")
+        assert restored.is_duplicate("https://x.ru/1", "Итоги года для рынка телематики — ГЛОНАСС")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,132 @@
+"""
+Tests for incremental RSS fetching
+"""
+import pytest
+import asyncio
+import httpx
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains import news
+from brains.circuit_breaker import CircuitBreaker
+from brains.news import fetch_rss, parse_feed, get_feed_state, FEED_STATES
+
+
+def make_feed(count: int) -> bytes:
+    items = "".join(
+        f"<item><title>Новость {i}</title><link>https://example.com/{i}</link>"
+        f"<pubDate>Mon, 02 Mar 2026 10:00:00 GMT</pubDate></item>"
+        for i in range(count)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><rss><channel>{items}</channel></rss>'.encode()
+
+
+SOURCE = {"name": "Test", "url": "https://feeds.example.com/rss", "category": "telematics", "ttl": 60}
+
+
+@pytest.fixture(autouse=True)
+def clean_states(monkeypatch):
+    FEED_STATES.clear()
+    # Локальный breaker вместо общего хранилища
+    monkeypatch.setattr(news, "get_source_breaker", lambda source: CircuitBreaker(name="rss:test"))
+    yield
+    FEED_STATES.clear()
+
+
+class TestFeedParsing:
+    """Тесты парсинга фидов"""
+
+    def test_stops_after_max_items(self):
+        """Берём не больше 15 новостей"""
+        items = parse_feed(make_feed(40), SOURCE)
+        assert len(items) == 15
+        assert items[0]["link"] == "https://example.com/0"
+
+    def test_atom_entries(self):
+        """Atom фиды тоже разбираются"""
+        doc = (
+            '<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>ГЛОНАСС</title>'
+            '<link href="https://example.com/a"/></entry></feed>'
+        ).encode()
+        items = parse_feed(doc, SOURCE)
+        assert items[0]["link"] == "https://example.com/a"
+        assert items[0]["score"] == 1
+
+
+class TestConditionalGet:
+    """Тесты условного GET и TTL"""
+
+    @pytest.mark.asyncio
+    async def test_not_modified_reuses_items(self):
+        """304 возвращает ранее загруженные новости"""
+        seen_headers = []
+
+        def handler(request):
+            seen_headers.append(request.headers.get("if-none-match"))
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, content=make_feed(3), headers={"ETag": '"v1"'})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            first = await fetch_rss(client, SOURCE)
+            # TTL ещё не истёк — запроса нет
+            assert await fetch_rss(client, SOURCE) == first
+            assert len(seen_headers) == 1
+
+            second = await fetch_rss(client, SOURCE, force=True)
+
+        assert seen_headers == [None, '"v1"']
+        assert second == first
+        assert get_feed_state(SOURCE).not_modified == 1
+
+    @pytest.mark.asyncio
+    async def test_backoff_for_failing_source(self):
+        """Падающий источник ставится на паузу"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(500)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            assert await fetch_rss(client, SOURCE) == []
+            assert await fetch_rss(client, SOURCE, force=True) == []
+
+        state = get_feed_state(SOURCE)
+        assert len(calls) == 1
+        assert state.failures == 1
+        assert state.next_fetch_at > state.fetched_at
+
+
+class TestRefresh:
+    """Тесты обновления всех фидов"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_refresh_shares_fetch(self, monkeypatch):
+        """Вызов во время фонового обновления ждёт его, а не грузит фиды заново"""
+        calls = []
+
+        async def fake_fetch(client, source, force=False):
+            calls.append(force)
+            await asyncio.sleep(0.05)
+            return [{"title": "Новость", "link": "https://example.com/1"}]
+
+        monkeypatch.setattr(news, "NEWS_SOURCES", [SOURCE])
+        monkeypatch.setattr(news, "fetch_rss", fake_fetch)
+
+        background = asyncio.create_task(news.refresh_all_feeds())
+        await asyncio.sleep(0)
+        first, second = await asyncio.gather(background, news.refresh_all_feeds())
+
+        assert first == second and len(first) == 1
+        assert calls == [False]
+
+        await news.refresh_all_feeds(force=True)
+        assert calls == [False, True]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
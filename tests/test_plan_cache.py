@@ -0,0 +1,165 @@
+"""
+Tests for the ReAct plan cache: slot extraction, re-binding, success tracking and eviction
+"""
+from datetime import datetime
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.plan_cache import PlanCache, PlanLookup, bind, extract_slots, is_read_only, templatize
+from brains.react_agent import ReActAgent, steps_from_data
+
+DAY1 = datetime(2026, 10, 19, 9, 0)
+DAY2 = datetime(2026, 10, 20, 9, 0)
+
+CALENDAR_PLAN = [
+    {"id": 1, "description": "Календарь на 2026-10-20", "tool": "get_calendar",
+     "parameters": {"date": "2026-10-20"}, "expected_result": "События", "depends_on": []},
+    {"id": 2, "description": "Записать задачи", "tool": "write_file",
+     "parameters": {"path": "/tmp/tasks.md", "content": "Задачи на 2026-10-20 (создано 2026-10-19)"},
+     "expected_result": "Файл создан", "depends_on": [1]},
+]
+
+READ_PLAN = [
+    {"id": 1, "description": "Прочитать файл", "tool": "read_file",
+     "parameters": {"path": "/tmp/a.txt"}, "expected_result": "Содержимое", "depends_on": []},
+]
+DELETE_PLAN = [
+    {"id": 1, "description": "Удалить файл", "tool": "run_command",
+     "parameters": {"command": "rm /tmp/a.txt"}, "expected_result": "Файл удалён", "depends_on": []},
+]
+
+
+def fake_embedder(vectors):
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        return vectors.get(text)
+    embed.calls = calls
+    return embed
+
+
+class TestSlots:
+    def test_relative_dates_and_paths(self):
+        template, slots = extract_slots("Проверь календарь на завтра и запиши задачи в /tmp/tasks.md", DAY1)
+        assert template == "проверь календарь на <date> и запиши задачи в <path>"
+        assert [(s.kind, s.value) for s in slots] == [("date", "2026-10-20"), ("path", "/tmp/tasks.md")]
+
+    def test_numbers_do_not_match_inside_dates(self):
+        _, slots = extract_slots("Покажи 5 последних записей за 05.11", DAY1)
+        assert [(s.kind, s.value) for s in slots] == [("num", "5"), ("date", "2026-11-05")]
+
+    def test_templatize_and_bind_roundtrip(self):
+        _, slots = extract_slots("Календарь на завтра в /tmp/tasks.md", DAY1)
+        template = templatize(CALENDAR_PLAN, slots)
+        assert template[0]["parameters"]["date"] == "{{0}}"
+        assert template[1]["parameters"]["path"] == "{{1}}"
+
+        _, new_slots = extract_slots("Календарь на завтра в /home/karina/todo.md", DAY2)
+        bound = bind(template, new_slots)
+        assert bound[0]["parameters"]["date"] == "2026-10-21"
+        assert bound[1]["parameters"]["path"] == "/home/karina/todo.md"
+
+
+class TestPlanCache:
+    @pytest.mark.asyncio
+    async def test_rebinds_dates_on_next_day(self):
+        cache = PlanCache(path=None, embed=fake_embedder({}))
+        task = "Проверь календарь на завтра и создай задачи в /tmp/tasks.md"
+
+        first = await cache.lookup(task, now=DAY1)
+        assert not first.hit
+        cache.record(first, CALENDAR_PLAN, success=True)
+
+        second = await cache.lookup(task, now=DAY2)
+        assert second.hit and second.similarity == 1.0
+        assert second.steps[0]["parameters"]["date"] == "2026-10-21"
+        assert second.steps[1]["parameters"]["content"] == "Задачи на 2026-10-21 (создано 2026-10-20)"
+
+    @pytest.mark.asyncio
+    async def test_embedding_match_requires_same_slots(self):
+        vectors = {
+            "подведи итоги недели": [1.0, 0.0],
+            "сделай итоги недели": [0.99, 0.05],
+            "сделай итоги за <num> недели": [0.99, 0.05],
+        }
+        embed = fake_embedder(vectors)
+        cache = PlanCache(path=None, similarity=0.95, embed=embed)
+        lookup = await cache.lookup("Подведи итоги недели", now=DAY1)
+        cache.record(lookup, READ_PLAN, success=True)
+
+        assert (await cache.lookup("Сделай итоги недели", now=DAY1)).hit
+        assert not (await cache.lookup("Сделай итоги за 2 недели", now=DAY1)).hit
+
+    @pytest.mark.asyncio
+    async def test_side_effect_plan_needs_exact_template(self):
+        embed = fake_embedder({"удали файл <path>": [1.0, 0.0], "прочитай файл <path>": [0.99, 0.05]})
+        cache = PlanCache(path=None, similarity=0.95, embed=embed)
+        lookup = await cache.lookup("Удали файл /tmp/a.txt", now=DAY1)
+        cache.record(lookup, DELETE_PLAN, success=True)
+
+        assert not (await cache.lookup("Прочитай файл /tmp/a.txt", now=DAY1)).hit
+        assert (await cache.lookup("Удали файл /tmp/b.txt", now=DAY1)).hit
+
+        assert is_read_only(READ_PLAN) and not is_read_only(CALENDAR_PLAN)
+        assert is_read_only([{"tool": "api_call", "parameters": {"url": "https://x"}}])
+        assert not is_read_only([{"tool": "api_call", "parameters": {"method": "post"}}])
+
+    @pytest.mark.asyncio
+    async def test_failed_plan_is_evicted(self):
+        cache = PlanCache(path=None, min_success_rate=0.7, embed=fake_embedder({}))
+        lookup = await cache.lookup("Подведи итоги недели", now=DAY1)
+        cache.record(lookup, CALENDAR_PLAN, success=True)
+
+        for _ in range(3):
+            hit = await cache.lookup("Подведи итоги недели", now=DAY1)
+            cache.record(hit, hit.steps, success=True)
+        hit = await cache.lookup("Подведи итоги недели", now=DAY1)
+        cache.record(hit, hit.steps, success=False)
+        assert hit.entry.uses == 5 and len(cache) == 1
+
+        hit = await cache.lookup("Подведи итоги недели", now=DAY1)
+        cache.record(hit, hit.steps, success=False)
+        assert len(cache) == 0
+        assert cache.get_stats()["evicted_failed"] == 1
+
+    def test_failed_fresh_plan_not_stored_and_persisted(self, tmp_path):
+        path = str(tmp_path / "plans.json")
+        cache = PlanCache(path=path, embed=fake_embedder({}))
+        template, slots = extract_slots("Проверь /tmp/a.txt", DAY1)
+        cache.record(PlanLookup("Проверь /tmp/a.txt", template, slots), CALENDAR_PLAN, success=False)
+        assert len(cache) == 0
+
+        cache.record(PlanLookup("Проверь /tmp/a.txt", template, slots), CALENDAR_PLAN, success=True)
+        restored = PlanCache(path=path)
+        assert restored.load() and list(restored.entries) == [template]
+
+
+@pytest.mark.asyncio
+async def test_agent_skips_planner_on_repeat(monkeypatch):
+    agent = ReActAgent(plan_cache=PlanCache(path=None, embed=fake_embedder({})))
+    planned = []
+
+    async def fake_plan(task, context=None):
+        planned.append(task)
+        return steps_from_data([dict(step) for step in CALENDAR_PLAN])
+
+    async def fake_execute(tool_name, **kwargs):
+        return {"success": True, "message": "ok", "data": "события"}
+
+    monkeypatch.setattr(agent.planner, "create_plan", fake_plan)
+    monkeypatch.setattr(agent.tools, "execute", fake_execute)
+
+    first = await agent.execute_task("Проверь календарь на завтра")
+    second = await agent.execute_task("Проверь календарь на завтра")
+    assert first.success and second.success
+    assert not first.plan_cached and second.plan_cached
+    assert len(planned) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
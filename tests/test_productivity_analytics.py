@@ -0,0 +1,133 @@
+"""
+Tests for columnar productivity analytics over daily rollups and its per-(user, window) cache
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.productivity_analytics import ProductivityAnalytics
+from brains.rollups import build_rollups
+
+MAX_WORK_HOURS = 9
+NIGHT_START = 22
+HABITS = ["Здоровый сон", "Обед", "Перерывы", "Планирование"]
+
+
+def make_rows(days=60, seed=3):
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    sessions, habits = [], []
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        start = day + timedelta(hours=rng.randint(6, 11), minutes=rng.randrange(0, 60, 5))
+        end = start + timedelta(hours=rng.uniform(4, 14))
+        sessions.append({
+            "date": day.strftime('%Y-%m-%d'),
+            "start_time": start.isoformat() + "+03:00",
+            "end_time": end.isoformat(),
+            "duration_hours": round((end - start).total_seconds() / 3600, 2),
+            "meetings_count": rng.randint(0, 6),
+        })
+        for habit in rng.sample(HABITS, rng.randint(0, len(HABITS))):
+            habits.append({"date": day.strftime('%Y-%m-%d'), "habit_name": habit, "completed": rng.random() < 0.7})
+    return sessions, habits
+
+
+def reference(sessions, habits, days):
+    """Прежний построчный расчёт"""
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    sessions = [s for s in sessions if s["date"] >= cutoff]
+    starts = [datetime.fromisoformat(s["start_time"]) for s in sessions]
+    ends = [datetime.fromisoformat(s["end_time"]) for s in sessions]
+    avg_start = sum(t.hour * 60 + t.minute for t in starts) / len(starts)
+    avg_end = sum(t.hour * 60 + t.minute for t in ends) / len(ends)
+    patterns = {
+        "avg_start_time": f"{int(avg_start // 60):02d}:{int(avg_start % 60):02d}",
+        "avg_end_time": f"{int(avg_end // 60):02d}:{int(avg_end % 60):02d}",
+        "avg_duration": round(sum(s["duration_hours"] for s in sessions) / len(sessions), 1),
+        "overwork_days": sum(s["duration_hours"] > MAX_WORK_HOURS for s in sessions),
+        "weekend_work_days": sum(t.weekday() >= 5 for t in starts),
+        "late_night_days": sum(t.hour >= NIGHT_START for t in ends),
+        "total_meetings": sum(s["meetings_count"] for s in sessions),
+        "total_days": len(sessions),
+    }
+    stats = {}
+    for record in habits:
+        if record["date"] < cutoff:
+            continue
+        habit = stats.setdefault(record["habit_name"], {"total": 0, "completed": 0})
+        habit["total"] += 1
+        habit["completed"] += record["completed"]
+    for habit in stats.values():
+        habit["rate"] = round(habit["completed"] / habit["total"] * 100, 1)
+    overwork = {s["date"] for s in sessions if s["duration_hours"] > MAX_WORK_HOURS}
+    return patterns, stats, overwork
+
+
+@pytest.fixture
+def analytics(monkeypatch):
+    sessions, habits = make_rows()
+    days = build_rollups(1, habit_rows=habits, work_rows=sessions,
+                         max_work_hours=MAX_WORK_HOURS, night_start=NIGHT_START)
+    service = ProductivityAnalytics(ttl=600)
+    fetches = []
+
+    async def fake_fetch(user_id, since):
+        fetches.append(since)
+        return [days[d] for d in sorted(days) if d >= since]
+
+    monkeypatch.setattr(service, "_fetch", fake_fetch)
+    service.rows, service.fetches = (sessions, habits), fetches
+    return service
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("days", [1, 7, 30, 45])
+async def test_matches_row_by_row_calculation(analytics, days):
+    aggregates = await analytics.get(1, days)
+    patterns, habits, overwork = reference(*analytics.rows, days)
+
+    assert aggregates.patterns == patterns
+    assert aggregates.habits == habits
+    assert {d["date"] for d in aggregates.overwork} == overwork
+    dates = [d["date"] for d in aggregates.overwork]
+    assert dates == sorted(dates, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_windows_share_one_load_and_invalidate(analytics):
+    await analytics.get(1, 7)
+    await analytics.get(1, 30)
+    await analytics.get(1, 7)
+    assert len(analytics.fetches) == 1
+    assert analytics.get_stats()["hits"] == 1
+
+    analytics.invalidate(1)
+    await analytics.get(1, 7)
+    assert len(analytics.fetches) == 2
+
+    # Окно шире загруженного — догрузка
+    await analytics.get(1, 45)
+    assert len(analytics.fetches) == 3
+
+
+@pytest.mark.asyncio
+async def test_empty_data(monkeypatch):
+    service = ProductivityAnalytics()
+
+    async def fake_fetch(user_id, since):
+        return []
+
+    monkeypatch.setattr(service, "_fetch", fake_fetch)
+    aggregates = await service.get(2, 7)
+    assert aggregates.patterns == {"error": "Недостаточно данных"}
+    assert aggregates.habits == {} and aggregates.overwork == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
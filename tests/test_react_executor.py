@@ -0,0 +1,120 @@
+"""
+Tests for dependency-aware parallel step execution in the ReAct agent
+"""
+import asyncio
+import time
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.plan_cache import PlanCache
+from brains.react_agent import PlanExecutor, ReActAgent, Step, steps_from_data, topological_order
+
+
+def step(step_id, depends_on=()):
+    return Step(step_id, f"Шаг {step_id}", "read_file", {"path": f"/tmp/{step_id}"}, "ok", list(depends_on))
+
+
+def sleeping_runner(delay=0.1, fail=(), log=None):
+    async def run(s):
+        if log is not None:
+            log.append(("start", s.id))
+        await asyncio.sleep(delay)
+        if log is not None:
+            log.append(("end", s.id))
+        return {"step_id": s.id, "success": s.id not in fail}
+    return run
+
+
+class TestPlanParsing:
+    def test_missing_depends_on_means_sequential(self):
+        data = [
+            {"id": 1, "description": "a", "tool": "read_file", "parameters": {}, "expected_result": ""},
+            {"id": 2, "description": "b", "tool": "read_file", "parameters": {}, "expected_result": ""},
+            {"id": 3, "description": "c", "tool": "read_file", "parameters": {}, "expected_result": "", "depends_on": []},
+            {"id": 4, "description": "d", "tool": "nope", "parameters": {}, "expected_result": ""},
+            {"id": 5, "description": "e", "tool": "read_file", "parameters": {}, "expected_result": "", "depends_on": [4, 5, 1]},
+        ]
+        steps = steps_from_data(data, {"read_file"})
+        assert [(s.id, s.depends_on) for s in steps] == [(1, []), (2, [1]), (3, []), (5, [1])]
+
+    def test_cycle_detected(self):
+        assert topological_order([step(1, [2]), step(2, [1])]) is None
+        assert [s.id for s in topological_order([step(2, [1]), step(1)])] == [1, 2]
+
+
+class TestPlanExecutor:
+    @pytest.mark.asyncio
+    async def test_independent_steps_run_concurrently(self):
+        plan = [step(1), step(2), step(3), step(4, [1, 2, 3])]
+        started = time.monotonic()
+        results = await PlanExecutor(max_parallel=3).run(plan, sleeping_runner(0.1))
+        elapsed = time.monotonic() - started
+
+        assert [r["step_id"] for r in results] == [1, 2, 3, 4]
+        assert all(r["success"] for r in results)
+        assert elapsed < 0.3
+        assert results[3]["started_at"] >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_parallelism_is_bounded(self):
+        active, peak = 0, 0
+
+        async def run(s):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+            return {"step_id": s.id, "success": True}
+
+        await PlanExecutor(max_parallel=2).run([step(i) for i in range(1, 7)], run)
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_failure_skips_downstream_only(self):
+        log = []
+        plan = [step(1), step(2, [1]), step(3, [2]), step(4)]
+        results = await PlanExecutor().run(plan, sleeping_runner(0.01, fail={1}, log=log))
+        by_id = {r["step_id"]: r for r in results}
+
+        assert by_id[2]["skipped"] and by_id[3]["skipped"]
+        assert by_id[4]["success"]
+        assert ("start", 2) not in log and ("start", 3) not in log
+
+    @pytest.mark.asyncio
+    async def test_cycle_falls_back_to_sequential(self):
+        log = []
+        await PlanExecutor().run([step(1, [2]), step(2, [1])], sleeping_runner(0.01, log=log))
+        assert log == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+
+
+@pytest.mark.asyncio
+async def test_agent_reports_step_timing(monkeypatch):
+    async def no_embedding(text):
+        return None
+
+    agent = ReActAgent(max_parallel=3, plan_cache=PlanCache(path=None, embed=no_embedding))
+
+    async def fake_plan(task, context=None):
+        return [step(1), step(2), step(3, [1, 2])]
+
+    async def fake_execute(tool_name, **kwargs):
+        await asyncio.sleep(0.05)
+        return {"success": True, "content": "ok"}
+
+    monkeypatch.setattr(agent.planner, "create_plan", fake_plan)
+    monkeypatch.setattr(agent.tools, "execute", fake_execute)
+
+    result = await agent.execute_task("прочитай файлы")
+    assert result.success
+    assert len(result.steps) == 3
+    assert all(s["elapsed"] >= 0.04 for s in result.steps)
+    assert result.elapsed < 0.14
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
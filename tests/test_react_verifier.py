@@ -0,0 +1,90 @@
+"""
+Tests for rule-based ReAct result verification (LLM judge only for ambiguous results)
+"""
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains import react_agent
+from brains.react_agent import FeedbackLoop, ResultVerifier, VERIFIER_STATS, get_verifier_stats
+
+
+@pytest.fixture
+def verifier():
+    return ResultVerifier()
+
+
+class TestResultVerifier:
+    def test_clean_command_passes(self, verifier):
+        result = {"success": True, "stdout": "done\n", "stderr": "", "returncode": 0}
+        verdict = verifier.verify("run_command", "Команда выполнена", result)
+        assert verdict["success"] and not verdict["needs_retry"]
+
+    def test_nonzero_returncode_fails_without_retry(self, verifier):
+        result = {"success": False, "stdout": "", "stderr": "ls: cannot access", "returncode": 2}
+        verdict = verifier.verify("run_command", "Список файлов", result)
+        assert not verdict["success"] and not verdict["needs_retry"]
+        assert verdict["issues"][0] == "Код возврата 2"
+
+    def test_known_errors(self, verifier):
+        timeout = verifier.verify("run_command", "", {"success": False, "error": "Timeout after 60s"})
+        assert not timeout["success"] and timeout["needs_retry"]
+
+        missing = verifier.verify("read_file", "", {"success": False, "error": "[Errno 2] No such file or directory"})
+        assert not missing["success"] and not missing["needs_retry"]
+
+    def test_success_never_goes_to_llm(self, verifier):
+        # Пустой вывод, ответ не по схеме, не найденная подстрока — успех по флагу
+        for tool, result in (
+            ("read_file", {"success": True, "content": ""}),
+            ("run_command", {"success": True, "stdout": "ok"}),
+            ("run_command", {"success": True, "stdout": "", "stderr": "", "returncode": 0}),
+        ):
+            verdict = verifier.verify(tool, "Содержимое конфига", result)
+            assert verdict["success"] and not verdict["needs_retry"]
+        assert verifier.verify("read_file", "", {"success": True, "content": ""})["verified_by"] == "rules:empty_output"
+
+    def test_unclassified_failure_goes_to_llm(self, verifier):
+        assert verifier.verify("api_call", "", {"success": False, "error": "boom"}) is None
+
+    def test_expected_substrings(self, verifier):
+        result = {"success": True, "content": "version = 1.2.3\nname = bot"}
+        assert verifier.verify("read_file", 'Файл содержит "version"', result)["verified_by"] == "rules:expected_substring"
+        missing = verifier.verify("read_file", 'Файл содержит «license»', result)
+        assert missing["success"] and missing["verified_by"] == "rules:substring_missing"
+
+
+@pytest.mark.asyncio
+async def test_llm_called_only_for_ambiguous(monkeypatch):
+    calls = []
+
+    async def fake_chat(prompt):
+        calls.append(prompt)
+        return '```json\n{"success": false, "issues": ["пусто"], "recommendations": [], "needs_retry": true, "alternative_approach": ""}\n```'
+
+    monkeypatch.setattr(react_agent, "mistral_chat", fake_chat)
+    monkeypatch.setitem(VERIFIER_STATS, "rules", 0)
+    monkeypatch.setitem(VERIFIER_STATS, "llm", 0)
+    feedback = FeedbackLoop()
+
+    assert (await feedback.analyze_result("ok", {"success": True, "content": "data"}, "read_file"))["success"]
+    assert not (await feedback.analyze_result("ok", {"success": False, "error": "Permission denied"}, "write_file"))["success"]
+    # Успешный запуск с пустым stdout — без LLM
+    empty = {"success": True, "stdout": "", "stderr": "", "returncode": 0}
+    assert (await feedback.analyze_result("Вывод команды", empty, "run_command"))["success"]
+    assert not calls
+
+    verdict = await feedback.analyze_result("ok", {"success": False, "error": "boom"}, "api_call")
+    assert verdict["verified_by"] == "llm" and verdict["needs_retry"]
+    assert len(calls) == 1 and "api_call" in calls[0]
+
+    stats = get_verifier_stats()
+    assert (stats["rules"], stats["llm"]) == (3, 1)
+    assert stats["skipped_share"] == pytest.approx(3 / 4)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,176 @@
+"""
+Tests for daily rollups: atomic increments, local cache and backfill
+"""
+from datetime import datetime, timedelta, timezone
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.rollups import DailyRollup, RollupStore, build_rollups
+
+MSK = timezone(timedelta(hours=3))
+
+
+class MemoryStore(RollupStore):
+    """RollupStore поверх словаря вместо Supabase"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.table = {}
+        self.selects = 0
+        self.fail_upsert = False
+
+    async def _select(self, user_id, since, until=None):
+        self.selects += 1
+        return [
+            dict(row) for (uid, day), row in self.table.items()
+            if uid == user_id and day >= since and (until is None or day <= until)
+        ]
+
+    async def _upsert(self, row):
+        if self.fail_upsert:
+            raise ConnectionError("supabase down")
+        key = (row["user_id"], row["date"])
+        self.table[key] = {**self.table.get(key, DailyRollup(*key).to_row()), **row}
+        return dict(self.table[key])
+
+    async def _increment(self, delta):
+        """Как increment_daily_rollup: сложение над текущей строкой таблицы"""
+        if self.fail_upsert:
+            raise ConnectionError("supabase down")
+        key = (delta["user_id"], delta["date"])
+        current = self.table.get(key)
+        if current is None:
+            self.table[key] = dict(delta)
+        else:
+            rollup = DailyRollup.from_row(current)
+            rollup.merge(DailyRollup.from_row(delta))
+            self.table[key] = rollup.to_row()
+        return dict(self.table[key])
+
+
+def test_latest_health_record_sets_day_status():
+    rollup = DailyRollup(user_id=1, date="2026-10-01")
+    rollup.add_health(True, "2026-10-01T21:00:00+03:00", "21:00:00")
+    # Запись с более ранним временем пришла позже (из другого источника)
+    rollup.add_health(False, "2026-10-01T05:00:00+00:00")
+
+    assert (rollup.health_records, rollup.health_confirmed) == (2, 1)
+    assert rollup.health_last_confirmed is True and rollup.health_last_time == "21:00:00"
+
+    # Числа NUMERIC из Supabase приходят строками
+    row = {**rollup.to_row(), "work_hours": "9.50", "work_max_hours": "9.50", "habits": {"Спорт": [1, 1]}}
+    restored = DailyRollup.from_row(row)
+    assert restored.work_hours == 9.5 and restored.habits == {"Спорт": [1, 1]}
+
+
+def test_build_rollups_from_raw_rows():
+    days = build_rollups(
+        7,
+        health_rows=[
+            {"date": "2026-10-01", "timestamp": "2026-10-01T09:00:00+03:00", "confirmed": True},
+            {"timestamp": "2026-10-02T09:00:00+03:00", "confirmed": False},
+        ],
+        habit_rows=[
+            {"date": "2026-10-01", "habit_name": "Обед", "completed": True},
+            {"date": "2026-10-01", "habit_name": "Обед", "completed": False},
+        ],
+        work_rows=[
+            {"date": "2026-10-03", "start_time": "2026-10-03T08:00:00", "end_time": "2026-10-03T23:00:00",
+             "duration_hours": 15, "meetings_count": 2},
+            {"date": "2026-10-03", "start_time": "2026-10-03T09:00:00", "end_time": "2026-10-03T12:00:00",
+             "duration_hours": 3, "meetings_count": None},
+        ],
+        goal_rows=[{"date": "2026-10-01", "goals": ["a", "b", "c"], "completed": [True, False, True]}],
+        max_work_hours=9, night_start=22,
+    )
+
+    assert sorted(days) == ["2026-10-01", "2026-10-02", "2026-10-03"]
+    assert days["2026-10-01"].habits == {"Обед": [2, 1]}
+    assert (days["2026-10-01"].goals_total, days["2026-10-01"].goals_completed) == (3, 2)
+    assert days["2026-10-02"].health_last_confirmed is False
+
+    work = days["2026-10-03"]
+    # 2026-10-03 — суббота
+    assert (work.work_sessions, work.work_hours, work.work_meetings) == (2, 18, 2)
+    assert (work.work_weekend, work.work_late, work.work_overwork) == (2, 1, 1)
+    assert work.work_start_min == 8 * 60 + 9 * 60
+    assert work.work_max_hours == 15 and work.work_max_end == "2026-10-03T23:00:00"
+
+
+def test_build_rollups_postgrest_timestamps():
+    """Доли секунды любой длины и "Z", как их отдаёт PostgREST (Python 3.10 тоже)"""
+    days = build_rollups(
+        7,
+        health_rows=[
+            {"date": "2026-10-19", "timestamp": "2026-10-19T08:00:00.12+00:00", "confirmed": False},
+            {"date": "2026-10-19", "timestamp": "2026-10-19T09:30:00Z", "confirmed": True},
+            {"date": "2026-10-19", "timestamp": "2026-10-19T07:00:00.1234567+00:00", "confirmed": False},
+        ],
+    )
+
+    day = days["2026-10-19"]
+    assert (day.health_records, day.health_confirmed) == (3, 1)
+    assert day.health_last_confirmed is True and day.health_last_time == "09:30:00"
+
+
+@pytest.mark.asyncio
+async def test_writes_update_cache_and_table():
+    store = MemoryStore(ttl=600)
+    today = datetime.now(MSK)
+    day = today.strftime('%Y-%m-%d')
+    since = (today - timedelta(days=7)).strftime('%Y-%m-%d')
+
+    assert await store.get_range(1, since) == []
+    await store.record_health(1, True, today)
+    await store.record_habit(1, day, "Спорт", True)
+    start = today.replace(hour=9, minute=0)
+    await store.record_work_session(1, start, start + timedelta(hours=10), 10, 3,
+                                    max_work_hours=9, night_start=22)
+    await store.set_goals(1, day, 4, 1)
+
+    # Записи обновили кэш: повторная загрузка не нужна
+    days = await store.get_range(1, since)
+    assert store.selects == 1 and store.get_stats()["hits"] == 1
+    assert len(days) == 1
+    rollup = days[0]
+    assert (rollup.health_records, rollup.work_overwork, rollup.goals_total) == (1, 1, 4)
+    assert rollup.habits == {"Спорт": [1, 1]}
+    assert store.table[(1, day)]["work_meetings"] == 3
+
+    # Второй воркер пишет в тот же день: запись прибавляется в БД, а не
+    # перезаписывает строку из его устаревшего кэша
+    other = MemoryStore(ttl=600)
+    other.table = store.table
+    await other.get_range(1, since)
+    await store.record_health(1, False, today + timedelta(minutes=1))
+    await other.record_health(1, True, today - timedelta(minutes=1))
+    await other.record_habit(1, day, "Спорт", False)
+
+    row = store.table[(1, day)]
+    assert row["health_records"] == 3 and row["health_confirmed"] == 2
+    assert row["health_last_confirmed"] is False  # Самая свежая запись
+    assert row["habits"] == {"Спорт": [2, 1]} and row["goals_total"] == 4
+    assert (await other.get_range(1, since))[0].health_records == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_upsert_drops_cache():
+    store = MemoryStore(ttl=600)
+    since = (datetime.now(MSK) - timedelta(days=7)).strftime('%Y-%m-%d')
+    await store.get_range(1, since)
+
+    store.fail_upsert = True
+    assert await store.record_health(1, True) is None
+    assert store.get_stats()["errors"] == 1
+
+    store.fail_upsert = False
+    assert await store.get_range(1, since) == []
+    assert store.selects == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,154 @@
+"""
+Tests for shared rate limiter / circuit breaker state
+"""
+import pytest
+import multiprocessing
+import sqlite3
+import time
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.shared_state import MemoryStateBackend, SQLiteStateBackend
+from brains.rate_limiter import RateLimiter
+from brains.ai import CircuitBreaker
+
+
+def _acquire_many(path, attempts, results):
+    """Воркер для проверки атомарности между процессами"""
+    backend = SQLiteStateBackend(path)
+    granted = 0
+    for _ in range(attempts):
+        allowed, _ = backend.try_acquire("mistral:global", calls=25, period=60)
+        granted += int(allowed)
+    backend.close()
+    results.put(granted)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """Оба бэкенда должны вести себя одинаково"""
+    if request.param == "memory":
+        instance = MemoryStateBackend()
+    else:
+        instance = SQLiteStateBackend(str(tmp_path / "state.db"))
+    yield instance
+    instance.close()
+
+
+class TestStateBackend:
+    """Тесты для StateBackend"""
+
+    def test_sliding_window(self, backend):
+        """Проверка скользящего окна"""
+        for i in range(3):
+            assert backend.try_acquire("k", calls=3, period=10, now=100.0 + i) == (True, 0.0)
+
+        allowed, retry_after = backend.try_acquire("k", calls=3, period=10, now=105.0)
+        assert allowed == False
+        assert retry_after == pytest.approx(5.0)
+        assert backend.count("k", period=10, now=105.0) == 3
+
+        # Старейший вызов вышел из окна
+        assert backend.try_acquire("k", calls=3, period=10, now=110.5)[0] == True
+
+    def test_reset(self, backend):
+        """Проверка сброса ключа"""
+        backend.try_acquire("k", calls=1, period=60)
+        backend.reset("k")
+        assert backend.count("k", period=60) == 0
+
+    def test_breaker_update(self, backend):
+        """Проверка атомарного изменения состояния breaker'а"""
+        assert backend.get_breaker("ai") == {}
+
+        backend.update_breaker("ai", lambda s: {"failures": s.get("failures", 0) + 1})
+        backend.update_breaker("ai", lambda s: {"failures": s.get("failures", 0) + 1})
+
+        assert backend.get_breaker("ai") == {"failures": 2}
+
+    def test_sqlite_survives_restart(self, tmp_path):
+        """Состояние сохраняется после перезапуска процесса"""
+        path = str(tmp_path / "state.db")
+        first = SQLiteStateBackend(path)
+        first.try_acquire("k", calls=5, period=60)
+        first.update_breaker("ai", lambda s: {"is_open": True})
+        first.close()
+
+        second = SQLiteStateBackend(path)
+        assert second.count("k", period=60) == 1
+        assert second.get_breaker("ai") == {"is_open": True}
+        second.close()
+
+    def test_sqlite_shared_between_processes(self, tmp_path):
+        """Несколько процессов не превышают общий лимит"""
+        path = str(tmp_path / "state.db")
+        SQLiteStateBackend(path).close()
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        workers = [ctx.Process(target=_acquire_many, args=(path, 20, results)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        assert sum(results.get(timeout=5) for _ in workers) == 25
+
+
+    def test_sqlite_busy_does_not_block(self, tmp_path):
+        """Занятый файл: лимитер закрыт, breaker решает локально, ожидание — миллисекунды"""
+        path = str(tmp_path / "state.db")
+        backend = SQLiteStateBackend(path, busy_timeout=0.02)
+        backend.update_breaker("ai", lambda s: {"failures": 1})
+
+        holder = sqlite3.connect(path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        try:
+            started = time.perf_counter()
+            assert backend.try_acquire("k", calls=5, period=60) == (False, SQLiteStateBackend.BUSY_RETRY_AFTER)
+            state = backend.update_breaker("ai", lambda s: {"failures": s.get("failures", 0) + 1})
+            assert time.perf_counter() - started < 0.5
+            assert state == {"failures": 2}
+        finally:
+            holder.execute("ROLLBACK")
+            holder.close()
+
+        # Локальное изменение не сохранено, хранилище снова доступно
+        assert backend.get_breaker("ai") == {"failures": 1}
+        assert backend.try_acquire("k", calls=5, period=60) == (True, 0.0)
+        backend.close()
+
+
+class TestSharedLimiterAndBreaker:
+    """Лимитеры и breaker'ы поверх общего хранилища"""
+
+    @pytest.mark.asyncio
+    async def test_limiters_share_budget(self, tmp_path):
+        """Два лимитера (как два воркера) делят один бюджет"""
+        path = str(tmp_path / "state.db")
+        worker_a = RateLimiter(calls=2, period=60, name="mistral", backend=SQLiteStateBackend(path))
+        worker_b = RateLimiter(calls=2, period=60, name="mistral", backend=SQLiteStateBackend(path))
+
+        assert await worker_a.acquire() == True
+        assert await worker_b.acquire() == True
+        assert await worker_a.acquire() == False
+        assert worker_b.get_remaining() == 0
+
+    def test_breaker_shared_between_instances(self):
+        """Breaker, открытый одним воркером, виден другому"""
+        backend = MemoryStateBackend()
+        worker_a = CircuitBreaker(max_failures=2, name="mistral_chat", backend=backend)
+        worker_b = CircuitBreaker(max_failures=2, name="mistral_chat", backend=backend)
+
+        worker_a.record_failure()
+        worker_b.record_failure()
+
+        assert worker_a.is_open == True
+        assert worker_b.can_proceed() == False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,116 @@
+"""
+Tests for the weekly summary pipeline: concurrent sections, timeouts, precompute and schedule
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import brains.smart_summary as smart_summary
+from brains.smart_summary import due_delivery, generate_weekly_summary, next_occurrence, precompute_sections
+
+MSK = timezone(timedelta(hours=3))
+
+
+@pytest.fixture
+def sections(monkeypatch):
+    calls = []
+
+    def section(name, delay, result):
+        async def build(*args):
+            calls.append(name)
+            await asyncio.sleep(delay)
+            return result
+        return build
+
+    async def ai_summary(summary):
+        return "Отличная неделя"
+
+    monkeypatch.setattr(smart_summary, "_get_health_summary",
+                        section("health", 0.2, {**smart_summary.SECTION_DEFAULTS["health"], "confirmed": 5}))
+    monkeypatch.setattr(smart_summary, "_get_calendar_summary", section("calendar", 0.2, {"total_events": 1}))
+    monkeypatch.setattr(smart_summary, "_get_memories_summary",
+                        section("memories", 0.2, {"new_memories": 3, "categories": {}}))
+    monkeypatch.setattr(smart_summary, "_generate_ai_summary", ai_summary)
+    monkeypatch.setattr(smart_summary, "_precomputed", {})
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_sections_run_concurrently(sections):
+    started = time.perf_counter()
+    summary = await generate_weekly_summary(1, 7)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.45
+    assert summary["health"]["confirmed"] == 5 and summary["memories"]["new_memories"] == 3
+    assert summary["ai_summary"] == "Отличная неделя"
+    assert set(summary["timings"]) == {"health", "calendar", "memories", "ai_summary"}
+    assert all(ms >= 150 for name, ms in summary["timings"].items() if name != "ai_summary")
+
+
+@pytest.mark.asyncio
+async def test_slow_section_replaced_by_default(sections, monkeypatch):
+    async def stuck(*args):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(smart_summary, "_get_memories_summary", stuck)
+    before = smart_summary.summary_stats["sections"].get("memories", {}).get("timeouts", 0)
+
+    result, _ = await smart_summary.build_sections(1, 7, timeout=0.3)
+    assert result["memories"] == {"new_memories": 0, "categories": {}, "error": "timeout"}
+    assert result["health"]["confirmed"] == 5
+    assert smart_summary.summary_stats["sections"]["memories"]["timeouts"] == before + 1
+
+
+@pytest.mark.asyncio
+async def test_precomputed_sections_used_once(sections):
+    await precompute_sections(1, 7)
+    assert sorted(sections) == ["health", "memories"]
+
+    sections.clear()
+    summary = await generate_weekly_summary(1, 7)
+    assert sections == ["calendar"]
+    assert summary["precomputed"] == ["health", "memories"]
+    assert summary["health"]["confirmed"] == 5
+
+    # Второй отчёт считается заново
+    sections.clear()
+    await generate_weekly_summary(1, 7)
+    assert sorted(sections) == ["calendar", "health", "memories"]
+
+
+def test_schedule_fires_once_per_week(monkeypatch):
+    monkeypatch.setattr(smart_summary, "SUMMARY_WEEKDAY", 6)
+    monkeypatch.setattr(smart_summary, "SUMMARY_HOUR", 10)
+    # 2026-10-18 — воскресенье
+    sunday_10 = datetime(2026, 10, 18, 10, 0, tzinfo=MSK)
+
+    assert next_occurrence(datetime(2026, 10, 15, 12, 0, tzinfo=MSK), 6, 10) == sunday_10
+    assert next_occurrence(sunday_10, 6, 10) == sunday_10
+    assert next_occurrence(sunday_10 + timedelta(seconds=1), 6, 10) == sunday_10 + timedelta(days=7)
+
+    # Не в минуту 10:00, а в любой момент после неё
+    assert due_delivery(sunday_10 - timedelta(minutes=1), None, 6) is None
+    assert due_delivery(sunday_10 + timedelta(minutes=7), None, 6) == sunday_10
+    assert due_delivery(sunday_10 + timedelta(minutes=7), sunday_10, 6) is None
+    # Бот был выключен дольше окна досылки
+    assert due_delivery(sunday_10 + timedelta(hours=7), None, 6) is None
+
+
+def test_delivery_state_survives_restart(tmp_path):
+    path = str(tmp_path / "weekly_summary.json")
+    scheduled = datetime(2026, 10, 18, 10, 0, tzinfo=MSK)
+
+    assert smart_summary._load_last_sent(path) is None
+    smart_summary._save_last_sent(path, scheduled)
+    assert smart_summary._load_last_sent(path) == scheduled
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
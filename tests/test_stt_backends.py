@@ -0,0 +1,159 @@
+"""
+Tests for STT backend fallback order and silence trimming
+"""
+import asyncio
+import io
+import pytest
+import sys
+import os
+
+import numpy as np
+import soundfile as sf
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains import stt_local
+from brains.stt import LocalWhisperSTT, STTBackend, STTRouter, build_router, speech_bounds, trim_silence
+from brains.stt_local import LocalWhisperEngine
+
+
+class FakeBackend(STTBackend):
+    def __init__(self, name, result=None, available=True, delay=0.0, error=None, timeout=1.0):
+        self.name = name
+        self.result = result
+        self._available = available
+        self.delay = delay
+        self.error = error
+        self.timeout = timeout
+        self.calls = 0
+
+    @property
+    def available(self):
+        return self._available
+
+    async def transcribe(self, audio):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def make_voice(sample_rate=48000, silence=1.5, speech=1.0) -> np.ndarray:
+    quiet = np.zeros(int(sample_rate * silence), dtype=np.float32)
+    t = np.arange(int(sample_rate * speech), dtype=np.float32) / sample_rate
+    tone = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([quiet, tone, quiet])
+
+
+class TestSTTRouter:
+    @pytest.mark.asyncio
+    async def test_first_backend_wins(self):
+        local = FakeBackend("local", "привет")
+        remote = FakeBackend("remote", "hello")
+        router = STTRouter([local, remote])
+
+        assert await router.transcribe(b"ogg") == "привет"
+        assert remote.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_falls_back_on_error_empty_and_timeout(self):
+        broken = FakeBackend("local", error=RuntimeError("boom"))
+        empty = FakeBackend("empty", "  ")
+        slow = FakeBackend("slow", "поздно", delay=0.5, timeout=0.05)
+        remote = FakeBackend("remote", "текст")
+        router = STTRouter([broken, empty, slow, remote])
+
+        assert await router.transcribe(b"ogg") == "текст"
+        stats = router.get_stats()
+        assert stats["local"]["failed"] == 1
+        assert stats["slow"]["timeouts"] == 1
+        assert stats["remote"]["ok"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unavailable_backend_skipped(self):
+        local = FakeBackend("local", "локально", available=False)
+        remote = FakeBackend("remote", "удалённо")
+        router = STTRouter([local, remote])
+
+        assert await router.transcribe(b"ogg") == "удалённо"
+        assert local.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_no_backends(self):
+        assert await STTRouter([FakeBackend("local", available=False)]).transcribe(b"ogg") is None
+
+    @pytest.mark.asyncio
+    async def test_stuck_local_worker_killed_and_skipped(self, monkeypatch):
+        """Таймаут гасит зависший воркер, локальный STT пропускается до конца cooldown"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        monkeypatch.setattr(stt_local, "FASTER_WHISPER_AVAILABLE", True)
+        engine = LocalWhisperEngine(cooldown=60)
+        engine._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        worker_pid = await loop.run_in_executor(engine._executor, os.getpid)
+
+        async def stuck(audio):
+            return await loop.run_in_executor(engine._executor, __import__("time").sleep, 30)
+
+        local = LocalWhisperSTT(engine, timeout=0.2)
+        monkeypatch.setattr(engine, "transcribe", stuck)
+        remote = FakeBackend("remote", "текст")
+        router = STTRouter([local, remote])
+
+        assert await router.transcribe(b"ogg") == "текст"
+        assert not engine.available and engine._executor is None and engine.restarts == 1
+        for _ in range(50):
+            if not os.path.exists(f"/proc/{worker_pid}"):
+                break
+            await asyncio.sleep(0.05)
+        assert not os.path.exists(f"/proc/{worker_pid}")
+
+        # Во время cooldown локальный бэкенд даже не пробуется
+        assert await router.transcribe(b"ogg") == "текст"
+        assert router.get_stats()["local"]["timeouts"] == 1
+
+        engine.unavailable_until = 0
+        assert engine.available
+        await engine.shutdown()
+
+    def test_build_router_order(self):
+        assert [b.name for b in build_router("remote, local").backends] == ["remote", "local"]
+        assert [b.name for b in build_router("local,unknown,local").backends] == ["local"]
+
+
+class TestSilenceTrimming:
+    def test_speech_bounds(self):
+        audio = make_voice(16000)
+        start, end = speech_bounds(audio, 16000)
+        assert abs(start / 16000 - 1.3) < 0.05
+        assert abs(end / 16000 - 2.7) < 0.05
+
+    def test_silence_has_no_bounds(self):
+        assert speech_bounds(np.zeros(16000, dtype=np.float32), 16000) is None
+
+    def test_trim_ogg_opus(self):
+        buffer = io.BytesIO()
+        sf.write(buffer, make_voice(), 48000, format="OGG", subtype="OPUS")
+        original = buffer.getvalue()
+
+        trimmed = trim_silence(original)
+        audio, sample_rate = sf.read(io.BytesIO(trimmed))
+        assert len(audio) / sample_rate < 2.0
+        assert len(trimmed) < len(original)
+
+    def test_silent_voice_returns_none(self):
+        buffer = io.BytesIO()
+        sf.write(buffer, np.zeros(48000, dtype=np.float32), 48000, format="OGG", subtype="OPUS")
+        assert trim_silence(buffer.getvalue()) is None
+
+    def test_unreadable_audio_passed_through(self):
+        assert trim_silence(b"not audio") == b"not audio"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,79 @@
+"""
+Tests for content-addressed TTS audio cache
+"""
+import pytest
+import os
+import sys
+import time
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.tts_cache import TTSAudioCache, cache_key, prerender_static_phrases
+from brains.tts_pool import tts_pool
+
+
+class TestTTSAudioCache:
+    """Тесты для TTSAudioCache"""
+
+    def test_key_ignores_case_and_spaces(self):
+        """Регистр и пробелы не меняют ключ, голос и формат — меняют"""
+        assert cache_key("Доброе  утро!", "v3_1_ru", 48000, "ogg") == cache_key("доброе утро!", "v3_1_ru", 48000, "ogg")
+        assert cache_key("Доброе утро!", "v3_1_ru", 48000, "ogg") != cache_key("Доброе утро!", "baya_v2", 48000, "ogg")
+        assert cache_key("Доброе утро!", "v3_1_ru", 48000, "ogg") != cache_key("Доброе утро!", "v3_1_ru", 24000, "ogg")
+
+    def test_hit_and_miss(self, tmp_path):
+        cache = TTSAudioCache(str(tmp_path))
+        assert cache.get("Привет", "v3_1_ru", 48000, "ogg") is None
+
+        cache.put("Привет", "v3_1_ru", 48000, "ogg", b"audio")
+        assert cache.get("привет", "v3_1_ru", 48000, "ogg") == b"audio"
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+
+    def test_lru_eviction_by_size(self, tmp_path):
+        """При превышении лимита вытесняется давно не использованная фраза"""
+        cache = TTSAudioCache(str(tmp_path), max_bytes=25)
+        cache.put("a", "v", 48000, "ogg", b"x" * 10)
+        cache.put("b", "v", 48000, "ogg", b"x" * 10)
+        cache.get("a", "v", 48000, "ogg")  # a теперь свежее b
+        cache.put("c", "v", 48000, "ogg", b"x" * 10)
+
+        assert cache.contains("a", "v", 48000, "ogg")
+        assert not cache.contains("b", "v", 48000, "ogg")
+        assert cache.get_stats()["entries"] == 2
+
+    def test_survives_restart(self, tmp_path):
+        """Кэш и порядок LRU восстанавливаются с диска"""
+        cache = TTSAudioCache(str(tmp_path), max_bytes=25)
+        cache.put("old", "v", 48000, "ogg", b"x" * 10)
+        time.sleep(0.01)
+        cache.put("new", "v", 48000, "ogg", b"x" * 10)
+
+        restored = TTSAudioCache(str(tmp_path), max_bytes=15)
+        assert restored.contains("new", "v", 48000, "ogg")
+        assert not restored.contains("old", "v", 48000, "ogg")
+
+    @pytest.mark.asyncio
+    async def test_prerender_skips_cached(self, monkeypatch, tmp_path):
+        """Предрендер синтезирует только отсутствующие фразы"""
+        from brains import tts
+        cache = TTSAudioCache(str(tmp_path))
+        monkeypatch.setattr(tts, "tts_cache", cache)
+        monkeypatch.setattr("brains.tts_cache.tts_cache", cache)
+        calls = []
+
+        async def fake_synthesize(text, voice, format="ogg"):
+            calls.append(text)
+            return text.encode()
+
+        monkeypatch.setattr(tts_pool, "synthesize", fake_synthesize)
+
+        phrases = ["Пора сделать укол!", "Доброе утро!"]
+        assert await prerender_static_phrases(["v3_1_ru"], phrases, idle_pause=0) == 2
+        assert await prerender_static_phrases(["v3_1_ru"], phrases, idle_pause=0) == 0
+        assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
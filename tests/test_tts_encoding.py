@@ -0,0 +1,43 @@
+"""
+Tests for in-memory TTS audio encoding
+"""
+import pytest
+import numpy as np
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.tts import to_pcm16, encode_wav, encode_ogg_opus, SOUNDFILE_OPUS
+
+
+class TestTTSEncoding:
+    """Тесты кодирования аудио"""
+
+    def test_pcm16_normalization(self):
+        """Пик приводится к полной шкале int16"""
+        pcm = to_pcm16(np.array([0.1, -0.25, 0.05], dtype=np.float32))
+        assert pcm.dtype == np.int16
+        assert pcm.min() == -32767
+
+    def test_silence_does_not_produce_nan(self):
+        """Тишина остаётся тишиной"""
+        assert not to_pcm16(np.zeros(100)).any()
+
+    def test_wav_in_memory(self):
+        """WAV собирается без диска"""
+        data = encode_wav(to_pcm16(np.sin(np.arange(4800) / 10)), 48000)
+        assert data[:4] == b"RIFF"
+        assert len(data) == 44 + 4800 * 2
+
+    @pytest.mark.skipif(not SOUNDFILE_OPUS, reason="libsndfile без Opus")
+    def test_ogg_opus_in_memory(self):
+        """OGG Opus собирается в памяти"""
+        data = encode_ogg_opus(to_pcm16(np.sin(np.arange(48000) / 10)), 48000)
+        assert data[:4] == b"OggS"
+        assert b"OpusHead" in data[:200]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,121 @@
+"""
+Tests for TTS worker pool backpressure and metrics
+"""
+import pytest
+import asyncio
+import time
+import types
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.exceptions import TTSError, TTSOverloadedError
+from brains.process_pool import spawn_pool
+from brains.tts_pool import TTSWorkerPool, TTSMetrics
+
+
+def make_pool(monkeypatch, delay: float = 0.05, fail: bool = False, **kwargs):
+    """Пул с подменённым синтезом (без torch)"""
+    pool = TTSWorkerPool(workers=1, torch_threads=1, preload_voices=[], **kwargs)
+
+    async def fake_run(text, voice, format, submitted_at):
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("boom")
+        return text.encode(), 0.01, delay
+
+    monkeypatch.setattr(pool, "_run", fake_run)
+    return pool
+
+
+class TestTTSWorkerPool:
+    """Тесты для TTSWorkerPool"""
+
+    @pytest.mark.asyncio
+    async def test_synthesize_records_metrics(self, monkeypatch):
+        """Успешный синтез попадает в метрики"""
+        pool = make_pool(monkeypatch)
+        assert await pool.synthesize("привет", "v3_1_ru") == "привет".encode()
+
+        stats = pool.get_stats()
+        assert stats["completed"] == 1
+        assert stats["pending"] == 0
+        assert stats["synthesis_p50"] == pytest.approx(0.05)
+
+    @pytest.mark.asyncio
+    async def test_backpressure_rejects_when_full(self, monkeypatch):
+        """Сверх workers + queue_size запросы отклоняются"""
+        pool = make_pool(monkeypatch, delay=0.3, queue_size=1, queue_timeout=0.05)
+
+        results = await asyncio.gather(
+            *[pool.synthesize(f"фраза {i}", "v3_1_ru") for i in range(3)],
+            return_exceptions=True
+        )
+
+        assert sum(isinstance(r, bytes) for r in results) == 2
+        assert sum(isinstance(r, TTSOverloadedError) for r in results) == 1
+        assert pool.metrics.rejected == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_releases_slot(self, monkeypatch):
+        """Ошибка синтеза не занимает слот очереди"""
+        pool = make_pool(monkeypatch, fail=True, queue_size=0)
+
+        with pytest.raises(TTSError):
+            await pool.synthesize("раз", "v3_1_ru")
+        with pytest.raises(TTSError):
+            await pool.synthesize("два", "v3_1_ru")
+
+        assert pool.metrics.failed == 2
+        assert pool.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_includes_slot_wait(self, monkeypatch):
+        """Ожидание свободного слота входит в метрику очереди"""
+        pool = TTSWorkerPool(workers=1, queue_size=0, queue_timeout=1, torch_threads=1, preload_voices=[])
+
+        async def fake_run(text, voice, format, submitted_at):
+            queue_wait = time.time() - submitted_at
+            await asyncio.sleep(0.2)
+            return text.encode(), queue_wait, 0.2
+
+        monkeypatch.setattr(pool, "_run", fake_run)
+        await asyncio.gather(pool.synthesize("раз", "v3_1_ru"), pool.synthesize("два", "v3_1_ru"))
+
+        assert max(pool.metrics.queue_wait) >= 0.15
+
+    def test_workers_do_not_import_main(self, monkeypatch, tmp_path):
+        """Ни один spawn-воркер не исполняет главный модуль родителя"""
+        marker = tmp_path / "imports"
+        script = tmp_path / "fake_main.py"
+        script.write_text(f"open({str(marker)!r}, 'a').write('x')\n")
+        fake_main = types.ModuleType("__main__")
+        fake_main.__file__ = str(script)
+        monkeypatch.setitem(sys.modules, "__main__", fake_main)
+
+        executor = spawn_pool(3)
+        try:
+            # Задачи заняты одновременно — пул поднимает все три процесса
+            futures = [executor.submit(time.sleep, 0.5) for _ in range(3)]
+            for future in futures:
+                future.result(timeout=60)
+            assert len(executor._processes) == 3
+        finally:
+            executor.shutdown(wait=True)
+        assert not marker.exists()
+
+    def test_percentiles(self):
+        """p50/p95 по окну"""
+        metrics = TTSMetrics()
+        for i in range(1, 101):
+            metrics.record(i / 100, i / 10)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["queue_wait_p50"] == pytest.approx(0.5, abs=0.02)
+        assert snapshot["synthesis_p95"] == pytest.approx(9.5, abs=0.1)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,73 @@
+"""
+Tests for sentence-chunked streaming TTS
+"""
+import pytest
+import asyncio
+import sys
+import os
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains import tts
+from brains.tts import KarinaTTS, split_sentences, MAX_CHUNK_LENGTH
+from brains.tts_cache import TTSAudioCache
+from brains.tts_pool import tts_pool
+
+
+class TestSplitSentences:
+    """Тесты разбиения текста"""
+
+    def test_long_text_is_chunked(self):
+        """Ни один фрагмент не длиннее лимита, текст не теряется"""
+        text = "Первое предложение. " + "Длинный кусок текста, " * 30 + "конец."
+        chunks = split_sentences(text)
+
+        assert len(chunks) > 1
+        assert all(len(c) <= MAX_CHUNK_LENGTH for c in chunks)
+        assert " ".join(chunks).split() == text.split()
+
+    def test_prefers_comma_over_later_space(self):
+        """Длинное предложение режется по запятой, даже если пробел ближе к лимиту"""
+        text = "а" * 150 + ", " + " ".join(["слово"] * 20) + "."
+        chunks = split_sentences(text)
+
+        assert chunks[0] == "а" * 150 + ","
+
+    def test_hard_cut_without_spaces(self):
+        """Текст без запятых и пробелов режется ровно по лимиту"""
+        text = "а" * (MAX_CHUNK_LENGTH * 2 + 10)
+        chunks = split_sentences(text)
+
+        assert all(len(c) <= MAX_CHUNK_LENGTH for c in chunks)
+        assert "".join(chunks) == text
+
+    def test_short_first_sentence_merged(self):
+        """Слишком короткое первое предложение склеивается со следующим"""
+        assert split_sentences("Привет! Как дела?") == ["Привет! Как дела?"]
+
+
+class TestStreamSpeech:
+    """Тесты потокового синтеза"""
+
+    @pytest.mark.asyncio
+    async def test_chunks_in_order_and_first_audio_metric(self, monkeypatch, tmp_path):
+        """Фрагменты приходят по порядку, время до первого звука записано"""
+        async def fake_synthesize(text, voice, format="ogg"):
+            # Поздние фрагменты готовы раньше — порядок всё равно сохраняется
+            await asyncio.sleep(0.05 if text.startswith("Первое") else 0.01)
+            return text.encode()
+
+        monkeypatch.setattr(tts_pool, "synthesize", fake_synthesize)
+        monkeypatch.setattr(tts, "tts_cache", TTSAudioCache(str(tmp_path)))
+        recorded = len(tts_pool.metrics.first_audio)
+
+        text = "Первое предложение ответа. " + "Второе предложение, довольно длинное. " * 10
+        chunks = [audio.decode() async for audio in KarinaTTS().stream_speech(text)]
+
+        assert chunks == split_sentences(text.strip())
+        assert len(tts_pool.metrics.first_audio) == recorded + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+"""
+Tests for perceptual-hash vision result cache
+"""
+import io
+import pytest
+import sys
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.vision import _read_and_prepare, prepare_image
+from brains.vision_cache import VisionResultCache, dhash, hamming, prompt_key
+
+
+def make_screenshot(seed: int, size=(1200, 800)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 255, (8, 12), dtype=np.uint8)
+    return Image.fromarray(np.kron(blocks, np.ones((100, 100), dtype=np.uint8))).convert("RGB").resize(size)
+
+
+def make_receipt(total: int) -> Image.Image:
+    """Белый чек с мелким текстом: разные суммы почти не меняют dHash"""
+    image = Image.new("RGB", (600, 900), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(20):
+        draw.text((40, 40 + line * 40), f"Товар {line}  ....  {total + line * 7} руб.", fill="black")
+    return image
+
+
+def to_jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class TestDHash:
+    """Тесты перцептивного хэша"""
+
+    def test_recompressed_copy_is_close(self):
+        """Пережатая и уменьшенная копия почти не меняет хэш"""
+        original = make_screenshot(1)
+        copy = Image.open(io.BytesIO(to_jpeg(original.resize((600, 400)), quality=40)))
+
+        assert hamming(dhash(original), dhash(copy)) <= 4
+        assert hamming(dhash(original), dhash(make_screenshot(2))) > 10
+
+    def test_prepare_image_computes_hash(self):
+        """Хэш считается при предобработке и совпадает для той же картинки"""
+        raw = to_jpeg(make_screenshot(1), quality=90)
+        assert prepare_image(raw).dhash is not None
+        assert prepare_image(raw).dhash == prepare_image(raw).dhash
+        assert prepare_image(b"broken").dhash is None
+
+
+class TestVisionResultCache:
+    """Тесты для VisionResultCache"""
+
+    def test_near_duplicate_hit(self):
+        cache = VisionResultCache(threshold=4)
+        key = prompt_key("Распознай текст")
+        cache.add(1, key, 0b1011_0000, "Чек на 500 руб.")
+
+        assert cache.lookup(1, key, 0b1011_0011) == "Чек на 500 руб."
+        assert cache.lookup(1, key, 0b0100_1111_1111) is None
+        assert cache.hits == 1 and cache.misses == 1
+
+    def test_scoped_by_user_and_prompt(self):
+        """Другой пользователь или другой тип запроса — промах"""
+        cache = VisionResultCache(threshold=4)
+        cache.add(1, prompt_key("OCR"), 42, "текст")
+
+        assert cache.lookup(2, prompt_key("OCR"), 42) is None
+        assert cache.lookup(1, prompt_key("Чек"), 42) is None
+
+    def test_seed_from_history(self):
+        cache = VisionResultCache(threshold=0)
+        rows = [
+            {"user_id": 1, "analysis": "старый", "metadata": {}},
+            {"user_id": 1, "analysis": "паспорт", "metadata": {"dhash": "00000000000000ff", "prompt_key": "doc"}},
+        ]
+        assert cache.seed(rows) == 1
+        assert cache.lookup(1, "doc", 0xff) == "паспорт"
+
+    def test_different_receipts_do_not_share_entry(self):
+        """Для текстовых запросов — только точная копия, даже при равном dHash"""
+        first = _read_and_prepare(to_jpeg(make_receipt(500), quality=90))
+        second = _read_and_prepare(to_jpeg(make_receipt(1700), quality=90))
+        assert first.md5 != second.md5
+        assert hamming(first.dhash, second.dhash) <= 4
+
+        cache = VisionResultCache(threshold=4)
+        key = prompt_key("Чек")
+        cache.add(1, key, first.dhash, "Итого 500 руб.", first.md5)
+
+        assert cache.lookup(1, key, second.dhash, second.md5, exact=True) is None
+        assert cache.lookup(1, key, first.dhash, first.md5, exact=True) == "Итого 500 руб."
+        # Перцептивный режим их бы склеил
+        assert cache.lookup(1, key, second.dhash, second.md5) == "Итого 500 руб."
+
+        seeded = VisionResultCache(threshold=4)
+        seeded.seed([{"user_id": 1, "analysis": "Итого 500 руб.", "image_hash": first.md5,
+                      "metadata": {"dhash": f"{first.dhash:016x}", "prompt_key": key}}])
+        assert seeded.lookup(1, key, second.dhash, second.md5, exact=True) is None
+        assert seeded.lookup(1, key, first.dhash, first.md5, exact=True) == "Итого 500 руб."
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,67 @@
+"""
+Tests for vision image preprocessing
+"""
+import io
+import base64
+import pytest
+import sys
+import os
+
+from PIL import Image
+
+# Добавляем корень проекта в path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brains.vision import prepare_image, VISION_MAX_SIDE
+
+
+def make_image(size, mode="RGB", exif_orientation=None, format="JPEG") -> bytes:
+    image = Image.new(mode, size, (200, 100, 50, 128)[:len(mode)])
+    buffer = io.BytesIO()
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        exif[0x8825] = {2: (55.0, 45.0, 0.0)}  # GPS
+        image.save(buffer, format=format, exif=exif)
+    else:
+        image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def decode(prepared) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(prepared.base64_data)))
+
+
+class TestPrepareImage:
+    """Тесты для prepare_image"""
+
+    def test_downscale_and_strip_exif(self):
+        """Большое фото уменьшается, поворот применён, EXIF удалён"""
+        raw = make_image((4000, 3000), exif_orientation=6)
+        prepared = prepare_image(raw)
+        image = decode(prepared)
+
+        assert prepared.mime_type == "image/jpeg"
+        assert max(image.size) == VISION_MAX_SIDE
+        assert image.size[0] < image.size[1]  # Повёрнуто по EXIF
+        assert not image.getexif()
+        assert prepared.encoded_bytes < prepared.original_bytes
+
+    def test_small_image_not_upscaled(self):
+        prepared = prepare_image(make_image((300, 200)))
+        assert prepared.size == (300, 200)
+
+    def test_transparency_kept_as_webp(self):
+        prepared = prepare_image(make_image((500, 500), mode="RGBA", format="PNG"), "image/png")
+        assert prepared.mime_type == "image/webp"
+        assert decode(prepared).mode == "RGBA"
+
+    def test_broken_image_sent_as_is(self):
+        """Нераспознанные данные уходят без изменений"""
+        prepared = prepare_image(b"not an image", "image/png")
+        assert prepared.mime_type == "image/png"
+        assert base64.b64decode(prepared.base64_data) == b"not an image"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])